@@ -11,8 +11,9 @@ import os
 from datetime import datetime, timezone
 from typing import Any
 
-from flask import Blueprint, Flask, jsonify, render_template_string, request
+from flask import Blueprint, Flask, g, jsonify, render_template_string, request
 
+from bot.admin_api.auth import SCOPE_READ, SCOPE_ROLES_WRITE, require_admin_key
 from bot.data import db
 from bot.services.accounts_service import AccountsService
 from bot.services.council_pause_service import CouncilPauseService
@@ -104,6 +105,7 @@ def _write_role_audit(
 
 
 @admin_api_bp.get("/admin/api/users/<provider>/<provider_user_id>")
+@require_admin_key(SCOPE_READ)
 def admin_user_view(provider: str, provider_user_id: str):
     account_id = _resolve_account_id(provider, provider_user_id)
     if not account_id:
@@ -120,6 +122,7 @@ def admin_user_view(provider: str, provider_user_id: str):
 
 
 @admin_api_bp.get("/admin/api/users/<provider>/<provider_user_id>/roles/external")
+@require_admin_key(SCOPE_READ)
 def admin_user_external_roles(provider: str, provider_user_id: str):
     account_id = _resolve_account_id(provider, provider_user_id)
     if not account_id:
@@ -135,18 +138,38 @@ def admin_user_external_roles(provider: str, provider_user_id: str):
 
 
 @admin_api_bp.post("/admin/api/users/<provider>/<provider_user_id>/roles/custom")
+@require_admin_key(SCOPE_ROLES_WRITE)
 def admin_user_custom_roles(provider: str, provider_user_id: str):
     correlation_id = request.headers.get("X-Correlation-ID") or generate_request_id()
     request_id = generate_request_id()
     body = request.get_json(silent=True) or {}
     action = str(body.get("action") or "").strip().lower()
     role_name = str(body.get("role_id") or body.get("role_name") or "").strip().lower()
-    actor_provider = str(body.get("actor_provider") or "").strip().lower()
-    actor_user_id = str(body.get("actor_user_id") or "").strip()
+    # Актор берётся из проверенного ключа; поля actor_* в теле допускаются только как совпадающее подтверждение.
+    api_key = g.admin_api_key
+    actor_provider = api_key.actor_provider
+    actor_user_id = api_key.actor_user_id
+    claimed_provider = str(body.get("actor_provider") or "").strip().lower()
+    claimed_user_id = str(body.get("actor_user_id") or "").strip()
     source = str(body.get("source") or "custom").strip().lower() or "custom"
     reason = str(body.get("reason") or "").strip() or None
 
-    if action not in {"assign", "remove"} or not role_name or not actor_provider or not actor_user_id:
+    if (claimed_provider and claimed_provider != actor_provider) or (claimed_user_id and claimed_user_id != actor_user_id):
+        _log_admin_api_error(
+            level=logging.WARNING,
+            reason="permission_denied_actor_mismatch",
+            user_id=actor_user_id,
+            entity_type="role_assignment",
+            entity_id=role_name or None,
+            correlation_id=correlation_id,
+            request_id=request_id,
+            key_id=api_key.key_id,
+            claimed_provider=claimed_provider,
+            claimed_user_id=claimed_user_id,
+        )
+        return jsonify({"ok": False, "error": "actor_mismatch"}), 403
+
+    if action not in {"assign", "remove"} or not role_name:
         _log_admin_api_error(
             level=logging.WARNING,
             reason="validation_failed_bad_request",
@@ -276,12 +299,14 @@ def admin_user_custom_roles(provider: str, provider_user_id: str):
 
 
 @admin_api_bp.get("/admin/api/council/pause")
+@require_admin_key(SCOPE_READ)
 def admin_council_pause_status():
     status = CouncilPauseService.get_pause_status_for_admin()
     return jsonify({"ok": True, **status})
 
 
 @admin_api_bp.get("/admin/council/pause")
+@require_admin_key(SCOPE_READ)
 def admin_council_pause_view():
     status = CouncilPauseService.get_pause_status_for_admin()
     return render_template_string(
@@ -302,6 +327,7 @@ def admin_council_pause_view():
 
 
 @admin_api_bp.get("/admin/users/<provider>/<provider_user_id>/roles")
+@require_admin_key(SCOPE_READ)
 def admin_roles_view(provider: str, provider_user_id: str):
     account_id = _resolve_account_id(provider, provider_user_id)
     if not account_id:
@@ -356,15 +382,22 @@ def create_admin_app() -> Flask:
 
 
 def run_admin_api() -> None:
-    host = os.getenv("ADMIN_API_HOST", "0.0.0.0")
+    host = os.getenv("ADMIN_API_HOST", "127.0.0.1")
     port = int(os.getenv("ADMIN_API_PORT", os.getenv("PORT", "8080")))
+    threads = max(1, int(os.getenv("ADMIN_API_THREADS", "8")))
     debug = os.getenv("ADMIN_API_DEBUG", "").strip().lower() in {"1", "true", "yes", "on"}
 
     logging.basicConfig(level=logging.INFO)
-    logger.info("starting admin api host=%s port=%s debug=%s", host, port, debug)
+    logger.info("starting admin api host=%s port=%s threads=%s debug=%s", host, port, threads, debug)
 
     try:
-        create_admin_app().run(host=host, port=port, debug=debug)
+        if debug:
+            # Dev-сервер Flask — только для локальной отладки.
+            create_admin_app().run(host=host, port=port, debug=True)
+            return
+        from waitress import serve
+
+        serve(create_admin_app(), host=host, port=port, threads=threads, ident="bebrobot-admin-api")
     except Exception:
         logger.exception("admin api server crashed host=%s port=%s", host, port)
         raise
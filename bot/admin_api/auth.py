@@ -0,0 +1,269 @@
+"""
+Назначение: модуль "auth" реализует продуктовый контур в зоне общая логика (Admin API).
+Ответственность: проверка подписанных запросов и API-ключей admin API, защита от повторов и лимит запросов на ключ.
+Где используется: общая логика (Admin API, `bot/admin_api/app.py`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable
+
+from flask import g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+ADMIN_API_KEYS_ENV = "ADMIN_API_KEYS"
+ADMIN_API_SIGNATURE_WINDOW_SEC = int(os.getenv("ADMIN_API_SIGNATURE_WINDOW_SEC", "300"))
+ADMIN_API_DEFAULT_RATE_PER_MINUTE = int(os.getenv("ADMIN_API_RATE_PER_MINUTE", "60"))
+ADMIN_API_NONCE_LIMIT_PER_KEY = 10000
+
+SCOPE_READ = "read"
+SCOPE_ROLES_WRITE = "roles:write"
+
+HEADER_KEY_ID = "X-Admin-Key-Id"
+HEADER_TIMESTAMP = "X-Admin-Timestamp"
+HEADER_NONCE = "X-Admin-Nonce"
+HEADER_SIGNATURE = "X-Admin-Signature"
+
+
+@dataclass(frozen=True)
+class AdminApiKey:
+    key_id: str
+    secret: str
+    actor_provider: str
+    actor_user_id: str
+    scopes: frozenset[str]
+    rate_per_minute: int
+
+
+class AdminApiAuthError(Exception):
+    def __init__(self, status: int, error: str, *, retry_after: int | None = None) -> None:
+        super().__init__(error)
+        self.status = status
+        self.error = error
+        self.retry_after = retry_after
+
+
+def _body_digest(body: bytes) -> str:
+    return hashlib.sha256(body or b"").hexdigest()
+
+
+def _canonical_request(method: str, path: str, timestamp: str, nonce: str, body: bytes) -> bytes:
+    return "\n".join((method.upper(), path, timestamp, nonce, _body_digest(body))).encode("utf-8")
+
+
+def sign_admin_request(
+    secret: str,
+    method: str,
+    path: str,
+    body: bytes = b"",
+    *,
+    key_id: str,
+    timestamp: int | None = None,
+    nonce: str | None = None,
+) -> dict[str, str]:
+    """Заголовки подписанного запроса для клиента admin API: path включает query string, если он есть."""
+
+    timestamp_value = str(int(time.time()) if timestamp is None else int(timestamp))
+    nonce_value = nonce or uuid.uuid4().hex
+    signature = hmac.new(
+        secret.encode("utf-8"),
+        _canonical_request(method, path, timestamp_value, nonce_value, body),
+        hashlib.sha256,
+    ).hexdigest()
+    return {
+        HEADER_KEY_ID: key_id,
+        HEADER_TIMESTAMP: timestamp_value,
+        HEADER_NONCE: nonce_value,
+        HEADER_SIGNATURE: signature,
+    }
+
+
+class AdminApiGuard:
+    """Ключи читаются из ADMIN_API_KEYS (JSON-список); nonce и лимиты живут в памяти процесса admin API."""
+
+    _lock = threading.Lock()
+    _keys_source: str | None = None
+    _keys: dict[str, AdminApiKey] = {}
+    _seen_nonces: dict[str, OrderedDict[str, float]] = {}
+    # key_id -> [доступные токены, monotonic последнего пополнения]
+    _buckets: dict[str, list[float]] = {}
+
+    @staticmethod
+    def reset() -> None:
+        with AdminApiGuard._lock:
+            AdminApiGuard._keys_source = None
+            AdminApiGuard._keys = {}
+            AdminApiGuard._seen_nonces = {}
+            AdminApiGuard._buckets = {}
+
+    @staticmethod
+    def _parse_keys(raw: str) -> dict[str, AdminApiKey]:
+        try:
+            entries = json.loads(raw) if raw else []
+        except ValueError:
+            logger.error("admin api keys config invalid json env=%s", ADMIN_API_KEYS_ENV)
+            return {}
+        keys: dict[str, AdminApiKey] = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            key_id = str(entry.get("key_id") or "").strip()
+            secret = str(entry.get("secret") or "")
+            actor_provider = str(entry.get("actor_provider") or "").strip().lower()
+            actor_user_id = str(entry.get("actor_user_id") or "").strip()
+            if not key_id or len(secret) < 16 or not actor_provider or not actor_user_id:
+                logger.error("admin api key skipped key_id=%s reason=incomplete_entry", key_id or None)
+                continue
+            keys[key_id] = AdminApiKey(
+                key_id=key_id,
+                secret=secret,
+                actor_provider=actor_provider,
+                actor_user_id=actor_user_id,
+                scopes=frozenset(str(scope).strip() for scope in entry.get("scopes") or [SCOPE_READ]),
+                rate_per_minute=max(1, int(entry.get("rate_per_minute") or ADMIN_API_DEFAULT_RATE_PER_MINUTE)),
+            )
+        return keys
+
+    @staticmethod
+    def keys() -> dict[str, AdminApiKey]:
+        raw = (os.getenv(ADMIN_API_KEYS_ENV) or "").strip()
+        with AdminApiGuard._lock:
+            if raw != AdminApiGuard._keys_source:
+                AdminApiGuard._keys = AdminApiGuard._parse_keys(raw)
+                AdminApiGuard._keys_source = raw
+                logger.info("admin api keys loaded count=%s", len(AdminApiGuard._keys))
+            return AdminApiGuard._keys
+
+    @staticmethod
+    def _remember_nonce(key_id: str, nonce: str, now: float) -> bool:
+        with AdminApiGuard._lock:
+            seen = AdminApiGuard._seen_nonces.setdefault(key_id, OrderedDict())
+            while seen and next(iter(seen.values())) <= now:
+                seen.popitem(last=False)
+            if nonce in seen:
+                return False
+            # Nonce хранится столько, сколько подпись с ним может пройти проверку окна времени.
+            seen[nonce] = now + 2 * ADMIN_API_SIGNATURE_WINDOW_SEC
+            while len(seen) > ADMIN_API_NONCE_LIMIT_PER_KEY:
+                seen.popitem(last=False)
+            return True
+
+    @staticmethod
+    def _take_token(api_key: AdminApiKey) -> float:
+        """0 — запрос разрешён, иначе через сколько секунд появится токен."""
+
+        now = time.monotonic()
+        capacity = float(api_key.rate_per_minute)
+        refill_per_sec = capacity / 60.0
+        with AdminApiGuard._lock:
+            bucket = AdminApiGuard._buckets.setdefault(api_key.key_id, [capacity, now])
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_sec)
+            bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / refill_per_sec
+
+    @staticmethod
+    def authenticate(*, method: str, path: str, headers: Any, body: bytes, scope: str) -> AdminApiKey:
+        keys = AdminApiGuard.keys()
+        if not keys:
+            raise AdminApiAuthError(503, "auth_not_configured")
+
+        authorization = str(headers.get("Authorization") or "").strip()
+        if authorization.startswith("Bearer ") and HEADER_SIGNATURE not in headers:
+            # Для чтения (HTML-страницы в браузере) достаточно ключа без подписи; изменения — только подписанные.
+            if scope != SCOPE_READ:
+                raise AdminApiAuthError(401, "signature_required")
+            key_id, _, secret = authorization[len("Bearer ") :].partition(":")
+            api_key = keys.get(key_id.strip())
+            if api_key is None or not hmac.compare_digest(api_key.secret, secret.strip()):
+                raise AdminApiAuthError(401, "unauthorized")
+            return AdminApiGuard._authorize(api_key, scope)
+
+        key_id = str(headers.get(HEADER_KEY_ID) or "").strip()
+        timestamp = str(headers.get(HEADER_TIMESTAMP) or "").strip()
+        nonce = str(headers.get(HEADER_NONCE) or "").strip()
+        signature = str(headers.get(HEADER_SIGNATURE) or "").strip().lower()
+        if not key_id or not timestamp or not nonce or not signature:
+            raise AdminApiAuthError(401, "unauthorized")
+        api_key = keys.get(key_id)
+        if api_key is None:
+            raise AdminApiAuthError(401, "unauthorized")
+
+        expected = hmac.new(
+            api_key.secret.encode("utf-8"),
+            _canonical_request(method, path, timestamp, nonce, body),
+            hashlib.sha256,
+        ).hexdigest()
+        if not hmac.compare_digest(expected, signature):
+            raise AdminApiAuthError(401, "unauthorized")
+        try:
+            skew = abs(time.time() - int(timestamp))
+        except ValueError:
+            raise AdminApiAuthError(401, "unauthorized") from None
+        if skew > ADMIN_API_SIGNATURE_WINDOW_SEC:
+            raise AdminApiAuthError(401, "signature_expired")
+        if not AdminApiGuard._remember_nonce(key_id, nonce, time.time()):
+            raise AdminApiAuthError(401, "replayed_request")
+        return AdminApiGuard._authorize(api_key, scope)
+
+    @staticmethod
+    def _authorize(api_key: AdminApiKey, scope: str) -> AdminApiKey:
+        # Лимит считается до проверки scope: запросы за пределами прав тоже расходуют квоту ключа.
+        retry_after = AdminApiGuard._take_token(api_key)
+        if retry_after > 0:
+            raise AdminApiAuthError(429, "rate_limited", retry_after=max(1, int(retry_after + 0.999)))
+        if scope not in api_key.scopes:
+            raise AdminApiAuthError(403, "scope_forbidden")
+        return api_key
+
+
+def require_admin_key(scope: str) -> Callable:
+    """Декоратор маршрута: пускает только подписанный запрос ключа с нужным scope; ключ кладётся в g.admin_api_key."""
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any):
+            query = request.query_string.decode("utf-8")
+            path = f"{request.path}?{query}" if query else request.path
+            try:
+                g.admin_api_key = AdminApiGuard.authenticate(
+                    method=request.method,
+                    path=path,
+                    headers=request.headers,
+                    body=request.get_data(cache=True),
+                    scope=scope,
+                )
+            except AdminApiAuthError as error:
+                logger.warning(
+                    "admin api auth rejected status=%s error=%s key_id=%s method=%s path=%s remote_addr=%s",
+                    error.status,
+                    error.error,
+                    request.headers.get(HEADER_KEY_ID),
+                    request.method,
+                    request.path,
+                    request.remote_addr,
+                )
+                response = jsonify({"ok": False, "error": error.error})
+                response.status_code = error.status
+                if error.retry_after:
+                    response.headers["Retry-After"] = str(error.retry_after)
+                return response
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -26,6 +26,8 @@ from bot.systems.core_logic import (
 )
 from bot.utils import send_temp
 from bot.utils.api_monitor import monitor
+from bot.utils.discord_http import is_cloudflare_rate_limited_response, is_global_rate_limited_response
+from bot.metrics import metrics
 from bot.services import AuthorityService, RoleManagementService
 from bot.services.role_management_service import USER_ACQUIRE_HINT_PLACEHOLDER
 from bot.systems.roles_catalog_shared import (
@@ -60,9 +62,24 @@ DISCORD_EMBED_FIELD_NAME_LIMIT = 256
 DISCORD_EMBED_FIELD_VALUE_LIMIT = 1024
 DISCORD_EMBED_FIELD_COUNT_LIMIT = 25
 
+_discord_http_requests = metrics.counter(
+    "discord_http_requests_total",
+    "Discord REST requests by HTTP method and response status.",
+    ("method", "status"),
+)
+
+
 @trace_config.on_request_end.append
 async def _trace_request_end(session, ctx, params):
-    monitor.record_request(params.response.status)
+    status = params.response.status
+    monitor.record_request(
+        status,
+        method=params.method,
+        url=params.url,
+        cloudflare=is_cloudflare_rate_limited_response(status, params.response.headers),
+        global_limit=is_global_rate_limited_response(status, params.response.headers),
+    )
+    _discord_http_requests.inc(method=params.method, status=status)
 
 
 bot = commands.Bot(
@@ -27,6 +27,7 @@ from bot.services.role_management_service import (
     SYNC_ONLY_DISCORD_ROLE_MESSAGE,
 )
 from bot.utils import send_temp
+from bot.utils.blocking_io import run_blocking_io
 
 logger = logging.getLogger(__name__)
 _MENTION_RE = re.compile(r"^<@!?(\d+)>$")
@@ -392,7 +393,12 @@ async def _sync_ctx_discord_roles_catalog(ctx: commands.Context, *, operation: s
             for role in ctx.guild.roles
             if not role.is_default()
         ]
-        result = RoleManagementService.sync_discord_guild_roles(guild_roles)
+        result = await run_blocking_io(
+            "rolesadmin.sync_discord_guild_roles",
+            RoleManagementService.sync_discord_guild_roles,
+            guild_roles,
+            logger=logger,
+        )
         _LAST_IMPLICIT_DISCORD_CATALOG_SYNC_AT[ctx.guild.id] = time.monotonic()
         logger.info(
             "rolesadmin implicit discord catalog sync completed actor_id=%s guild_id=%s operation=%s source=%s roles=%s upserted=%s removed=%s",
@@ -1872,7 +1878,14 @@ async def rolesadmin_sync_discord_roles(ctx: commands.Context):
             for role in ctx.guild.roles
             if not role.is_default()
         ]
-        result = RoleManagementService.sync_discord_guild_roles(guild_roles)
+        # Явная команда всегда сверяет каталог, даже если список ролей не менялся.
+        result = await run_blocking_io(
+            "rolesadmin.sync_discord_guild_roles",
+            RoleManagementService.sync_discord_guild_roles,
+            guild_roles,
+            force=True,
+            logger=logger,
+        )
         _LAST_IMPLICIT_DISCORD_CATALOG_SYNC_AT[ctx.guild.id] = time.monotonic()
         await send_temp(
             ctx,
@@ -254,6 +254,8 @@ class ShopView(discord.ui.View):
                 actor_provider="discord",
                 actor_user_id=self.author_id,
                 expected_price_points=item.price_points,
+                # Повторное нажатие той же кнопки подтверждения даёт тот же ключ и не списывает баллы дважды.
+                idempotency_key=f"discord:{interaction.message.id}" if interaction.message else f"discord:{interaction.id}",
             )
             if not result.ok:
                 logger.warning(
@@ -18,6 +18,9 @@ import traceback
 import asyncio
 import uuid
 import time
+from bot.data.rpc_capabilities import rpc_capabilities
+from bot.data.supabase_metrics import InstrumentedSupabaseClient
+from bot.metrics import CollectedMetric, metrics
 from bot.legacy_identity_logging import (
     log_identity_resolve_error,
     log_legacy_identity_fallback_used,
@@ -121,6 +124,11 @@ class LazyList(UserList):
 
 class Database:
     _instance = None
+    # Сколько раз повторять условный update билетов и банка при конкурентных изменениях (fallback без RPC).
+    TICKET_CAS_ATTEMPTS = 8
+    BANK_CAS_ATTEMPTS = 8
+    # Сбрасывается в False, если таблица bank_ledger (sql/p22) ещё не создана.
+    _bank_ledger_available = True
     
     def __new__(cls):
         if cls._instance is None:
@@ -141,10 +149,12 @@ class Database:
         ).strip()
         postgrest_timeout = float(os.getenv("SUPABASE_POSTGREST_TIMEOUT_SEC", "20"))
         if self.url and self.key:
-            self.supabase = create_client(
-                self.url,
-                self.key,
-                options=ClientOptions(postgrest_client_timeout=postgrest_timeout),
+            self.supabase = InstrumentedSupabaseClient(
+                create_client(
+                    self.url,
+                    self.key,
+                    options=ClientOptions(postgrest_client_timeout=postgrest_timeout),
+                )
             )
         else:
             self.supabase = None
@@ -276,23 +286,34 @@ class Database:
         except Exception as e:
             raise RuntimeError(f"Таблица scores не существует или недоступна: {str(e)}")
         try:
-            self.supabase.table("fines").select("id").limit(1).execute()
             try:
-                self.supabase.table("fines").select("was_on_time").limit(1).execute()
+                # Обычно схема полная: один запрос вместо трёх. Поштучные пробы — только если чего-то нет.
+                self.supabase.table("fines").select(
+                    "id,was_on_time,reminder_3d_sent_at,reminder_1d_sent_at,overdue_notice_sent_at"
+                ).limit(1).execute()
                 self.has_was_on_time = True
-            except Exception:
-                self.has_was_on_time = False
-                logger.warning("Столбец 'was_on_time' отсутствует в таблице fines")
-            try:
-                self.supabase.table("fines").select("reminder_3d_sent_at,reminder_1d_sent_at,overdue_notice_sent_at").limit(1).execute()
                 self.has_fine_reminder_tracking = True
             except Exception:
-                self.has_fine_reminder_tracking = False
-                logger.warning(
-                    "Столбцы reminder_3d_sent_at/reminder_1d_sent_at/overdue_notice_sent_at отсутствуют в таблице fines"
-                )
+                self.supabase.table("fines").select("id").limit(1).execute()
+                try:
+                    self.supabase.table("fines").select("was_on_time").limit(1).execute()
+                    self.has_was_on_time = True
+                except Exception:
+                    self.has_was_on_time = False
+                    logger.warning("Столбец 'was_on_time' отсутствует в таблице fines")
+                try:
+                    self.supabase.table("fines").select("reminder_3d_sent_at,reminder_1d_sent_at,overdue_notice_sent_at").limit(1).execute()
+                    self.has_fine_reminder_tracking = True
+                except Exception:
+                    self.has_fine_reminder_tracking = False
+                    logger.warning(
+                        "Столбцы reminder_3d_sent_at/reminder_1d_sent_at/overdue_notice_sent_at отсутствуют в таблице fines"
+                    )
         except Exception as e:
             raise RuntimeError(f"Таблица fines не существует или недоступна: {str(e)}")
+        rpc_capabilities.record_schema(self.supabase, "scores.user_id", self._scores_has_user_id)
+        rpc_capabilities.record_schema(self.supabase, "fines.was_on_time", self.has_was_on_time)
+        rpc_capabilities.record_schema(self.supabase, "fines.reminder_tracking", self.has_fine_reminder_tracking)
 
         try:
             self.supabase.table("fine_payments").select("id").limit(1).execute()
@@ -691,8 +712,8 @@ class Database:
 
             rpc_applied = False
             try:
-                rpc_payload_variants = [
-                    {
+                rpc_payload_variants = {
+                    "author_account_id": {
                         "p_account_id": resolved_account_id,
                         "p_user_id": None,
                         "p_delta": points,
@@ -700,7 +721,7 @@ class Database:
                         "p_author_account_id": author_account_id,
                         "p_op_key": op_key,
                     },
-                    {
+                    "author_id": {
                         "p_account_id": resolved_account_id,
                         "p_user_id": None,
                         "p_delta": points,
@@ -708,13 +729,14 @@ class Database:
                         "p_author_id": author_id,
                         "p_op_key": op_key,
                     },
-                ]
+                }
                 rpc_response = None
                 rpc_errors = []
-                for rpc_payload in rpc_payload_variants:
+                # Сигнатура определяется один раз на процесс: дальше вызывается только подошедший вариант.
+                for variant in rpc_capabilities.plan(self.supabase, "apply_points_action", tuple(rpc_payload_variants)):
                     try:
                         rpc_started_at = time.perf_counter()
-                        rpc_response = self.supabase.rpc("apply_points_action", rpc_payload).execute()
+                        rpc_response = self.supabase.rpc("apply_points_action", rpc_payload_variants[variant]).execute()
                         self._log_db_timing(
                             table="actions",
                             rpc_name="apply_points_action",
@@ -722,12 +744,14 @@ class Database:
                             started_at=rpc_started_at,
                             account_id=resolved_account_id,
                         )
+                        rpc_capabilities.record_success(self.supabase, "apply_points_action", variant)
                         break
                     except Exception as rpc_variant_error:
+                        rpc_capabilities.record_error(self.supabase, "apply_points_action", rpc_variant_error, variant=variant)
                         rpc_errors.append(str(rpc_variant_error))
                         continue
                 if rpc_response is None:
-                    raise RuntimeError("; ".join(rpc_errors))
+                    raise RuntimeError("; ".join(rpc_errors) or "apply_points_action rpc is not available")
                 rpc_data = getattr(rpc_response, "data", None) or []
                 if rpc_data:
                     row = rpc_data[0]
@@ -753,6 +777,7 @@ class Database:
                 )
 
             if not rpc_applied:
+                rpc_capabilities.record_fallback(self.supabase, "apply_points_action")
                 if not self.update_scores_by_account(resolved_account_id, points, user_id=cache_user_id):
                     raise RuntimeError("Не удалось обновить баллы")
                 action = {
@@ -899,6 +924,167 @@ class Database:
             op_key=op_key,
         )
 
+    def apply_shop_purchase(
+        self,
+        *,
+        account_id: str,
+        role_name: str,
+        category: str,
+        price_points: int,
+        reason: str,
+        op_key: str,
+    ) -> Optional[dict]:
+        """Покупка в магазине одной SQL-транзакцией (RPC `shop_purchase_item`, sql/p24).
+
+        Возвращает {"status", "new_points", "error_code"}; status — completed/duplicate/rejected/failed.
+        None означает, что RPC ещё не развернут и вызывающий код должен пройти пошаговый путь.
+        """
+        rpc_method = getattr(self.supabase, "rpc", None)
+        if not callable(rpc_method):
+            return None
+        if not rpc_capabilities.plan(self.supabase, "shop_purchase_item"):
+            rpc_capabilities.record_fallback(self.supabase, "shop_purchase_item")
+            return None
+
+        try:
+            result = rpc_method(
+                "shop_purchase_item",
+                {
+                    "p_op_key": op_key,
+                    "p_account_id": account_id,
+                    "p_role_name": role_name,
+                    "p_category": category,
+                    "p_price_points": int(price_points),
+                    "p_reason": reason,
+                },
+            ).execute()
+        except Exception as error:
+            if rpc_capabilities.record_error(self.supabase, "shop_purchase_item", error):
+                logger.warning("shop purchase rpc function missing; fallback to step-by-step path account_id=%s error=%s", account_id, error)
+                rpc_capabilities.record_fallback(self.supabase, "shop_purchase_item")
+                return None
+            logger.error("❌ shop purchase rpc failed account_id=%s role_name=%s op_key=%s error=%s", account_id, role_name, op_key, error)
+            return {"status": "failed", "new_points": None, "error_code": "rpc_error"}
+        rpc_capabilities.record_success(self.supabase, "shop_purchase_item")
+
+        payload = result.data
+        row = payload[0] if isinstance(payload, list) and payload and isinstance(payload[0], dict) else payload
+        if not isinstance(row, dict):
+            logger.error("❌ shop purchase rpc returned empty payload account_id=%s op_key=%s", account_id, op_key)
+            return {"status": "failed", "new_points": None, "error_code": "empty_response"}
+        outcome = {
+            "status": str(row.get("status") or "failed"),
+            "new_points": None if row.get("new_points") is None else float(row.get("new_points")),
+            "error_code": row.get("error_code"),
+        }
+        if outcome["status"] == "completed" and price_points > 0:
+            # Баллы списаны в БД: синхронизируем локальный кэш так же, как add_action после RPC.
+            self.ensure_core_data_loaded()
+            cache_user_id = self._get_discord_user_for_account_id(account_id)
+            if cache_user_id is not None and outcome["new_points"] is not None:
+                self.scores[cache_user_id] = outcome["new_points"]
+            timestamp = datetime.now(timezone.utc).isoformat()
+            self.actions.insert(0, {
+                "account_id": account_id,
+                "points": -float(price_points),
+                "reason": reason,
+                "author_account_id": account_id,
+                "action_type": "remove",
+                "op_key": f"{op_key}:debit",
+                "timestamp": timestamp,
+            })
+            if cache_user_id is not None:
+                if cache_user_id not in self.history:
+                    self.history[cache_user_id] = []
+                self.history[cache_user_id].insert(0, {
+                    "points": -float(price_points),
+                    "reason": reason,
+                    "author_account_id": account_id,
+                    "timestamp": timestamp,
+                })
+        logger.info(
+            "shop purchase rpc result account_id=%s role_name=%s op_key=%s status=%s error_code=%s",
+            account_id,
+            role_name,
+            op_key,
+            outcome["status"],
+            outcome["error_code"],
+        )
+        return outcome
+
+    def commit_moderation_case(self, case_payload: dict, plan: dict) -> Optional[dict]:
+        """Кейс модерации со всеми наказаниями одной SQL-транзакцией (RPC `commit_moderation_case`, sql/p26).
+
+        Возвращает {"status", "case", "actions", "fine", "new_points", "error"}; status — applied/duplicate/failed.
+        При failed транзакция откатилась целиком и ничего не применено.
+        None означает, что RPC ещё не развернут и вызывающий код должен пройти пошаговый путь.
+        """
+        rpc_method = getattr(self.supabase, "rpc", None)
+        if not callable(rpc_method):
+            return None
+        if not rpc_capabilities.plan(self.supabase, "commit_moderation_case"):
+            rpc_capabilities.record_fallback(self.supabase, "commit_moderation_case")
+            return None
+
+        op_key = case_payload.get("op_key")
+        try:
+            result = rpc_method("commit_moderation_case", {"p_case": case_payload, "p_plan": plan}).execute()
+        except Exception as error:
+            if rpc_capabilities.record_error(self.supabase, "commit_moderation_case", error):
+                logger.warning("moderation case rpc function missing; fallback to step-by-step path op_key=%s error=%s", op_key, error)
+                rpc_capabilities.record_fallback(self.supabase, "commit_moderation_case")
+                return None
+            logger.error("❌ moderation case rpc failed op_key=%s error=%s", op_key, error)
+            return {"status": "failed", "case": None, "actions": [], "fine": None, "new_points": None, "error": str(error)}
+        rpc_capabilities.record_success(self.supabase, "commit_moderation_case")
+
+        payload = result.data
+        row = payload[0] if isinstance(payload, list) and payload and isinstance(payload[0], dict) else payload
+        if not isinstance(row, dict) or not isinstance(row.get("case_row"), dict):
+            logger.error("❌ moderation case rpc returned empty payload op_key=%s", op_key)
+            return {"status": "failed", "case": None, "actions": [], "fine": None, "new_points": None, "error": "empty_response"}
+        outcome = {
+            "status": str(row.get("status") or "failed"),
+            "case": row["case_row"],
+            "actions": list(row.get("action_rows") or []),
+            "fine": row.get("fine_row"),
+            "new_points": None if row.get("new_points") is None else float(row.get("new_points")),
+            "error": None,
+        }
+        if outcome["status"] != "applied":
+            return outcome
+
+        # Штраф записан в БД: синхронизируем локальные кэши так же, как add_fine и add_action после RPC.
+        fine_plan = plan.get("fine") or {}
+        if isinstance(outcome["fine"], dict):
+            self.fines.insert(0, outcome["fine"])
+        elif fine_plan and outcome["new_points"] is not None:
+            account_id = case_payload.get("account_id")
+            amount = float(fine_plan.get("amount") or 0)
+            reason = f"Модерация кейс #{outcome['case'].get('id')}: {fine_plan.get('reason_text')}"
+            self.ensure_core_data_loaded()
+            cache_user_id = self._get_discord_user_for_account_id(account_id)
+            if cache_user_id is not None:
+                self.scores[cache_user_id] = outcome["new_points"]
+            timestamp = datetime.now(timezone.utc).isoformat()
+            self.actions.insert(0, {
+                "account_id": account_id,
+                "points": -amount,
+                "reason": reason,
+                "author_account_id": fine_plan.get("author_account_id"),
+                "action_type": "remove",
+                "op_key": f"{op_key}:fine_points",
+                "timestamp": timestamp,
+            })
+            if cache_user_id is not None:
+                self.history.setdefault(cache_user_id, []).insert(0, {
+                    "points": -amount,
+                    "reason": reason,
+                    "author_account_id": fine_plan.get("author_account_id"),
+                    "timestamp": timestamp,
+                })
+        return outcome
+
     def _handle_response(self, response):
         """Обработка ответа от Supabase"""
         if not response:
@@ -907,6 +1093,10 @@ class Database:
             raise Exception(f"Supabase error: {response.error}")
         return response
 
+    def dirty_score_count(self) -> int:
+        """Сколько изменённых баллов ещё не записано в scores (для отчёта об остановке)."""
+        return len(self._dirty_score_keys)
+
     def save_all(self):
         try:
             if not self.supabase:
@@ -1093,96 +1283,32 @@ class Database:
             logger.error(f"Ошибка чтения баланса банка: {str(e)}")
         return 0.0
 
-    def add_to_bank(self, amount: float):
-        try:
-            if not self.supabase:
-                logger.warning("❌ Supabase не инициализирован")
-                return False
-            current = self.get_bank_balance()
-            new_total = current + amount
-            self.supabase.table("bank").upsert({
-                "id": 1,
-                "total": new_total,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }).execute()
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка обновления банка: {str(e)}")
-            return False
+    def add_to_bank(self, amount: float, reason: str = "", op_key: Optional[str] = None) -> bool:
+        """Изменить банк без строки в bank_history (движение всё равно попадает в bank_ledger)."""
+        return self.apply_bank_delta(
+            amount,
+            reason or "bank adjustment",
+            op_key=op_key,
+            allow_overdraft=True,
+            write_history=False,
+        )
 
     def add_to_bank_with_history(self, user_id: int, amount: float, reason: str) -> bool:
-        """Пополнить банк и записать операцию в историю.
-
-        Если запись в history не удалась, баланс банка откатывается до исходного значения.
-        """
-        try:
-            if not self.supabase:
-                logger.warning(
-                    "❌ add_to_bank_with_history: Supabase не инициализирован user_id=%s amount=%s",
-                    user_id,
-                    amount,
-                )
-                return False
-            if amount <= 0:
-                logger.warning(
-                    "❌ add_to_bank_with_history: invalid amount user_id=%s amount=%s reason=%s",
-                    user_id,
-                    amount,
-                    reason,
-                )
-                return False
-
-            rpc_used, rpc_success = self._apply_bank_delta_atomic_via_rpc(
-                user_id=user_id,
-                delta=amount,
-                reason=reason,
-                operation="credit",
-            )
-            if rpc_used:
-                return rpc_success
-
-            current = self.get_bank_balance()
-            new_total = current + amount
-            self.supabase.table("bank").upsert({
-                "id": 1,
-                "total": new_total,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }).execute()
-
-            if not self.log_bank_income(user_id, amount, reason):
-                logger.error(
-                    "❌ add_to_bank_with_history: history insert failed, rolling back bank total user_id=%s amount=%s reason=%s current=%s attempted_total=%s",
-                    user_id,
-                    amount,
-                    reason,
-                    current,
-                    new_total,
-                )
-                self.supabase.table("bank").upsert({
-                    "id": 1,
-                    "total": current,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }).execute()
-                return False
-
-            logger.info(
-                "✅ add_to_bank_with_history: success (fallback path) user_id=%s amount=%s reason=%s previous_total=%s new_total=%s",
-                user_id,
-                amount,
-                reason,
-                current,
-                new_total,
-            )
-            return True
-        except Exception as e:
-            logger.error(
-                "❌ add_to_bank_with_history failed user_id=%s amount=%s reason=%s error=%s",
+        """Пополнить банк и записать операцию в историю одной атомарной операцией."""
+        if amount <= 0:
+            logger.warning(
+                "❌ add_to_bank_with_history: invalid amount user_id=%s amount=%s reason=%s",
                 user_id,
                 amount,
                 reason,
-                e,
             )
             return False
+        return self.apply_bank_delta(
+            amount,
+            reason,
+            account_id=self._get_account_id_for_discord_user(user_id) if user_id else None,
+            user_id=user_id,
+        )
 
     def record_payment(self, user_id: int, fine_id: int, amount: float, author_id: int) -> bool:
         """Совместимый wrapper оплаты штрафа по user_id."""
@@ -1246,10 +1372,7 @@ class Database:
             )
 
             if not is_test:
-                self.add_to_bank(amount)
-                user_id = self._get_discord_user_for_account_id(account_id)
-                if user_id is not None:
-                    self.log_bank_income(user_id, amount, f"Оплата штрафа ID #{fine_id}")
+                self.apply_bank_delta(amount, f"Оплата штрафа ID #{fine_id}", account_id=account_id)
 
             # 5. Обновляем данные по штрафу
             if fine:
@@ -1465,99 +1588,301 @@ class Database:
             logger.info(f"⏱ Быстрая оплата: {self.quick_pay_streak[user_id]} подряд")
 
     def spend_from_bank(self, amount: float, user_id: int, reason: str) -> bool:
-        try:
-            if not self.supabase:
-                return False
-            if amount <= 0:
-                logger.warning("❌ spend_from_bank invalid amount user_id=%s amount=%s reason=%s", user_id, amount, reason)
-                return False
+        """Списать из банка; при нехватке средств операция отклоняется целиком."""
+        if amount <= 0:
+            logger.warning("❌ spend_from_bank invalid amount user_id=%s amount=%s reason=%s", user_id, amount, reason)
+            return False
+        return self.apply_bank_delta(
+            -amount,
+            reason,
+            account_id=self._get_account_id_for_discord_user(user_id) if user_id else None,
+            user_id=user_id,
+        )
 
-            rpc_used, rpc_success = self._apply_bank_delta_atomic_via_rpc(
-                user_id=user_id,
-                delta=-amount,
-                reason=reason,
-                operation="debit",
-            )
-            if rpc_used:
-                return rpc_success
+    def apply_bank_delta(
+        self,
+        delta: float,
+        reason: str,
+        *,
+        account_id: Optional[str] = None,
+        user_id: Optional[int] = None,
+        op_key: Optional[str] = None,
+        allow_overdraft: bool = False,
+        write_history: bool = True,
+    ) -> bool:
+        """Единственная точка изменения банка: дельта, строка bank_ledger и (опционально) bank_history.
 
-            current = self.get_bank_balance()
-            if current < amount:
-                return False
-            new_total = current - amount
-            self.supabase.table("bank").upsert({
-                "id": 1,
-                "total": new_total,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }).execute()
+        Основной путь — RPC `apply_bank_ledger_delta` (sql/p22), где всё это одна транзакция
+        под блокировкой строки bank. Без RPC: условный update total по прочитанному значению,
+        затем история и последним журнал; при сбое дельта откатывается, а записанная история
+        гасится встречной строкой. Повтор с тем же op_key (в том числе параллельный — его
+        отсекает уникальный индекс журнала) ничего не меняет и считается успехом.
+        """
+        if not self.supabase:
+            logger.warning("❌ apply_bank_delta: Supabase не инициализирован delta=%s reason=%s", delta, reason)
+            return False
+        if not delta:
+            return True
 
-            history_payload = self._prefer_account_id_payload("bank_history", user_id, {
-                "user_id": user_id,
-                "amount": -amount,
-                "reason": reason,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            })
+        rpc_used, rpc_success = self._apply_bank_delta_atomic_via_rpc(
+            delta=delta,
+            reason=reason,
+            account_id=account_id,
+            user_id=user_id,
+            op_key=op_key,
+            allow_overdraft=allow_overdraft,
+            write_history=write_history,
+        )
+        if rpc_used:
+            return rpc_success
+
+        # Быстрый путь для повторов; окончательно дубликат решает уникальный индекс op_key при записи журнала.
+        if op_key and self._bank_ledger_has_op_key(op_key):
+            logger.warning("⚠️ apply_bank_delta op_key=%s уже применён, пропуск дубликата", op_key)
+            return True
+
+        previous_total = self._compare_and_set_bank_total(delta, allow_overdraft=allow_overdraft)
+        if previous_total is None:
+            return False
+        new_total = previous_total + delta
+
+        history_payload = None
+        if write_history:
+            if account_id:
+                history_payload = {"account_id": account_id, "amount": delta, "reason": reason}
+            else:
+                history_payload = self._prefer_account_id_payload(
+                    "bank_history", user_id or 0, {"user_id": user_id, "amount": delta, "reason": reason}
+                )
+            history_payload["timestamp"] = datetime.now(timezone.utc).isoformat()
             try:
                 self.supabase.table("bank_history").insert(history_payload).execute()
             except Exception as history_error:
                 logger.error(
-                    "❌ spend_from_bank history insert failed, rolling back bank total user_id=%s amount=%s reason=%s current=%s attempted_total=%s error=%s",
-                    user_id,
-                    amount,
+                    "❌ apply_bank_delta: history write failed, rolling back bank total delta=%s reason=%s previous_total=%s error=%s",
+                    delta,
                     reason,
-                    current,
-                    new_total,
+                    previous_total,
                     history_error,
                 )
-                self.supabase.table("bank").upsert({
-                    "id": 1,
-                    "total": current,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }).execute()
+                self._rollback_bank_total(delta, reason)
                 return False
 
-            logger.info(
-                "✅ spend_from_bank: success (fallback path) user_id=%s amount=%s reason=%s previous_total=%s new_total=%s",
-                user_id,
-                amount,
+        # Журнал пишется последним: строка с op_key появляется только у полностью применённой операции,
+        # поэтому после любого отката повтор с тем же op_key снова проходит.
+        try:
+            ledger_written = self._insert_bank_ledger_row(
+                {
+                    "delta": delta,
+                    "balance_after": new_total,
+                    "reason": reason or "",
+                    "account_id": account_id,
+                    "user_id": None if account_id else user_id,
+                    "op_key": op_key,
+                }
+            )
+        except Exception as ledger_error:
+            logger.error(
+                "❌ apply_bank_delta: ledger write failed, rolling back bank total delta=%s reason=%s previous_total=%s error=%s",
+                delta,
                 reason,
-                current,
-                new_total,
+                previous_total,
+                ledger_error,
             )
+            self._rollback_bank_total(delta, reason, history_payload=history_payload)
+            return False
+        if not ledger_written:
+            # Параллельный вызов с тем же op_key записал журнал раньше: наша дельта лишняя.
+            logger.warning("⚠️ apply_bank_delta op_key=%s применён параллельным вызовом, откат дубликата", op_key)
+            self._rollback_bank_total(delta, reason, history_payload=history_payload)
             return True
+
+        logger.info(
+            "✅ apply_bank_delta: success (fallback path) delta=%s reason=%s previous_total=%s new_total=%s",
+            delta,
+            reason,
+            previous_total,
+            new_total,
+        )
+        return True
+
+    def _compare_and_set_bank_total(self, delta: float, *, allow_overdraft: bool) -> Optional[float]:
+        """Условный update bank.total; возвращает прежний total или None (ошибка, нехватка средств, конкуренция)."""
+        try:
+            for _attempt in range(self.BANK_CAS_ATTEMPTS):
+                response = self.supabase.table("bank").select("total").eq("id", 1).limit(1).execute()
+                rows = response.data or []
+                if not rows:
+                    if delta < 0 and not allow_overdraft:
+                        return None
+                    try:
+                        self.supabase.table("bank").insert(
+                            {"id": 1, "total": delta, "updated_at": datetime.now(timezone.utc).isoformat()}
+                        ).execute()
+                        return 0.0
+                    except Exception:
+                        continue
+                raw_total = rows[0].get("total")
+                current = float(raw_total or 0)
+                if delta < 0 and not allow_overdraft and current + delta < 0:
+                    logger.warning("❌ bank delta rejected: insufficient funds total=%s delta=%s", current, delta)
+                    return None
+                update_response = (
+                    self.supabase.table("bank")
+                    .update({"total": current + delta, "updated_at": datetime.now(timezone.utc).isoformat()})
+                    .eq("id", 1)
+                    .eq("total", raw_total)
+                    .execute()
+                )
+                if update_response.data:
+                    return current
+            logger.error("❌ bank delta: не удалось применить из-за конкурентных изменений delta=%s attempts=%s", delta, self.BANK_CAS_ATTEMPTS)
+            return None
         except Exception as e:
-            logger.error(f"Ошибка при трате из банка: {str(e)}")
+            logger.error("Ошибка обновления банка delta=%s: %s", delta, e)
+            return None
+
+    def _rollback_bank_total(self, delta: float, reason: str, *, history_payload: Optional[dict] = None) -> None:
+        """Вернуть дельту банка после сбоя; уже записанная история гасится встречной строкой."""
+        if self._compare_and_set_bank_total(-delta, allow_overdraft=True) is None:
+            logger.error(
+                "❌ apply_bank_delta: КРИТИЧЕСКАЯ рассинхронизация, откат банка не сработал delta=%s reason=%s",
+                delta,
+                reason,
+            )
+        if history_payload is None:
+            return
+        reversal = {
+            **history_payload,
+            "amount": -delta,
+            "reason": f"rollback: {reason}",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            self.supabase.table("bank_history").insert(reversal).execute()
+        except Exception as error:
+            logger.error("❌ apply_bank_delta: history reversal failed delta=%s reason=%s error=%s", delta, reason, error)
+
+    def _insert_bank_ledger_row(self, payload: dict) -> bool:
+        """Записать строку журнала; False — строка с этим op_key уже есть (сработал уникальный индекс)."""
+        if not self._bank_ledger_available:
+            return True
+        try:
+            self.supabase.table("bank_ledger").insert(payload).execute()
+            return True
+        except Exception as error:
+            if self._is_missing_table_error(error, "bank_ledger"):
+                # Миграция p22 ещё не применена: работаем без журнала, как раньше.
+                self._bank_ledger_available = False
+                logger.warning("bank_ledger table missing; bank deltas are not journaled until sql/p22 is applied")
+                return True
+            if payload.get("op_key") and self._is_unique_violation_error(error):
+                return False
+            raise
+
+    def _bank_ledger_has_op_key(self, op_key: str) -> bool:
+        if not self._bank_ledger_available:
+            return False
+        try:
+            response = self.supabase.table("bank_ledger").select("id").eq("op_key", op_key).limit(1).execute()
+            return bool(response.data)
+        except Exception as error:
+            logger.warning("bank_ledger op_key lookup failed op_key=%s error=%s", op_key, error)
             return False
 
     @staticmethod
-    def _is_missing_rpc_function_error(error: Exception) -> bool:
+    def _is_unique_violation_error(error: Exception) -> bool:
         message = str(error).lower()
-        return (
-            "function" in message and "does not exist" in message
-        ) or "could not find the function" in message
+        return "23505" in message or "duplicate key" in message
+
+    @staticmethod
+    def _is_missing_table_error(error: Exception, table_name: str) -> bool:
+        message = str(error).lower()
+        return table_name in message and (
+            "does not exist" in message or "could not find the table" in message or "pgrst205" in message
+        )
+
+    def verify_bank_ledger(self) -> Optional[dict]:
+        """Сверяет bank.total с суммой bank_ledger; при расхождении пишет ошибку и метрику."""
+        if not self.supabase:
+            return None
+        if not rpc_capabilities.plan(self.supabase, "verify_bank_ledger"):
+            return None
+        try:
+            response = self.supabase.rpc("verify_bank_ledger", {}).execute()
+            rpc_capabilities.record_success(self.supabase, "verify_bank_ledger")
+            rows = response.data or []
+            row = rows[0] if isinstance(rows, list) and rows else rows
+            if not isinstance(row, dict):
+                return None
+            result = {
+                "bank_total": float(row.get("bank_total") or 0),
+                "ledger_total": float(row.get("ledger_total") or 0),
+                "drift": float(row.get("drift") or 0),
+                "ledger_rows": int(row.get("ledger_rows") or 0),
+            }
+        except Exception as error:
+            rpc_capabilities.record_error(self.supabase, "verify_bank_ledger", error)
+            logger.error("❌ bank ledger verification failed error=%s", error)
+            return None
 
-    def _apply_bank_delta_atomic_via_rpc(self, *, user_id: int, delta: float, reason: str, operation: str) -> tuple[bool, bool]:
+        if abs(result["drift"]) > 1e-6:
+            self._inc_metric("bank_ledger_drift_detected")
+            logger.error(
+                "❌ bank ledger drift detected bank_total=%s ledger_total=%s drift=%s ledger_rows=%s",
+                result["bank_total"],
+                result["ledger_total"],
+                result["drift"],
+                result["ledger_rows"],
+            )
+        else:
+            logger.info(
+                "bank ledger verified bank_total=%s ledger_rows=%s",
+                result["bank_total"],
+                result["ledger_rows"],
+            )
+        return result
+
+    def _apply_bank_delta_atomic_via_rpc(
+        self,
+        *,
+        delta: float,
+        reason: str,
+        account_id: Optional[str],
+        user_id: Optional[int],
+        op_key: Optional[str],
+        allow_overdraft: bool,
+        write_history: bool,
+    ) -> tuple[bool, bool]:
         """Пытается выполнить атомарную банковую операцию через SQL RPC.
 
         Возвращает:
-        - (True, True): RPC вызван и операция успешна;
+        - (True, True): RPC вызван и операция успешна (или уже была применена с тем же op_key);
         - (True, False): RPC вызван, но завершился ошибкой/отказом;
         - (False, False): RPC не использован (например, функция ещё не развернута), вызывающий код может fallback-иться.
         """
         rpc_method = getattr(self.supabase, "rpc", None)
         if not callable(rpc_method):
-            logger.warning("bank rpc path unavailable: supabase.rpc missing operation=%s user_id=%s", operation, user_id)
+            logger.warning("bank rpc path unavailable: supabase.rpc missing delta=%s reason=%s", delta, reason)
+            return False, False
+        if not rpc_capabilities.plan(self.supabase, "apply_bank_ledger_delta"):
+            rpc_capabilities.record_fallback(self.supabase, "apply_bank_ledger_delta")
             return False, False
 
         try:
             result = rpc_method(
-                "apply_bank_operation",
+                "apply_bank_ledger_delta",
                 {
-                    "p_user_id": int(user_id),
                     "p_delta": float(delta),
                     "p_reason": str(reason or "").strip(),
+                    "p_account_id": account_id,
+                    "p_user_id": int(user_id) if user_id else None,
+                    "p_op_key": op_key,
+                    "p_allow_overdraft": bool(allow_overdraft),
+                    "p_write_history": bool(write_history),
                 },
             ).execute()
+            rpc_capabilities.record_success(self.supabase, "apply_bank_ledger_delta")
             payload = result.data
             applied = True
             error_code = None
@@ -1569,43 +1894,43 @@ class Database:
                 applied = bool(payload.get("applied", True))
                 error_code = payload.get("error_code")
 
+            if not applied and error_code == "duplicate":
+                logger.warning("⚠️ bank rpc op_key=%s уже применён, пропуск дубликата", op_key)
+                return True, True
             if not applied:
                 logger.error(
-                    "❌ bank rpc operation rejected operation=%s user_id=%s delta=%s reason=%s error_code=%s payload=%s",
-                    operation,
-                    user_id,
+                    "❌ bank rpc operation rejected delta=%s reason=%s account_id=%s error_code=%s payload=%s",
                     delta,
                     reason,
+                    account_id,
                     error_code,
                     payload,
                 )
                 return True, False
 
             logger.info(
-                "✅ bank rpc operation success operation=%s user_id=%s delta=%s reason=%s",
-                operation,
-                user_id,
+                "✅ bank rpc operation success delta=%s reason=%s account_id=%s op_key=%s",
                 delta,
                 reason,
+                account_id,
+                op_key,
             )
             return True, True
         except Exception as error:
-            if self._is_missing_rpc_function_error(error):
+            if rpc_capabilities.record_error(self.supabase, "apply_bank_ledger_delta", error):
                 logger.warning(
-                    "bank rpc function missing; fallback to legacy path operation=%s user_id=%s delta=%s reason=%s error=%s",
-                    operation,
-                    user_id,
+                    "bank rpc function missing; fallback to legacy path delta=%s reason=%s error=%s",
                     delta,
                     reason,
                     error,
                 )
+                rpc_capabilities.record_fallback(self.supabase, "apply_bank_ledger_delta")
                 return False, False
             logger.error(
-                "❌ bank rpc operation failed operation=%s user_id=%s delta=%s reason=%s error=%s",
-                operation,
-                user_id,
+                "❌ bank rpc operation failed delta=%s reason=%s account_id=%s error=%s",
                 delta,
                 reason,
+                account_id,
                 error,
             )
             return True, False
@@ -1695,23 +2020,238 @@ class Database:
         if not account_id:
             logger.error("❌ update_tickets_by_account aborted: пустой account_id")
             return False
+        return self._compare_and_set_tickets(account_id, ticket_type, amount) is not None
 
+    def _compare_and_set_tickets(self, account_id: str, ticket_type: str, amount: int) -> Optional[int]:
+        """Применяет дельту билетов условным update по прочитанному значению.
+
+        Возвращает фактически применённую дельту (с учётом обрезки до нуля) или None при ошибке.
+        Если значение успели поменять параллельно, update не находит строку и попытка повторяется.
+        """
         field = f"tickets_{ticket_type}"
         try:
-            score_resp = (
-                self.supabase.table("scores")
-                .select(field)
-                .eq("account_id", account_id)
-                .limit(1)
-                .execute()
+            for _attempt in range(self.TICKET_CAS_ATTEMPTS):
+                score_resp = (
+                    self.supabase.table("scores")
+                    .select(field)
+                    .eq("account_id", account_id)
+                    .limit(1)
+                    .execute()
+                )
+                data = score_resp.data or []
+                if not data:
+                    new_value = max(amount, 0)
+                    try:
+                        self.supabase.table("scores").insert({"account_id": account_id, field: new_value}).execute()
+                        return new_value
+                    except Exception as insert_error:
+                        # Строку мог создать параллельный вызов: повторяем уже через условный update.
+                        logger.warning(
+                            "update_tickets_by_account: insert raced account_id=%s field=%s error=%s",
+                            account_id,
+                            field,
+                            insert_error,
+                        )
+                        continue
+                current = int(data[0].get(field) or 0)
+                new_value = max(current + amount, 0)
+                if new_value == current:
+                    return 0
+                update_resp = (
+                    self.supabase.table("scores")
+                    .update({field: new_value})
+                    .eq("account_id", account_id)
+                    .eq(field, current)
+                    .execute()
+                )
+                if update_resp.data:
+                    return new_value - current
+            logger.error(
+                "❌ update_tickets_by_account: не удалось применить дельту из-за конкурентных изменений account_id=%s field=%s amount=%s attempts=%s",
+                account_id,
+                field,
+                amount,
+                self.TICKET_CAS_ATTEMPTS,
             )
-            data = score_resp.data or []
-            current = int(data[0].get(field) or 0) if data else 0
-            new_value = max(current + amount, 0)
-            self.supabase.table("scores").upsert({"account_id": account_id, field: new_value}, on_conflict="account_id").execute()
-            return True
+            return None
         except Exception as e:
             logger.error("Ошибка обновления билетов account_id=%s: %s", account_id, e)
+            return None
+
+    def _apply_ticket_delta_atomic_via_rpc(
+        self,
+        *,
+        account_id: str,
+        ticket_type: str,
+        delta: int,
+        reason: str,
+        author_account_id: str,
+        author_id: int,
+        op_key: str,
+    ) -> tuple[bool, bool]:
+        """Пытается изменить билеты и записать ticket_actions одной SQL-транзакцией.
+
+        Возвращаемые пары — как у `_apply_bank_delta_atomic_via_rpc`.
+        """
+        rpc_method = getattr(self.supabase, "rpc", None)
+        if not callable(rpc_method):
+            return False, False
+        if not rpc_capabilities.plan(self.supabase, "apply_ticket_action"):
+            rpc_capabilities.record_fallback(self.supabase, "apply_ticket_action")
+            return False, False
+
+        try:
+            result = rpc_method(
+                "apply_ticket_action",
+                {
+                    "p_account_id": account_id,
+                    "p_ticket_type": ticket_type,
+                    "p_delta": int(delta),
+                    "p_reason": str(reason or "").strip(),
+                    "p_author_account_id": author_account_id,
+                    "p_author_id": int(author_id or 0),
+                    "p_op_key": op_key,
+                },
+            ).execute()
+            rpc_capabilities.record_success(self.supabase, "apply_ticket_action")
+            payload = result.data
+            row = payload[0] if isinstance(payload, list) and payload and isinstance(payload[0], dict) else payload
+            applied = bool((row or {}).get("applied", True)) if isinstance(row, dict) else True
+            if not applied:
+                logger.warning("⚠️ ticket rpc op_key=%s уже применён, пропуск дубликата account_id=%s", op_key, account_id)
+            else:
+                logger.info(
+                    "✅ ticket rpc operation success account_id=%s ticket_type=%s delta=%s new_value=%s op_key=%s",
+                    account_id,
+                    ticket_type,
+                    delta,
+                    (row or {}).get("new_value") if isinstance(row, dict) else None,
+                    op_key,
+                )
+            return True, True
+        except Exception as error:
+            if rpc_capabilities.record_error(self.supabase, "apply_ticket_action", error):
+                logger.warning(
+                    "ticket rpc function missing; fallback to legacy path account_id=%s ticket_type=%s delta=%s error=%s",
+                    account_id,
+                    ticket_type,
+                    delta,
+                    error,
+                )
+                rpc_capabilities.record_fallback(self.supabase, "apply_ticket_action")
+                return False, False
+            logger.error(
+                "❌ ticket rpc operation failed account_id=%s ticket_type=%s delta=%s op_key=%s error=%s",
+                account_id,
+                ticket_type,
+                delta,
+                op_key,
+                error,
+            )
+            return True, False
+
+    def apply_ticket_delta_by_account(
+        self,
+        account_id: str,
+        ticket_type: str,
+        amount: int,
+        reason: str,
+        author_account_id: Optional[str],
+        author_id: int = 0,
+        op_key: Optional[str] = None,
+    ) -> bool:
+        """Атомарно меняет билеты и пишет парную строку ticket_actions.
+
+        Основной путь — RPC `apply_ticket_action` (sql/p21). Без него: условный update баланса,
+        затем запись журнала; если журнал не записался, применённая дельта откатывается.
+        """
+        if ticket_type not in ("normal", "gold") or not self.supabase:
+            return False
+        if not account_id:
+            logger.error("❌ apply_ticket_delta_by_account aborted: пустой account_id")
+            return False
+        if not author_account_id:
+            author_account_id = self._get_account_id_for_discord_user(author_id)
+        if not author_account_id:
+            logger.error(
+                "❌ apply_ticket_delta_by_account: не найден author_account_id author_id=%s account_id=%s",
+                author_id,
+                account_id,
+            )
+            return False
+
+        op_key = str(op_key or uuid.uuid4())
+        rpc_used, rpc_success = self._apply_ticket_delta_atomic_via_rpc(
+            account_id=account_id,
+            ticket_type=ticket_type,
+            delta=amount,
+            reason=reason,
+            author_account_id=author_account_id,
+            author_id=author_id,
+            op_key=op_key,
+        )
+        if rpc_used:
+            return rpc_success
+
+        # Быстрый путь для повторов; окончательно дубликат решает уникальный индекс op_key при записи журнала.
+        if self._ticket_actions_has_op_key(op_key):
+            logger.warning("⚠️ apply_ticket_delta op_key=%s уже применён, пропуск дубликата account_id=%s", op_key, account_id)
+            return True
+
+        applied_delta = self._compare_and_set_tickets(account_id, ticket_type, amount)
+        if applied_delta is None:
+            return False
+        payload = {
+            "account_id": account_id,
+            "ticket_type": ticket_type,
+            "amount": amount,
+            "reason": reason,
+            "author_id": author_id,
+            "author_account_id": author_account_id,
+            "op_key": op_key,
+        }
+        try:
+            self.supabase.table("ticket_actions").insert(payload).execute()
+            return True
+        except Exception as ledger_error:
+            if self._is_unique_violation_error(ledger_error):
+                # Параллельный вызов с тем же op_key записал журнал раньше: наша дельта лишняя.
+                logger.warning(
+                    "⚠️ apply_ticket_delta op_key=%s применён параллельным вызовом, откат дубликата account_id=%s",
+                    op_key,
+                    account_id,
+                )
+                if applied_delta and self._compare_and_set_tickets(account_id, ticket_type, -applied_delta) is None:
+                    logger.error(
+                        "❌ apply_ticket_delta_by_account: КРИТИЧЕСКАЯ рассинхронизация, откат дубликата не сработал account_id=%s ticket_type=%s applied_delta=%s op_key=%s",
+                        account_id,
+                        ticket_type,
+                        applied_delta,
+                        op_key,
+                    )
+                return True
+            logger.error(
+                "❌ apply_ticket_delta_by_account: ticket_actions insert failed, rolling back account_id=%s ticket_type=%s applied_delta=%s error=%s",
+                account_id,
+                ticket_type,
+                applied_delta,
+                ledger_error,
+            )
+            if applied_delta and self._compare_and_set_tickets(account_id, ticket_type, -applied_delta) is None:
+                logger.error(
+                    "❌ apply_ticket_delta_by_account: КРИТИЧЕСКАЯ рассинхронизация, откат не сработал account_id=%s ticket_type=%s applied_delta=%s",
+                    account_id,
+                    ticket_type,
+                    applied_delta,
+                )
+            return False
+
+    def _ticket_actions_has_op_key(self, op_key: str) -> bool:
+        try:
+            response = self.supabase.table("ticket_actions").select("id").eq("op_key", op_key).limit(1).execute()
+            return bool(response.data)
+        except Exception as error:
+            logger.warning("ticket_actions op_key lookup failed op_key=%s error=%s", op_key, error)
             return False
 
     def log_ticket_action(self, user_id: int, ticket_type: str, amount: int, reason: str, author_id: int, author_account_id: Optional[str] = None):
@@ -1827,10 +2367,7 @@ class Database:
         author_account_id: Optional[str],
         author_id: int = 0,
     ) -> bool:
-        if self.update_tickets_by_account(account_id, ticket_type, amount):
-            self.log_ticket_action_by_account(account_id, ticket_type, amount, reason, author_account_id, author_id=author_id)
-            return True
-        return False
+        return self.apply_ticket_delta_by_account(account_id, ticket_type, amount, reason, author_account_id, author_id=author_id)
 
     def remove_ticket_by_account(
         self,
@@ -1841,10 +2378,7 @@ class Database:
         author_account_id: Optional[str],
         author_id: int = 0,
     ) -> bool:
-        if self.update_tickets_by_account(account_id, ticket_type, -amount):
-            self.log_ticket_action_by_account(account_id, ticket_type, -amount, reason, author_account_id, author_id=author_id)
-            return True
-        return False
+        return self.apply_ticket_delta_by_account(account_id, ticket_type, -amount, reason, author_account_id, author_id=author_id)
 
     def transfer_user_data(self, old_id: int, new_id: int) -> bool:
         """
@@ -1926,3 +2460,19 @@ class Database:
 
 # Глобальный экземпляр
 db = Database()
+
+
+def _collect_db_metrics() -> list[CollectedMetric]:
+    # Те же счётчики, что печатает scripts/account_metrics_report.py, но без отдельного запуска скрипта.
+    return [
+        CollectedMetric(
+            "account_events_total",
+            "counter",
+            "Account-first data layer events by name.",
+            [({"event": name}, value) for name, value in sorted(db.get_account_metrics_snapshot().items())],
+        ),
+        CollectedMetric("scores_dirty", "gauge", "Changed scores not yet flushed to Supabase.", [({}, db.dirty_score_count())]),
+    ]
+
+
+metrics.register_collector("database", _collect_db_metrics)
@@ -0,0 +1,231 @@
+"""
+Назначение: модуль "rpc capabilities" реализует продуктовый контур в зоне общая логика (данные).
+Ответственность: однократное на процесс определение доступных SQL RPC и их сигнатур, повторная проверка только по ошибкам отсутствия функции и счётчики fallback-путей.
+Где используется: общая логика (`bot/data/db.py`: баллы, банк, билеты, магазин, проверка схемы при старте).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Sequence
+
+from bot.metrics import CollectedMetric, metrics
+
+logger = logging.getLogger(__name__)
+
+RPC_STATE_UNKNOWN = "unknown"
+RPC_STATE_AVAILABLE = "available"
+RPC_STATE_MISSING = "missing"
+
+DEFAULT_VARIANT = "default"
+
+
+def is_missing_rpc_error(error: Exception) -> bool:
+    """PGRST202: функции нет или у неё другие имена параметров — PostgREST не различает эти случаи."""
+
+    message = str(error).lower()
+    return (
+        "pgrst202" in message
+        or ("function" in message and "does not exist" in message)
+        or "could not find the function" in message
+    )
+
+
+def is_schema_reload_error(error: Exception) -> bool:
+    """PostgREST перечитывает кеш схемы (например, после миграции): всё найденное ранее могло устареть."""
+
+    message = str(error).lower()
+    return "pgrst002" in message or "could not query the database for the schema cache" in message
+
+
+@dataclass
+class RpcCapability:
+    name: str
+    variants: tuple[str, ...] = (DEFAULT_VARIANT,)
+    state: str = RPC_STATE_UNKNOWN
+    variant: str | None = None
+    unsupported: set[str] = field(default_factory=set)
+    rpc_calls: int = 0
+    fallbacks: int = 0
+    failed_attempts: int = 0
+    probes: int = 0
+    detected_at: float | None = None
+    last_error: str | None = None
+
+    @property
+    def fallback_rate(self) -> float:
+        total = self.rpc_calls + self.fallbacks
+        return self.fallbacks / total if total else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "variant": self.variant,
+            "unsupported_variants": sorted(self.unsupported),
+            "rpc_calls": self.rpc_calls,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": round(self.fallback_rate, 4),
+            "failed_attempts": self.failed_attempts,
+            "probes": self.probes,
+            "detected_at": self.detected_at,
+            "last_error": self.last_error,
+        }
+
+
+class RpcCapabilityRegistry:
+    """Состояние привязано к объекту клиента: новый клиент (переподключение, тесты) — новое определение."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._client: Any = None
+        self._rpcs: dict[str, RpcCapability] = {}
+        self._schema: dict[str, bool] = {}
+
+    def _bind(self, client: Any) -> None:
+        if client is not self._client:
+            self._client = client
+            self._rpcs = {}
+            self._schema = {}
+
+    def _capability(self, rpc: str, variants: Sequence[str]) -> RpcCapability:
+        capability = self._rpcs.get(rpc)
+        if capability is None:
+            capability = self._rpcs[rpc] = RpcCapability(name=rpc, variants=tuple(variants))
+        return capability
+
+    def plan(self, client: Any, rpc: str, variants: Sequence[str] = (DEFAULT_VARIANT,)) -> list[str]:
+        """Варианты сигнатуры, которые стоит вызвать сейчас; пустой список — RPC нет, сразу fallback без round trip."""
+
+        with self._lock:
+            self._bind(client)
+            capability = self._capability(rpc, variants)
+            if capability.state == RPC_STATE_AVAILABLE and capability.variant:
+                return [capability.variant]
+            if capability.state == RPC_STATE_MISSING:
+                return []
+            capability.probes += 1
+            return [variant for variant in capability.variants if variant not in capability.unsupported]
+
+    def record_success(self, client: Any, rpc: str, variant: str = DEFAULT_VARIANT) -> None:
+        with self._lock:
+            self._bind(client)
+            capability = self._capability(rpc, (variant,))
+            capability.rpc_calls += 1
+            if capability.state == RPC_STATE_AVAILABLE and capability.variant == variant:
+                return
+            capability.state = RPC_STATE_AVAILABLE
+            capability.variant = variant
+            capability.detected_at = time.time()
+        logger.info("rpc capability detected rpc=%s variant=%s", rpc, variant)
+
+    def record_error(self, client: Any, rpc: str, error: Exception, *, variant: str = DEFAULT_VARIANT) -> bool:
+        """Учесть неудачный вызов; True, если ошибка означает отсутствие функции/сигнатуры (нужен fallback)."""
+
+        missing = is_missing_rpc_error(error)
+        with self._lock:
+            self._bind(client)
+            capability = self._capability(rpc, (variant,))
+            capability.failed_attempts += 1
+            capability.last_error = str(error)[:300]
+            if is_schema_reload_error(error) and not missing:
+                # Схема перечитывается: всё определённое ранее проверим заново на следующих вызовах.
+                for item in self._rpcs.values():
+                    item.state, item.variant = RPC_STATE_UNKNOWN, None
+                    item.unsupported.clear()
+                self._schema = {}
+                state, reprobe = RPC_STATE_UNKNOWN, True
+            elif not missing:
+                # Таймауты и бизнес-ошибки не говорят ничего о наличии функции.
+                return False
+            else:
+                reprobe = capability.state == RPC_STATE_AVAILABLE
+                capability.unsupported.add(variant)
+                if reprobe:
+                    # Работавшая сигнатура пропала (откат миграции, смена параметров): остальные проверим заново.
+                    capability.unsupported = {variant}
+                    capability.variant = None
+                if set(capability.variants) <= capability.unsupported:
+                    capability.state = RPC_STATE_MISSING
+                    capability.detected_at = time.time()
+                else:
+                    capability.state = RPC_STATE_UNKNOWN
+                state = capability.state
+        logger.warning(
+            "rpc capability changed rpc=%s variant=%s state=%s reprobe=%s error=%s",
+            rpc,
+            variant,
+            state,
+            reprobe,
+            str(error)[:200],
+        )
+        return missing
+
+    def record_fallback(self, client: Any, rpc: str) -> None:
+        with self._lock:
+            self._bind(client)
+            self._capability(rpc, (DEFAULT_VARIANT,)).fallbacks += 1
+
+    def record_schema(self, client: Any, key: str, present: bool) -> None:
+        with self._lock:
+            self._bind(client)
+            self._schema[key] = bool(present)
+
+    def invalidate(self, rpc: str | None = None) -> None:
+        """Забыть результат определения (после ручной миграции без перезапуска процесса)."""
+
+        with self._lock:
+            targets = list(self._rpcs.values()) if rpc is None else [self._rpcs[rpc]] if rpc in self._rpcs else []
+            for capability in targets:
+                capability.state, capability.variant = RPC_STATE_UNKNOWN, None
+                capability.unsupported.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "rpcs": {name: capability.as_dict() for name, capability in sorted(self._rpcs.items())},
+                "schema": dict(sorted(self._schema.items())),
+            }
+
+
+rpc_capabilities = RpcCapabilityRegistry()
+
+
+def _collect_rpc_capability_metrics() -> list[CollectedMetric]:
+    snapshot = rpc_capabilities.snapshot()
+    rpcs = snapshot["rpcs"]
+    return [
+        CollectedMetric(
+            "rpc_available",
+            "gauge",
+            "1 when the SQL RPC was detected on the connected database, 0 when missing, -1 while unknown.",
+            [
+                ({"rpc": name}, {RPC_STATE_AVAILABLE: 1, RPC_STATE_MISSING: 0}.get(item["state"], -1))
+                for name, item in rpcs.items()
+            ],
+        ),
+        CollectedMetric(
+            "rpc_path_total",
+            "counter",
+            "Operations served by the SQL RPC or by the step-by-step fallback path.",
+            [({"rpc": name, "path": "rpc"}, item["rpc_calls"]) for name, item in rpcs.items()]
+            + [({"rpc": name, "path": "fallback"}, item["fallbacks"]) for name, item in rpcs.items()],
+        ),
+        CollectedMetric(
+            "rpc_failed_attempts_total",
+            "counter",
+            "RPC round trips that failed (missing function, wrong signature or runtime error).",
+            [({"rpc": name}, item["failed_attempts"]) for name, item in rpcs.items()],
+        ),
+        CollectedMetric(
+            "schema_feature_present",
+            "gauge",
+            "Optional columns detected by the startup schema probe.",
+            [({"feature": key}, int(present)) for key, present in snapshot["schema"].items()],
+        ),
+    ]
+
+
+metrics.register_collector("rpc_capabilities", _collect_rpc_capability_metrics)
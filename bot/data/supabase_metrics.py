@@ -0,0 +1,70 @@
+"""
+Назначение: модуль "supabase metrics" реализует продуктовый контур в зоне общая логика (данные).
+Ответственность: обёртка клиента Supabase, считающая вызовы и задержку execute() по таблицам и RPC.
+Где используется: общая логика (`bot/data/db.py` оборачивает клиент при создании).
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from bot.metrics import metrics
+
+_db_call_seconds = metrics.histogram(
+    "db_call_duration_seconds",
+    "Supabase execute() latency by table or rpc and outcome.",
+    ("table", "status"),
+)
+
+
+class _TimedQuery:
+    """Прокси построителя запроса: цепочка select/eq/... сохраняет таблицу, execute() измеряется."""
+
+    __slots__ = ("_builder", "_table")
+
+    def __init__(self, builder: Any, table: str) -> None:
+        self._builder = builder
+        self._table = table
+
+    def execute(self, *args: Any, **kwargs: Any) -> Any:
+        started_at = time.perf_counter()
+        status = "ok"
+        try:
+            return self._builder.execute(*args, **kwargs)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            _db_call_seconds.observe(time.perf_counter() - started_at, table=self._table, status=status)
+
+    def _wrap(self, result: Any) -> Any:
+        return _TimedQuery(result, self._table) if hasattr(result, "execute") else result
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            # Свойства вроде .not_ тоже возвращают построитель.
+            return self._wrap(attr)
+
+        def _chained(*args: Any, **kwargs: Any) -> Any:
+            return self._wrap(attr(*args, **kwargs))
+
+        return _chained
+
+
+class InstrumentedSupabaseClient:
+    def __init__(self, client: Any) -> None:
+        self._client = client
+
+    def table(self, table_name: str) -> _TimedQuery:
+        return _TimedQuery(self._client.table(table_name), table_name)
+
+    def from_(self, table_name: str) -> _TimedQuery:
+        return _TimedQuery(self._client.from_(table_name), table_name)
+
+    def rpc(self, fn: str, *args: Any, **kwargs: Any) -> _TimedQuery:
+        return _TimedQuery(self._client.rpc(fn, *args, **kwargs), f"rpc:{fn}")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
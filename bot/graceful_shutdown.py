@@ -0,0 +1,169 @@
+"""
+Назначение: модуль "graceful shutdown" реализует продуктовый контур в зоне общая логика.
+Ответственность: согласованная остановка процесса по SIGTERM/SIGINT: прекращение приёма, дренаж очередей с дедлайном, сброс грязных баллов и отчёт о том, что осталось.
+Где используется: общая логика (`bot/main.py`, Telegram polling в `bot/telegram_bot/main.py`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_DEADLINE_ENV = "SHUTDOWN_DRAIN_DEADLINE_SEC"
+# Меньше SUPERVISOR_STOP_TIMEOUT_SEC, чтобы supervisor не успел прислать SIGKILL до отчёта.
+DEFAULT_SHUTDOWN_DEADLINE_SEC = 15.0
+STEP_TIMEOUT_GRACE_SEC = 1.0
+
+# Шаг получает оставшийся бюджет времени и возвращает число незавершённых элементов (None — нечего считать).
+ShutdownStep = Callable[[float], Awaitable["int | None"]]
+
+
+def shutdown_deadline_sec() -> float:
+    try:
+        return max(1.0, float(os.getenv(SHUTDOWN_DEADLINE_ENV) or DEFAULT_SHUTDOWN_DEADLINE_SEC))
+    except ValueError:
+        logger.warning("invalid %s, using default value=%s", SHUTDOWN_DEADLINE_ENV, DEFAULT_SHUTDOWN_DEADLINE_SEC)
+        return DEFAULT_SHUTDOWN_DEADLINE_SEC
+
+
+@dataclass
+class ShutdownStepResult:
+    status: str
+    pending: int = 0
+    duration_ms: int = 0
+
+
+@dataclass
+class ShutdownReport:
+    reason: str
+    steps: dict[str, ShutdownStepResult] = field(default_factory=dict)
+    duration_ms: int = 0
+
+    @property
+    def pending_total(self) -> int:
+        return sum(result.pending for result in self.steps.values())
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "reason": self.reason,
+            "duration_ms": self.duration_ms,
+            "pending_total": self.pending_total,
+            "steps": {
+                name: {"status": result.status, "pending": result.pending, "duration_ms": result.duration_ms}
+                for name, result in self.steps.items()
+            },
+        }
+
+
+class GracefulShutdown:
+    """Шаги выполняются в порядке регистрации; повторный run() возвращает отчёт уже идущей остановки."""
+
+    # (имя, шаг, резерв секунд, который остаётся за этим шагом, пока дренируются предыдущие)
+    _steps: list[tuple[str, ShutdownStep, float]] = []
+    _stopping = False
+    _reason: str | None = None
+    _task: asyncio.Task | None = None
+    _signal_handlers_installed = False
+
+    @staticmethod
+    def reset() -> None:
+        GracefulShutdown._steps = []
+        GracefulShutdown._stopping = False
+        GracefulShutdown._reason = None
+        GracefulShutdown._task = None
+        GracefulShutdown._signal_handlers_installed = False
+
+    @staticmethod
+    def register_step(name: str, step: ShutdownStep, *, reserve_sec: float = 0.0) -> None:
+        GracefulShutdown._steps = [entry for entry in GracefulShutdown._steps if entry[0] != name]
+        GracefulShutdown._steps.append((name, step, max(0.0, reserve_sec)))
+
+    @staticmethod
+    def is_stopping() -> bool:
+        return GracefulShutdown._stopping
+
+    @staticmethod
+    def signal_handlers_installed() -> bool:
+        return GracefulShutdown._signal_handlers_installed
+
+    @staticmethod
+    def install_signal_handlers(on_signal: Callable[[str], Any]) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, on_signal, sig.name)
+            except (NotImplementedError, RuntimeError):
+                # Windows: остаётся стандартный KeyboardInterrupt.
+                return
+        GracefulShutdown._signal_handlers_installed = True
+
+    @staticmethod
+    def request_stop(reason: str) -> bool:
+        """Перевести процесс в режим остановки; True только для первого запроса."""
+
+        if GracefulShutdown._stopping:
+            logger.info("shutdown already in progress reason=%s new_reason=%s", GracefulShutdown._reason, reason)
+            return False
+        GracefulShutdown._stopping = True
+        GracefulShutdown._reason = reason
+        logger.warning("shutdown requested reason=%s steps=%s", reason, ",".join(entry[0] for entry in GracefulShutdown._steps))
+        return True
+
+    @staticmethod
+    async def run(reason: str, *, deadline_sec: float | None = None) -> ShutdownReport:
+        if not GracefulShutdown._stopping:
+            GracefulShutdown.request_stop(reason)
+        if GracefulShutdown._task is None:
+            GracefulShutdown._task = asyncio.create_task(
+                GracefulShutdown._run_steps(GracefulShutdown._reason or reason, deadline_sec or shutdown_deadline_sec()),
+                name="graceful-shutdown",
+            )
+        # shield: отмена вызывающего (например, runtime-задачи) не должна обрывать дренаж.
+        return await asyncio.shield(GracefulShutdown._task)
+
+    @staticmethod
+    async def _run_steps(reason: str, deadline_sec: float) -> ShutdownReport:
+        started_at = time.monotonic()
+        deadline = started_at + deadline_sec
+        report = ShutdownReport(reason=reason)
+        steps = list(GracefulShutdown._steps)
+        for index, (name, step, _reserve) in enumerate(steps):
+            step_started_at = time.monotonic()
+            # Дренаж не должен съесть время сброса баллов и освобождения lock, идущих следом.
+            reserved_later = sum(entry[2] for entry in steps[index + 1 :])
+            remaining = max(0.0, deadline - step_started_at - reserved_later)
+            try:
+                # Шаг сам укладывается в remaining; внешний таймаут с запасом страхует от зависшего шага.
+                pending = await asyncio.wait_for(step(remaining), timeout=remaining + STEP_TIMEOUT_GRACE_SEC)
+                result = ShutdownStepResult(status="ok", pending=int(pending or 0))
+            except asyncio.TimeoutError:
+                result = ShutdownStepResult(status="timeout", pending=1)
+            except Exception:
+                logger.exception("shutdown step failed step=%s reason=%s", name, reason)
+                result = ShutdownStepResult(status="failed", pending=1)
+            result.duration_ms = int((time.monotonic() - step_started_at) * 1000)
+            report.steps[name] = result
+            logger.info(
+                "shutdown step finished step=%s status=%s pending=%s duration_ms=%s",
+                name,
+                result.status,
+                result.pending,
+                result.duration_ms,
+            )
+        report.duration_ms = int((time.monotonic() - started_at) * 1000)
+        logger.log(
+            logging.WARNING if report.pending_total else logging.INFO,
+            "shutdown complete reason=%s duration_ms=%s pending_total=%s steps=%s",
+            reason,
+            report.duration_ms,
+            report.pending_total,
+            ",".join(f"{name}:{result.status}:{result.pending}" for name, result in report.steps.items()),
+        )
+        return report
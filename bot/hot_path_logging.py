@@ -0,0 +1,301 @@
+"""
+Назначение: модуль "hot path logging" реализует продуктовый контур в зоне общая логика.
+Ответственность: выборка и token bucket для INFO/DEBUG-логов горячих путей с итогами «N similar messages suppressed» и неблокирующая запись логов через очередь.
+Где используется: общая логика (`safe_send`, `AuthorityService`, `AccountsService.refresh_identity_from_platform_user`, `on_message`; `bot/main.py` и `bot/telegram_bot/main.py` включают слой при старте).
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable
+
+from bot.metrics import CollectedMetric, metrics
+
+logger = logging.getLogger(__name__)
+
+HOT_PATH_RATE_ENV = "LOG_HOT_PATH_RATE_PER_SEC"
+HOT_PATH_BURST_ENV = "LOG_HOT_PATH_BURST"
+HOT_PATH_SAMPLE_EVERY_ENV = "LOG_HOT_PATH_SAMPLE_EVERY"
+HOT_PATH_SUMMARY_INTERVAL_ENV = "LOG_HOT_PATH_SUMMARY_INTERVAL_SECONDS"
+LOG_QUEUE_ENABLED_ENV = "LOG_QUEUE_ENABLED"
+
+DEFAULT_RATE_PER_SEC = 2.0
+DEFAULT_BURST = 20
+DEFAULT_SAMPLE_EVERY = 1
+DEFAULT_SUMMARY_INTERVAL_SEC = 60.0
+# Защита от неограниченного роста: call site — это (logger, файл, строка), их конечное число, но лимит дешёвый.
+DEFAULT_MAX_SITES = 2048
+
+
+@lru_cache(maxsize=None)
+def hot_path(sample_every: int | None = None) -> dict[str, Any]:
+    """`extra` для вызова логгера на горячем пути; `sample_every=N` оставляет каждое N-е сообщение этого call site."""
+
+    extra: dict[str, Any] = {"hot_path": True}
+    if sample_every is not None:
+        extra["hot_path_sample_every"] = max(1, int(sample_every))
+    return extra
+
+
+HOT_PATH = hot_path()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+@dataclass
+class _SiteState:
+    tokens: float
+    updated: float
+    seen: int = 0
+    suppressed: int = 0
+    last_seen: float = 0.0
+
+
+class HotPathLogFilter(logging.Filter):
+    """Ограничивает записи, помеченные `extra=HOT_PATH`; WARNING и выше, как и непомеченные записи, проходят всегда.
+
+    Выборка и token bucket считаются отдельно для каждого call site (logger, файл, строка). Первое пропущенное
+    после подавления сообщение получает суффикс с числом подавленных, а по затихшим call site итог выводится
+    отдельной записью не реже раза в `summary_interval` секунд.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate_per_sec: float | None = None,
+        burst: int | None = None,
+        sample_every: int | None = None,
+        summary_interval: float | None = None,
+        max_sites: int = DEFAULT_MAX_SITES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__()
+        self.rate_per_sec = max(0.0, rate_per_sec if rate_per_sec is not None else _env_float(HOT_PATH_RATE_ENV, DEFAULT_RATE_PER_SEC))
+        self.burst = max(1, int(burst if burst is not None else _env_float(HOT_PATH_BURST_ENV, DEFAULT_BURST)))
+        self.sample_every = max(
+            1, int(sample_every if sample_every is not None else _env_float(HOT_PATH_SAMPLE_EVERY_ENV, DEFAULT_SAMPLE_EVERY))
+        )
+        self.summary_interval = max(
+            1.0,
+            summary_interval
+            if summary_interval is not None
+            else _env_float(HOT_PATH_SUMMARY_INTERVAL_ENV, DEFAULT_SUMMARY_INTERVAL_SEC),
+        )
+        self.max_sites = max(1, int(max_sites))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sites: dict[tuple[str, str, int], _SiteState] = {}
+        self._last_sweep = clock()
+        self.passed = 0
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "hot_path", False):
+            return True
+        decided = getattr(record, "_hot_path_decision", None)
+        if decided is not None:
+            # Без очереди фильтр стоит на каждом root-обработчике: решение по записи принимаем один раз.
+            return decided
+
+        now = self._clock()
+        key = (record.name, record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) >= self.max_sites:
+                    self._evict_idle_locked()
+                site = self._sites[key] = _SiteState(tokens=float(self.burst), updated=now)
+            site.seen += 1
+            site.last_seen = now
+            site.tokens = min(float(self.burst), site.tokens + (now - site.updated) * self.rate_per_sec)
+            site.updated = now
+
+            sample_every = int(getattr(record, "hot_path_sample_every", 0) or self.sample_every)
+            allowed = (site.seen - 1) % sample_every == 0 and site.tokens >= 1.0
+            if allowed:
+                site.tokens -= 1.0
+                pending, site.suppressed = site.suppressed, 0
+                self.passed += 1
+            else:
+                site.suppressed += 1
+                self.suppressed += 1
+            summaries = self._collect_idle_summaries_locked(now)
+
+        self._emit_summaries(summaries)
+        record._hot_path_decision = allowed
+        if not allowed:
+            return False
+        if pending:
+            # Форматируем только здесь: подавленные записи так и не доходят до getMessage().
+            record.msg = f"{record.getMessage()} [{pending} similar messages suppressed]"
+            record.args = None
+        return True
+
+    def _evict_idle_locked(self) -> None:
+        idle = [key for key, site in self._sites.items() if not site.suppressed]
+        for key in idle or list(self._sites):
+            del self._sites[key]
+
+    def _collect_idle_summaries_locked(self, now: float, *, force: bool = False) -> list[tuple[tuple[str, str, int], int]]:
+        if not force and now - self._last_sweep < self.summary_interval:
+            return []
+        self._last_sweep = now
+        summaries = []
+        for key, site in self._sites.items():
+            if site.suppressed and (force or now - site.last_seen >= self.summary_interval):
+                summaries.append((key, site.suppressed))
+                site.suppressed = 0
+        return summaries
+
+    @staticmethod
+    def _emit_summaries(summaries: list[tuple[tuple[str, str, int], int]]) -> None:
+        for (name, pathname, lineno), count in summaries:
+            logging.getLogger(name).info(
+                "%s similar messages suppressed site=%s:%s",
+                count,
+                os.path.basename(pathname),
+                lineno,
+            )
+
+    def flush(self) -> None:
+        """Вывести итоги по всем call site с подавленными сообщениями (при остановке процесса)."""
+
+        with self._lock:
+            summaries = self._collect_idle_summaries_locked(self._clock(), force=True)
+        self._emit_summaries(summaries)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "passed": self.passed,
+                "suppressed": self.suppressed,
+                "sites": len(self._sites),
+                "pending": sum(site.suppressed for site in self._sites.values()),
+            }
+
+
+class DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке: строку собирают обработчики в потоке QueueListener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class HotPathLogging:
+    """Состояние установленного слоя: один на процесс, повторная установка ничего не делает."""
+
+    _lock = threading.Lock()
+    _filter: HotPathLogFilter | None = None
+    _listener: logging.handlers.QueueListener | None = None
+    _queue_handler: logging.Handler | None = None
+    _original_handlers: list[logging.Handler] = []
+    _atexit_registered = False
+
+    @staticmethod
+    def install(*, use_queue: bool | None = None, log_filter: HotPathLogFilter | None = None) -> HotPathLogFilter:
+        """Повесить фильтр горячих путей на root и, если включено, увести запись root-обработчиков в фоновый поток."""
+
+        with HotPathLogging._lock:
+            if HotPathLogging._filter is not None:
+                return HotPathLogging._filter
+
+            if use_queue is None:
+                use_queue = os.getenv(LOG_QUEUE_ENABLED_ENV, "1").strip().lower() not in {"0", "false", "no", "off"}
+            hot_filter = log_filter or HotPathLogFilter()
+            root_logger = logging.getLogger()
+            handlers = list(root_logger.handlers)
+
+            if use_queue and handlers:
+                # SimpleQueue не ограничена: put() не блокирует event loop, а WARNING+ не теряются при всплеске.
+                log_queue: queue.SimpleQueue = queue.SimpleQueue()
+                queue_handler = DeferredFormatQueueHandler(log_queue)
+                queue_handler.addFilter(hot_filter)
+                listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+                for handler in handlers:
+                    root_logger.removeHandler(handler)
+                root_logger.addHandler(queue_handler)
+                listener.start()
+                HotPathLogging._listener = listener
+                HotPathLogging._queue_handler = queue_handler
+                HotPathLogging._original_handlers = handlers
+            else:
+                for handler in handlers:
+                    handler.addFilter(hot_filter)
+                HotPathLogging._original_handlers = handlers
+
+            HotPathLogging._filter = hot_filter
+            if not HotPathLogging._atexit_registered:
+                atexit.register(HotPathLogging.uninstall)
+                HotPathLogging._atexit_registered = True
+
+        logger.info(
+            "hot path logging installed queue=%s rate_per_sec=%s burst=%s sample_every=%s handlers=%s",
+            bool(HotPathLogging._listener),
+            hot_filter.rate_per_sec,
+            hot_filter.burst,
+            hot_filter.sample_every,
+            len(handlers),
+        )
+        return hot_filter
+
+    @staticmethod
+    def uninstall() -> None:
+        """Вывести итоги подавления, дописать очередь и вернуть root-обработчики на место."""
+
+        with HotPathLogging._lock:
+            hot_filter = HotPathLogging._filter
+            if hot_filter is None:
+                return
+            hot_filter.flush()
+            root_logger = logging.getLogger()
+            listener = HotPathLogging._listener
+            if listener is not None:
+                listener.stop()
+                if HotPathLogging._queue_handler is not None:
+                    root_logger.removeHandler(HotPathLogging._queue_handler)
+                for handler in HotPathLogging._original_handlers:
+                    root_logger.addHandler(handler)
+            else:
+                for handler in HotPathLogging._original_handlers:
+                    handler.removeFilter(hot_filter)
+            HotPathLogging._filter = None
+            HotPathLogging._listener = None
+            HotPathLogging._queue_handler = None
+            HotPathLogging._original_handlers = []
+
+    @staticmethod
+    def snapshot() -> dict[str, Any]:
+        hot_filter = HotPathLogging._filter
+        if hot_filter is None:
+            return {"installed": False}
+        return {"installed": True, "queue": HotPathLogging._listener is not None, **hot_filter.snapshot()}
+
+
+def _collect_hot_path_logging_metrics() -> list[CollectedMetric]:
+    snapshot = HotPathLogging.snapshot()
+    if not snapshot["installed"]:
+        return []
+    return [
+        CollectedMetric(
+            "log_hot_path_records_total",
+            "counter",
+            "INFO/DEBUG hot-path log records written or suppressed by sampling and per-call-site token buckets.",
+            [({"result": "passed"}, snapshot["passed"]), ({"result": "suppressed"}, snapshot["suppressed"])],
+        ),
+    ]
+
+
+metrics.register_collector("hot_path_logging", _collect_hot_path_logging_metrics)
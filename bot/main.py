@@ -11,6 +11,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Системные импорты
+import argparse
 import asyncio
 import logging
 import time
@@ -24,7 +25,7 @@ from aiohttp import ClientConnectionError, ClientError, ServerTimeoutError
 from dotenv import load_dotenv
 
 from bot.telegram_bot.config import TELEGRAM_BOT_TOKEN_ENV, get_telegram_bot_token
-from bot.services.ai_request_scheduler import enqueue_ai_request
+from bot.services.ai_request_scheduler import drain_ai_request_scheduler, enqueue_ai_request
 from bot.services.ai_service import (
     _build_media_input,
     close_shared_http_session,
@@ -49,9 +50,13 @@ from bot.services.moderation_notifications import ModerationNotificationsService
 from bot.systems.profile_titles_logic import (
     handle_member_join_for_profile_titles,
     handle_member_update_for_profile_titles,
-    profile_titles_sync_loop,
+    sync_discord_titles_once,
+)
+from bot.systems.external_roles_sync_logic import (
+    DEFAULT_EXTERNAL_ROLES_SYNC_INTERVAL_SEC,
+    schedule_external_roles_sync,
+    sync_external_roles_once,
 )
-from bot.systems.external_roles_sync_logic import external_roles_sync_loop, schedule_external_roles_sync
 import bot.commands.fines
 import bot.data.tournament_db as tournament_db
 from bot.systems.tournament_logic import BettingView
@@ -67,13 +72,22 @@ from bot.telegram_bot.main import (
     TelegramPollingLockActiveError,
     TelegramPollingPreflightConflictError,
     TelegramPollingTransientNetworkError,
+    release_polling_lock as release_telegram_polling_lock,
     run_polling as run_telegram_polling,
+    stop_polling_intake as stop_telegram_polling_intake,
 )
+from bot.telegram_bot.send_governor import telegram_send_governor
+from bot.graceful_shutdown import GracefulShutdown
+from bot.hot_path_logging import HOT_PATH, HotPathLogging
+from bot.metrics import start_metrics_server
+from bot.runtime_supervisor import RuntimeSupervisor
 from bot.utils.discord_http import (
     is_transient_rate_limit_error,
     log_discord_http_exception,
 )
 from bot.commands.roles_admin import log_rolesadmin_command_registration_snapshot
+from bot.services.job_lock_service import run_with_leader_lock
+from bot.services.job_scheduler import JobScheduler, ScheduledJob
 
 
 # Константы
@@ -83,6 +97,35 @@ TOP_CHANNEL_ID = int(os.getenv("MONTHLY_TOP_CHANNEL_ID", 0))
 # Таймеры удаления сообщений
 active_timers = {}
 
+# Роль процесса: all — всё в одном процессе (по умолчанию), остальные — отдельные воркеры.
+PROCESS_ROLE_ENV = "BOT_PROCESS_ROLE"
+PROCESS_ROLE_ALL = "all"
+PROCESS_ROLE_DISCORD = "discord"
+PROCESS_ROLE_TELEGRAM = "telegram"
+PROCESS_ROLE_JOBS = "jobs"
+PROCESS_ROLE_AI = "ai"
+PROCESS_ROLE_SUPERVISOR = "supervisor"
+PROCESS_ROLES = (
+    PROCESS_ROLE_ALL,
+    PROCESS_ROLE_DISCORD,
+    PROCESS_ROLE_TELEGRAM,
+    PROCESS_ROLE_JOBS,
+    PROCESS_ROLE_AI,
+    PROCESS_ROLE_SUPERVISOR,
+)
+PROCESS_ROLE = PROCESS_ROLE_ALL
+job_scheduler: "JobScheduler | None" = None
+shutdown_task: "asyncio.Task | None" = None
+# fail_fast — падение Telegram останавливает процесс целиком (как раньше); isolated — каждый runtime
+# перезапускается независимо внутри процесса, общие сервисы (HTTP-сессия, AI-планировщик, autosave) живут дальше.
+RUNTIME_SUPERVISION_MODE_ENV = "RUNTIME_SUPERVISION_MODE"
+RUNTIME_SUPERVISION_FAIL_FAST = "fail_fast"
+RUNTIME_SUPERVISION_ISOLATED = "isolated"
+RUNTIME_RESTART_BASE_DELAY_SEC = max(0.1, float(os.getenv("RUNTIME_RESTART_BASE_DELAY_SEC", "2")))
+RUNTIME_RESTART_MAX_DELAY_SEC = max(1.0, float(os.getenv("RUNTIME_RESTART_MAX_DELAY_SEC", "120")))
+SHUTDOWN_SCORES_FLUSH_RESERVE_SEC = 3.0
+SHUTDOWN_TELEGRAM_RELEASE_RESERVE_SEC = 2.0
+
 # Prevent duplicate background tasks if on_ready fires multiple times
 tasks_started = False
 startup_tasks_started = False
@@ -98,8 +141,10 @@ COMMAND_SYNC_STATE_FILE = os.getenv(
     os.path.join(os.path.dirname(os.path.abspath(__file__)), "command_sync_state.json"),
 )
 COMMAND_SYNC_MIN_INTERVAL = int(os.getenv("COMMAND_SYNC_MIN_INTERVAL", "21600"))
-DISCORD_FULL_SCAN_BATCH_SIZE = max(1, int(os.getenv("DISCORD_FULL_SCAN_BATCH_SIZE", "200")))
+DISCORD_FULL_SCAN_BATCH_SIZE = max(1, int(os.getenv("DISCORD_FULL_SCAN_BATCH_SIZE", "500")))
 DISCORD_FULL_SCAN_PAUSE_SECONDS = max(0.0, float(os.getenv("DISCORD_FULL_SCAN_PAUSE_SECONDS", "1.0")))
+# Повторный полный скан гильдии не запускается раньше этого интервала после завершённого.
+DISCORD_FULL_SCAN_MIN_INTERVAL_SECONDS = max(0.0, float(os.getenv("DISCORD_FULL_SCAN_MIN_INTERVAL_SECONDS", "86400")))
 bot = command_bot
 db.bot = bot
 
@@ -146,6 +191,8 @@ def _install_ai_session_hooks_for_discord() -> None:
 
     async def _setup_hook_with_ai_session(*args, **kwargs):
         await init_shared_http_session()
+        _install_shutdown_signal_handlers(close_discord=True)
+        await start_metrics_server()
         if original_setup_hook is not None:
             return await original_setup_hook(*args, **kwargs)
         return None
@@ -161,6 +208,56 @@ def _install_ai_session_hooks_for_discord() -> None:
     _ai_session_hooks_installed = True
 
 
+async def _flush_dirty_scores(_timeout_sec: float) -> int:
+    from bot.utils.blocking_io import run_blocking_io
+
+    flushed = await run_blocking_io("db.save_all", db.save_all)
+    still_dirty = db.dirty_score_count()
+    logging.info("shutdown scores flush flushed=%s still_dirty=%s", flushed, still_dirty)
+    return still_dirty
+
+
+def _register_shutdown_steps() -> None:
+    # Порядок: прекратить приём -> доработать AI и исходящие сообщения -> сбросить баллы -> отдать polling lock.
+    GracefulShutdown.register_step("telegram_intake", stop_telegram_polling_intake)
+    GracefulShutdown.register_step("ai_scheduler", drain_ai_request_scheduler)
+    GracefulShutdown.register_step("telegram_send_queue", telegram_send_governor.drain)
+    GracefulShutdown.register_step(
+        "scores_flush",
+        _flush_dirty_scores,
+        reserve_sec=SHUTDOWN_SCORES_FLUSH_RESERVE_SEC,
+    )
+    GracefulShutdown.register_step(
+        "telegram_polling_lock",
+        release_telegram_polling_lock,
+        reserve_sec=SHUTDOWN_TELEGRAM_RELEASE_RESERVE_SEC,
+    )
+
+
+async def _graceful_shutdown(reason: str, *, close_discord: bool) -> None:
+    await GracefulShutdown.run(reason)
+    if close_discord and not bot.is_closed():
+        await bot.close()
+
+
+def _install_shutdown_signal_handlers(*, close_discord: bool) -> None:
+    if GracefulShutdown.signal_handlers_installed():
+        return
+    _register_shutdown_steps()
+
+    def _on_signal(signal_name: str) -> None:
+        global shutdown_task
+        if shutdown_task is not None:
+            logging.warning("shutdown signal repeated signal=%s; drain already in progress", signal_name)
+            return
+        shutdown_task = asyncio.create_task(
+            _graceful_shutdown(f"signal:{signal_name}", close_discord=close_discord),
+            name="graceful-shutdown-signal",
+        )
+
+    GracefulShutdown.install_signal_handlers(_on_signal)
+
+
 def _create_task_with_startup_logging(
     coro,
     *,
@@ -219,68 +316,37 @@ def _create_task_with_startup_logging(
 
 
 async def _run_discord_full_identity_scan_once() -> None:
-    from bot.services import AccountsService
+    from bot.services.identity_scan_service import IdentityScanService
 
     totals = {"updated": 0, "inserted": 0, "skipped": 0}
+    # Identity-индекс читается один раз на весь проход по гильдиям.
+    shared_preload: dict[str, object] = {}
     logging.info(
-        "discord identity full scan started guilds=%s batch_size=%s pause_seconds=%s",
+        "discord identity full scan started guilds=%s batch_size=%s pause_seconds=%s min_interval_seconds=%s",
         len(bot.guilds),
         DISCORD_FULL_SCAN_BATCH_SIZE,
         DISCORD_FULL_SCAN_PAUSE_SECONDS,
+        DISCORD_FULL_SCAN_MIN_INTERVAL_SECONDS,
     )
 
     for guild in bot.guilds:
-        guild_totals = {"updated": 0, "inserted": 0, "skipped": 0}
-        processed = 0
-        current_batch = 0
         try:
-            logging.info(
-                "discord identity full scan guild started guild_id=%s member_count=%s",
-                guild.id,
-                getattr(guild, "member_count", None),
+            guild_totals = await IdentityScanService.scan_discord_guild(
+                guild,
+                chunk_size=DISCORD_FULL_SCAN_BATCH_SIZE,
+                pause_seconds=DISCORD_FULL_SCAN_PAUSE_SECONDS,
+                min_interval_seconds=DISCORD_FULL_SCAN_MIN_INTERVAL_SECONDS,
+                shared_preload=shared_preload,
             )
-            async for member in guild.fetch_members(limit=None):
-                processed += 1
-                current_batch += 1
-                try:
-                    status = AccountsService.refresh_identity_from_platform_user(
-                        "discord",
-                        member,
-                        source_handler="discord.full_scan",
-                        guild_id=guild.id,
-                    )
-                except Exception:
-                    logging.exception(
-                        "discord identity full scan member refresh failed guild_id=%s member_id=%s",
-                        guild.id,
-                        getattr(member, "id", None),
-                    )
-                    status = "skipped"
-
-                normalized_status = status if status in guild_totals else "skipped"
-                guild_totals[normalized_status] += 1
-                totals[normalized_status] += 1
-
-                if current_batch >= DISCORD_FULL_SCAN_BATCH_SIZE:
-                    logging.info(
-                        "discord identity full scan progress guild_id=%s processed=%s updated=%s inserted=%s skipped=%s",
-                        guild.id,
-                        processed,
-                        guild_totals["updated"],
-                        guild_totals["inserted"],
-                        guild_totals["skipped"],
-                    )
-                    current_batch = 0
-                    if DISCORD_FULL_SCAN_PAUSE_SECONDS > 0:
-                        await asyncio.sleep(DISCORD_FULL_SCAN_PAUSE_SECONDS)
-
+            for key in totals:
+                totals[key] += guild_totals.get(key, 0)
             logging.info(
                 "discord identity full scan guild completed guild_id=%s processed=%s updated=%s inserted=%s skipped=%s",
                 guild.id,
-                processed,
-                guild_totals["updated"],
-                guild_totals["inserted"],
-                guild_totals["skipped"],
+                guild_totals.get("processed", 0),
+                guild_totals.get("updated", 0),
+                guild_totals.get("inserted", 0),
+                guild_totals.get("skipped", 0),
             )
         except discord.Forbidden:
             logging.exception("discord identity full scan forbidden guild_id=%s", getattr(guild, "id", None))
@@ -290,13 +356,11 @@ async def _run_discord_full_identity_scan_once() -> None:
                 exc,
                 stage="on_ready.full_scan",
                 guild_id=getattr(guild, "id", None),
-                processed=processed,
             )
         except Exception:
             logging.exception(
-                "discord identity full scan failed guild_id=%s processed=%s",
+                "discord identity full scan failed guild_id=%s",
                 getattr(guild, "id", None),
-                processed,
             )
 
     logging.info(
@@ -400,16 +464,20 @@ def configure_logging() -> None:
     # Убираем шумные служебные сообщения библиотек из startup-логов.
     logging.getLogger("discord.client").setLevel(logging.WARNING)
     logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    # Горячие пути (on_message, safe_send, проверки прав) пишут INFO через выборку; запись в поток/файл — в фоне.
+    HotPathLogging.install()
 
 
 async def send_greetings(channel, user_list):
     for user_id in user_list:
         await safe_send(channel, f"Привет, <@{user_id}>!")
 
-async def autosave_task():
-    await bot.wait_until_ready()
+async def autosave_task(*, follow_discord_lifecycle: bool = True):
+    # В режиме isolated autosave — общий сервис процесса и не останавливается вместе с Discord runtime.
+    if follow_discord_lifecycle:
+        await bot.wait_until_ready()
     autosave_interval_sec = int(os.getenv("SCORES_AUTOSAVE_INTERVAL_SEC", "600"))
-    while not bot.is_closed():
+    while not (follow_discord_lifecycle and bot.is_closed()):
         try:
             db.save_all()
         except Exception:
@@ -417,6 +485,105 @@ async def autosave_task():
         await asyncio.sleep(autosave_interval_sec)
 
 
+def _start_autosave_once(*, follow_discord_lifecycle: bool = True) -> None:
+    global startup_tasks_started
+    # Не дублируем фоновые задачи при повторном on_ready (reconnect)
+    if startup_tasks_started:
+        return
+    startup_tasks_started = True
+    _create_task_with_startup_logging(
+        autosave_task(follow_discord_lifecycle=follow_discord_lifecycle),
+        step="autosave_task",
+        operation_id="startup-loop-9",
+        startup_burst=True,
+    )
+
+
+def _role_runs_background_jobs() -> bool:
+    return PROCESS_ROLE in (PROCESS_ROLE_ALL, PROCESS_ROLE_JOBS)
+
+
+def _interval_from_env(env_name: str, default_sec: int, minimum_sec: int) -> int:
+    try:
+        return max(minimum_sec, int(os.getenv(env_name, str(default_sec))))
+    except ValueError:
+        return default_sec
+
+
+def _build_job_scheduler() -> JobScheduler:
+    from bot.services.council_pause_service import CouncilPauseService
+    from bot.services.moderation_service import ModerationService
+    from bot.systems.tournament_logic import notify_expired_registrations, send_tournament_reminders
+    from bot.utils.blocking_io import run_blocking_io
+
+    scheduler = JobScheduler()
+    # Порядок регистрации задаёт сдвиг первого запуска (JOB_SCHEDULER_STAGGER_SEC).
+    for job in (
+        ScheduledJob.from_env("check_overdue_fines", lambda: fines_logic.check_overdue_fines(bot), 3600),
+        ScheduledJob.from_env("debt_repayment", lambda: fines_logic.repay_debts_once(bot), 86400),
+        ScheduledJob.from_env("fines_reminders", lambda: fines_logic.remind_fines(bot), 86400),
+        ScheduledJob.from_env("fines_summary", lambda: fines_logic.fines_summary_report(bot), 172800),
+        ScheduledJob.from_env(
+            "mute_reconciliation",
+            lambda: ModerationNotificationsService.reconcile_mutes(bot),
+            60,
+            max_runtime_seconds=300,
+            jitter_seconds=5,
+            record_history=False,
+        ),
+        ScheduledJob.from_env(
+            "moderation_case_recovery",
+            lambda: run_blocking_io("moderation.recover_stale_cases", ModerationService.recover_stale_pending_cases),
+            ModerationService.CASE_RECOVERY_AGE_SECONDS // 2,
+            record_history=False,
+        ),
+        ScheduledJob.from_env(
+            "bank_ledger_verification",
+            lambda: run_blocking_io("bank.verify_ledger", db.verify_bank_ledger),
+            3600,
+        ),
+        ScheduledJob.from_env(
+            "council_pause_reconcile",
+            lambda: run_blocking_io("council.pause_reconcile", CouncilPauseService.sync_pause_state),
+            _interval_from_env("COUNCIL_PAUSE_RECONCILE_INTERVAL_SEC", 300, 30),
+            record_history=False,
+        ),
+        ScheduledJob.from_env("tournament_reminders", lambda: send_tournament_reminders(bot), 21600),
+        ScheduledJob.from_env("registration_deadlines", lambda: notify_expired_registrations(bot), 3600),
+        ScheduledJob.from_env(
+            "profile_titles_sync",
+            lambda: sync_discord_titles_once(bot),
+            _interval_from_env("PROFILE_TITLES_SYNC_INTERVAL_SEC", 21600, 300),
+        ),
+        ScheduledJob.from_env(
+            "external_roles_sync",
+            lambda: sync_external_roles_once(bot),
+            _interval_from_env("EXTERNAL_ROLES_SYNC_INTERVAL_SEC", DEFAULT_EXTERNAL_ROLES_SYNC_INTERVAL_SEC, 60),
+        ),
+    ):
+        scheduler.register(job)
+    return scheduler
+
+
+def _run_background_job(step: str, coro_factory):
+    """Wrap job into leader lock when several jobs-workers may run at once."""
+
+    if PROCESS_ROLE == PROCESS_ROLE_JOBS:
+        return run_with_leader_lock(step, coro_factory)
+    return coro_factory()
+
+
+def _start_background_loops() -> None:
+    global job_scheduler
+    job_scheduler = _build_job_scheduler()
+    _create_task_with_startup_logging(
+        _run_background_job("job_scheduler", job_scheduler.run_forever),
+        step="job_scheduler",
+        operation_id="startup-loop-1",
+        startup_burst=True,
+    )
+
+
 def _restore_runtime_views_once() -> None:
     global runtime_views_restored
     if runtime_views_restored:
@@ -499,6 +666,14 @@ def _restore_runtime_views_once() -> None:
     runtime_views_restored = True
     logging.info("discord runtime view restoration complete active_tournaments=%s", len(active_tournaments))
 
+async def _jobs_role_interaction_check(interaction: discord.Interaction) -> bool:
+    # Slash-команды обслуживает процесс роли discord; jobs-worker их не принимает.
+    return PROCESS_ROLE != PROCESS_ROLE_JOBS
+
+
+bot.tree.interaction_check = _jobs_role_interaction_check
+
+
 @bot.event
 async def on_ready():
     print(f'🟢 Бот {bot.user} запущен!')
@@ -507,62 +682,24 @@ async def on_ready():
     global tasks_started, startup_tasks_started, commands_synced, presence_initialized, discord_full_scan_started
     if not tasks_started:
         tasks_started = True
-
-        _create_task_with_startup_logging(
-            fines_logic.check_overdue_fines(bot),
-            step="check_overdue_fines_loop",
-            operation_id="startup-loop-1",
-            startup_burst=True,
-        )
-        _create_task_with_startup_logging(
-            fines_logic.debt_repayment_loop(bot),
-            step="debt_repayment_loop",
-            operation_id="startup-loop-2",
-            startup_burst=True,
-        )
-        _create_task_with_startup_logging(
-            fines_logic.reminder_loop(bot),
-            step="reminder_loop",
-            operation_id="startup-loop-3",
-            startup_burst=True,
-        )
-        _create_task_with_startup_logging(
-            fines_logic.fines_summary_loop(bot),
-            step="fines_summary_loop",
-            operation_id="startup-loop-4",
-            startup_burst=True,
-        )
-        _create_task_with_startup_logging(
-            ModerationNotificationsService.mute_reconciliation_loop(bot),
-            step="mute_reconciliation_loop",
-            operation_id="startup-loop-4b",
-            startup_burst=True,
-        )
-        from bot.systems.tournament_logic import tournament_reminder_loop, registration_deadline_loop
-        _create_task_with_startup_logging(
-            tournament_reminder_loop(bot),
-            step="tournament_reminder_loop",
-            operation_id="startup-loop-5",
-            startup_burst=True,
-        )
-        _create_task_with_startup_logging(
-            registration_deadline_loop(bot),
-            step="registration_deadline_loop",
-            operation_id="startup-loop-6",
-            startup_burst=True,
-        )
-        _create_task_with_startup_logging(
-            profile_titles_sync_loop(bot),
-            step="profile_titles_sync_loop",
-            operation_id="startup-loop-7",
-            startup_burst=True,
-        )
-        _create_task_with_startup_logging(
-            external_roles_sync_loop(bot),
-            step="external_roles_sync_loop",
-            operation_id="startup-loop-8",
-            startup_burst=True,
-        )
+        if _role_runs_background_jobs():
+            _start_background_loops()
+        else:
+            _log_startup_step(logging.INFO, "startup background loops skipped", step="background_loops", process_role=PROCESS_ROLE)
+
+    if PROCESS_ROLE == PROCESS_ROLE_JOBS:
+        # jobs-worker держит gateway только ради фоновых задач: UI, синхронизация
+        # команд и persistent views остаются за процессом роли discord.
+        if not discord_full_scan_started:
+            discord_full_scan_started = True
+            _create_task_with_startup_logging(
+                _run_background_job("discord_full_identity_scan_once", _run_discord_full_identity_scan_once),
+                step="discord_full_identity_scan_once",
+                operation_id="startup-once-full-scan",
+                startup_burst=True,
+            )
+        _start_autosave_once()
+        return
 
     if not presence_initialized:
         activity = discord.Activity(
@@ -615,7 +752,7 @@ async def on_ready():
     
     _restore_runtime_views_once()
 
-    if not discord_full_scan_started:
+    if not discord_full_scan_started and _role_runs_background_jobs():
         discord_full_scan_started = True
         _create_task_with_startup_logging(
             _run_discord_full_identity_scan_once(),
@@ -624,15 +761,7 @@ async def on_ready():
             startup_burst=True,
         )
 
-    # Не дублируем фоновые задачи при повторном on_ready (reconnect)
-    if not startup_tasks_started:
-        startup_tasks_started = True
-        _create_task_with_startup_logging(
-            autosave_task(),
-            step="autosave_task",
-            operation_id="startup-loop-9",
-            startup_burst=True,
-        )
+    _start_autosave_once()
 
     print('--- Ленивый режим загрузки данных активирован ---')
     print("📡 Задачи активированы.")
@@ -640,6 +769,8 @@ async def on_ready():
 
 @bot.event
 async def on_member_update(before: discord.Member, after: discord.Member):
+    if PROCESS_ROLE == PROCESS_ROLE_JOBS:
+        return
     await handle_member_update_for_profile_titles(before, after)
 
     from bot.services import AccountsService
@@ -673,6 +804,8 @@ async def on_member_update(before: discord.Member, after: discord.Member):
 
 @bot.event
 async def on_member_join(member: discord.Member):
+    if PROCESS_ROLE == PROCESS_ROLE_JOBS:
+        return
     from bot.services import AccountsService
 
     AccountsService.refresh_identity_from_platform_user(
@@ -686,6 +819,8 @@ async def on_member_join(member: discord.Member):
 
 @bot.event
 async def on_member_remove(member: discord.Member):
+    if PROCESS_ROLE == PROCESS_ROLE_JOBS:
+        return
     from bot.services import AccountsService
 
     try:
@@ -709,8 +844,12 @@ async def on_member_remove(member: discord.Member):
 
 @bot.event
 async def on_message(message: discord.Message):
+    if PROCESS_ROLE == PROCESS_ROLE_JOBS:
+        return
     if message.author.bot:
         return
+    if GracefulShutdown.is_stopping():
+        return
 
     try:
         from bot.services import AccountsService
@@ -726,6 +865,7 @@ async def on_message(message: discord.Message):
             getattr(message.channel, "id", None),
             getattr(message, "id", None),
             getattr(message.author, "id", None),
+            extra=HOT_PATH,
         )
         ctx = await bot.get_context(message)
         logging.info(
@@ -734,6 +874,7 @@ async def on_message(message: discord.Message):
             getattr(message, "id", None),
             getattr(message.author, "id", None),
             getattr(ctx, "valid", False),
+            extra=HOT_PATH,
         )
         if getattr(ctx, "valid", False):
             await bot.process_commands(message)
@@ -752,6 +893,7 @@ async def on_message(message: discord.Message):
                         getattr(attachment, "id", None),
                         content_type,
                         getattr(attachment, "filename", None),
+                        extra=HOT_PATH,
                     )
                     continue
                 try:
@@ -771,6 +913,7 @@ async def on_message(message: discord.Message):
                             getattr(attachment, "filename", None),
                             content_type,
                             len(payload),
+                            extra=HOT_PATH,
                         )
                 except Exception:
                     logging.exception(
@@ -942,8 +1085,12 @@ def run_telegram_main(token: str) -> None:
     try:
         async def _run() -> None:
             await init_shared_http_session()
+            _install_shutdown_signal_handlers(close_discord=False)
+            await start_metrics_server()
             try:
                 await run_telegram_polling(token)
+                if GracefulShutdown.is_stopping():
+                    await GracefulShutdown.run("telegram polling stopped")
             finally:
                 await close_shared_http_session()
 
@@ -1013,6 +1160,43 @@ def run_discord_main(token: str) -> None:
         )
         raise
 
+def _runtime_supervision_mode() -> str:
+    mode = (os.getenv(RUNTIME_SUPERVISION_MODE_ENV) or RUNTIME_SUPERVISION_FAIL_FAST).strip().lower()
+    if mode not in (RUNTIME_SUPERVISION_FAIL_FAST, RUNTIME_SUPERVISION_ISOLATED):
+        logging.warning(
+            "unknown %s=%s, using %s",
+            RUNTIME_SUPERVISION_MODE_ENV,
+            mode,
+            RUNTIME_SUPERVISION_FAIL_FAST,
+        )
+        return RUNTIME_SUPERVISION_FAIL_FAST
+    return mode
+
+
+def _prepare_discord_restart() -> None:
+    # После close() клиент discord.py нельзя запустить повторно без clear(): сбрасываем состояние gateway и HTTP.
+    _reset_discord_http_client_state("runtime_supervisor.restart")
+    bot.clear()
+
+
+async def _supervise_runtimes_isolated(run_discord, run_telegram) -> None:
+    _start_autosave_once(follow_discord_lifecycle=False)
+    supervisor = RuntimeSupervisor(
+        base_delay_sec=RUNTIME_RESTART_BASE_DELAY_SEC,
+        max_delay_sec=RUNTIME_RESTART_MAX_DELAY_SEC,
+        should_stop=GracefulShutdown.is_stopping,
+    )
+    supervisor.add(
+        "discord-runtime",
+        run_discord,
+        before_restart=_prepare_discord_restart,
+        permanent_errors=(discord.LoginFailure,),
+    )
+    supervisor.add("telegram-runtime", run_telegram)
+    logging.info("runtime supervision mode=%s runtimes=discord-runtime,telegram-runtime", RUNTIME_SUPERVISION_ISOLATED)
+    await supervisor.run()
+
+
 async def _run_both_async(discord_token: str, telegram_token: str) -> None:
     await init_shared_http_session()
 
@@ -1033,6 +1217,9 @@ async def _run_both_async(discord_token: str, telegram_token: str) -> None:
                 step="bot.start",
                 hostname=os.uname().nodename,
             )
+            if GracefulShutdown.is_stopping():
+                logging.info("discord runtime stopped for graceful shutdown")
+                return
             logging.error(
                 "discord runtime stopped unexpectedly while telegram remains active; stopping Discord without auto-retry. "
                 "A full dashboard restart is required to start Discord again"
@@ -1108,6 +1295,9 @@ async def _run_both_async(discord_token: str, telegram_token: str) -> None:
                 max(1, int(os.getenv("TELEGRAM_POLLING_MAX_TRANSIENT_FAILURES", "3"))) - 1,
             )
             await run_telegram_polling(telegram_token)
+            if GracefulShutdown.is_stopping():
+                logging.info("telegram runtime stopped for graceful shutdown")
+                return
             logging.error(
                 "telegram runtime stopped unexpectedly without exception; "
                 "fail-fast shutdown so external supervisor can decide restart policy"
@@ -1162,6 +1352,17 @@ async def _run_both_async(discord_token: str, telegram_token: str) -> None:
             async with telegram_runtime_guard:
                 telegram_runtime_started = False
 
+    _install_shutdown_signal_handlers(close_discord=True)
+    await start_metrics_server()
+    if _runtime_supervision_mode() == RUNTIME_SUPERVISION_ISOLATED:
+        try:
+            await _supervise_runtimes_isolated(_run_discord_once, _run_telegram_with_retries)
+            if shutdown_task is not None:
+                await shutdown_task
+        finally:
+            await close_shared_http_session()
+        return
+
     discord_task = asyncio.create_task(_run_discord_once(), name="discord-runtime")
     telegram_task = asyncio.create_task(_run_telegram_with_retries(), name="telegram-runtime")
 
@@ -1182,6 +1383,9 @@ async def _run_both_async(discord_token: str, telegram_token: str) -> None:
                     continue
 
                 if exc is None:
+                    if GracefulShutdown.is_stopping():
+                        logging.info("%s stopped for graceful shutdown", task_name)
+                        continue
                     logging.warning(
                         "%s stopped; remaining_runtimes=%s",
                         task_name,
@@ -1227,6 +1431,8 @@ async def _run_both_async(discord_token: str, telegram_token: str) -> None:
                             )
                             other_task.cancel()
 
+        if shutdown_task is not None:
+            await shutdown_task
         if runtime_errors and "telegram-runtime" in runtime_errors:
             raise runtime_errors["telegram-runtime"]
     finally:
@@ -1237,21 +1443,64 @@ def run_both_main(discord_token: str, telegram_token: str) -> None:
     asyncio.run(_run_both_async(discord_token, telegram_token))
 
 
-def main() -> None:
-    """Launcher for Discord/Telegram runtimes based on available tokens."""
+def _parse_process_role(argv: list[str] | None) -> str:
+    parser = argparse.ArgumentParser(description="Discord/Telegram bot launcher")
+    parser.add_argument(
+        "--role",
+        choices=PROCESS_ROLES,
+        default=(os.getenv(PROCESS_ROLE_ENV) or PROCESS_ROLE_ALL).strip().lower(),
+        help="process role: all runtimes in one process (default) or a single dedicated worker",
+    )
+    args = parser.parse_args(argv)
+    if args.role not in PROCESS_ROLES:
+        parser.error(f"unknown {PROCESS_ROLE_ENV}={args.role!r}, expected one of: {', '.join(PROCESS_ROLES)}")
+    return args.role
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Launcher for Discord/Telegram runtimes based on process role and available tokens."""
+
+    global PROCESS_ROLE
 
     load_dotenv()
     configure_logging()
 
+    PROCESS_ROLE = _parse_process_role(argv)
+
     discord_token = (os.getenv('DISCORD_TOKEN') or '').strip()
     telegram_token = get_telegram_bot_token()
 
     logging.info(
-        "startup token detection: discord_token_present=%s telegram_token_present=%s",
+        "startup token detection: process_role=%s discord_token_present=%s telegram_token_present=%s",
+        PROCESS_ROLE,
         bool(discord_token),
         bool(telegram_token),
     )
 
+    if PROCESS_ROLE == PROCESS_ROLE_SUPERVISOR:
+        from bot.process_supervisor import run_supervisor
+
+        run_supervisor(discord_token_present=bool(discord_token), telegram_token_present=bool(telegram_token))
+        return
+    if PROCESS_ROLE == PROCESS_ROLE_AI:
+        from bot.services.ai_worker import get_ai_worker_bind, serve_ai_worker
+
+        host, port = get_ai_worker_bind()
+        asyncio.run(serve_ai_worker(host, port))
+        return
+    if PROCESS_ROLE in (PROCESS_ROLE_DISCORD, PROCESS_ROLE_JOBS):
+        if not discord_token:
+            logging.error("process role %s requires DISCORD_TOKEN", PROCESS_ROLE)
+            return
+        run_discord_main(discord_token)
+        return
+    if PROCESS_ROLE == PROCESS_ROLE_TELEGRAM:
+        if not telegram_token:
+            logging.error("process role %s requires %s", PROCESS_ROLE, TELEGRAM_BOT_TOKEN_ENV)
+            return
+        run_telegram_main(telegram_token)
+        return
+
     if discord_token and telegram_token:
         run_both_main(discord_token, telegram_token)
         return
@@ -0,0 +1,268 @@
+"""
+Назначение: модуль "metrics" реализует продуктовый контур в зоне общая логика.
+Ответственность: единый реестр метрик процесса (счётчики, gauge, гистограммы задержек) и их выдача в текстовом формате Prometheus по локальному HTTP.
+Где используется: общая логика (БД, отправки Discord/Telegram, AI-планировщик, фоновые задачи; `bot/main.py` поднимает endpoint).
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "bebrobot_"
+METRICS_HOST_ENV = "METRICS_HOST"
+METRICS_PORT_ENV = "METRICS_PORT"
+DEFAULT_METRICS_HOST = "127.0.0.1"
+METRICS_PATH = "/metrics"
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы в секундах: от быстрых запросов к Supabase до долгих AI-ответов и фоновых задач.
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable[tuple[str, Any]]) -> str:
+    pairs = [f'{key}="{_escape_label_value(value)}"' for key, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...], lock: threading.Lock) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = lock
+        self._values: dict[tuple[str, ...], Any] = {}
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"metric {self.name} expects labels {self.labelnames}, got {tuple(sorted(labels))}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list[tuple[str, tuple[tuple[str, Any], ...], float]]:
+        with self._lock:
+            return [(self.name, tuple(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if amount < 0:
+            raise ValueError("counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...], lock: threading.Lock, buckets: tuple[float, ...]) -> None:
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def samples(self) -> list[tuple[str, tuple[tuple[str, Any], ...], float]]:
+        rendered = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                labels = tuple(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, state["buckets"]):
+                    rendered.append((f"{self.name}_bucket", labels + (("le", _format_value(bound)),), count))
+                rendered.append((f"{self.name}_bucket", labels + (("le", "+Inf"),), state["count"]))
+                rendered.append((f"{self.name}_sum", labels, state["sum"]))
+                rendered.append((f"{self.name}_count", labels, state["count"]))
+        return rendered
+
+
+@dataclass
+class CollectedMetric:
+    """Метрика, которую коллектор собирает в момент scrape из уже существующего состояния сервиса."""
+
+    name: str
+    kind: str
+    documentation: str
+    samples: list[tuple[dict[str, Any], float]] = field(default_factory=list)
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = METRICS_PREFIX) -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: dict[str, Callable[[], Iterable[CollectedMetric]]] = {}
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Iterable[str], **kwargs: Any):
+        full_name = f"{self.prefix}{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = cls(full_name, documentation, tuple(labelnames), threading.Lock(), **kwargs)
+                self._metrics[full_name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {full_name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, name: str, collector: Callable[[], Iterable[CollectedMetric]]) -> None:
+        with self._lock:
+            self._collectors[name] = collector
+
+    def _collect(self) -> list[CollectedMetric]:
+        with self._lock:
+            collectors = list(self._collectors.items())
+        collected: list[CollectedMetric] = []
+        for name, collector in collectors:
+            try:
+                collected.extend(collector())
+            except Exception:
+                # Сломанный коллектор не должен ронять весь scrape.
+                logger.exception("metrics collector failed collector=%s", name)
+        return collected
+
+    def render_text(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        for collected in self._collect():
+            full_name = f"{self.prefix}{collected.name}"
+            lines.append(f"# HELP {full_name} {collected.documentation}")
+            lines.append(f"# TYPE {full_name} {collected.kind}")
+            for labels, value in collected.samples:
+                lines.append(f"{full_name}{_format_labels(sorted(labels.items()))} {_format_value(float(value))}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            for metric in self._metrics.values():
+                with metric._lock:
+                    metric._values.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def get_metrics_bind() -> tuple[str, int] | None:
+    """Адрес scrape endpoint или None, если METRICS_PORT не задан (endpoint выключен)."""
+
+    raw_port = (os.getenv(METRICS_PORT_ENV) or "").strip()
+    if not raw_port:
+        return None
+    try:
+        port = int(raw_port)
+    except ValueError:
+        logger.warning("invalid %s=%s, metrics endpoint disabled", METRICS_PORT_ENV, raw_port)
+        return None
+    if port <= 0:
+        return None
+    return (os.getenv(METRICS_HOST_ENV) or DEFAULT_METRICS_HOST).strip(), port
+
+
+def build_metrics_app(registry: MetricsRegistry | None = None):
+    from aiohttp import web
+
+    target = registry or metrics
+
+    async def _metrics(_request: web.Request) -> web.Response:
+        response = web.Response(text=target.render_text())
+        response.headers["Content-Type"] = CONTENT_TYPE_LATEST
+        return response
+
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, _metrics)
+    return app
+
+
+_metrics_runner = None
+
+
+async def start_metrics_server() -> bool:
+    """Поднять локальный /metrics один раз на процесс; ошибка bind не мешает запуску бота."""
+
+    global _metrics_runner
+    if _metrics_runner is not None:
+        return True
+    bind = get_metrics_bind()
+    if bind is None:
+        return False
+    from aiohttp import web
+
+    host, port = bind
+    runner = web.AppRunner(build_metrics_app())
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host=host, port=port).start()
+    except OSError:
+        logger.exception("metrics endpoint failed to bind host=%s port=%s", host, port)
+        await runner.cleanup()
+        return False
+    _metrics_runner = runner
+    logger.info("metrics endpoint listening host=%s port=%s path=%s", host, port, METRICS_PATH)
+    return True
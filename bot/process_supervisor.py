@@ -0,0 +1,174 @@
+"""
+Назначение: модуль "process supervisor" реализует продуктовый контур в зоне общая логика.
+Ответственность: запуск ролей бота (discord/telegram/jobs/ai) отдельными процессами с перезапуском при падении.
+Где используется: `bot/main.py --role supervisor`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+SUPERVISOR_ROLES_ENV = "SUPERVISOR_ROLES"
+# Роли, которые supervisor умеет запускать дочерними процессами (см. PROCESS_ROLES в bot/main.py).
+SUPERVISED_ROLES = ("discord", "telegram", "jobs", "ai")
+SUPERVISOR_RESTART_BASE_DELAY_SEC = 1.0
+SUPERVISOR_RESTART_MAX_DELAY_SEC = 60.0
+# Процесс, проживший дольше этого порога, считается стабильным: backoff сбрасывается.
+SUPERVISOR_STABLE_UPTIME_SEC = 300.0
+SUPERVISOR_STOP_TIMEOUT_SEC = 20.0
+
+_MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+@dataclass
+class SupervisedRole:
+    role: str
+    restarts: int = 0
+    process: asyncio.subprocess.Process | None = field(default=None, repr=False)
+
+
+def resolve_supervisor_roles(*, discord_token_present: bool, telegram_token_present: bool) -> list[str]:
+    """Roles from SUPERVISOR_ROLES or, by default, every role the configured tokens allow."""
+
+    raw = (os.getenv(SUPERVISOR_ROLES_ENV) or "").strip()
+    if raw:
+        roles: list[str] = []
+        for item in raw.split(","):
+            role = item.strip().lower()
+            if role and role not in roles:
+                roles.append(role)
+        return roles
+
+    roles = []
+    if discord_token_present:
+        roles.extend(["discord", "jobs"])
+    if telegram_token_present:
+        roles.append("telegram")
+    if roles:
+        roles.append("ai")
+    return roles
+
+
+def restart_delay_seconds(consecutive_failures: int) -> float:
+    if consecutive_failures <= 0:
+        return 0.0
+    return min(SUPERVISOR_RESTART_MAX_DELAY_SEC, SUPERVISOR_RESTART_BASE_DELAY_SEC * (2 ** (consecutive_failures - 1)))
+
+
+def build_child_env(roles: list[str]) -> dict[str, str]:
+    env = dict(os.environ)
+    env.pop("BOT_PROCESS_ROLE", None)
+    if "ai" in roles and not env.get("AI_WORKER_URL"):
+        from bot.services.ai_worker import get_ai_worker_bind
+
+        host, port = get_ai_worker_bind()
+        connect_host = "127.0.0.1" if host in ("0.0.0.0", "") else host
+        env["AI_WORKER_URL"] = f"http://{connect_host}:{port}"
+    return env
+
+
+def child_env_for_role(env: dict[str, str], role: str) -> dict[str, str]:
+    """Каждому дочернему процессу — свой порт /metrics: METRICS_PORT + 1 + индекс роли."""
+
+    raw_port = (env.get("METRICS_PORT") or "").strip()
+    if not raw_port.isdigit() or int(raw_port) <= 0:
+        return env
+    child_env = dict(env)
+    child_env["METRICS_PORT"] = str(int(raw_port) + 1 + SUPERVISED_ROLES.index(role))
+    return child_env
+
+
+async def _supervise_role(entry: SupervisedRole, env: dict[str, str], stop_event: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    consecutive_failures = 0
+    while not stop_event.is_set():
+        delay = restart_delay_seconds(consecutive_failures)
+        if delay:
+            logger.warning("supervisor restart scheduled role=%s delay_sec=%.1f restarts=%s", entry.role, delay, entry.restarts)
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+        started_at = loop.time()
+        entry.process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            _MAIN_SCRIPT,
+            "--role",
+            entry.role,
+            env=child_env_for_role(env, entry.role),
+        )
+        logger.info("supervisor child started role=%s pid=%s", entry.role, entry.process.pid)
+        returncode = await entry.process.wait()
+        uptime = loop.time() - started_at
+        if stop_event.is_set():
+            logger.info("supervisor child stopped role=%s returncode=%s", entry.role, returncode)
+            return
+
+        entry.restarts += 1
+        consecutive_failures = 1 if uptime >= SUPERVISOR_STABLE_UPTIME_SEC else consecutive_failures + 1
+        logger.error(
+            "supervisor child exited role=%s returncode=%s uptime_sec=%.1f consecutive_failures=%s",
+            entry.role,
+            returncode,
+            uptime,
+            consecutive_failures,
+        )
+
+
+async def _stop_children(entries: list[SupervisedRole]) -> None:
+    running = [entry for entry in entries if entry.process is not None and entry.process.returncode is None]
+    for entry in running:
+        entry.process.terminate()
+    for entry in running:
+        try:
+            await asyncio.wait_for(entry.process.wait(), timeout=SUPERVISOR_STOP_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            logger.warning("supervisor child did not stop in time, killing role=%s pid=%s", entry.role, entry.process.pid)
+            entry.process.kill()
+            await entry.process.wait()
+
+
+async def supervise(roles: list[str]) -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остаётся стандартный KeyboardInterrupt.
+            pass
+
+    env = build_child_env(roles)
+    entries = [SupervisedRole(role=role) for role in roles]
+    tasks = [asyncio.create_task(_supervise_role(entry, env, stop_event), name=f"supervise:{entry.role}") for entry in entries]
+    try:
+        await stop_event.wait()
+    finally:
+        stop_event.set()
+        await _stop_children(entries)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_supervisor(*, discord_token_present: bool, telegram_token_present: bool) -> None:
+    roles = resolve_supervisor_roles(
+        discord_token_present=discord_token_present,
+        telegram_token_present=telegram_token_present,
+    )
+    invalid = [role for role in roles if role not in SUPERVISED_ROLES]
+    if invalid:
+        logger.error("supervisor roles invalid roles=%s env=%s", invalid, SUPERVISOR_ROLES_ENV)
+        return
+    if not roles:
+        logger.error("supervisor has nothing to run: no bot tokens configured and %s is empty", SUPERVISOR_ROLES_ENV)
+        return
+    logger.info("supervisor starting roles=%s", ",".join(roles))
+    asyncio.run(supervise(roles))
@@ -0,0 +1,207 @@
+"""
+Назначение: модуль "runtime supervisor" реализует продуктовый контур в зоне общая логика.
+Ответственность: независимый перезапуск runtime-платформ внутри одного процесса с backoff и счётчиками здоровья по каждой платформе.
+Где используется: общая логика (`bot/main.py`, режим `RUNTIME_SUPERVISION_MODE=isolated`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable
+
+from bot.metrics import CollectedMetric, metrics
+from bot.process_supervisor import (
+    SUPERVISOR_RESTART_BASE_DELAY_SEC,
+    SUPERVISOR_RESTART_MAX_DELAY_SEC,
+    SUPERVISOR_STABLE_UPTIME_SEC,
+)
+
+logger = logging.getLogger(__name__)
+
+RUNTIME_STATE_STARTING = "starting"
+RUNTIME_STATE_RUNNING = "running"
+RUNTIME_STATE_BACKOFF = "backoff"
+RUNTIME_STATE_STOPPED = "stopped"
+RUNTIME_STATE_FAILED = "failed"
+
+
+@dataclass
+class RuntimeHealth:
+    name: str
+    state: str = RUNTIME_STATE_STARTING
+    restarts: int = 0
+    consecutive_failures: int = 0
+    last_error: str | None = None
+    started_at: float | None = None
+    last_exit_at: float | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class _SupervisedRuntime:
+    health: RuntimeHealth
+    run: Callable[[], Awaitable[None]]
+    before_restart: Callable[[], Any] | None
+    permanent_errors: tuple[type[BaseException], ...]
+
+
+class RuntimeSupervisor:
+    """Каждый runtime живёт в своём цикле: падение одного не отменяет другие и общие сервисы процесса."""
+
+    def __init__(
+        self,
+        *,
+        base_delay_sec: float = SUPERVISOR_RESTART_BASE_DELAY_SEC,
+        max_delay_sec: float = SUPERVISOR_RESTART_MAX_DELAY_SEC,
+        stable_uptime_sec: float = SUPERVISOR_STABLE_UPTIME_SEC,
+        should_stop: Callable[[], bool] = lambda: False,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.base_delay_sec = base_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self.stable_uptime_sec = stable_uptime_sec
+        self._should_stop = should_stop
+        self._clock = clock
+        self._runtimes: dict[str, _SupervisedRuntime] = {}
+
+    def add(
+        self,
+        name: str,
+        run: Callable[[], Awaitable[None]],
+        *,
+        before_restart: Callable[[], Any] | None = None,
+        permanent_errors: tuple[type[BaseException], ...] = (),
+    ) -> None:
+        self._runtimes[name] = _SupervisedRuntime(
+            health=RuntimeHealth(name=name),
+            run=run,
+            before_restart=before_restart,
+            permanent_errors=permanent_errors,
+        )
+
+    def restart_delay_seconds(self, consecutive_failures: int) -> float:
+        if consecutive_failures <= 0:
+            return 0.0
+        return min(self.max_delay_sec, self.base_delay_sec * (2 ** (consecutive_failures - 1)))
+
+    def health_snapshot(self) -> dict[str, dict[str, Any]]:
+        return {name: runtime.health.as_dict() for name, runtime in self._runtimes.items()}
+
+    def _set_state(self, health: RuntimeHealth, state: str, **extra: Any) -> None:
+        health.state = state
+        logger.log(
+            logging.ERROR if state in (RUNTIME_STATE_BACKOFF, RUNTIME_STATE_FAILED) else logging.INFO,
+            "runtime supervisor state runtime=%s state=%s restarts=%s consecutive_failures=%s%s",
+            health.name,
+            state,
+            health.restarts,
+            health.consecutive_failures,
+            "".join(f" {key}={value}" for key, value in extra.items()),
+        )
+
+    async def _wait_backoff(self, delay: float) -> None:
+        # Короткими шагами, чтобы остановка процесса не ждала полный backoff.
+        deadline = self._clock() + delay
+        while not self._should_stop() and self._clock() < deadline:
+            await asyncio.sleep(min(1.0, max(0.0, deadline - self._clock())))
+
+    async def _supervise(self, runtime: _SupervisedRuntime) -> None:
+        health = runtime.health
+        while not self._should_stop():
+            if health.restarts and runtime.before_restart is not None:
+                try:
+                    result = runtime.before_restart()
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception:
+                    logger.exception("runtime supervisor before_restart failed runtime=%s", health.name)
+
+            started_at = self._clock()
+            health.started_at = time.time()
+            self._set_state(health, RUNTIME_STATE_RUNNING)
+            error: BaseException | None = None
+            try:
+                await runtime.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                error = exc
+            health.last_exit_at = time.time()
+
+            if self._should_stop():
+                break
+            if error is not None and isinstance(error, runtime.permanent_errors):
+                health.last_error = f"{type(error).__name__}: {error}"
+                self._set_state(health, RUNTIME_STATE_FAILED, error_type=type(error).__name__)
+                return
+
+            uptime = self._clock() - started_at
+            health.restarts += 1
+            health.consecutive_failures = 1 if uptime >= self.stable_uptime_sec else health.consecutive_failures + 1
+            health.last_error = (
+                f"{type(error).__name__}: {error}" if error is not None else "runtime stopped without exception"
+            )
+            delay = self.restart_delay_seconds(health.consecutive_failures)
+            self._set_state(
+                health,
+                RUNTIME_STATE_BACKOFF,
+                uptime_sec=f"{uptime:.1f}",
+                delay_sec=f"{delay:.1f}",
+                error=health.last_error,
+            )
+            await self._wait_backoff(delay)
+        self._set_state(health, RUNTIME_STATE_STOPPED)
+
+    async def run(self) -> None:
+        """Работает, пока should_stop() не станет True или пока все runtime не упадут окончательно."""
+
+        global _active_supervisor
+        _active_supervisor = self
+        tasks = [
+            asyncio.create_task(self._supervise(runtime), name=f"runtime-supervisor:{name}")
+            for name, runtime in self._runtimes.items()
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_active_supervisor: RuntimeSupervisor | None = None
+
+
+def runtime_health_snapshot() -> dict[str, dict[str, Any]]:
+    """Здоровье runtime текущего процесса; пусто, если процесс работает не в режиме isolated."""
+
+    if _active_supervisor is None:
+        return {}
+    return _active_supervisor.health_snapshot()
+
+
+def _collect_runtime_metrics() -> list[CollectedMetric]:
+    health = runtime_health_snapshot()
+    return [
+        CollectedMetric(
+            "runtime_restarts_total",
+            "counter",
+            "In-process runtime restarts by runtime (isolated supervision mode).",
+            [({"runtime": name}, item["restarts"]) for name, item in sorted(health.items())],
+        ),
+        CollectedMetric(
+            "runtime_up",
+            "gauge",
+            "1 while the runtime is running under the in-process supervisor.",
+            [({"runtime": name}, int(item["state"] == RUNTIME_STATE_RUNNING)) for name, item in sorted(health.items())],
+        ),
+    ]
+
+
+metrics.register_collector("runtime_supervisor", _collect_runtime_metrics)
@@ -16,8 +16,10 @@ from datetime import datetime, timedelta, timezone
 from typing import Any, Optional, Tuple
 
 from bot.data import db
+from bot.hot_path_logging import HOT_PATH
 from bot.legacy_identity_logging import log_legacy_schema_fallback
 from bot.services.auth import RoleResolver
+from bot.services.identity_username_index import IDENTITY_NAME_FIELDS, IdentityUsernameIndex
 
 logger = logging.getLogger(__name__)
 _ACCOUNT_ID_RE = re.compile(
@@ -49,6 +51,10 @@ class AccountsService:
     MAX_VISIBLE_PROFILE_ROLES = 3
     HIDDEN_PROFILE_ROLE_NAMES = {"telegram linked", "discord linked"}
     ACCOUNT_ID_CACHE_TTL_SEC = int(os.getenv("ACCOUNT_ID_CACHE_TTL_SEC", "300"))
+    _identity_username_indexes: dict[str, IdentityUsernameIndex] = {}
+    # Полная перестройка индекса ловит записи других процессов; свои записи применяются точечно.
+    IDENTITY_INDEX_REFRESH_SEC = int(os.getenv("IDENTITY_INDEX_REFRESH_SEC", "900"))
+    IDENTITY_LOOKUP_PAGE_SIZE = 1000
     FALLBACK_CHAT_MEMBER_TITLE = "участник чата"
     PURGE_RESULT_PURGED = "purged"
     PURGE_RESULT_SKIPPED_LINKED = "skipped_linked"
@@ -156,10 +162,17 @@ class AccountsService:
 
     @staticmethod
     def _load_identity_row(provider: str, provider_user_id: str) -> dict[str, object] | None:
+        row, _loaded = AccountsService._fetch_identity_row(provider, provider_user_id)
+        return row
+
+    @staticmethod
+    def _fetch_identity_row(provider: str, provider_user_id: str) -> tuple[dict[str, object] | None, bool]:
+        """Возвращает (строка, loaded): loaded=False означает ошибку чтения, а не отсутствие строки."""
+
         normalized_provider = str(provider or "").strip().lower()
         normalized_user_id = str(provider_user_id or "").strip()
         if not db.supabase or normalized_provider not in {"telegram", "discord"} or not normalized_user_id:
-            return None
+            return None, True
 
         select_variants = (
             "account_id,provider,provider_user_id,username,provider_username,display_name,provider_display_name,global_username",
@@ -180,8 +193,8 @@ class AccountsService:
                 )
                 rows = response.data or []
                 if rows:
-                    return dict(rows[0])
-                return None
+                    return dict(rows[0]), True
+                return None, True
             except Exception as error:
                 last_error = error
                 logger.warning(
@@ -199,7 +212,7 @@ class AccountsService:
                 normalized_user_id,
                 AccountsService._format_db_error(last_error),
             )
-        return None
+        return None, False
 
     @staticmethod
     def _load_account_custom_nick(account_id: str) -> str | None:
@@ -335,25 +348,37 @@ class AccountsService:
         return str(context.get("best_public_name") or "").strip() or None
 
     @staticmethod
-    def _load_identity_rows_for_lookup(provider: str) -> list[dict]:
+    def _fetch_identity_rows_for_lookup(provider: str) -> list[dict] | None:
+        """Все identity провайдера постранично; None — чтение не удалось."""
+
         if not db.supabase:
-            return []
+            return None
 
         select_variants = (
             "account_id,provider_user_id,username,provider_username,display_name,provider_display_name,global_username",
             "account_id,provider_user_id,username,display_name",
             "account_id,provider_user_id",
         )
+        page_size = AccountsService.IDENTITY_LOOKUP_PAGE_SIZE
         last_error: Exception | None = None
         for select_clause in select_variants:
+            rows: list[dict] = []
+            offset = 0
             try:
-                response = (
-                    db.supabase.table("account_identities")
-                    .select(select_clause)
-                    .eq("provider", str(provider))
-                    .execute()
-                )
-                return response.data or []
+                while True:
+                    response = (
+                        db.supabase.table("account_identities")
+                        .select(select_clause)
+                        .eq("provider", str(provider))
+                        .order("provider_user_id")
+                        .range(offset, offset + page_size - 1)
+                        .execute()
+                    )
+                    page = response.data or []
+                    rows.extend(page)
+                    if len(page) < page_size:
+                        return rows
+                    offset += len(page)
             except Exception as error:
                 last_error = error
                 logger.warning(
@@ -369,7 +394,75 @@ class AccountsService:
                 provider,
                 AccountsService._format_db_error(last_error),
             )
-        return []
+        return None
+
+    @staticmethod
+    def _identity_index(provider: str) -> IdentityUsernameIndex | None:
+        if not db.supabase:
+            return None
+
+        normalized_provider = str(provider or "").strip().lower()
+        index = AccountsService._identity_username_indexes.get(normalized_provider)
+        is_stale = (
+            index is None
+            or index.source is not db.supabase
+            or time.monotonic() - index.loaded_at >= AccountsService.IDENTITY_INDEX_REFRESH_SEC
+        )
+        if is_stale:
+            rows = AccountsService._fetch_identity_rows_for_lookup(normalized_provider)
+            if rows is None:
+                return None
+            index = IdentityUsernameIndex.build(normalized_provider, rows, source=db.supabase)
+            AccountsService._identity_username_indexes[normalized_provider] = index
+            logger.info("identity username index rebuilt provider=%s rows=%s", normalized_provider, len(index))
+            return index
+
+        for provider_user_id in index.take_dirty():
+            row, loaded = AccountsService._fetch_identity_row(normalized_provider, provider_user_id)
+            if not loaded:
+                # Ошибка чтения не значит, что identity удалена: строка остаётся в индексе до следующей попытки.
+                index.mark_dirty(provider_user_id)
+            elif row is None:
+                index.remove(provider_user_id)
+            else:
+                index.upsert(row)
+        return index
+
+    @staticmethod
+    def _mark_identity_index_dirty(provider: str | None, provider_user_id: str | None) -> None:
+        """Помечает identity к точечному перечитыванию при следующем поиске по индексу."""
+
+        index = AccountsService._identity_username_indexes.get(str(provider or "").strip().lower())
+        if index is not None:
+            index.mark_dirty(str(provider_user_id or "").strip())
+
+    @staticmethod
+    def apply_identity_upsert_payloads(provider: str | None, payloads: list[dict]) -> None:
+        """Пакетные upsert-ы identity применяются к индексу напрямую, без точечного перечитывания каждой строки."""
+
+        index = AccountsService._identity_username_indexes.get(str(provider or "").strip().lower())
+        if index is None:
+            return
+        for payload in payloads:
+            index.merge(payload)
+
+    @staticmethod
+    def _load_identity_rows_for_lookup(provider: str) -> list[dict]:
+        index = AccountsService._identity_index(provider)
+        return index.rows() if index is not None else []
+
+    @staticmethod
+    def _identity_lookup_match(row: dict, matched_by: str) -> dict[str, str | None]:
+        return {
+            "account_id": str(row.get("account_id") or "").strip() or None,
+            "provider_user_id": str(row.get("provider_user_id") or "").strip() or None,
+            "matched_by": matched_by,
+            "username": str(row.get("username") or row.get("provider_username") or "").strip() or None,
+            "display_name": str(
+                row.get("display_name") or row.get("provider_display_name") or row.get("global_username") or ""
+            ).strip()
+            or None,
+        }
 
     @staticmethod
     def find_accounts_by_identity_username(provider: str, username: str) -> list[dict[str, str | None]]:
@@ -379,53 +472,47 @@ class AccountsService:
         if not normalized:
             return []
 
-        rows = AccountsService._load_identity_rows_for_lookup(provider)
+        index = AccountsService._identity_index(provider)
+        if index is None:
+            return []
+
+        key = IdentityUsernameIndex.normalize(provider, normalized)
         matches: list[dict[str, str | None]] = []
-        seen: set[tuple[str | None, str | None]] = set()
-        normalized_lower = normalized.casefold()
-        for row in rows:
-            fields = [
-                row.get("username"),
-                row.get("provider_username"),
-                row.get("display_name"),
-                row.get("provider_display_name"),
-                row.get("global_username"),
-            ]
-            matched_by: str | None = None
-            for field_name, raw_value in zip(
-                ("username", "provider_username", "display_name", "provider_display_name", "global_username"),
-                fields,
-            ):
-                value = str(raw_value or "").strip()
-                if not value:
-                    continue
-                candidate = value.lstrip("@") if provider == "telegram" else value
-                if candidate.casefold() == normalized_lower:
-                    matched_by = field_name
-                    break
+        seen: set[str | None] = set()
+        for row in index.exact(normalized):
+            matched_by = next(
+                field_name
+                for field_name in IDENTITY_NAME_FIELDS
+                if IdentityUsernameIndex.normalize(provider, row.get(field_name)) == key
+            )
+            match = AccountsService._identity_lookup_match(row, matched_by)
+            seen.add(match["provider_user_id"])
+            matches.append(match)
+
+        if normalized.isdigit() and normalized not in seen:
+            row = index.get(normalized)
+            if row is not None:
+                matches.append(AccountsService._identity_lookup_match(row, "provider_user_id"))
+        return matches
 
-            if not matched_by and normalized.isdigit() and str(row.get("provider_user_id") or "").strip() == normalized:
-                matched_by = "provider_user_id"
+    @staticmethod
+    def search_identity_usernames(provider: str, prefix: str, *, limit: int = 20) -> list[dict[str, str | None]]:
+        """Identity провайдера, у которых одно из имён начинается с `prefix` (без учёта регистра)."""
 
-            if not matched_by:
-                continue
+        normalized = str(prefix or "").strip()
+        index = AccountsService._identity_index(provider) if normalized else None
+        if index is None:
+            return []
 
-            key = (str(row.get("account_id") or "").strip() or None, str(row.get("provider_user_id") or "").strip() or None)
-            if key in seen:
-                continue
-            seen.add(key)
-            matches.append(
-                {
-                    "account_id": key[0],
-                    "provider_user_id": key[1],
-                    "matched_by": matched_by,
-                    "username": str(row.get("username") or row.get("provider_username") or "").strip() or None,
-                    "display_name": str(
-                        row.get("display_name") or row.get("provider_display_name") or row.get("global_username") or ""
-                    ).strip()
-                    or None,
-                }
+        key = IdentityUsernameIndex.normalize(provider, normalized)
+        matches: list[dict[str, str | None]] = []
+        for row in index.prefix(normalized, limit=limit):
+            matched_by = next(
+                field_name
+                for field_name in IDENTITY_NAME_FIELDS
+                if IdentityUsernameIndex.normalize(provider, row.get(field_name)).startswith(key)
             )
+            matches.append(AccountsService._identity_lookup_match(row, matched_by))
         return matches
 
     @staticmethod
@@ -590,6 +677,7 @@ class AccountsService:
                 guild_id,
                 chat_id,
                 "user_obj_missing",
+                extra=HOT_PATH,
             )
             return "skipped"
 
@@ -604,6 +692,7 @@ class AccountsService:
                 guild_id,
                 chat_id,
                 "provider_user_id_missing",
+                extra=HOT_PATH,
             )
             return "skipped"
 
@@ -668,6 +757,7 @@ class AccountsService:
                 int(hydration_metrics.get("updated") or 0),
                 int(hydration_metrics.get("skipped_due_to_account_id_required") or 0),
                 int(hydration_metrics.get("inserted") or 0),
+                extra=HOT_PATH,
             )
             return status
         except Exception:
@@ -771,6 +861,7 @@ class AccountsService:
                 updated_rows = list(response.data or [])
                 if updated_rows:
                     metrics["updated"] += 1
+                    AccountsService._mark_identity_index_dirty(normalized_provider, normalized_provider_user_id)
                     if variant != payload:
                         logger.info(
                             "persist_identity_lookup_fields updated existing row with fallback columns provider=%s provider_user_id=%s payload_keys=%s requested_keys=%s",
@@ -833,6 +924,7 @@ class AccountsService:
             try:
                 db.supabase.table("account_identities").upsert(variant, on_conflict="provider,provider_user_id").execute()
                 metrics["inserted"] += 1
+                AccountsService._mark_identity_index_dirty(normalized_provider, normalized_provider_user_id)
                 if variant != payload:
                     logger.info(
                         "persist_identity_lookup_fields saved with fallback columns provider=%s provider_user_id=%s payload_keys=%s requested_keys=%s",
@@ -1183,6 +1275,7 @@ class AccountsService:
                     db.supabase.table("account_identities").delete().eq("account_id", str(from_account_id)).eq(
                         "provider", str(provider)
                     ).eq("provider_user_id", str(provider_user_id)).execute()
+                    AccountsService._mark_identity_index_dirty(str(provider), str(provider_user_id))
                     logger.warning(
                         "rebind_account_identities removed duplicate source identity from_account_id=%s to_account_id=%s provider=%s provider_user_id=%s",
                         from_account_id,
@@ -1196,12 +1289,14 @@ class AccountsService:
                     db.supabase.table("account_identities").update({"account_id": str(to_account_id)}).eq(
                         "account_id", str(from_account_id)
                     ).eq("provider", str(provider)).eq("provider_user_id", str(provider_user_id)).execute()
+                    AccountsService._mark_identity_index_dirty(str(provider), str(provider_user_id))
                     target_keys.add(identity_key)
                 except Exception as e:
                     if AccountsService._is_unique_violation(e):
                         db.supabase.table("account_identities").delete().eq("account_id", str(from_account_id)).eq(
                             "provider", str(provider)
                         ).eq("provider_user_id", str(provider_user_id)).execute()
+                        AccountsService._mark_identity_index_dirty(str(provider), str(provider_user_id))
                         target_keys.add(identity_key)
                         logger.warning(
                             "rebind_account_identities resolved unique conflict by deleting source identity from_account_id=%s to_account_id=%s provider=%s provider_user_id=%s error=%s",
@@ -1502,6 +1597,7 @@ class AccountsService:
             updated_rows = response.data or []
             if updated_rows:
                 AccountsService._cache_account_id(normalized_provider, normalized_provider_user_id, normalized_account_id)
+                AccountsService._mark_identity_index_dirty(normalized_provider, normalized_provider_user_id)
                 logger.warning(
                     "register identity claimed lookup identity row provider=%s provider_user_id=%s account_id=%s",
                     normalized_provider,
@@ -1571,6 +1667,7 @@ class AccountsService:
         }
         try:
             db.supabase.table("account_identities").insert(payload).execute()
+            AccountsService._mark_identity_index_dirty(provider, provider_user_id)
             return True, "Регистрация завершена"
         except Exception as e:
             if AccountsService._is_unique_violation(e):
@@ -1928,9 +2025,11 @@ class AccountsService:
                         on_conflict="provider,provider_user_id",
                     ).execute()
                     AccountsService._cache_account_id(target_provider, target_provider_user_id, str(account_id))
+                    AccountsService._mark_identity_index_dirty(target_provider, target_provider_user_id)
                 except TypeError:
                     db.supabase.table("account_identities").upsert(identity_payload).execute()
                     AccountsService._cache_account_id(target_provider, target_provider_user_id, str(account_id))
+                    AccountsService._mark_identity_index_dirty(target_provider, target_provider_user_id)
                 except Exception as e:
                     if AccountsService._is_unique_violation(e):
                         AccountsService.invalidate_account_id_cache(target_provider, target_provider_user_id)
@@ -2453,6 +2552,11 @@ class AccountsService:
             logger.warning("save_account_titles failed for account_id=%s source=%s error=%s", normalized_account_id, source, e)
             return False
 
+    @staticmethod
+    def forget_account_titles(account_id: str) -> None:
+        """Сбросить кэш званий аккаунта, когда их изменили в БД в обход save_account_titles."""
+        AccountsService._account_titles_cache.pop(str(account_id or "").strip(), None)
+
     @staticmethod
     def get_configured_title_role_ids() -> set[int]:
         configured = AccountsService.get_configured_title_roles()
@@ -2546,6 +2650,7 @@ class AccountsService:
                 return False, "Связь не найдена"
 
             AccountsService.invalidate_account_id_cache(provider, provider_user_id)
+            AccountsService._mark_identity_index_dirty(provider, provider_user_id)
             account_id = None
             if result.data:
                 account_id = str(result.data[0].get("account_id") or "").strip() or None
@@ -2637,6 +2742,7 @@ class AccountsService:
                 return False, AccountsService.PURGE_RESULT_SKIPPED_NOT_FOUND
 
             AccountsService.invalidate_account_id_cache(normalized_provider, normalized_user_id)
+            AccountsService._mark_identity_index_dirty(normalized_provider, normalized_user_id)
             logger.info(
                 "identity_purge_result=%s provider=%s provider_user_id=%s",
                 AccountsService.PURGE_RESULT_PURGED,
@@ -14,11 +14,28 @@ from collections import deque
 from dataclasses import dataclass, field
 from typing import Any
 
+from bot.metrics import CollectedMetric, metrics
 from bot.services.ai_service import generate_guiy_reply
 
 
 logger = logging.getLogger(__name__)
 
+_ai_wait_seconds = metrics.histogram(
+    "ai_queue_wait_seconds",
+    "Time AI requests spent queued before a worker picked them up.",
+    ("platform",),
+)
+_ai_processing_seconds = metrics.histogram(
+    "ai_request_duration_seconds",
+    "AI request processing time by platform and outcome.",
+    ("platform", "status"),
+)
+_ai_dropped = metrics.counter(
+    "ai_requests_dropped_total",
+    "AI requests rejected before queuing by reason.",
+    ("platform", "reason"),
+)
+
 
 DEFAULT_AI_SCHEDULER_MAX_CONCURRENCY = 2
 DEFAULT_AI_SCHEDULER_PER_CHAT_QUANTUM = 1
@@ -169,10 +186,12 @@ class AIRequestScheduler:
         self._request_seq = 0
         self._total_queue_len = 0
         self._platform_counts: dict[str, int] = {"telegram": 0, "discord": 0}
+        self._active_items: dict[str, _QueuedRequest] = {}
+        self._closing = False
 
     async def start(self) -> None:
         async with self._lock:
-            if self._workers:
+            if self._workers or self._closing:
                 return
             for index in range(self._max_concurrency):
                 task = asyncio.create_task(self._worker_loop(index + 1), name=f"ai_scheduler_worker_{index + 1}")
@@ -195,6 +214,16 @@ class AIRequestScheduler:
         future: asyncio.Future[str | None] = loop.create_future()
 
         async with self._condition:
+            if self._closing:
+                _ai_dropped.inc(platform=normalized_platform, reason="shutting_down")
+                logger.warning(
+                    "ai scheduler dropped request reason=shutting_down platform=%s conversation_id=%s user_id=%s",
+                    normalized_platform,
+                    conversation_key,
+                    sender_key,
+                )
+                return None
+
             bucket = self._conversation_buckets.get(conversation_key)
             if bucket is None:
                 bucket = _ConversationBucket()
@@ -202,6 +231,7 @@ class AIRequestScheduler:
                 self._conversation_order.append(conversation_key)
 
             if bucket.size >= self._max_queue_per_chat:
+                _ai_dropped.inc(platform=normalized_platform, reason="max_queue_per_chat")
                 logger.warning(
                     "ai scheduler dropped request reason=max_queue_per_chat platform=%s conversation_id=%s user_id=%s queue_len=%s per_chat_len=%s platform_parity=%s",
                     normalized_platform,
@@ -249,71 +279,84 @@ class AIRequestScheduler:
             if item is None:
                 continue
 
-            started_at = time.monotonic()
-            wait_ms = int((started_at - item.enqueued_at) * 1000)
+            self._active_items[item.request_id] = item
+            try:
+                await self._process(worker_id, item)
+            finally:
+                self._active_items.pop(item.request_id, None)
+
+    async def _process(self, worker_id: int, item: _QueuedRequest) -> None:
+        started_at = time.monotonic()
+        wait_ms = int((started_at - item.enqueued_at) * 1000)
+        _ai_wait_seconds.observe(started_at - item.enqueued_at, platform=item.platform)
+        status = "error"
+        logger.info(
+            "ai scheduler dequeue worker_id=%s request_id=%s platform=%s conversation_id=%s user_id=%s queue_len=%s wait_ms=%s platform_parity=%s",
+            worker_id,
+            item.request_id,
+            item.platform,
+            item.conversation_id,
+            item.user_id,
+            self._total_queue_len,
+            wait_ms,
+            self._platform_parity(),
+        )
+
+        try:
+            reply = await asyncio.wait_for(
+                generate_guiy_reply(
+                    str(item.payload.get("text") or ""),
+                    provider=item.platform,
+                    user_id=item.user_id,
+                    conversation_id=item.conversation_id,
+                    media_inputs=item.payload.get("media_inputs"),
+                ),
+                timeout=self._request_timeout_sec,
+            )
+            processing_ms = int((time.monotonic() - started_at) * 1000)
             logger.info(
-                "ai scheduler dequeue worker_id=%s request_id=%s platform=%s conversation_id=%s user_id=%s queue_len=%s wait_ms=%s platform_parity=%s",
+                "ai scheduler processed worker_id=%s request_id=%s platform=%s conversation_id=%s user_id=%s processing_ms=%s wait_ms=%s platform_parity=%s",
                 worker_id,
                 item.request_id,
                 item.platform,
                 item.conversation_id,
                 item.user_id,
-                self._total_queue_len,
+                processing_ms,
                 wait_ms,
                 self._platform_parity(),
             )
-
-            try:
-                reply = await asyncio.wait_for(
-                    generate_guiy_reply(
-                        str(item.payload.get("text") or ""),
-                        provider=item.platform,
-                        user_id=item.user_id,
-                        conversation_id=item.conversation_id,
-                        media_inputs=item.payload.get("media_inputs"),
-                    ),
-                    timeout=self._request_timeout_sec,
-                )
-                processing_ms = int((time.monotonic() - started_at) * 1000)
-                logger.info(
-                    "ai scheduler processed worker_id=%s request_id=%s platform=%s conversation_id=%s user_id=%s processing_ms=%s wait_ms=%s platform_parity=%s",
-                    worker_id,
-                    item.request_id,
-                    item.platform,
-                    item.conversation_id,
-                    item.user_id,
-                    processing_ms,
-                    wait_ms,
-                    self._platform_parity(),
-                )
-                if not item.future.done():
-                    item.future.set_result(reply)
-            except asyncio.TimeoutError:
-                logger.error(
-                    "ai scheduler timeout worker_id=%s request_id=%s platform=%s conversation_id=%s user_id=%s timeout_sec=%s wait_ms=%s platform_parity=%s",
-                    worker_id,
-                    item.request_id,
-                    item.platform,
-                    item.conversation_id,
-                    item.user_id,
-                    self._request_timeout_sec,
-                    wait_ms,
-                    self._platform_parity(),
-                )
-                if not item.future.done():
-                    item.future.set_result(None)
-            except Exception:
-                logger.exception(
-                    "ai scheduler worker failed worker_id=%s request_id=%s platform=%s conversation_id=%s user_id=%s wait_ms=%s",
-                    worker_id,
-                    item.request_id,
-                    item.platform,
-                    item.conversation_id,
-                    item.user_id,
-                    wait_ms,
-                )
-                if not item.future.done():
-                    item.future.set_result(None)
+            status = "ok"
+            if not item.future.done():
+                item.future.set_result(reply)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.error(
+                "ai scheduler timeout worker_id=%s request_id=%s platform=%s conversation_id=%s user_id=%s timeout_sec=%s wait_ms=%s platform_parity=%s",
+                worker_id,
+                item.request_id,
+                item.platform,
+                item.conversation_id,
+                item.user_id,
+                self._request_timeout_sec,
+                wait_ms,
+                self._platform_parity(),
+            )
+            if not item.future.done():
+                item.future.set_result(None)
+        except Exception:
+            logger.exception(
+                "ai scheduler worker failed worker_id=%s request_id=%s platform=%s conversation_id=%s user_id=%s wait_ms=%s",
+                worker_id,
+                item.request_id,
+                item.platform,
+                item.conversation_id,
+                item.user_id,
+                wait_ms,
+            )
+            if not item.future.done():
+                item.future.set_result(None)
+        finally:
+            _ai_processing_seconds.observe(time.monotonic() - started_at, platform=item.platform, status=status)
 
     async def _dequeue_next(self) -> _QueuedRequest | None:
         async with self._condition:
@@ -375,6 +418,40 @@ class AIRequestScheduler:
         self._active_conversation_budget = 0
         return None
 
+    async def drain(self, timeout_sec: float) -> int:
+        """Остановка: новые запросы отклоняются, очередь дорабатывается до дедлайна; вернёт число брошенных запросов."""
+
+        async with self._condition:
+            self._closing = True
+        deadline = time.monotonic() + max(0.0, timeout_sec)
+        while (self._total_queue_len > 0 or self._active_items) and self._workers and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        abandoned: list[_QueuedRequest] = list(self._active_items.values())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        async with self._condition:
+            for bucket in self._conversation_buckets.values():
+                while (item := bucket.pop_next()) is not None:
+                    abandoned.append(item)
+            self._conversation_buckets.clear()
+            self._conversation_order.clear()
+            self._total_queue_len = 0
+            self._platform_counts = {"telegram": 0, "discord": 0}
+        # Ожидающие вызывающие получают None, как при таймауте, и не висят до отмены своих задач.
+        for item in abandoned:
+            if not item.future.done():
+                item.future.set_result(None)
+        logger.log(
+            logging.WARNING if abandoned else logging.INFO,
+            "ai scheduler drained abandoned=%s request_ids=%s",
+            len(abandoned),
+            ",".join(item.request_id for item in abandoned[:20]),
+        )
+        return len(abandoned)
+
     def _platform_parity(self) -> str:
         return f"telegram:{self._platform_counts.get('telegram', 0)},discord:{self._platform_counts.get('discord', 0)}"
 
@@ -394,6 +471,30 @@ async def get_ai_request_scheduler() -> AIRequestScheduler:
         return _SCHEDULER
 
 
+def _collect_ai_scheduler_metrics() -> list[CollectedMetric]:
+    scheduler = _SCHEDULER
+    queued = scheduler._platform_counts if scheduler is not None else {}
+    active = len(scheduler._active_items) if scheduler is not None else 0
+    return [
+        CollectedMetric(
+            "ai_queue_depth",
+            "gauge",
+            "AI requests waiting in the local scheduler by platform.",
+            [({"platform": platform}, count) for platform, count in sorted(queued.items())],
+        ),
+        CollectedMetric("ai_requests_in_flight", "gauge", "AI requests currently processed by scheduler workers.", [({}, active)]),
+    ]
+
+
+metrics.register_collector("ai_request_scheduler", _collect_ai_scheduler_metrics)
+
+
+async def drain_ai_request_scheduler(timeout_sec: float) -> int:
+    if _SCHEDULER is None:
+        return 0
+    return await _SCHEDULER.drain(timeout_sec)
+
+
 async def enqueue_ai_request(
     *,
     platform: str,
@@ -401,6 +502,18 @@ async def enqueue_ai_request(
     user_id: str | int | None,
     payload: dict[str, Any],
 ) -> str | None:
+    from bot.services.ai_worker import enqueue_remote_ai_request, get_ai_worker_url
+
+    worker_url = get_ai_worker_url()
+    if worker_url:
+        return await enqueue_remote_ai_request(
+            worker_url,
+            platform=platform,
+            conversation_id=conversation_id,
+            user_id=user_id,
+            payload=payload,
+        )
+
     scheduler = await get_ai_request_scheduler()
     return await scheduler.enqueue(
         platform=platform,
@@ -0,0 +1,157 @@
+"""
+Назначение: модуль "ai worker" реализует продуктовый контур в зоне общая логика.
+Ответственность: вынос AI-планировщика в отдельный процесс (роль ai) и клиент для Discord/Telegram-процессов.
+Где используется: Telegram и Discord AI-ветки при заданном AI_WORKER_URL; процесс `bot/main.py --role ai`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+import os
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+AI_WORKER_URL_ENV = "AI_WORKER_URL"
+AI_WORKER_TOKEN_ENV = "AI_WORKER_TOKEN"
+AI_WORKER_HOST_ENV = "AI_WORKER_HOST"
+AI_WORKER_PORT_ENV = "AI_WORKER_PORT"
+DEFAULT_AI_WORKER_HOST = "127.0.0.1"
+DEFAULT_AI_WORKER_PORT = 8787
+_GENERATE_PATH = "/ai/generate"
+_HEALTH_PATH = "/healthz"
+_METRICS_PATH = "/metrics"
+
+
+def get_ai_worker_url() -> str:
+    return (os.getenv(AI_WORKER_URL_ENV) or "").strip().rstrip("/")
+
+
+def get_ai_worker_bind() -> tuple[str, int]:
+    host = (os.getenv(AI_WORKER_HOST_ENV) or DEFAULT_AI_WORKER_HOST).strip()
+    try:
+        port = int(os.getenv(AI_WORKER_PORT_ENV) or DEFAULT_AI_WORKER_PORT)
+    except ValueError:
+        logger.warning("invalid %s, using default port=%s", AI_WORKER_PORT_ENV, DEFAULT_AI_WORKER_PORT)
+        port = DEFAULT_AI_WORKER_PORT
+    return host, port
+
+
+def _worker_token() -> str:
+    return (os.getenv(AI_WORKER_TOKEN_ENV) or "").strip()
+
+
+async def enqueue_remote_ai_request(
+    base_url: str,
+    *,
+    platform: str,
+    conversation_id: str | int | None,
+    user_id: str | int | None,
+    payload: dict[str, Any],
+) -> str | None:
+    """Send request to the ai worker process; None on any failure, like the local scheduler."""
+
+    from bot.services.ai_request_scheduler import AI_SCHEDULER_REQUEST_TIMEOUT_SEC
+    from bot.services.ai_service import get_shared_http_session
+
+    headers = {}
+    token = _worker_token()
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    body = {
+        "platform": platform,
+        "conversation_id": None if conversation_id is None else str(conversation_id),
+        "user_id": None if user_id is None else str(user_id),
+        "payload": payload,
+    }
+    try:
+        session = await get_shared_http_session()
+        async with session.post(
+            f"{base_url}{_GENERATE_PATH}",
+            json=body,
+            headers=headers,
+            # Запрос может стоять в очереди воркера, поэтому таймаут шире таймаута генерации.
+            timeout=aiohttp.ClientTimeout(total=AI_SCHEDULER_REQUEST_TIMEOUT_SEC * 2),
+        ) as response:
+            if response.status != 200:
+                logger.error(
+                    "ai worker request failed status=%s platform=%s conversation_id=%s user_id=%s",
+                    response.status,
+                    platform,
+                    conversation_id,
+                    user_id,
+                )
+                return None
+            data = await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        logger.exception(
+            "ai worker request transport failure platform=%s conversation_id=%s user_id=%s",
+            platform,
+            conversation_id,
+            user_id,
+        )
+        return None
+    reply = data.get("reply") if isinstance(data, dict) else None
+    return str(reply) if reply else None
+
+
+def build_ai_worker_app() -> web.Application:
+    async def _generate(request: web.Request) -> web.Response:
+        token = _worker_token()
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": "invalid_json"}, status=400)
+        if not isinstance(body, dict) or not isinstance(body.get("payload"), dict):
+            return web.json_response({"error": "invalid_payload"}, status=400)
+
+        from bot.services.ai_request_scheduler import get_ai_request_scheduler
+
+        scheduler = await get_ai_request_scheduler()
+        reply = await scheduler.enqueue(
+            platform=str(body.get("platform") or "unknown"),
+            conversation_id=body.get("conversation_id"),
+            user_id=body.get("user_id"),
+            payload=body["payload"],
+        )
+        return web.json_response({"reply": reply})
+
+    async def _health(_request: web.Request) -> web.Response:
+        return web.json_response({"ok": True})
+
+    async def _metrics(_request: web.Request) -> web.Response:
+        from bot.metrics import CONTENT_TYPE_LATEST, metrics
+
+        response = web.Response(text=metrics.render_text())
+        response.headers["Content-Type"] = CONTENT_TYPE_LATEST
+        return response
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_post(_GENERATE_PATH, _generate)
+    app.router.add_get(_HEALTH_PATH, _health)
+    # Worker и так слушает локальный порт: метрики AI-очереди отдаются рядом, без отдельного сервера.
+    app.router.add_get(_METRICS_PATH, _metrics)
+    return app
+
+
+async def serve_ai_worker(host: str, port: int) -> None:
+    from bot.services.ai_service import close_shared_http_session, init_shared_http_session
+
+    await init_shared_http_session()
+    runner = web.AppRunner(build_ai_worker_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logger.info("ai worker listening host=%s port=%s auth_enabled=%s", host, port, bool(_worker_token()))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await close_shared_http_session()
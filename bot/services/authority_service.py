@@ -8,6 +8,7 @@
 import logging
 from dataclasses import dataclass
 
+from bot.hot_path_logging import HOT_PATH
 from bot.services.accounts_service import AccountsService
 from bot.services.profile_titles import normalize_protected_profile_title
 
@@ -239,6 +240,7 @@ class AuthorityService:
                 actor.level,
                 sorted(actor_titles),
                 False,
+                extra=HOT_PATH,
             )
             return False
 
@@ -253,6 +255,7 @@ class AuthorityService:
                 actor.level,
                 sorted(actor_titles),
                 allowed,
+                extra=HOT_PATH,
             )
             return allowed
 
@@ -266,6 +269,7 @@ class AuthorityService:
             actor.level,
             required_level,
             allowed,
+            extra=HOT_PATH,
         )
         return allowed
 
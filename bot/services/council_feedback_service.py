@@ -253,7 +253,7 @@ class CouncilFeedbackService:
         if not db.supabase:
             return {"ok": False, "error": "db_unavailable", "message": "База данных недоступна. Повторите попытку позже."}
 
-        pause_state = CouncilPauseService.sync_pause_state(platform=provider, user_id=str(provider_user_id))
+        pause_state = CouncilPauseService.get_pause_status()
         term_id = CouncilFeedbackService._get_active_term_id()
         queued_by_pause = False
         if term_id is None:
@@ -345,7 +345,7 @@ class CouncilFeedbackService:
             row = rows[0]
             status_code = str(row.get("status") or "draft")
             if status_code == "draft":
-                pause_state = CouncilPauseService.sync_pause_state(platform=provider, user_id=str(provider_user_id))
+                pause_state = CouncilPauseService.get_pause_status()
                 if pause_state.get("paused"):
                     status_code = "awaiting_term_launch"
             return {
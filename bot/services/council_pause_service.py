@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timezone
 
 from bot.data import db
@@ -20,6 +23,35 @@ _TERM_ROLE_CODE_TO_PROJECT_ROLE: dict[str, str] = {
 
 
 class CouncilPauseService:
+    # Пользовательские чтения берут статус из этого кэша; переходы паузы делает только sync_pause_state (реконсилер).
+    PAUSE_STATUS_CACHE_TTL_SEC = int(os.getenv("COUNCIL_PAUSE_STATUS_CACHE_TTL_SEC", "60"))
+    _status_cache: tuple[float, dict[str, object]] | None = None
+    _status_lock = threading.Lock()
+
+    @staticmethod
+    def _remember_status(status: dict[str, object]) -> None:
+        expires_at = time.monotonic() + max(1, CouncilPauseService.PAUSE_STATUS_CACHE_TTL_SEC)
+        with CouncilPauseService._status_lock:
+            CouncilPauseService._status_cache = (expires_at, dict(status))
+
+    @staticmethod
+    def invalidate_status_cache() -> None:
+        with CouncilPauseService._status_lock:
+            CouncilPauseService._status_cache = None
+
+    @staticmethod
+    def get_pause_status() -> dict[str, object]:
+        """Текущий статус паузы только на чтение: один запрос к council_audit_log, дальше кэш."""
+
+        with CouncilPauseService._status_lock:
+            cached = CouncilPauseService._status_cache
+            if cached is not None and cached[0] > time.monotonic():
+                return dict(cached[1])
+        state = CouncilPauseService._read_latest_state()
+        status = {"paused": bool(state.get("paused")), "reason": state.get("reason"), "paused_at": state.get("paused_at")}
+        CouncilPauseService._remember_status(status)
+        return dict(status)
+
     @staticmethod
     def _load_latest_term() -> dict[str, object] | None:
         if not db.supabase:
@@ -312,6 +344,19 @@ class CouncilPauseService:
 
     @staticmethod
     def sync_pause_state(*, platform: str = "system", user_id: str | None = None) -> dict[str, object]:
+        """Реконсилер: вычисляет, нужна ли пауза, и при смене состояния пишет событие и снимает роли.
+
+        Вызывается периодической задачей council_pause_reconcile, а не пользовательскими командами.
+        """
+
+        state = CouncilPauseService._reconcile_pause_state(platform=platform, user_id=user_id)
+        CouncilPauseService._remember_status(
+            {"paused": bool(state.get("paused")), "reason": state.get("reason"), "paused_at": state.get("paused_at")}
+        )
+        return state
+
+    @staticmethod
+    def _reconcile_pause_state(*, platform: str, user_id: str | None) -> dict[str, object]:
         required, reason, entity_id = CouncilPauseService._is_pause_required()
         current = CouncilPauseService._read_latest_state()
 
@@ -362,7 +407,7 @@ class CouncilPauseService:
 
     @staticmethod
     def get_pause_status_for_admin() -> dict[str, object]:
-        state = CouncilPauseService.sync_pause_state(platform="admin_api")
+        state = CouncilPauseService.get_pause_status()
         if not state.get("paused"):
             return {
                 "paused": False,
@@ -1369,7 +1369,7 @@ class CouncilService:
         started_at: datetime | None = None,
         source_platform: str = "system",
     ) -> QuestionVotingTransitionDecision:
-        pause_state = CouncilPauseService.sync_pause_state(platform=source_platform, user_id=actor_profile_id)
+        pause_state = CouncilPauseService.get_pause_status()
         if pause_state.get("paused"):
             logger.warning(
                 "CouncilService blocked question voting start by pause question_id=%s actor_profile_id=%s reason=%s",
@@ -1441,7 +1441,8 @@ class CouncilService:
 
 
     def get_pause_status(self, *, source_platform: str = "system", actor_profile_id: str | None = None) -> dict[str, object]:
-        return CouncilPauseService.sync_pause_state(platform=source_platform, user_id=actor_profile_id)
+        # Только чтение: переходы паузы выполняет периодический реконсилер CouncilPauseService.sync_pause_state.
+        return CouncilPauseService.get_pause_status()
 
 
 council_service = CouncilService()
@@ -7,6 +7,7 @@
 
 import logging
 import threading
+import time
 from collections import defaultdict
 from datetime import datetime, timezone
 from typing import Iterable
@@ -17,27 +18,44 @@ from bot.data import db
 
 logger = logging.getLogger(__name__)
 
+SYNC_MODE_FULL = "full"
+SYNC_MODE_ACCOUNT = "account"
+
+_metrics_lock = threading.Lock()
+_sync_metrics: dict[str, dict[str, float]] = {}
+
 
 class ExternalRolesSyncService:
     """Sync snapshot of external roles for linked accounts."""
 
     UPSERT_BATCH_SIZE = 500
+    # Размер списка account_id в одном in_() и страницы чтения: URL PostgREST и max-rows ограничены.
+    READ_CHUNK_SIZE = 200
+    READ_PAGE_SIZE = 1000
 
     @staticmethod
     def sync_all_linked_accounts(bot: discord.Client) -> dict[str, int]:
+        started_at = time.perf_counter()
+        cost: dict[str, int] = {}
+        stats = ExternalRolesSyncService._sync_all_linked_accounts(bot, cost)
+        ExternalRolesSyncService._record_sync_metrics(SYNC_MODE_FULL, started_at, cost, stats)
+        return stats
+
+    @staticmethod
+    def _sync_all_linked_accounts(bot: discord.Client, cost: dict[str, int]) -> dict[str, int]:
         if not db.supabase:
             logger.warning("external roles sync skipped: supabase is not configured")
             return {"processed": 0, "synced": 0, "errors": 0}
 
-        linked_rows = ExternalRolesSyncService._load_linked_accounts()
+        linked_rows = ExternalRolesSyncService._load_linked_accounts(cost)
         if not linked_rows:
             logger.info("external roles sync skipped: no linked accounts with both providers")
             return {"processed": 0, "synced": 0, "errors": 0}
 
-        discord_roles_by_user = ExternalRolesSyncService._collect_discord_roles(bot)
+        discord_roles_by_user = ExternalRolesSyncService._collect_discord_roles(bot, cost)
         account_ids = [str(row.get("account_id") or "").strip() for row in linked_rows if str(row.get("account_id") or "").strip()]
         try:
-            existing_bindings = ExternalRolesSyncService._load_existing_bindings(account_ids)
+            existing_bindings = ExternalRolesSyncService._load_existing_bindings(account_ids, cost)
         except Exception:
             logger.exception("external roles sync aborted: failed to preload existing bindings")
             return {"processed": 0, "synced": 0, "errors": 1}
@@ -74,24 +92,42 @@ class ExternalRolesSyncService:
                     telegram_user_id,
                 )
 
-        batch_errors = ExternalRolesSyncService._apply_sync_changes(upsert_payloads, soft_delete_targets)
+        batch_errors = ExternalRolesSyncService._apply_sync_changes(upsert_payloads, soft_delete_targets, cost)
         errors += batch_errors
         logger.info(
-            "external roles sync finished processed=%s synced=%s errors=%s upserts=%s soft_deletes=%s",
+            "external roles sync finished processed=%s synced=%s errors=%s upserts=%s soft_deletes=%s db_reads=%s db_writes=%s",
             processed,
             synced,
             errors,
             len(upsert_payloads),
             len(soft_delete_targets),
+            cost.get("db_reads", 0),
+            cost.get("db_writes", 0),
         )
         return {"processed": processed, "synced": synced, "errors": errors}
 
     @staticmethod
     def sync_account_by_account_id(bot: discord.Client, account_id: str) -> bool:
+        """Member-scoped sync: роли одного участника берутся из кеша гильдий без обхода всех участников."""
+
+        started_at = time.perf_counter()
+        cost: dict[str, int] = {}
+        changed = ExternalRolesSyncService._sync_account_by_account_id(bot, account_id, cost)
+        ExternalRolesSyncService._record_sync_metrics(
+            SYNC_MODE_ACCOUNT,
+            started_at,
+            cost,
+            {"processed": 1, "synced": int(changed), "errors": 0},
+        )
+        return changed
+
+    @staticmethod
+    def _sync_account_by_account_id(bot: discord.Client, account_id: str, cost: dict[str, int]) -> bool:
         if not db.supabase or not account_id:
             logger.warning("external roles force sync skipped invalid account_id=%s", account_id)
             return False
         try:
+            ExternalRolesSyncService._count(cost, "db_reads")
             response = (
                 db.supabase.table("account_links_registry")
                 .select("account_id,discord_user_id,telegram_user_id")
@@ -115,14 +151,15 @@ class ExternalRolesSyncService:
                 )
                 return False
 
-            discord_roles = ExternalRolesSyncService._collect_discord_roles(bot).get(discord_user_id, [])
+            discord_roles = ExternalRolesSyncService._collect_member_discord_roles(bot, discord_user_id, cost)
             telegram_roles = ExternalRolesSyncService._build_telegram_snapshot(telegram_user_id)
-            existing_bindings = ExternalRolesSyncService._load_existing_bindings([str(account_id)]).get(str(account_id))
+            existing_bindings = ExternalRolesSyncService._load_existing_bindings([str(account_id)], cost).get(str(account_id))
             changed = ExternalRolesSyncService.sync_account_role_bindings(
                 account_id,
                 discord_roles,
                 telegram_roles,
                 existing_bindings=existing_bindings,
+                cost=cost,
             )
             logger.info(
                 "external roles force sync completed account_id=%s discord_roles=%s telegram_roles=%s changed=%s",
@@ -188,6 +225,7 @@ class ExternalRolesSyncService:
         telegram_roles: Iterable[dict[str, str]],
         *,
         existing_bindings: dict[str, list[dict[str, str]]] | None = None,
+        cost: dict[str, int] | None = None,
     ) -> bool:
         if not db.supabase or not account_id:
             return False
@@ -200,9 +238,47 @@ class ExternalRolesSyncService:
         )
         if not plan["changed"]:
             return False
-        errors = ExternalRolesSyncService._apply_sync_changes(plan["upserts"], plan["soft_deletes"])
+        errors = ExternalRolesSyncService._apply_sync_changes(plan["upserts"], plan["soft_deletes"], cost)
         return errors == 0
 
+    @staticmethod
+    def metrics_snapshot() -> dict[str, dict[str, float]]:
+        """Накопленные стоимость и длительность синхронизаций по режимам (full/account)."""
+
+        with _metrics_lock:
+            return {mode: dict(values) for mode, values in _sync_metrics.items()}
+
+    @staticmethod
+    def _record_sync_metrics(mode: str, started_at: float, cost: dict[str, int], stats: dict[str, int]) -> None:
+        duration_ms = (time.perf_counter() - started_at) * 1000
+        with _metrics_lock:
+            metrics = _sync_metrics.setdefault(
+                mode,
+                {"runs": 0, "errors": 0, "synced": 0, "duration_ms_total": 0.0, "duration_ms_max": 0.0, "db_reads": 0, "db_writes": 0, "members_scanned": 0},
+            )
+            metrics["runs"] += 1
+            metrics["errors"] += int(stats.get("errors", 0))
+            metrics["synced"] += int(stats.get("synced", 0))
+            metrics["duration_ms_total"] += duration_ms
+            metrics["duration_ms_max"] = max(metrics["duration_ms_max"], duration_ms)
+            metrics["last_duration_ms"] = duration_ms
+            for key in ("db_reads", "db_writes", "members_scanned"):
+                metrics[key] += int(cost.get(key, 0))
+                metrics[f"last_{key}"] = int(cost.get(key, 0))
+        logger.info(
+            "external roles sync cost mode=%s duration_ms=%.1f db_reads=%s db_writes=%s members_scanned=%s",
+            mode,
+            duration_ms,
+            cost.get("db_reads", 0),
+            cost.get("db_writes", 0),
+            cost.get("members_scanned", 0),
+        )
+
+    @staticmethod
+    def _count(cost: dict[str, int] | None, key: str, value: int = 1) -> None:
+        if cost is not None:
+            cost[key] = cost.get(key, 0) + value
+
     @staticmethod
     def get_last_sync_at(account_id: str) -> str | None:
         if not db.supabase or not account_id:
@@ -224,35 +300,40 @@ class ExternalRolesSyncService:
             return None
 
     @staticmethod
-    def _load_linked_accounts() -> list[dict]:
+    def _load_linked_accounts(cost: dict[str, int] | None = None) -> list[dict]:
+        rows: list[dict] = []
+        page_size = ExternalRolesSyncService.READ_PAGE_SIZE
         try:
-            response = (
-                db.supabase.table("account_links_registry")
-                .select("account_id,discord_user_id,telegram_user_id")
-                .not_.is_("discord_user_id", "null")
-                .not_.is_("telegram_user_id", "null")
-                .execute()
-            )
-            return response.data or []
+            while True:
+                ExternalRolesSyncService._count(cost, "db_reads")
+                response = (
+                    db.supabase.table("account_links_registry")
+                    .select("account_id,discord_user_id,telegram_user_id")
+                    .not_.is_("discord_user_id", "null")
+                    .not_.is_("telegram_user_id", "null")
+                    .order("account_id")
+                    .range(len(rows), len(rows) + page_size - 1)
+                    .execute()
+                )
+                page = response.data or []
+                rows.extend(page)
+                if len(page) < page_size:
+                    return rows
         except Exception:
             logger.exception("external roles sync failed to load linked accounts")
             return []
 
     @staticmethod
-    def _load_existing_bindings(account_ids: Iterable[str]) -> dict[str, dict[str, list[dict[str, str]]]]:
+    def _load_existing_bindings(
+        account_ids: Iterable[str],
+        cost: dict[str, int] | None = None,
+    ) -> dict[str, dict[str, list[dict[str, str]]]]:
         normalized_ids = sorted({str(account_id or "").strip() for account_id in account_ids if str(account_id or "").strip()})
         bindings: dict[str, dict[str, list[dict[str, str]]]] = defaultdict(lambda: defaultdict(list))
         if not normalized_ids:
             return {}
         try:
-            response = (
-                db.supabase.table("external_role_bindings")
-                .select("account_id,source,external_role_id,external_role_name")
-                .in_("account_id", normalized_ids)
-                .is_("deleted_at", "null")
-                .execute()
-            )
-            for row in response.data or []:
+            for row in ExternalRolesSyncService._iter_binding_rows(normalized_ids, cost):
                 account_id = str(row.get("account_id") or "").strip()
                 source = str(row.get("source") or "").strip()
                 role_id = str(row.get("external_role_id") or "").strip()
@@ -267,14 +348,40 @@ class ExternalRolesSyncService:
                 )
         except Exception:
             logger.exception(
-                "external roles sync failed to load existing bindings account_ids=%s",
-                normalized_ids,
+                "external roles sync failed to load existing bindings accounts=%s",
+                len(normalized_ids),
             )
             raise
         return {account_id: dict(source_map) for account_id, source_map in bindings.items()}
 
     @staticmethod
-    def _collect_discord_roles(bot: discord.Client) -> dict[str, list[dict[str, str]]]:
+    def _iter_binding_rows(account_ids: list[str], cost: dict[str, int] | None) -> Iterable[dict]:
+        page_size = ExternalRolesSyncService.READ_PAGE_SIZE
+        for chunk in ExternalRolesSyncService._chunked(account_ids, ExternalRolesSyncService.READ_CHUNK_SIZE):
+            offset = 0
+            while True:
+                ExternalRolesSyncService._count(cost, "db_reads")
+                response = (
+                    db.supabase.table("external_role_bindings")
+                    .select("account_id,source,external_role_id,external_role_name")
+                    .in_("account_id", chunk)
+                    .is_("deleted_at", "null")
+                    .order("account_id")
+                    .order("external_role_id")
+                    .range(offset, offset + page_size - 1)
+                    .execute()
+                )
+                page = response.data or []
+                yield from page
+                if len(page) < page_size:
+                    break
+                offset += len(page)
+
+    @staticmethod
+    def _collect_discord_roles(
+        bot: discord.Client,
+        cost: dict[str, int] | None = None,
+    ) -> dict[str, list[dict[str, str]]]:
         roles_by_user: dict[str, list[dict[str, str]]] = defaultdict(list)
         guilds = getattr(bot, "guilds", None)
         if guilds is None:
@@ -286,22 +393,55 @@ class ExternalRolesSyncService:
 
         for guild in bot.guilds:
             for member in guild.members:
+                ExternalRolesSyncService._count(cost, "members_scanned")
                 if getattr(member, "bot", False):
                     continue
                 user_key = str(getattr(member, "id", "") or "").strip()
                 if not user_key:
                     continue
-                for role in member.roles:
-                    if role.is_default():
-                        continue
-                    roles_by_user[user_key].append(
-                        {
-                            "external_role_id": str(role.id),
-                            "external_role_name": str(role.name),
-                        }
-                    )
+                roles_by_user[user_key].extend(ExternalRolesSyncService._member_role_snapshot(member))
         return roles_by_user
 
+    @staticmethod
+    def _collect_member_discord_roles(
+        bot: discord.Client,
+        discord_user_id: str,
+        cost: dict[str, int] | None = None,
+    ) -> list[dict[str, str]]:
+        """Роли одного участника по всем гильдиям через кеш `guild.get_member` — O(гильдий), а не O(участников)."""
+
+        guilds = getattr(bot, "guilds", None)
+        if guilds is None:
+            logger.error(
+                "external roles sync skipped discord member snapshot: bot has no guilds attribute bot_type=%s",
+                type(bot).__name__,
+            )
+            return []
+        try:
+            member_id = int(discord_user_id)
+        except (TypeError, ValueError):
+            return []
+
+        roles: list[dict[str, str]] = []
+        for guild in guilds:
+            member = guild.get_member(member_id)
+            ExternalRolesSyncService._count(cost, "members_scanned")
+            if member is None or getattr(member, "bot", False):
+                continue
+            roles.extend(ExternalRolesSyncService._member_role_snapshot(member))
+        return roles
+
+    @staticmethod
+    def _member_role_snapshot(member: discord.Member) -> list[dict[str, str]]:
+        return [
+            {
+                "external_role_id": str(role.id),
+                "external_role_name": str(role.name),
+            }
+            for role in member.roles
+            if not role.is_default()
+        ]
+
     @staticmethod
     def _build_telegram_snapshot(telegram_user_id: str) -> list[dict[str, str]]:
         if not telegram_user_id:
@@ -392,10 +532,12 @@ class ExternalRolesSyncService:
     def _apply_sync_changes(
         upsert_payloads: list[dict[str, str | None]],
         soft_delete_targets: list[dict[str, object]],
+        cost: dict[str, int] | None = None,
     ) -> int:
         errors = 0
         for chunk in ExternalRolesSyncService._chunked(upsert_payloads, ExternalRolesSyncService.UPSERT_BATCH_SIZE):
             try:
+                ExternalRolesSyncService._count(cost, "db_writes")
                 ExternalRolesSyncService._upsert_batch(chunk)
             except Exception:
                 errors += 1
@@ -406,32 +548,44 @@ class ExternalRolesSyncService:
                     role_ids,
                 )
 
+        # Set-based soft delete: одна роль, снятая у многих аккаунтов, — один update на пачку account_id.
+        for (source, role_id), (synced_at, account_ids) in ExternalRolesSyncService._group_soft_deletes(soft_delete_targets).items():
+            for account_chunk in ExternalRolesSyncService._chunked(account_ids, ExternalRolesSyncService.READ_CHUNK_SIZE):
+                try:
+                    ExternalRolesSyncService._count(cost, "db_writes")
+                    (
+                        db.supabase.table("external_role_bindings")
+                        .update({"deleted_at": synced_at, "last_synced_at": synced_at})
+                        .eq("source", source)
+                        .eq("external_role_id", role_id)
+                        .in_("account_id", account_chunk)
+                        .is_("deleted_at", "null")
+                        .execute()
+                    )
+                except Exception:
+                    errors += 1
+                    logger.exception(
+                        "external roles sync soft-delete failed source=%s role_id=%s accounts=%s",
+                        source,
+                        role_id,
+                        len(account_chunk),
+                    )
+        return errors
+
+    @staticmethod
+    def _group_soft_deletes(soft_delete_targets: list[dict[str, object]]) -> dict[tuple[str, str], tuple[str, list[str]]]:
+        grouped: dict[tuple[str, str], tuple[str, list[str]]] = {}
         for delete_target in soft_delete_targets:
             account_id = str(delete_target.get("account_id") or "").strip()
             source = str(delete_target.get("source") or "").strip()
             synced_at = str(delete_target.get("synced_at") or "").strip()
             role_ids = [str(role_id or "").strip() for role_id in list(delete_target.get("role_ids") or []) if str(role_id or "").strip()]
-            if not account_id or not source or not synced_at or not role_ids:
+            if not account_id or not source or not synced_at:
                 continue
-            try:
-                (
-                    db.supabase.table("external_role_bindings")
-                    .update({"deleted_at": synced_at, "last_synced_at": synced_at})
-                    .eq("account_id", account_id)
-                    .eq("source", source)
-                    .in_("external_role_id", role_ids)
-                    .is_("deleted_at", "null")
-                    .execute()
-                )
-            except Exception:
-                errors += 1
-                logger.exception(
-                    "external roles sync soft-delete failed account_id=%s source=%s missing_ids=%s",
-                    account_id,
-                    source,
-                    role_ids,
-                )
-        return errors
+            for role_id in role_ids:
+                _, account_ids = grouped.setdefault((source, role_id), (synced_at, []))
+                account_ids.append(account_id)
+        return grouped
 
     @staticmethod
     def _upsert_batch(payloads: list[dict[str, str | None]]) -> None:
@@ -446,7 +600,7 @@ class ExternalRolesSyncService:
             db.supabase.table("external_role_bindings").upsert(payloads).execute()
 
     @staticmethod
-    def _chunked(items: list[dict[str, str | None]], chunk_size: int) -> Iterable[list[dict[str, str | None]]]:
+    def _chunked(items: list, chunk_size: int) -> Iterable[list]:
         if chunk_size <= 0:
             yield items
             return
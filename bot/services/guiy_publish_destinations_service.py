@@ -8,12 +8,15 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from datetime import datetime, timezone
 import logging
 from typing import Any
 
 import discord
 
 from bot.data import db
+from bot.services.telegram_chat_registry import TelegramChatRegistry
+from bot.utils.flow_state import register_flow_state_type
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,7 @@ _TELEGRAM_REGISTRY_TABLE = "bot_chat_registry"
 _TELEGRAM_TRACKED_TYPES = {"group", "supergroup", "channel"}
 
 
+@register_flow_state_type
 @dataclass(frozen=True, slots=True)
 class GuiyPublishDestination:
     provider: str
@@ -233,12 +237,14 @@ class GuiyPublishDestinationsService:
         )
 
     @staticmethod
-    def register_telegram_chat(*, chat_id: str | int | None, chat_title: str | None, chat_type: str | None, is_active: bool = True) -> None:
+    def register_telegram_chat(*, chat_id: str | int | None, chat_title: str | None, chat_type: str | None, is_active: bool = True) -> bool:
+        """Upsert чата в реестр; True — строка записана."""
+
         normalized_chat_id = str(chat_id or "").strip()
         normalized_chat_type = str(chat_type or "").strip()
         normalized_chat_title = str(chat_title or "").strip() or None
         if not normalized_chat_id or not normalized_chat_type:
-            return
+            return False
         logger.info(
             "telegram bot chat registry seen chat_id=%s chat_title=%s chat_type=%s is_active=%s",
             normalized_chat_id,
@@ -253,13 +259,15 @@ class GuiyPublishDestinationsService:
                 normalized_chat_title,
                 normalized_chat_type,
             )
-            return
+            return False
         payload = {
             "provider": "telegram",
             "chat_id": normalized_chat_id,
             "chat_title": normalized_chat_title,
             "chat_type": normalized_chat_type,
             "is_active": bool(is_active),
+            # Записи теперь редкие (см. TelegramChatRegistry), поэтому отметку видимости ставим явно.
+            "last_seen_at": datetime.now(timezone.utc).isoformat(),
         }
         try:
             db.supabase.table(_TELEGRAM_REGISTRY_TABLE).upsert(payload, on_conflict="provider,chat_id").execute()
@@ -271,6 +279,8 @@ class GuiyPublishDestinationsService:
                 normalized_chat_type,
                 is_active,
             )
+            return False
+        return True
 
     @staticmethod
     def mark_telegram_chat_inactive(chat_id: str | int | None, *, reason: str) -> None:
@@ -278,6 +288,7 @@ class GuiyPublishDestinationsService:
         if not normalized_chat_id:
             return
         logger.warning("telegram bot chat registry mark inactive chat_id=%s reason=%s", normalized_chat_id, reason)
+        TelegramChatRegistry.forget(normalized_chat_id)
         if not getattr(db, "supabase", None):
             return
         try:
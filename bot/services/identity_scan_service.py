@@ -0,0 +1,385 @@
+"""
+Назначение: модуль "identity scan service" реализует продуктовый контур в зоне общая логика.
+Ответственность: полный скан участников Discord-сервера с пакетной записью только изменившихся identity и возобновлением с контрольной точки.
+Где используется: Discord (стартовый full scan в `bot/main.py`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from bot.data import db
+from bot.services.accounts_service import AccountsService
+from bot.utils.blocking_io import run_blocking_io
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_FIELDS = ("username", "display_name", "global_username")
+SCAN_STATE_TABLE = "bot_identity_scan_state"
+SCAN_STATUS_RUNNING = "running"
+SCAN_STATUS_COMPLETED = "completed"
+
+
+class IdentityScanService:
+    """Fingerprint-based bulk identity scan: one preload, in-memory diff, chunked upserts."""
+
+    PRELOAD_PAGE_SIZE = 1000
+
+    @staticmethod
+    def lookup_fields(user_obj: Any) -> dict[str, str | None]:
+        """Same field priority and normalization as `refresh_identity_from_platform_user`."""
+
+        username = next(
+            (value for value in (str(getattr(user_obj, "name", "") or "").strip(), str(getattr(user_obj, "username", "") or "").strip()) if value),
+            None,
+        )
+        display_name = next(
+            (
+                value
+                for value in (
+                    str(getattr(user_obj, "display_name", "") or "").strip(),
+                    str(getattr(user_obj, "full_name", "") or "").strip(),
+                    str(getattr(user_obj, "global_name", "") or "").strip(),
+                )
+                if value
+            ),
+            None,
+        )
+        global_username = str(getattr(user_obj, "global_name", "") or "").strip() or None
+        return {
+            "username": str(username or "").lstrip("@").strip() or None,
+            "display_name": display_name,
+            "global_username": global_username,
+        }
+
+    @staticmethod
+    def fingerprint(fields: dict[str, Any]) -> str:
+        raw = "\x1f".join(str(fields.get(field) or "").strip() for field in IDENTITY_FIELDS)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+    @staticmethod
+    def preload_identity_index(provider: str) -> tuple[dict[str, dict[str, Any]], tuple[str, ...]]:
+        """All identities of the provider keyed by provider_user_id, plus identity columns the schema has."""
+
+        select_variants = (
+            ("provider_user_id,account_id,username,display_name,global_username", IDENTITY_FIELDS),
+            ("provider_user_id,account_id,username,display_name", ("username", "display_name")),
+        )
+        last_error: Exception | None = None
+        for select_clause, columns in select_variants:
+            index: dict[str, dict[str, Any]] = {}
+            offset = 0
+            try:
+                while True:
+                    # PostgREST отдаёт не больше max-rows строк за запрос, поэтому читаем страницами.
+                    response = (
+                        db.supabase.table("account_identities")
+                        .select(select_clause)
+                        .eq("provider", provider)
+                        .order("provider_user_id")
+                        .range(offset, offset + IdentityScanService.PRELOAD_PAGE_SIZE - 1)
+                        .execute()
+                    )
+                    rows = response.data or []
+                    for row in rows:
+                        provider_user_id = str(row.get("provider_user_id") or "").strip()
+                        if provider_user_id:
+                            index[provider_user_id] = row
+                    if len(rows) < IdentityScanService.PRELOAD_PAGE_SIZE:
+                        return index, columns
+                    offset += len(rows)
+            except Exception as error:
+                last_error = error
+                logger.warning(
+                    "identity scan preload failed provider=%s select=%s error=%s",
+                    provider,
+                    select_clause,
+                    AccountsService._format_db_error(error),
+                )
+        raise RuntimeError(f"identity scan preload failed provider={provider}") from last_error
+
+    @staticmethod
+    def plan_identity_upserts(
+        provider: str,
+        members_fields: list[tuple[str, dict[str, str | None]]],
+        index: dict[str, dict[str, Any]],
+        *,
+        columns: tuple[str, ...],
+        account_id_required: bool,
+    ) -> tuple[list[dict[str, Any]], dict[str, int]]:
+        """Diff platform fields against preloaded rows; only changed or new identities produce payloads.
+
+        Payloads of bound identities carry their account_id, so the upsert never writes NULL into it.
+        Without account_id a payload is either a lookup-only row or, when account_id is required,
+        a new identity that `upsert_identity_chunk` registers through account creation.
+        """
+
+        stats = {"updated": 0, "inserted": 0, "skipped": 0}
+        payloads: list[dict[str, Any]] = []
+        for provider_user_id, fields in members_fields:
+            existing = index.get(provider_user_id)
+            if not any(fields.get(column) for column in columns):
+                stats["skipped"] += 1
+                continue
+
+            # Пустые значения с платформы не затирают сохранённые, как в persist_identity_lookup_fields.
+            merged = {
+                column: fields.get(column) or (str((existing or {}).get(column) or "").strip() or None)
+                for column in columns
+            }
+            if existing is not None and IdentityScanService.fingerprint(merged) == IdentityScanService.fingerprint(
+                {column: existing.get(column) for column in columns}
+            ):
+                stats["skipped"] += 1
+                continue
+
+            account_id = str((existing or {}).get("account_id") or "").strip()
+            payload = {"provider": provider, "provider_user_id": provider_user_id, **merged}
+            if account_id:
+                payload["account_id"] = account_id
+            payloads.append(payload)
+            stats["inserted" if existing is None else "updated"] += 1
+            index[provider_user_id] = {**(existing or {}), **payload}
+        return payloads, stats
+
+    @staticmethod
+    def upsert_identity_chunk(provider: str, payloads: list[dict[str, Any]], *, account_id_required: bool = False) -> None:
+        """Bound and lookup-only rows go in separate bulk upserts: a bulk request has one column set."""
+
+        bound = [payload for payload in payloads if payload.get("account_id")]
+        unbound = [payload for payload in payloads if not payload.get("account_id")]
+        IdentityScanService._upsert_identity_rows(provider, bound)
+        if account_id_required:
+            for payload in unbound:
+                IdentityScanService._register_identity(provider, payload)
+        else:
+            IdentityScanService._upsert_identity_rows(provider, unbound)
+
+    @staticmethod
+    def _upsert_identity_rows(provider: str, payloads: list[dict[str, Any]]) -> None:
+        if not payloads:
+            return
+        try:
+            db.supabase.table("account_identities").upsert(payloads, on_conflict="provider,provider_user_id").execute()
+            AccountsService.apply_identity_upsert_payloads(provider, payloads)
+            return
+        except Exception as error:
+            logger.warning(
+                "identity scan chunk upsert failed, falling back to per-row writes provider=%s rows=%s error=%s",
+                provider,
+                len(payloads),
+                AccountsService._format_db_error(error),
+            )
+        for payload in payloads:
+            IdentityScanService._persist_identity_fields(provider, payload)
+
+    @staticmethod
+    def _register_identity(provider: str, payload: dict[str, Any]) -> None:
+        """New identity when account_id is NOT NULL: account first (same path as /register), then the fields."""
+
+        registered, message = AccountsService.register_identity(provider, payload["provider_user_id"])
+        if not registered:
+            logger.warning(
+                "identity scan account creation failed provider=%s provider_user_id=%s reason=%s",
+                provider,
+                payload["provider_user_id"],
+                message,
+            )
+            return
+        IdentityScanService._persist_identity_fields(provider, payload)
+
+    @staticmethod
+    def _persist_identity_fields(provider: str, payload: dict[str, Any]) -> None:
+        AccountsService.persist_identity_lookup_fields(
+            provider,
+            payload["provider_user_id"],
+            username=payload.get("username"),
+            display_name=payload.get("display_name"),
+            global_username=payload.get("global_username"),
+        )
+
+    @staticmethod
+    def load_checkpoint(provider: str, scope_id: str) -> dict[str, Any] | None:
+        try:
+            response = (
+                db.supabase.table(SCAN_STATE_TABLE)
+                .select("*")
+                .eq("provider", provider)
+                .eq("scope_id", scope_id)
+                .limit(1)
+                .execute()
+            )
+        except Exception:
+            logger.exception("identity scan checkpoint load failed provider=%s scope_id=%s", provider, scope_id)
+            return None
+        return (response.data or [None])[0]
+
+    @staticmethod
+    def save_checkpoint(provider: str, scope_id: str, **fields: Any) -> None:
+        payload = {
+            "provider": provider,
+            "scope_id": scope_id,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            **fields,
+        }
+        try:
+            db.supabase.table(SCAN_STATE_TABLE).upsert(payload, on_conflict="provider,scope_id").execute()
+        except Exception:
+            logger.exception("identity scan checkpoint save failed provider=%s scope_id=%s", provider, scope_id)
+
+    @staticmethod
+    def _completed_recently(checkpoint: dict[str, Any] | None, min_interval_seconds: float) -> bool:
+        if not checkpoint or checkpoint.get("status") != SCAN_STATUS_COMPLETED or min_interval_seconds <= 0:
+            return False
+        raw = str(checkpoint.get("completed_at") or "").replace("Z", "+00:00")
+        try:
+            completed_at = datetime.fromisoformat(raw)
+        except ValueError:
+            return False
+        if completed_at.tzinfo is None:
+            completed_at = completed_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - completed_at < timedelta(seconds=min_interval_seconds)
+
+    @staticmethod
+    async def scan_discord_guild(
+        guild: Any,
+        *,
+        chunk_size: int,
+        pause_seconds: float,
+        min_interval_seconds: float,
+        shared_preload: dict[str, Any] | None = None,
+    ) -> dict[str, int]:
+        """Scan one guild; resumes after the last checkpointed member id of an interrupted scan.
+
+        `shared_preload` is one dict for all guilds of a scan run: identities are preloaded once
+        and the index stays current as guilds write to it.
+        """
+
+        import discord
+
+        provider = "discord"
+        scope_id = str(guild.id)
+        totals = {"updated": 0, "inserted": 0, "skipped": 0, "processed": 0}
+        if not db.supabase:
+            logger.warning("discord identity full scan skipped: supabase is not configured guild_id=%s", guild.id)
+            return totals
+
+        checkpoint = await run_blocking_io(
+            "identity_scan.load_checkpoint", IdentityScanService.load_checkpoint, provider, scope_id, logger=logger
+        )
+        if IdentityScanService._completed_recently(checkpoint, min_interval_seconds):
+            logger.info(
+                "discord identity full scan guild skipped: completed recently guild_id=%s completed_at=%s min_interval_sec=%s",
+                guild.id,
+                checkpoint.get("completed_at"),
+                min_interval_seconds,
+            )
+            return totals
+
+        resume_after = None
+        started_at = datetime.now(timezone.utc).isoformat()
+        if checkpoint and checkpoint.get("status") == SCAN_STATUS_RUNNING and checkpoint.get("cursor"):
+            resume_after = str(checkpoint["cursor"])
+            started_at = str(checkpoint.get("started_at") or started_at)
+            totals["processed"] = int(checkpoint.get("processed") or 0)
+
+        preload = shared_preload if shared_preload is not None else {}
+        if "index" not in preload:
+            preload["index"], preload["columns"] = await run_blocking_io(
+                "identity_scan.preload", IdentityScanService.preload_identity_index, provider, logger=logger
+            )
+        index, columns = preload["index"], preload["columns"]
+        account_id_required = AccountsService._is_account_id_required_for_account_identities()
+        logger.info(
+            "discord identity full scan guild started guild_id=%s member_count=%s preloaded=%s resume_after=%s chunk_size=%s",
+            guild.id,
+            getattr(guild, "member_count", None),
+            len(index),
+            resume_after,
+            chunk_size,
+        )
+
+        async def _flush(chunk: list[tuple[str, dict[str, str | None]]], cursor: str | None) -> None:
+            payloads, stats = IdentityScanService.plan_identity_upserts(
+                provider,
+                chunk,
+                index,
+                columns=columns,
+                account_id_required=account_id_required,
+            )
+            await run_blocking_io(
+                "identity_scan.upsert_chunk",
+                IdentityScanService.upsert_identity_chunk,
+                provider,
+                payloads,
+                account_id_required=account_id_required,
+                logger=logger,
+            )
+            for key, value in stats.items():
+                totals[key] += value
+            totals["processed"] += len(chunk)
+            await run_blocking_io(
+                "identity_scan.save_checkpoint",
+                IdentityScanService.save_checkpoint,
+                provider,
+                scope_id,
+                status=SCAN_STATUS_RUNNING,
+                cursor=cursor,
+                processed=totals["processed"],
+                started_at=started_at,
+                logger=logger,
+            )
+            logger.info(
+                "discord identity full scan progress guild_id=%s processed=%s updated=%s inserted=%s skipped=%s",
+                guild.id,
+                totals["processed"],
+                totals["updated"],
+                totals["inserted"],
+                totals["skipped"],
+            )
+
+        chunk: list[tuple[str, dict[str, str | None]]] = []
+        after = discord.Object(id=int(resume_after)) if resume_after else None
+        # fetch_members идёт страницами по возрастанию id, но внутри страницы отдаёт участников
+        # в обратном порядке. Безопасный курсор — максимальный id уже полностью пройденных страниц.
+        safe_cursor = resume_after
+        previous_id: int | None = None
+        page_max_id: int | None = None
+        async for member in guild.fetch_members(limit=None, after=after):
+            provider_user_id = str(getattr(member, "id", "") or "").strip()
+            if not provider_user_id:
+                continue
+            member_id = int(provider_user_id)
+            if previous_id is not None and member_id > previous_id:
+                safe_cursor = str(page_max_id)
+                page_max_id = member_id
+            else:
+                page_max_id = member_id if page_max_id is None else max(page_max_id, member_id)
+            previous_id = member_id
+
+            chunk.append((provider_user_id, IdentityScanService.lookup_fields(member)))
+            if len(chunk) >= chunk_size:
+                await _flush(chunk, safe_cursor)
+                chunk = []
+                if pause_seconds > 0:
+                    await asyncio.sleep(pause_seconds)
+        if chunk:
+            await _flush(chunk, safe_cursor)
+
+        await run_blocking_io(
+            "identity_scan.save_checkpoint",
+            IdentityScanService.save_checkpoint,
+            provider,
+            scope_id,
+            status=SCAN_STATUS_COMPLETED,
+            cursor=None,
+            processed=totals["processed"],
+            started_at=started_at,
+            completed_at=datetime.now(timezone.utc).isoformat(),
+            logger=logger,
+        )
+        return totals
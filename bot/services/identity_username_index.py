@@ -0,0 +1,159 @@
+"""
+Назначение: модуль "identity username index" реализует продуктовый контур в зоне общая логика.
+Ответственность: инкрементальный casefold-индекс имён identity (точное и префиксное совпадение) вместо полного скана таблицы на каждый поиск.
+Где используется: общая логика (`AccountsService.find_accounts_by_identity_username`, `AccountsService.search_identity_usernames`).
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from collections.abc import Iterable
+from typing import Any
+
+IDENTITY_NAME_FIELDS = ("username", "provider_username", "display_name", "provider_display_name", "global_username")
+
+
+class IdentityUsernameIndex:
+    """Индекс identity одного провайдера: имя → provider_user_id и отсортированные ключи для префиксов."""
+
+    def __init__(self, provider: str, *, source: Any = None) -> None:
+        self.provider = provider
+        # Источник данных (клиент Supabase), из которого построен индекс: смена клиента требует перестройки.
+        self.source = source
+        self.loaded_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._rows: dict[str, dict] = {}
+        self._keys_by_user: dict[str, set[str]] = {}
+        self._users_by_key: dict[str, set[str]] = {}
+        self._sorted_keys: list[str] = []
+        self._dirty: set[str] = set()
+
+    @staticmethod
+    def normalize(provider: str, value: object) -> str:
+        candidate = str(value or "").strip()
+        if provider == "telegram":
+            candidate = candidate.lstrip("@")
+        return candidate.casefold()
+
+    @classmethod
+    def build(cls, provider: str, rows: Iterable[dict], *, source: Any = None) -> "IdentityUsernameIndex":
+        index = cls(provider, source=source)
+        for row in rows:
+            user_id = str(row.get("provider_user_id") or "").strip()
+            if not user_id:
+                continue
+            keys = index._row_keys(row)
+            index._rows[user_id] = dict(row)
+            index._keys_by_user[user_id] = keys
+            for key in keys:
+                index._users_by_key.setdefault(key, set()).add(user_id)
+        index._sorted_keys = sorted(index._users_by_key)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _row_keys(self, row: dict) -> set[str]:
+        keys = {IdentityUsernameIndex.normalize(self.provider, row.get(field)) for field in IDENTITY_NAME_FIELDS}
+        keys.discard("")
+        return keys
+
+    def _add_key(self, key: str, user_id: str) -> None:
+        users = self._users_by_key.get(key)
+        if users is None:
+            self._users_by_key[key] = {user_id}
+            bisect.insort(self._sorted_keys, key)
+        else:
+            users.add(user_id)
+
+    def _drop_key(self, key: str, user_id: str) -> None:
+        users = self._users_by_key.get(key)
+        if users is None:
+            return
+        users.discard(user_id)
+        if not users:
+            del self._users_by_key[key]
+            position = bisect.bisect_left(self._sorted_keys, key)
+            if position < len(self._sorted_keys) and self._sorted_keys[position] == key:
+                del self._sorted_keys[position]
+
+    def upsert(self, row: dict) -> None:
+        user_id = str(row.get("provider_user_id") or "").strip()
+        if not user_id:
+            return
+        with self._lock:
+            old_keys = self._keys_by_user.get(user_id, set())
+            new_keys = self._row_keys(row)
+            for key in old_keys - new_keys:
+                self._drop_key(key, user_id)
+            for key in new_keys - old_keys:
+                self._add_key(key, user_id)
+            self._rows[user_id] = dict(row)
+            self._keys_by_user[user_id] = new_keys
+
+    def merge(self, payload: dict) -> None:
+        """Применить частичную запись (как upsert в таблицу): незаданные поля строки сохраняются."""
+
+        user_id = str(payload.get("provider_user_id") or "").strip()
+        if not user_id:
+            return
+        with self._lock:
+            self.upsert({**self._rows.get(user_id, {}), **payload})
+
+    def remove(self, provider_user_id: str) -> None:
+        user_id = str(provider_user_id or "").strip()
+        with self._lock:
+            for key in self._keys_by_user.pop(user_id, set()):
+                self._drop_key(key, user_id)
+            self._rows.pop(user_id, None)
+
+    def mark_dirty(self, provider_user_id: str) -> None:
+        user_id = str(provider_user_id or "").strip()
+        if user_id:
+            with self._lock:
+                self._dirty.add(user_id)
+
+    def take_dirty(self) -> set[str]:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return dirty
+
+    def get(self, provider_user_id: str) -> dict | None:
+        with self._lock:
+            row = self._rows.get(str(provider_user_id or "").strip())
+            return dict(row) if row is not None else None
+
+    def rows(self) -> list[dict]:
+        with self._lock:
+            return [dict(row) for row in self._rows.values()]
+
+    def exact(self, value: object) -> list[dict]:
+        key = IdentityUsernameIndex.normalize(self.provider, value)
+        if not key:
+            return []
+        with self._lock:
+            return [dict(self._rows[user_id]) for user_id in sorted(self._users_by_key.get(key, ()))]
+
+    def prefix(self, value: object, *, limit: int = 20) -> list[dict]:
+        key = IdentityUsernameIndex.normalize(self.provider, value)
+        if not key or limit <= 0:
+            return []
+        matches: list[dict] = []
+        seen: set[str] = set()
+        with self._lock:
+            position = bisect.bisect_left(self._sorted_keys, key)
+            while position < len(self._sorted_keys) and len(matches) < limit:
+                candidate = self._sorted_keys[position]
+                if not candidate.startswith(key):
+                    break
+                for user_id in sorted(self._users_by_key[candidate]):
+                    if user_id in seen:
+                        continue
+                    seen.add(user_id)
+                    matches.append(dict(self._rows[user_id]))
+                    if len(matches) >= limit:
+                        break
+                position += 1
+        return matches
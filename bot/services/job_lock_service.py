@@ -0,0 +1,175 @@
+"""
+Назначение: модуль "job lock service" реализует продуктовый контур в зоне общая логика.
+Ответственность: DB-backed leader lock (lease) для фоновых задач, чтобы каждую задачу выполнял только один jobs-worker.
+Где используется: общая логика (роль процесса jobs).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from bot.data import db
+from bot.utils.blocking_io import run_blocking_io
+
+logger = logging.getLogger(__name__)
+
+JOB_LOCKS_TABLE = "bot_job_locks"
+DEFAULT_JOB_LOCK_TTL_SECONDS = 90.0
+# Запас до истечения своего lease: задача останавливается раньше, чем его сможет захватить standby.
+LEASE_SAFETY_MARGIN_RATIO = 0.1
+
+PROCESS_LOCK_OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _utc_iso(moment: datetime) -> str:
+    # Без "+00:00": знак "+" ломает значения внутри PostgREST-фильтра or=(...).
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class JobLeaderLock:
+    """Lease в таблице `bot_job_locks`: владелец продлевает его, пока задача работает."""
+
+    def __init__(
+        self,
+        job_name: str,
+        *,
+        owner_id: str | None = None,
+        ttl_seconds: float = DEFAULT_JOB_LOCK_TTL_SECONDS,
+        supabase: Any | None = None,
+    ) -> None:
+        self.job_name = job_name
+        self.owner_id = owner_id or PROCESS_LOCK_OWNER_ID
+        self.ttl_seconds = max(5.0, float(ttl_seconds))
+        self._supabase = supabase
+
+    @property
+    def supabase(self) -> Any:
+        return self._supabase if self._supabase is not None else db.supabase
+
+    def try_acquire(self) -> bool:
+        """Acquire or renew the lease. Returns True when this owner holds it."""
+
+        supabase = self.supabase
+        if supabase is None:
+            logger.warning("job lock unavailable: supabase missing job_name=%s owner_id=%s", self.job_name, self.owner_id)
+            return False
+
+        now = datetime.now(timezone.utc)
+        payload = {
+            "owner_id": self.owner_id,
+            "expires_at": _utc_iso(now + timedelta(seconds=self.ttl_seconds)),
+            "updated_at": _utc_iso(now),
+        }
+        try:
+            # Один UPDATE с условием: захват чужого просроченного lease или продление своего.
+            response = (
+                supabase.table(JOB_LOCKS_TABLE)
+                .update(payload)
+                .eq("job_name", self.job_name)
+                .or_(f"owner_id.eq.{self.owner_id},expires_at.lt.{_utc_iso(now)}")
+                .execute()
+            )
+            if response.data:
+                return True
+        except Exception:
+            logger.exception("job lock update failed job_name=%s owner_id=%s", self.job_name, self.owner_id)
+            return False
+
+        try:
+            response = (
+                supabase.table(JOB_LOCKS_TABLE)
+                .insert({"job_name": self.job_name, "acquired_at": _utc_iso(now), **payload})
+                .execute()
+            )
+            return bool(response.data)
+        except Exception as error:
+            # Конфликт первичного ключа: lease держит другой живой владелец.
+            logger.debug("job lock insert rejected job_name=%s owner_id=%s error=%s", self.job_name, self.owner_id, error)
+            return False
+
+    def release(self) -> None:
+        supabase = self.supabase
+        if supabase is None:
+            return
+        try:
+            supabase.table(JOB_LOCKS_TABLE).delete().eq("job_name", self.job_name).eq("owner_id", self.owner_id).execute()
+        except Exception:
+            logger.exception("job lock release failed job_name=%s owner_id=%s", self.job_name, self.owner_id)
+
+
+async def run_with_leader_lock(
+    job_name: str,
+    coro_factory: Callable[[], Awaitable[Any]],
+    *,
+    ttl_seconds: float = DEFAULT_JOB_LOCK_TTL_SECONDS,
+    lock: JobLeaderLock | None = None,
+) -> None:
+    """Run `coro_factory()` only while this process holds the job lease.
+
+    Standby-процессы раз в ttl/3 пытаются захватить lease; лидер с той же
+    частотой продлевает его. Неудачное продление (сбой БД) задачу не отменяет,
+    пока не истёк последний продлённый lease: до этого момента его не может
+    захватить никто другой. Задача отменяется, когда до истечения остаётся
+    меньше запаса, и процесс возвращается в standby.
+    """
+
+    leader_lock = lock or JobLeaderLock(job_name, ttl_seconds=ttl_seconds)
+    poll_interval = leader_lock.ttl_seconds / 3
+    safety_margin = leader_lock.ttl_seconds * LEASE_SAFETY_MARGIN_RATIO
+    loop = asyncio.get_running_loop()
+    task: asyncio.Task | None = None
+    lease_expires_at = 0.0
+    try:
+        while True:
+            # Срок считается от момента до запроса: так он не позже срока, записанного в БД.
+            attempt_started_at = loop.time()
+            held = await run_blocking_io(f"job_lock.{job_name}", leader_lock.try_acquire, logger=logger)
+            delay = poll_interval
+            if held:
+                lease_expires_at = attempt_started_at + leader_lock.ttl_seconds
+                if task is None:
+                    logger.info("job leader lock acquired job_name=%s owner_id=%s", job_name, leader_lock.owner_id)
+                    task = asyncio.create_task(coro_factory(), name=f"leader:{job_name}")
+            elif task is not None:
+                remaining = lease_expires_at - loop.time()
+                if remaining <= safety_margin:
+                    logger.warning("job leader lock lost, stopping job job_name=%s owner_id=%s", job_name, leader_lock.owner_id)
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    task = None
+                else:
+                    logger.warning(
+                        "job leader lock renewal failed, keeping job until lease expires job_name=%s owner_id=%s remaining_sec=%.1f",
+                        job_name,
+                        leader_lock.owner_id,
+                        remaining,
+                    )
+                    delay = min(poll_interval, remaining - safety_margin)
+
+            if task is not None and task.done():
+                if task.cancelled():
+                    logger.warning("job cancelled while holding leader lock job_name=%s", job_name)
+                elif task.exception() is not None:
+                    logger.error(
+                        "job failed while holding leader lock job_name=%s error=%s",
+                        job_name,
+                        task.exception(),
+                        exc_info=task.exception(),
+                    )
+                else:
+                    logger.info("job finished while holding leader lock job_name=%s", job_name)
+                return
+
+            await asyncio.sleep(delay)
+    finally:
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if task is not None:
+            await run_blocking_io(f"job_lock.{job_name}.release", leader_lock.release, logger=logger)
@@ -0,0 +1,542 @@
+"""
+Назначение: модуль "job scheduler" реализует продуктовый контур в зоне общая логика.
+Ответственность: планировщик фоновых задач с расписанием (интервал или cron), сохранённым временем запуска, jitter, защитой от наложения и историей запусков.
+Где используется: общая логика (фоновые задачи Discord-процесса, роли all/jobs).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from bot.data import db
+from bot.metrics import metrics
+from bot.services.job_lock_service import PROCESS_LOCK_OWNER_ID
+from bot.utils.blocking_io import run_blocking_io
+
+logger = logging.getLogger(__name__)
+
+_job_duration_seconds = metrics.histogram(
+    "job_duration_seconds",
+    "Scheduled background job run duration by job and status.",
+    ("job", "status"),
+)
+
+JOB_STATE_TABLE = "bot_scheduled_jobs"
+JOB_HISTORY_TABLE = "bot_job_run_history"
+JOB_SCHEDULE_ENV_PREFIX = "JOB_SCHEDULE_"
+JOB_SCHEDULER_JITTER_SEC_ENV = "JOB_SCHEDULER_JITTER_SEC"
+JOB_SCHEDULER_STAGGER_SEC_ENV = "JOB_SCHEDULER_STAGGER_SEC"
+DEFAULT_JOB_JITTER_SEC = 30.0
+DEFAULT_JOB_STAGGER_SEC = 15.0
+# Пауза после неудачного claim того же слота: растёт от 1 с до минуты, пока lease держит другой процесс.
+CLAIM_RETRY_MIN_SEC = 1.0
+CLAIM_RETRY_MAX_SEC = 60.0
+
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+
+def _utc_iso(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _parse_utc(value: Any) -> datetime | None:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name) or default))
+    except ValueError:
+        logger.warning("invalid %s, using default value=%s", name, default)
+        return default
+
+
+class IntervalSchedule:
+    def __init__(self, seconds: float) -> None:
+        if seconds <= 0:
+            raise ValueError("interval must be positive")
+        self.seconds = float(seconds)
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+    def __repr__(self) -> str:
+        return f"IntervalSchedule({self.seconds:g})"
+
+
+class CronSchedule:
+    """Cron-выражение из пяти полей (минута час день месяц день_недели) в UTC.
+
+    Поддерживаются `*`, списки `a,b`, диапазоны `a-b` и шаги `*/n`, `a-b/n`.
+    День недели: 0 или 7 — воскресенье. Как в cron, при ограничении и дня месяца,
+    и дня недели достаточно совпадения любого из них.
+    """
+
+    _BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str) -> None:
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression must have 5 fields: {expression!r}")
+        self.expression = expression
+        fields = [self._parse_field(part, low, high) for part, (low, high) in zip(parts, self._BOUNDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {0 if day == 7 else day for day in weekdays}
+        self._days_restricted = parts[2] != "*"
+        self._weekdays_restricted = parts[4] != "*"
+
+    @staticmethod
+    def _parse_field(part: str, low: int, high: int) -> set[int]:
+        values: set[int] = set()
+        for item in part.split(","):
+            base, _, step_raw = item.partition("/")
+            step = int(step_raw) if step_raw else 1
+            if step <= 0:
+                raise ValueError(f"invalid cron step: {item!r}")
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start_raw, end_raw = base.split("-", 1)
+                start, end = int(start_raw), int(end_raw)
+            else:
+                start = int(base)
+                end = high if step_raw else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"cron value out of range: {item!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        # datetime.weekday(): понедельник = 0, в cron понедельник = 1.
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._days_restricted and self._weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate <= limit:
+            if candidate.month not in self.months:
+                year = candidate.year + (candidate.month == 12)
+                month = candidate.month % 12 + 1
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"cron expression never fires: {self.expression!r}")
+
+    def __repr__(self) -> str:
+        return f"CronSchedule({self.expression!r})"
+
+
+def parse_schedule(spec: str | float | int) -> IntervalSchedule | CronSchedule:
+    """Число — интервал в секундах, иначе cron-выражение."""
+
+    if isinstance(spec, (int, float)):
+        return IntervalSchedule(spec)
+    text = str(spec).strip()
+    try:
+        return IntervalSchedule(float(text))
+    except ValueError:
+        return CronSchedule(text)
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    schedule: IntervalSchedule | CronSchedule
+    max_runtime_seconds: float = 1800.0
+    jitter_seconds: float | None = None
+    record_history: bool = True
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        run: Callable[[], Awaitable[Any]],
+        default_schedule: str | float | int,
+        **kwargs: Any,
+    ) -> "ScheduledJob":
+        """Расписание можно переопределить переменной JOB_SCHEDULE_<NAME>."""
+
+        env_name = f"{JOB_SCHEDULE_ENV_PREFIX}{name.upper()}"
+        spec = (os.getenv(env_name) or "").strip()
+        schedule = None
+        if spec:
+            try:
+                schedule = parse_schedule(spec)
+            except ValueError:
+                logger.error("invalid job schedule override env=%s value=%r, using default", env_name, spec)
+        return cls(name=name, run=run, schedule=schedule or parse_schedule(default_schedule), **kwargs)
+
+
+@dataclass
+class JobMetrics:
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    skipped: int = 0
+    last_status: str | None = None
+    last_duration_sec: float = 0.0
+    max_duration_sec: float = 0.0
+    total_duration_sec: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "last_status": self.last_status,
+            "last_duration_sec": round(self.last_duration_sec, 3),
+            "max_duration_sec": round(self.max_duration_sec, 3),
+            "avg_duration_sec": round(self.total_duration_sec / self.runs, 3) if self.runs else 0.0,
+        }
+
+
+class JobStateStore(ABC):
+    """Хранилище состояния задач: время следующего запуска, lease выполнения и итог последнего запуска."""
+
+    @abstractmethod
+    def load(self, job_name: str) -> dict[str, Any] | None:
+        """Вернуть строку состояния задачи или None, если её ещё нет."""
+
+    @abstractmethod
+    def ensure(self, job_name: str, next_run_at: datetime) -> dict[str, Any]:
+        """Вернуть строку состояния, создав её с `next_run_at`, если задачи ещё нет."""
+
+    @abstractmethod
+    def claim(self, job_name: str, *, due_at: Any, next_run_at: datetime, running_until: datetime, now: datetime) -> bool:
+        """Атомарно забрать запуск `due_at`: False, если его уже взял другой процесс или идёт прошлый запуск."""
+
+    @abstractmethod
+    def finish(self, job_name: str, *, status: str, finished_at: datetime, duration_sec: float, error: str | None) -> None:
+        """Снять lease и записать итог запуска."""
+
+    @abstractmethod
+    def add_history(self, row: dict[str, Any]) -> None:
+        """Добавить строку в историю запусков."""
+
+
+class InMemoryJobStateStore(JobStateStore):
+    """Состояние в памяти процесса: для тестов и работы без Supabase (не переживает рестарт)."""
+
+    def __init__(self) -> None:
+        self.rows: dict[str, dict[str, Any]] = {}
+        self.history: list[dict[str, Any]] = []
+
+    def load(self, job_name: str) -> dict[str, Any] | None:
+        row = self.rows.get(job_name)
+        return dict(row) if row else None
+
+    def ensure(self, job_name: str, next_run_at: datetime) -> dict[str, Any]:
+        row = self.rows.setdefault(job_name, {"job_name": job_name, "next_run_at": _utc_iso(next_run_at), "running_until": None})
+        return dict(row)
+
+    def claim(self, job_name: str, *, due_at: Any, next_run_at: datetime, running_until: datetime, now: datetime) -> bool:
+        row = self.rows.get(job_name)
+        if row is None or row.get("next_run_at") != due_at:
+            return False
+        busy_until = _parse_utc(row.get("running_until"))
+        if busy_until is not None and busy_until >= now:
+            return False
+        row.update(
+            next_run_at=_utc_iso(next_run_at),
+            running_until=_utc_iso(running_until),
+            last_started_at=_utc_iso(now),
+            last_owner_id=PROCESS_LOCK_OWNER_ID,
+        )
+        return True
+
+    def finish(self, job_name: str, *, status: str, finished_at: datetime, duration_sec: float, error: str | None) -> None:
+        row = self.rows.setdefault(job_name, {"job_name": job_name})
+        row.update(
+            running_until=None,
+            last_finished_at=_utc_iso(finished_at),
+            last_status=status,
+            last_duration_ms=int(duration_sec * 1000),
+            last_error=error,
+        )
+
+    def add_history(self, row: dict[str, Any]) -> None:
+        self.history.append(dict(row))
+
+
+class SupabaseJobStateStore(JobStateStore):
+    """Состояние в таблицах `bot_scheduled_jobs`/`bot_job_run_history` (sql/p17_job_scheduler.sql)."""
+
+    def __init__(self, supabase_provider: Callable[[], Any] | None = None) -> None:
+        self._supabase_provider = supabase_provider or (lambda: db.supabase)
+
+    def _table(self, name: str):
+        supabase = self._supabase_provider()
+        if supabase is None:
+            raise RuntimeError("supabase client is not initialized")
+        return supabase.table(name)
+
+    def load(self, job_name: str) -> dict[str, Any] | None:
+        response = self._table(JOB_STATE_TABLE).select("*").eq("job_name", job_name).limit(1).execute()
+        return (response.data or [None])[0]
+
+    def ensure(self, job_name: str, next_run_at: datetime) -> dict[str, Any]:
+        self._table(JOB_STATE_TABLE).upsert(
+            {"job_name": job_name, "next_run_at": _utc_iso(next_run_at)},
+            on_conflict="job_name",
+            ignore_duplicates=True,
+        ).execute()
+        row = self.load(job_name)
+        if row is None:
+            raise RuntimeError(f"job state row missing after upsert job_name={job_name}")
+        return row
+
+    def claim(self, job_name: str, *, due_at: Any, next_run_at: datetime, running_until: datetime, now: datetime) -> bool:
+        # Условный UPDATE: сравнение next_run_at отсекает повторный запуск того же слота
+        # другим процессом, running_until — наложение на ещё не завершённый запуск.
+        response = (
+            self._table(JOB_STATE_TABLE)
+            .update(
+                {
+                    "next_run_at": _utc_iso(next_run_at),
+                    "running_until": _utc_iso(running_until),
+                    "last_started_at": _utc_iso(now),
+                    "last_owner_id": PROCESS_LOCK_OWNER_ID,
+                    "updated_at": _utc_iso(now),
+                }
+            )
+            .eq("job_name", job_name)
+            .eq("next_run_at", due_at)
+            .or_(f"running_until.is.null,running_until.lt.{_utc_iso(now)}")
+            .execute()
+        )
+        return bool(response.data)
+
+    def finish(self, job_name: str, *, status: str, finished_at: datetime, duration_sec: float, error: str | None) -> None:
+        self._table(JOB_STATE_TABLE).update(
+            {
+                "running_until": None,
+                "last_finished_at": _utc_iso(finished_at),
+                "last_status": status,
+                "last_duration_ms": int(duration_sec * 1000),
+                "last_error": error,
+                "updated_at": _utc_iso(finished_at),
+            }
+        ).eq("job_name", job_name).execute()
+
+    def add_history(self, row: dict[str, Any]) -> None:
+        self._table(JOB_HISTORY_TABLE).insert(row).execute()
+
+
+def default_job_state_store() -> JobStateStore:
+    if db.supabase is None:
+        logger.warning("job scheduler state is not durable: supabase missing, using in-memory store")
+        return InMemoryJobStateStore()
+    return SupabaseJobStateStore()
+
+
+class JobScheduler:
+    """Запускает зарегистрированные задачи по расписанию, каждую в отдельной asyncio-задаче."""
+
+    def __init__(
+        self,
+        store: JobStateStore | None = None,
+        *,
+        jitter_seconds: float | None = None,
+        stagger_seconds: float | None = None,
+        clock: Callable[[], datetime] | None = None,
+    ) -> None:
+        self.store = store or default_job_state_store()
+        self.jitter_seconds = _env_float(JOB_SCHEDULER_JITTER_SEC_ENV, DEFAULT_JOB_JITTER_SEC) if jitter_seconds is None else jitter_seconds
+        self.stagger_seconds = (
+            _env_float(JOB_SCHEDULER_STAGGER_SEC_ENV, DEFAULT_JOB_STAGGER_SEC) if stagger_seconds is None else stagger_seconds
+        )
+        self._clock = clock or (lambda: datetime.now(timezone.utc))
+        self.jobs: dict[str, ScheduledJob] = {}
+        self.metrics: dict[str, JobMetrics] = {}
+
+    def register(self, job: ScheduledJob) -> None:
+        if job.name in self.jobs:
+            raise ValueError(f"job already registered: {job.name}")
+        self.jobs[job.name] = job
+        self.metrics[job.name] = JobMetrics()
+
+    def metrics_snapshot(self) -> dict[str, dict[str, Any]]:
+        return {name: metrics.as_dict() for name, metrics in self.metrics.items()}
+
+    def _jitter(self, job: ScheduledJob) -> float:
+        limit = self.jitter_seconds if job.jitter_seconds is None else job.jitter_seconds
+        return random.uniform(0, limit) if limit > 0 else 0.0
+
+    async def _io(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await run_blocking_io(f"job_scheduler.{name}", func, *args, logger=logger, **kwargs)
+
+    async def ensure_state(self, job: ScheduledJob, index: int) -> dict[str, Any]:
+        # Новая задача стартует со сдвигом по индексу, чтобы задачи не били в Supabase одновременно.
+        first_run_at = self._clock() + timedelta(seconds=index * self.stagger_seconds + self._jitter(job))
+        return await self._io(f"{job.name}.ensure", self.store.ensure, job.name, first_run_at)
+
+    async def run_due(self, job: ScheduledJob, due_at: Any) -> str | None:
+        """Claim and run one occurrence. Returns run status or None when another process took it."""
+
+        metrics = self.metrics[job.name]
+        now = self._clock()
+        next_run_at = job.schedule.next_after(now) + timedelta(seconds=self._jitter(job))
+        running_until = now + timedelta(seconds=job.max_runtime_seconds)
+        claimed = await self._io(
+            f"{job.name}.claim",
+            self.store.claim,
+            job.name,
+            due_at=due_at,
+            next_run_at=next_run_at,
+            running_until=running_until,
+            now=now,
+        )
+        if not claimed:
+            metrics.skipped += 1
+            logger.info("scheduled job skipped: occurrence claimed elsewhere or still running job_name=%s due_at=%s", job.name, due_at)
+            return None
+
+        started = time.perf_counter()
+        error: str | None = None
+        try:
+            await asyncio.wait_for(job.run(), timeout=job.max_runtime_seconds)
+            status = STATUS_SUCCESS
+        except asyncio.TimeoutError:
+            status = STATUS_TIMEOUT
+            error = f"exceeded max_runtime_seconds={job.max_runtime_seconds:g}"
+            metrics.timeouts += 1
+            logger.error("scheduled job timed out job_name=%s max_runtime_sec=%s", job.name, job.max_runtime_seconds)
+        except Exception as exc:
+            status = STATUS_FAILED
+            error = f"{type(exc).__name__}: {exc}"[:500]
+            metrics.failures += 1
+            logger.exception("scheduled job failed job_name=%s", job.name)
+        duration = time.perf_counter() - started
+        finished_at = self._clock()
+
+        metrics.runs += 1
+        metrics.last_status = status
+        metrics.last_duration_sec = duration
+        metrics.max_duration_sec = max(metrics.max_duration_sec, duration)
+        metrics.total_duration_sec += duration
+        _job_duration_seconds.observe(duration, job=job.name, status=status)
+        logger.info(
+            "scheduled job finished job_name=%s status=%s duration_ms=%s next_run_at=%s",
+            job.name,
+            status,
+            int(duration * 1000),
+            _utc_iso(next_run_at),
+        )
+
+        await self._io(
+            f"{job.name}.finish",
+            self.store.finish,
+            job.name,
+            status=status,
+            finished_at=finished_at,
+            duration_sec=duration,
+            error=error,
+        )
+        if job.record_history:
+            await self._io(
+                f"{job.name}.history",
+                self.store.add_history,
+                {
+                    "job_name": job.name,
+                    "owner_id": PROCESS_LOCK_OWNER_ID,
+                    "started_at": _utc_iso(now),
+                    "finished_at": _utc_iso(finished_at),
+                    "status": status,
+                    "duration_ms": int(duration * 1000),
+                    "error": error,
+                },
+            )
+        return status
+
+    def _skipped_claim_delay(self, state: dict[str, Any] | None, due_at: Any, backoff: float) -> tuple[float, float]:
+        """Пауза перед повтором claim и новое значение backoff после того, как слот не удалось забрать."""
+
+        if state is None or state.get("next_run_at") != due_at:
+            # Слот забрал другой процесс и сдвинул расписание: дальше обычное ожидание next_run_at.
+            return 0.0, 0.0
+        backoff = min(max(backoff * 2, CLAIM_RETRY_MIN_SEC), CLAIM_RETRY_MAX_SEC)
+        busy_until = _parse_utc(state.get("running_until"))
+        lease_wait = (busy_until - self._clock()).total_seconds() if busy_until is not None else 0.0
+        if lease_wait > 0:
+            # Идёт запуск другого владельца (или он упал, не сняв lease): ждём истечения lease, а не бьём в хранилище.
+            return min(lease_wait + CLAIM_RETRY_MIN_SEC, 300.0), backoff
+        return backoff, backoff
+
+    async def _job_loop(self, job: ScheduledJob, index: int) -> None:
+        state: dict[str, Any] | None = None
+        claim_backoff = 0.0
+        while True:
+            try:
+                if state is None:
+                    state = await self.ensure_state(job, index)
+
+                due_at = state.get("next_run_at")
+                due_moment = _parse_utc(due_at) or self._clock()
+                delay = (due_moment - self._clock()).total_seconds()
+                if delay > 0:
+                    # Просыпаемся не реже раза в 5 минут: расписание могли сдвинуть другие процессы.
+                    await asyncio.sleep(min(delay, 300.0))
+                    state = await self._io(f"{job.name}.load", self.store.load, job.name)
+                    continue
+
+                status = await self.run_due(job, due_at)
+                state = await self._io(f"{job.name}.load", self.store.load, job.name)
+                if status is not None:
+                    claim_backoff = 0.0
+                    continue
+                retry_delay, claim_backoff = self._skipped_claim_delay(state, due_at, claim_backoff)
+                if retry_delay > 0:
+                    await asyncio.sleep(retry_delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Ошибка хранилища не должна останавливать задачу: повторяем после паузы.
+                logger.exception("job scheduler state error job_name=%s", job.name)
+                state = None
+                await asyncio.sleep(60.0)
+
+    async def run_forever(self) -> None:
+        tasks = [
+            asyncio.create_task(self._job_loop(job, index), name=f"scheduled_job:{job.name}")
+            for index, job in enumerate(self.jobs.values())
+        ]
+        logger.info("job scheduler started jobs=%s", ",".join(self.jobs))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
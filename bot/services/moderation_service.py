@@ -8,7 +8,7 @@
 import logging
 import re
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 from uuid import uuid4
 
 from bot.data import db
@@ -33,6 +33,18 @@ class ModerationService:
     ACTION_FINE_POINTS = "fine_points"
     ACTION_BANK_INCOME = "bank_income"
     DEFAULT_WARN_TTL_MINUTES = 10 * 24 * 60
+    CASES_PAGE_MAX_LIMIT = 20
+    # Кейс в pending дольше этого срока считается брошенным (процесс упал посреди commit_case).
+    CASE_RECOVERY_AGE_SECONDS = 600
+    # Шаги с побочными эффектами: после каждого журнал commit_steps сохраняется в строке кейса.
+    _JOURNALED_STEPS = (
+        "warn_update",
+        "mute_apply",
+        "ban_apply",
+        "demotion_apply",
+        "fine_apply",
+        "bank_income_apply",
+    )
     _ACTION_PRIORITY = {
         ACTION_MUTE: 1,
         ACTION_KICK: 2,
@@ -46,6 +58,8 @@ class ModerationService:
     STATUS_FAILED = "failed"
     STATUS_ROLLED_BACK = "rolled_back"
     STATUS_DUPLICATE = "duplicate"
+    # Кейс забран на компенсацию одним владельцем (commit_case или восстановление).
+    STATUS_ROLLING_BACK = "rolling_back"
     FINE_PAYMENT_MODE_INSTANT = "instant"
     FINE_PAYMENT_MODE_MANUAL = "manual"
     FINE_PAYMENT_MODE_LEGACY = "legacy"
@@ -636,46 +650,90 @@ class ModerationService:
 
     @staticmethod
     def list_recent_cases(account_id: str, limit: int = 5, cursor: str | None = None) -> dict[str, Any]:
-        safe_limit = max(1, min(int(limit or 5), 20))
-        case_rows = ModerationService._select_many("moderation_cases", account_id=account_id)
-        case_rows.sort(
-            key=lambda row: (
-                ModerationService._parse_dt(row.get("created_at")) or datetime.min.replace(tzinfo=timezone.utc),
-                str(row.get("id") or ""),
-            ),
-            reverse=True,
-        )
-
-        if cursor:
-            cursor_ts, _, cursor_id = str(cursor).partition("|")
-            cursor_dt = ModerationService._parse_dt(cursor_ts)
-            filtered: list[dict[str, Any]] = []
-            for row in case_rows:
-                row_dt = ModerationService._parse_dt(row.get("created_at")) or datetime.min.replace(tzinfo=timezone.utc)
-                if cursor_dt and row_dt > cursor_dt:
-                    continue
-                if cursor_dt and row_dt == cursor_dt and str(row.get("id") or "") >= cursor_id:
-                    continue
-                filtered.append(row)
-            case_rows = filtered
-
-        items: list[dict[str, Any]] = []
-        for row in case_rows[:safe_limit]:
-            actions = ModerationService._select_many("moderation_actions", case_id=row.get("id"))
-            actions.sort(key=lambda item: ModerationService._parse_dt(item.get("created_at")) or datetime.min.replace(tzinfo=timezone.utc))
-            items.append(
-                {
-                    "case": dict(row),
-                    "actions": [dict(action) for action in actions],
-                }
+        """One page of cases (newest first) with their actions in two queries.
+
+        Cursor is `created_at|id` of the last case on the previous page; the keyset filter and
+        ordering run in the database, so page cost does not grow with the account history.
+        """
+        safe_limit = max(1, min(int(limit or 5), ModerationService.CASES_PAGE_MAX_LIMIT))
+        keyset_filter = ModerationService._case_keyset_filter(cursor) if cursor else None
+        if cursor and keyset_filter is None:
+            return {"items": [], "next_cursor": None, "limit": safe_limit}
+
+        def _cases_query():
+            query = db.supabase.table("moderation_cases").select("*").eq("account_id", account_id)
+            if keyset_filter:
+                query = query.or_(keyset_filter)
+            # limit + 1: лишняя строка только сообщает, что есть следующая страница.
+            return query.order("created_at", desc=True).order("id", desc=True).limit(safe_limit + 1)
+
+        case_rows = ModerationService._select_query("moderation_cases", _cases_query, account_id=account_id, cursor=cursor)
+        page_rows = case_rows[:safe_limit]
+
+        actions_by_case: dict[str, list[dict[str, Any]]] = {}
+        case_ids = [row.get("id") for row in page_rows if row.get("id") is not None]
+        if case_ids:
+            action_rows = ModerationService._select_query(
+                "moderation_actions",
+                lambda: db.supabase.table("moderation_actions")
+                .select("*")
+                .in_("case_id", case_ids)
+                .order("created_at")
+                .order("id"),
+                case_ids=case_ids,
             )
+            for action in action_rows:
+                actions_by_case.setdefault(str(action.get("case_id")), []).append(action)
 
+        items = [
+            {"case": dict(row), "actions": [dict(action) for action in actions_by_case.get(str(row.get("id")), [])]}
+            for row in page_rows
+        ]
         next_cursor = None
         if len(case_rows) > safe_limit and items:
             last_case = items[-1]["case"]
             next_cursor = f"{last_case.get('created_at') or ''}|{last_case.get('id') or ''}"
         return {"items": items, "next_cursor": next_cursor, "limit": safe_limit}
 
+    @staticmethod
+    def _case_keyset_filter(cursor: str) -> str | None:
+        cursor_ts, _, cursor_id = str(cursor).partition("|")
+        if not ModerationService._parse_dt(cursor_ts):
+            logger.warning("moderation cases cursor rejected cursor=%s", cursor)
+            return None
+        # Значения в кавычках: в ISO-времени есть ':' и '+', которые иначе ломают разбор or-фильтра PostgREST.
+        quoted_ts = f'"{cursor_ts.strip()}"'
+        if not cursor_id.strip():
+            return f"created_at.lt.{quoted_ts}"
+        return f'created_at.lt.{quoted_ts},and(created_at.eq.{quoted_ts},id.lt."{cursor_id.strip()}")'
+
+    @staticmethod
+    def _select_query(table: str, build_query: Callable[[], Any], **log_fields: Any) -> list[dict]:
+        """Run a prepared read query with the same missing-table handling as `_select_many`."""
+        if not db.supabase:
+            logger.error("moderation select query skipped: supabase is not initialized table=%s", table)
+            return []
+        if hasattr(db, "tables") and table not in getattr(db, "tables", {}):
+            logger.warning("moderation select query skipped missing fake table=%s fields=%s", table, log_fields)
+            return []
+
+        try:
+            response = build_query().execute()
+            return [dict(row) for row in (response.data or [])]
+        except Exception as exc:
+            if ModerationService._is_missing_table_error(exc):
+                ModerationService._mark_table_missing(table)
+                logger.error(
+                    "moderation select query failed missing table=%s fields=%s error=%s. "
+                    "Create table in DB or refresh schema cache.",
+                    table,
+                    log_fields,
+                    exc,
+                )
+                return []
+            logger.exception("moderation select query failed table=%s fields=%s error=%s", table, log_fields, exc)
+            return []
+
     @staticmethod
     def get_user_moderation_snapshot(
         account_id: str,
@@ -1391,6 +1449,44 @@ class ModerationService:
             or "участник чата" in normalized_titles
         )
 
+    @staticmethod
+    def _plan_demotion(account_id: str, *, case_id: Any = None) -> tuple[str, str, list[str]]:
+        """Ступень понижения и новый список званий; RuntimeError, если понижать некуда."""
+        before_titles = AccountsService.get_account_titles(account_id)
+        demotion_transition = ModerationService._resolve_demotion_transition(before_titles)
+        if not demotion_transition:
+            logger.error(
+                "moderation demotion apply failed: transition not found account_id=%s current_titles=%s case_id=%s",
+                account_id,
+                before_titles,
+                case_id,
+            )
+            raise RuntimeError("Не удалось определить ступень понижения")
+        demotion_from, demotion_to = demotion_transition
+        updated_titles: list[str] = []
+        removed_source = False
+        already_has_target = False
+        for title in before_titles:
+            normalized = normalize_protected_profile_title(title)
+            if normalized == demotion_from:
+                removed_source = True
+                continue
+            if normalized == demotion_to:
+                already_has_target = True
+            updated_titles.append(title)
+        if not removed_source:
+            logger.error(
+                "moderation demotion apply failed: source title not present account_id=%s source=%s titles=%s case_id=%s",
+                account_id,
+                demotion_from,
+                before_titles,
+                case_id,
+            )
+            raise RuntimeError("Не удалось выполнить понижение: исходное звание отсутствует")
+        if not already_has_target:
+            updated_titles.append(demotion_to[:1].upper() + demotion_to[1:])
+        return demotion_from, demotion_to, updated_titles
+
     @staticmethod
     def _apply_staff_escalation_override(
         actions: list[str],
@@ -1934,7 +2030,7 @@ class ModerationService:
         }
 
     @staticmethod
-    def _save_warn_state(
+    def _warn_state_payloads(
         *,
         account_id: str,
         violation_type_id: Any,
@@ -1942,9 +2038,9 @@ class ModerationService:
         global_warn_count_after: int,
         case_id: Any,
         updated_at: str,
-        has_prior_warns: bool = True,
-        has_prior_mutes: bool = False,
-    ) -> dict[str, Any]:
+        has_prior_warns: bool,
+        has_prior_mutes: bool,
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
         payload_by_violation = {
             "account_id": account_id,
             "violation_type_id": violation_type_id,
@@ -1953,6 +2049,40 @@ class ModerationService:
             "updated_at": updated_at,
             "last_warn_refresh_at": updated_at,
         }
+        global_payload = {
+            "account_id": account_id,
+            "active_warn_count": global_warn_count_after,
+            "last_violation_type_id": violation_type_id,
+            "last_case_id": case_id,
+            "updated_at": updated_at,
+            "last_warn_refresh_at": updated_at,
+            "has_prior_warns": has_prior_warns,
+            "has_prior_mutes": has_prior_mutes,
+        }
+        return payload_by_violation, global_payload
+
+    @staticmethod
+    def _save_warn_state(
+        *,
+        account_id: str,
+        violation_type_id: Any,
+        per_violation_warn_count_after: int,
+        global_warn_count_after: int,
+        case_id: Any,
+        updated_at: str,
+        has_prior_warns: bool = True,
+        has_prior_mutes: bool = False,
+    ) -> dict[str, Any]:
+        payload_by_violation, global_payload = ModerationService._warn_state_payloads(
+            account_id=account_id,
+            violation_type_id=violation_type_id,
+            per_violation_warn_count_after=per_violation_warn_count_after,
+            global_warn_count_after=global_warn_count_after,
+            case_id=case_id,
+            updated_at=updated_at,
+            has_prior_warns=has_prior_warns,
+            has_prior_mutes=has_prior_mutes,
+        )
         existing_state = ModerationService._select_single(
             "moderation_warn_state_by_violation",
             account_id=account_id,
@@ -1967,16 +2097,6 @@ class ModerationService:
             return updated_rows[0] if updated_rows else payload_by_violation
 
         inserted = ModerationService._insert_row("moderation_warn_state_by_violation", payload_by_violation)
-        global_payload = {
-            "account_id": account_id,
-            "active_warn_count": global_warn_count_after,
-            "last_violation_type_id": violation_type_id,
-            "last_case_id": case_id,
-            "updated_at": updated_at,
-            "last_warn_refresh_at": updated_at,
-            "has_prior_warns": has_prior_warns,
-            "has_prior_mutes": has_prior_mutes,
-        }
         existing_global = ModerationService._select_single("moderation_warn_state", account_id=account_id)
         if existing_global:
             ModerationService._update_rows("moderation_warn_state", {"account_id": account_id}, global_payload)
@@ -2015,7 +2135,31 @@ class ModerationService:
         ends_at: str | None = None,
         created_at: str,
     ) -> Optional[dict]:
-        payload = {
+        payload = ModerationService._action_payload(
+            case_id=case_id,
+            action_type=action_type,
+            op_key=op_key,
+            value_numeric=value_numeric,
+            value_text=value_text,
+            starts_at=starts_at,
+            ends_at=ends_at,
+            created_at=created_at,
+        )
+        return ModerationService._insert_row("moderation_actions", payload)
+
+    @staticmethod
+    def _action_payload(
+        *,
+        case_id: Any,
+        action_type: str,
+        op_key: str | None = None,
+        value_numeric: float | int | None = None,
+        value_text: str | None = None,
+        starts_at: str | None = None,
+        ends_at: str | None = None,
+        created_at: str,
+    ) -> dict[str, Any]:
+        return {
             "case_id": case_id,
             "action_type": action_type,
             "value_numeric": value_numeric,
@@ -2025,7 +2169,6 @@ class ModerationService:
             "created_at": created_at,
             "op_key": op_key,
         }
-        return ModerationService._insert_row("moderation_actions", payload)
 
     @staticmethod
     def _build_result(
@@ -2112,14 +2255,69 @@ class ModerationService:
         fine_applied: bool,
         bank_income_applied: bool,
         completed_steps: list[str],
+        case_fine_row: dict[str, Any] | None = None,
+        fine_uncertain: bool = False,
+        bank_income_uncertain: bool = False,
     ) -> tuple[str, list[str], list[str]]:
         rolled_back: list[str] = []
         dirty_state: list[str] = []
         rollback_status = ModerationService.STATUS_ROLLED_BACK
 
+        apply_bank_delta = getattr(db, "apply_bank_delta", None)
+        if bank_income_uncertain and not bank_income_applied and fine_points > 0:
+            if callable(apply_bank_delta):
+                # Как со штрафом: повтор с тем же op_key не зачислит второй раз, после него зачисление можно вернуть.
+                bank_income_applied = bool(
+                    apply_bank_delta(
+                        fine_points,
+                        f"Moderation case #{case_row.get('id') if case_row else 'unknown'} recovery",
+                        account_id=target_subject.get("account_id"),
+                        op_key=f"{op_key}:bank_income",
+                    )
+                )
+            if not bank_income_applied:
+                # Без идемпотентного примитива неизвестно, прошло ли зачисление.
+                dirty_state.append("bank_income_apply")
+                logger.error(
+                    "moderation rollback bank income outcome unknown case_id=%s op_key=%s amount=%s",
+                    case_row.get("id") if case_row else None,
+                    op_key,
+                    fine_points,
+                )
+
+        if fine_uncertain and fine_points > 0 and not fine_applied:
+            # Повтор с тем же op_key не спишет второй раз, зато после него штраф точно применён и его можно вернуть.
+            fine_applied = bool(
+                db.add_action_by_account(
+                    target_subject["account_id"],
+                    -fine_points,
+                    f"Moderation case #{case_row.get('id') if case_row else 'unknown'} recovery",
+                    actor_subject["account_id"],
+                    op_key=f"{op_key}:fine_points",
+                )
+            )
+            if not fine_applied:
+                dirty_state.append("fine_apply")
+
+        if case_fine_row:
+            if ModerationService._cancel_case_fine_debt(case_fine_row, op_key=op_key):
+                rolled_back.append("case_fine_create")
+            else:
+                dirty_state.append("case_fine_create")
+
         if bank_income_applied and fine_points > 0:
             rollback_bank_reason = f"Rollback bank income for moderation case #{case_row.get('id') if case_row else 'unknown'} op_key={op_key}"
-            if db.add_to_bank(-fine_points):
+            if callable(apply_bank_delta):
+                bank_reverted = apply_bank_delta(
+                    -fine_points,
+                    rollback_bank_reason,
+                    account_id=target_subject.get("account_id"),
+                    op_key=f"{op_key}:rollback:bank_income",
+                    allow_overdraft=True,
+                )
+            else:
+                bank_reverted = db.add_to_bank(-fine_points)
+            if bank_reverted:
                 rolled_back.append("bank_income_apply")
                 logger.info(
                     "✅ moderation rollback bank income reverted case_id=%s op_key=%s amount=%s",
@@ -2184,9 +2382,14 @@ class ModerationService:
 
         if case_row:
             case_status = ModerationService.STATUS_ROLLED_BACK if not dirty_state else ModerationService.STATUS_FAILED
+            # Забранный на откат кейс закрывает только владелец: из rolling_back, а не из любого статуса.
+            claimed = str(case_row.get("status") or "").strip().lower() == ModerationService.STATUS_ROLLING_BACK
+            case_filters = {"id": case_row.get("id")}
+            if claimed:
+                case_filters["status"] = ModerationService.STATUS_ROLLING_BACK
             updated_case = ModerationService._update_rows(
                 "moderation_cases",
-                {"id": case_row.get("id")},
+                case_filters,
                 {
                     "status": case_status,
                     "rollback_status": "ok" if not dirty_state else "manual_review_required",
@@ -2195,6 +2398,9 @@ class ModerationService:
                     "updated_at": datetime.now(timezone.utc).isoformat(),
                 },
             )
+            if not updated_case and claimed:
+                current_case = ModerationService._select_single("moderation_cases", id=case_row.get("id")) or {}
+                updated_case = str(current_case.get("status") or "").strip().lower() == case_status
             if not updated_case:
                 dirty_state.append("finalize_case")
 
@@ -2228,6 +2434,337 @@ class ModerationService:
         )
         return rollback_status, rolled_back, dirty_state
 
+    @staticmethod
+    def _cancel_case_fine_debt(case_fine_row: dict[str, Any], *, op_key: str) -> bool:
+        canceled_at = datetime.now(timezone.utc).isoformat()
+        ok = True
+        if case_fine_row.get("id") is not None:
+            ok = bool(
+                ModerationService._update_rows(
+                    "moderation_case_fines",
+                    {"id": case_fine_row.get("id")},
+                    {"status": "canceled", "updated_at": canceled_at, "rollback_op_key": op_key},
+                )
+            )
+        legacy_fine_id = case_fine_row.get("legacy_fine_id")
+        if legacy_fine_id is not None:
+            if ModerationService._update_rows("fines", {"id": legacy_fine_id}, {"is_canceled": True}):
+                cached_fine = db.get_fine_by_id(int(legacy_fine_id))
+                if cached_fine:
+                    cached_fine["is_canceled"] = True
+            else:
+                ok = False
+        return ok
+
+    @staticmethod
+    def _journal_case_steps(case_id: Any, completed_steps: list[str]) -> None:
+        """Persist completed steps so a crashed commit can be compensated by `recover_stale_pending_cases`."""
+        if not ModerationService._update_rows(
+            "moderation_cases",
+            {"id": case_id},
+            {"commit_steps": ", ".join(completed_steps), "updated_at": datetime.now(timezone.utc).isoformat()},
+        ):
+            logger.warning("moderation case journal write failed case_id=%s steps=%s", case_id, completed_steps)
+
+    @staticmethod
+    def _claim_case_for_rollback(case_row: dict[str, Any]) -> bool:
+        """Take exclusive ownership of compensating a case: pending -> rolling_back in one conditional update.
+
+        Only the process whose update matched the row compensates its steps. A `rolling_back` case whose
+        claimant died is re-claimed by comparing `updated_at`. Returns False when another process owns or
+        already finished the case, and on a DB error: the case then stays pending for the stale recovery.
+        """
+        case_id = case_row.get("id")
+        current_status = str(case_row.get("status") or ModerationService.STATUS_PENDING).strip().lower()
+        if current_status == ModerationService.STATUS_PENDING:
+            filters = {"id": case_id, "status": ModerationService.STATUS_PENDING}
+        elif current_status == ModerationService.STATUS_ROLLING_BACK:
+            filters = {"id": case_id, "status": ModerationService.STATUS_ROLLING_BACK, "updated_at": case_row.get("updated_at")}
+        else:
+            return False
+        claimed_at = datetime.now(timezone.utc).isoformat()
+        claimed = ModerationService._update_rows(
+            "moderation_cases",
+            filters,
+            {"status": ModerationService.STATUS_ROLLING_BACK, "rollback_status": "started", "updated_at": claimed_at},
+        )
+        if claimed:
+            case_row.update(status=ModerationService.STATUS_ROLLING_BACK, updated_at=claimed_at)
+            return True
+        # UPDATE мог пройти с пустым ответом: владелец тот, чья метка updated_at осталась в строке.
+        current = ModerationService._select_single("moderation_cases", id=case_id) or {}
+        owned = (
+            str(current.get("status") or "").strip().lower() == ModerationService.STATUS_ROLLING_BACK
+            and ModerationService._parse_dt(current.get("updated_at")) == ModerationService._parse_dt(claimed_at)
+        )
+        if owned:
+            case_row.update(status=ModerationService.STATUS_ROLLING_BACK, updated_at=current.get("updated_at"))
+        return owned
+
+    @staticmethod
+    def recover_stale_pending_cases(
+        *,
+        older_than_seconds: int | None = None,
+        limit: int = 50,
+    ) -> dict[str, int]:
+        """Compensate cases left in pending by a crashed or timed-out `commit_case`.
+
+        Mutes, bans and case fines are found by case_id; points fine and bank income are reverted
+        when the case journal (`commit_steps`) shows them applied. A step journaled as `<step>:started`
+        may or may not have happened: the fine and bank income are re-applied with their op_keys and
+        then reverted; without `db.apply_bank_delta` bank income is left for manual review.
+        """
+        age_seconds = ModerationService.CASE_RECOVERY_AGE_SECONDS if older_than_seconds is None else older_than_seconds
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=max(0, age_seconds))).isoformat()
+        stale_rows = ModerationService._select_query(
+            "moderation_cases",
+            lambda: db.supabase.table("moderation_cases")
+            .select("*")
+            .eq("status", ModerationService.STATUS_PENDING)
+            .lt("created_at", cutoff)
+            .order("created_at")
+            .limit(max(1, int(limit))),
+            status=ModerationService.STATUS_PENDING,
+            cutoff=cutoff,
+        )
+        # Владелец отката упал посреди компенсации: кейс перезабирается по устаревшей метке updated_at.
+        stale_rows += ModerationService._select_query(
+            "moderation_cases",
+            lambda: db.supabase.table("moderation_cases")
+            .select("*")
+            .eq("status", ModerationService.STATUS_ROLLING_BACK)
+            .lt("updated_at", cutoff)
+            .order("updated_at")
+            .limit(max(1, int(limit))),
+            status=ModerationService.STATUS_ROLLING_BACK,
+            cutoff=cutoff,
+        )
+        totals = {"found": len(stale_rows), "recovered": 0, "manual_review": 0, "skipped": 0}
+        for case_row in stale_rows:
+            if not ModerationService._claim_case_for_rollback(case_row):
+                totals["skipped"] += 1
+                continue
+            case_id = case_row.get("id")
+            op_key = str(case_row.get("op_key") or "")
+            plan = case_row.get("commit_plan") if isinstance(case_row.get("commit_plan"), dict) else {}
+            steps = [step.strip() for step in str(case_row.get("commit_steps") or "").split(",") if step.strip()]
+            fine_points = float(plan.get("fine_points") or 0)
+            manual_fine = plan.get("fine_payment_mode") == ModerationService.FINE_PAYMENT_MODE_MANUAL
+            active_mutes = [
+                row
+                for row in ModerationService._select_many("moderation_mutes", case_id=case_id)
+                if ModerationService._is_truthy(row.get("is_active"))
+            ]
+            active_bans = [
+                row
+                for row in ModerationService._select_many("moderation_bans", case_id=case_id)
+                if ModerationService._is_truthy(row.get("is_active"))
+            ]
+            case_fines = [
+                row
+                for row in ModerationService._select_many("moderation_case_fines", source_case_id=case_id)
+                if str(row.get("status") or "").strip().lower() not in {"canceled", "cancelled", "paid"}
+            ]
+            rollback_status, _, dirty_state = ModerationService._rollback_case(
+                provider=str(case_row.get("source_platform") or "unknown"),
+                chat_id=case_row.get("source_chat_id"),
+                actor_subject={"account_id": case_row.get("actor_account_id")},
+                target_subject={"account_id": case_row.get("account_id")},
+                violation_code=str(plan.get("violation_code") or case_row.get("violation_type_id") or ""),
+                selected_actions=list(plan.get("selected_actions") or []),
+                selected_rule_id=case_row.get("penalty_rule_id"),
+                case_row=case_row,
+                op_key=op_key,
+                warn_state_before=dict(plan.get("warn_state_before") or {}),
+                warn_changed="warn_update" in steps,
+                mute_row=active_mutes[0] if active_mutes else None,
+                ban_row=active_bans[0] if active_bans else None,
+                fine_points=fine_points,
+                fine_applied="fine_apply" in steps and not manual_fine,
+                bank_income_applied="bank_income_apply" in steps,
+                completed_steps=steps,
+                case_fine_row=case_fines[0] if case_fines else None,
+                fine_uncertain="fine_apply:started" in steps and not manual_fine,
+                bank_income_uncertain="bank_income_apply:started" in steps,
+            )
+            totals["manual_review" if dirty_state else "recovered"] += 1
+            logger.warning(
+                "moderation stale pending case recovered case_id=%s op_key=%s steps=%s rollback_status=%s",
+                case_id,
+                op_key,
+                steps,
+                rollback_status,
+            )
+        if stale_rows:
+            logger.info("moderation stale case recovery completed %s", " ".join(f"{k}={v}" for k, v in totals.items()))
+        return totals
+
+    @staticmethod
+    def _case_commit_plan(
+        *,
+        rule: dict[str, Any],
+        context: dict[str, Any],
+        violation_code: str,
+        selected_actions: list[str],
+        target_account_id: str,
+        actor_account_id: str,
+        violation_type_id: Any,
+        op_key: str,
+        now: datetime,
+        warn_count_before: int,
+        warn_count_after: int,
+        global_warn_after: int,
+        warn_state_before: dict[str, Any],
+    ) -> dict[str, Any]:
+        """План для RPC commit_moderation_case: те же строки, что пишет пошаговый путь, без case_id.
+
+        case_id, тексты с номером кейса и итоговые счётчики проставляет SQL-функция внутри транзакции.
+        """
+        created_at = now.isoformat()
+        reason_text = str(context.get("reason_text") or context.get("reason") or "")
+        user_reason = reason_text or str(rule.get("description_for_user") or violation_code)
+        fine_points = float(rule.get("fine_points") or 0)
+        fine_payment_mode = ModerationService._fine_payment_mode(rule)
+        plan: dict[str, Any] = {}
+
+        def _action(action_type: str, **fields: Any) -> dict[str, Any]:
+            return ModerationService._action_payload(case_id=None, action_type=action_type, op_key=op_key, created_at=created_at, **fields)
+
+        if ModerationService.ACTION_WARN in selected_actions:
+            warn_ttl_minutes = ModerationService._rule_warn_ttl_minutes(rule)
+            state_by_violation, state_global = ModerationService._warn_state_payloads(
+                account_id=target_account_id,
+                violation_type_id=violation_type_id,
+                per_violation_warn_count_after=warn_count_after,
+                global_warn_count_after=global_warn_after,
+                case_id=None,
+                updated_at=created_at,
+                has_prior_warns=True,
+                has_prior_mutes=ModerationService._is_truthy(warn_state_before.get("has_prior_mutes")),
+            )
+            plan["warn"] = {
+                "action": _action(
+                    ModerationService.ACTION_WARN,
+                    value_numeric=ModerationService._rule_warn_increment(rule),
+                    value_text=rule.get("description_for_admin") or reason_text or violation_code,
+                    starts_at=created_at,
+                    ends_at=(now + timedelta(minutes=warn_ttl_minutes)).isoformat() if warn_ttl_minutes > 0 else None,
+                ),
+                "state_by_violation": state_by_violation,
+                "state_global": state_global,
+            }
+
+        mute_minutes = int(rule.get("mute_minutes") or 0)
+        mute_until = None
+        if ModerationService.ACTION_MUTE in selected_actions and mute_minutes > 0:
+            mute_until = (now + timedelta(minutes=mute_minutes)).isoformat()
+            plan["mute"] = {
+                "row": {
+                    "account_id": target_account_id,
+                    "reason_text": user_reason,
+                    "starts_at": created_at,
+                    "ends_at": mute_until,
+                    "is_active": True,
+                    "created_at": created_at,
+                    "op_key": op_key,
+                },
+                "action": _action(ModerationService.ACTION_MUTE, value_numeric=mute_minutes, value_text=user_reason, starts_at=created_at, ends_at=mute_until),
+                "history": {"account_id": target_account_id, "updated_at": created_at, "last_warn_refresh_at": created_at, "has_prior_mutes": True},
+            }
+
+        ban_until = None
+        if ModerationService.ACTION_BAN in selected_actions:
+            ban_minutes = ModerationService._rule_ban_minutes(rule)
+            ban_until = (now + timedelta(minutes=ban_minutes)).isoformat() if ban_minutes > 0 else None
+            plan["ban"] = {
+                "row": {
+                    "account_id": target_account_id,
+                    "reason_text": user_reason,
+                    "starts_at": created_at,
+                    "ends_at": ban_until,
+                    "is_active": True,
+                    "created_at": created_at,
+                    "op_key": op_key,
+                },
+                "action": _action(
+                    ModerationService.ACTION_BAN,
+                    value_numeric=ban_minutes if ban_minutes > 0 else None,
+                    value_text=user_reason,
+                    starts_at=created_at,
+                    ends_at=ban_until,
+                ),
+            }
+
+        if ModerationService.ACTION_KICK in selected_actions:
+            plan["kick"] = {"action": _action(ModerationService.ACTION_KICK, value_text=user_reason, starts_at=created_at)}
+
+        if ModerationService.ACTION_DEMOTION in selected_actions:
+            demotion_from, demotion_to, updated_titles = ModerationService._plan_demotion(target_account_id)
+            plan["demotion"] = {
+                "from": demotion_from,
+                "to": demotion_to,
+                "titles": list(dict.fromkeys(title.strip() for title in updated_titles if title.strip())),
+                "titles_source": "moderation_case_demotion",
+                "action": _action(
+                    ModerationService.ACTION_DEMOTION,
+                    value_text=f"{demotion_from} -> {demotion_to}; reason={user_reason}",
+                    starts_at=created_at,
+                ),
+            }
+
+        fine_applied = False
+        if ModerationService.ACTION_FINE_POINTS in selected_actions and fine_points > 0:
+            fine_plan: dict[str, Any] = {
+                "amount": fine_points,
+                "payment_mode": fine_payment_mode,
+                "reason_text": reason_text or violation_code,
+                "author_account_id": actor_account_id,
+                "action": _action(ModerationService.ACTION_FINE_POINTS, value_numeric=fine_points, starts_at=created_at),
+            }
+            if fine_payment_mode == ModerationService.FINE_PAYMENT_MODE_MANUAL:
+                try:
+                    due_at = (datetime.fromisoformat(created_at) + timedelta(days=14)).isoformat()
+                except ValueError:
+                    due_at = (datetime.now(timezone.utc) + timedelta(days=14)).isoformat()
+                fine_plan["legacy_fine"] = {
+                    "account_id": target_account_id,
+                    "author_account_id": actor_account_id,
+                    "amount": fine_points,
+                    "type": 1,
+                    "due_date": due_at,
+                }
+                fine_plan["case_fine"] = {
+                    "account_id": target_account_id,
+                    "status": "pending",
+                    "amount_total": fine_points,
+                    "amount_paid": 0.0,
+                    "due_date": due_at,
+                    "payment_mode": ModerationService.FINE_PAYMENT_MODE_MANUAL,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+            else:
+                fine_applied = True
+                plan["bank_income"] = {
+                    "amount": fine_points,
+                    "reason_text": reason_text or violation_code,
+                    "action": _action(ModerationService.ACTION_BANK_INCOME, value_numeric=fine_points, starts_at=created_at),
+                }
+            plan["fine"] = fine_plan
+
+        plan["finalize"] = {
+            "status": ModerationService.STATUS_APPLIED,
+            "applied_actions": ", ".join(selected_actions),
+            "warnings_before": warn_count_before,
+            "warnings_after": warn_count_after,
+            "mute_until": mute_until,
+            "ban_applied": ModerationService.ACTION_BAN in selected_actions,
+            "ban_until": ban_until,
+            "fine_points_applied": fine_points if fine_applied else 0,
+            "updated_at": created_at,
+        }
+        return plan
+
     @staticmethod
     def commit_case(
         provider: str,
@@ -2255,8 +2792,8 @@ class ModerationService:
         ui_payload["moderation_op_key"] = moderation_op_key
         selected_actions = list(ui_payload.get("selected_actions") or [])
         chat_id = context.get("chat_id") or context.get("source_chat_id")
-        existing_case = ModerationService._select_single("moderation_cases", op_key=moderation_op_key)
-        if existing_case:
+
+        def _duplicate_result(existing_case: dict[str, Any]) -> dict[str, Any]:
             existing_status = str(existing_case.get("status") or "").strip().lower() or ModerationService.STATUS_APPLIED
             existing_action_rows = ModerationService._select_many("moderation_actions", case_id=existing_case.get("id"))
             result_ui_payload = dict(ui_payload)
@@ -2309,6 +2846,10 @@ class ModerationService:
                 case_status=existing_status,
             )
 
+        existing_case = ModerationService._select_single("moderation_cases", op_key=moderation_op_key)
+        if existing_case:
+            return _duplicate_result(existing_case)
+
         now = datetime.now(timezone.utc)
         created_at = now.isoformat()
         warn_state_before = ModerationService._load_warn_state(str(target_subject["account_id"]), violation_type["id"])
@@ -2324,8 +2865,20 @@ class ModerationService:
             "created_at": created_at,
             "op_key": moderation_op_key,
             "status": ModerationService.STATUS_PENDING,
+            # Снимок для recover_stale_pending_cases: чем откатывать, если процесс упадёт посреди кейса.
+            "commit_plan": {
+                "violation_code": str(violation_type.get("code") or violation_code),
+                "selected_actions": selected_actions,
+                "fine_points": float(rule.get("fine_points") or 0),
+                "fine_payment_mode": ModerationService._fine_payment_mode(rule),
+                "warn_state_before": {
+                    key: warn_state_before.get(key)
+                    for key in ("active_warn_count", "last_violation_type_id", "last_case_id", "has_prior_warns", "has_prior_mutes")
+                },
+            },
         }
         moderation_case = None
+        case_fine_row = None
         applied_actions: list[dict[str, Any]] = []
         mute_row = None
         ban_row = None
@@ -2343,443 +2896,539 @@ class ModerationService:
         completed_steps: list[str] = []
         current_step = "authority_check"
         rollback_status = "not_required"
-        try:
-            ModerationService._log_case_event(
-                "info",
-                message="moderation case apply started",
-                provider=provider,
-                chat_id=chat_id,
-                actor_account_id=actor_subject.get("account_id"),
-                target_account_id=target_subject.get("account_id"),
-                violation_code=str(violation_type.get("code") or violation_code),
-                requested_action_set=selected_actions,
-                selected_rule_id=rule.get("id"),
-                case_id=None,
-                op_key=moderation_op_key,
-                status=ModerationService.STATUS_PENDING,
-                error_code=None,
-                rollback_status=rollback_status,
-                step=current_step,
-            )
-            completed_steps.append(current_step)
-            current_step = "rule_selection"
-            completed_steps.append(current_step)
-
-            current_step = "case_insert"
-            moderation_case = ModerationService._insert_row("moderation_cases", case_payload)
-            if not moderation_case:
-                raise RuntimeError("Не удалось создать moderation-case")
-            ui_payload["case_id"] = moderation_case.get("id")
-            completed_steps.append(current_step)
-
-            if ModerationService.ACTION_WARN in selected_actions:
-                current_step = "create_moderation_actions"
-                warn_expires_at = (now + timedelta(minutes=warn_ttl_minutes)).isoformat() if warn_ttl_minutes > 0 else None
-                warn_action = ModerationService._create_action(
-                    case_id=moderation_case["id"],
-                    action_type=ModerationService.ACTION_WARN,
+        atomic_outcome = None
+        commit_moderation_case = getattr(db, "commit_moderation_case", None)
+        if callable(commit_moderation_case):
+            # Основной путь: кейс, действия и все наказания одной SQL-транзакцией (sql/p26).
+            # Сага ниже с журналом шагов и recover_stale_pending_cases — только для базы без этой функции.
+            current_step = "case_commit"
+            try:
+                commit_plan = ModerationService._case_commit_plan(
+                    rule=rule,
+                    context=context,
+                    violation_code=violation_code,
+                    selected_actions=selected_actions,
+                    target_account_id=str(target_subject["account_id"]),
+                    actor_account_id=str(actor_subject["account_id"]),
+                    violation_type_id=violation_type["id"],
                     op_key=moderation_op_key,
-                    value_numeric=warn_increment,
-                    value_text=rule.get("description_for_admin") or str(context.get("reason_text") or context.get("reason") or violation_code),
-                    starts_at=created_at,
-                    ends_at=warn_expires_at,
-                    created_at=created_at,
+                    now=now,
+                    warn_count_before=warn_count_before,
+                    warn_count_after=warn_count_after,
+                    global_warn_after=global_warn_after,
+                    warn_state_before=warn_state_before,
                 )
-                if not warn_action:
-                    raise RuntimeError("Не удалось создать warn action")
-                applied_actions.append(warn_action)
-                completed_steps.append(current_step)
-
-                current_step = "warn_update"
-                warn_state = ModerationService._save_warn_state(
-                    account_id=target_subject["account_id"],
-                    violation_type_id=violation_type["id"],
-                    per_violation_warn_count_after=warn_count_after,
-                    global_warn_count_after=global_warn_after,
-                    case_id=moderation_case["id"],
-                    updated_at=created_at,
-                    has_prior_warns=True,
-                    has_prior_mutes=ModerationService._is_truthy(warn_state_before.get("has_prior_mutes")),
+            except Exception as exc:
+                current_step = "demotion_apply"
+                atomic_outcome = {"status": ModerationService.STATUS_FAILED, "case": None, "actions": [], "error": str(exc)}
+            else:
+                atomic_outcome = commit_moderation_case(case_payload, commit_plan)
+
+        if atomic_outcome is not None:
+            atomic_status = str(atomic_outcome.get("status") or "").strip().lower()
+            if atomic_status == ModerationService.STATUS_DUPLICATE:
+                return _duplicate_result(dict(atomic_outcome.get("case") or {}))
+            if atomic_status != ModerationService.STATUS_APPLIED:
+                error_code = f"{current_step}_failed"
+                ModerationService._log_case_event(
+                    "error",
+                    message="moderation case apply failed",
+                    provider=provider,
+                    chat_id=chat_id,
+                    actor_account_id=actor_subject.get("account_id"),
+                    target_account_id=target_subject.get("account_id"),
+                    violation_code=str(violation_type.get("code") or violation_code),
+                    requested_action_set=selected_actions,
+                    selected_rule_id=rule.get("id"),
+                    case_id=None,
+                    op_key=moderation_op_key,
+                    status=ModerationService.STATUS_FAILED,
+                    error_code=error_code,
+                    rollback_status=rollback_status,
+                    step=current_step,
                 )
-                if not warn_state:
-                    raise RuntimeError("Не удалось обновить состояние предупреждений")
-                logger.info(
-                    "moderation apply counters account_id=%s violation_type_id=%s per_violation_before=%s per_violation_after=%s global_warn_before=%s global_warn_after=%s rule_id=%s case_id=%s op_key=%s",
-                    target_subject.get("account_id"),
-                    violation_type.get("id"),
-                    warn_count_before,
-                    warn_count_after,
-                    global_warn_before,
-                    global_warn_after,
-                    rule.get("id"),
-                    moderation_case.get("id"),
+                logger.error(
+                    "moderation case apply exception step=%s op_key=%s error=%s",
+                    current_step,
                     moderation_op_key,
+                    atomic_outcome.get("error"),
                 )
-                warn_changed = True
-                completed_steps.append(current_step)
-
-            mute_minutes = int(rule.get("mute_minutes") or 0)
-            if ModerationService.ACTION_MUTE in selected_actions and mute_minutes > 0:
-                current_step = "mute_apply"
-                mute_until = (now + timedelta(minutes=mute_minutes)).isoformat()
-                mute_reason = str(context.get("reason_text") or context.get("reason") or rule.get("description_for_user") or violation_code)
-                mute_row = ModerationService._insert_row(
-                    "moderation_mutes",
-                    {
-                        "account_id": target_subject["account_id"],
-                        "case_id": moderation_case["id"],
-                        "reason_text": mute_reason,
-                        "starts_at": created_at,
-                        "ends_at": mute_until,
-                        "is_active": True,
-                        "created_at": created_at,
-                        "op_key": moderation_op_key,
-                    },
-                )
-                if not mute_row:
-                    raise RuntimeError("Не удалось применить мут")
-                mute_action = ModerationService._create_action(
-                    case_id=moderation_case["id"],
-                    action_type=ModerationService.ACTION_MUTE,
+                return ModerationService._build_result(
+                    ok=False,
+                    provider=provider,
+                    actor_subject=actor_subject,
+                    target_subject=target_subject,
+                    violation_code=str(violation_type.get("code") or violation_code),
+                    selected_actions=selected_actions,
                     op_key=moderation_op_key,
-                    value_numeric=mute_minutes,
-                    value_text=mute_reason,
-                    starts_at=created_at,
-                    ends_at=mute_until,
-                    created_at=created_at,
+                    status=ModerationService.STATUS_FAILED,
+                    error_code=error_code,
+                    user_message=ModerationService.FRIENDLY_ERROR_MESSAGE,
+                    moderator_message=f"Кейс модерации не применён: шаг сбоя {current_step}, транзакция отменена целиком, наказания не выданы.",
+                    ui_payload=ui_payload,
+                    rule=rule,
+                    violation_type=violation_type,
+                    warnings_before=warn_count_before,
+                    warnings_after=warn_count_before,
+                    authority=authority,
+                    rollback_status=rollback_status,
                 )
-                if not mute_action:
-                    raise RuntimeError("Не удалось создать mute action")
-                applied_actions.append(mute_action)
-                ModerationService._remember_mute_history(target_subject["account_id"], created_at)
-                completed_steps.append(current_step)
-
-            if ModerationService.ACTION_BAN in selected_actions:
-                current_step = "ban_apply"
-                ban_reason = str(context.get("reason_text") or context.get("reason") or rule.get("description_for_user") or violation_code)
-                ban_until = (now + timedelta(minutes=ban_minutes)).isoformat() if ban_minutes > 0 else None
-                ban_row = ModerationService._insert_row(
-                    "moderation_bans",
-                    {
-                        "account_id": target_subject["account_id"],
-                        "case_id": moderation_case["id"],
-                        "reason_text": ban_reason,
-                        "starts_at": created_at,
-                        "ends_at": ban_until,
-                        "is_active": True,
-                        "created_at": created_at,
-                        "op_key": moderation_op_key,
-                    },
-                )
-                if not ban_row:
-                    raise RuntimeError("Не удалось применить бан")
-                ban_action = ModerationService._create_action(
-                    case_id=moderation_case["id"],
-                    action_type=ModerationService.ACTION_BAN,
+            moderation_case = dict(atomic_outcome["case"])
+            applied_actions = list(atomic_outcome.get("actions") or [])
+            finalize_payload = commit_plan["finalize"]
+            mute_until = finalize_payload["mute_until"]
+            ban_until = finalize_payload["ban_until"]
+            fine_applied = bool(finalize_payload["fine_points_applied"])
+            ui_payload["case_id"] = moderation_case.get("id")
+            demotion_plan = commit_plan.get("demotion")
+            if demotion_plan:
+                ui_payload["demotion_transition_from"] = demotion_plan["from"]
+                ui_payload["demotion_transition_to"] = demotion_plan["to"]
+                AccountsService.forget_account_titles(str(target_subject["account_id"]))
+        else:
+            try:
+                ModerationService._log_case_event(
+                    "info",
+                    message="moderation case apply started",
+                    provider=provider,
+                    chat_id=chat_id,
+                    actor_account_id=actor_subject.get("account_id"),
+                    target_account_id=target_subject.get("account_id"),
+                    violation_code=str(violation_type.get("code") or violation_code),
+                    requested_action_set=selected_actions,
+                    selected_rule_id=rule.get("id"),
+                    case_id=None,
                     op_key=moderation_op_key,
-                    value_numeric=ban_minutes if ban_minutes > 0 else None,
-                    value_text=ban_reason,
-                    starts_at=created_at,
-                    ends_at=ban_until,
-                    created_at=created_at,
+                    status=ModerationService.STATUS_PENDING,
+                    error_code=None,
+                    rollback_status=rollback_status,
+                    step=current_step,
                 )
-                if not ban_action:
-                    raise RuntimeError("Не удалось создать ban action")
-                applied_actions.append(ban_action)
+                completed_steps.append(current_step)
+                current_step = "rule_selection"
                 completed_steps.append(current_step)
 
-            if ModerationService.ACTION_KICK in selected_actions:
-                current_step = "kick_apply"
-                kick_action = ModerationService._create_action(
-                    case_id=moderation_case["id"],
-                    action_type=ModerationService.ACTION_KICK,
-                    op_key=moderation_op_key,
-                    value_text=str(context.get("reason_text") or context.get("reason") or rule.get("description_for_user") or violation_code),
-                    starts_at=created_at,
-                    created_at=created_at,
-                )
-                if not kick_action:
-                    raise RuntimeError("Не удалось создать kick action")
-                applied_actions.append(kick_action)
+                current_step = "case_insert"
+                moderation_case = ModerationService._insert_row("moderation_cases", case_payload)
+                if not moderation_case:
+                    # Уникальный индекс по op_key: параллельная отправка того же кейса уже вставила строку.
+                    concurrent_case = ModerationService._select_single("moderation_cases", op_key=moderation_op_key)
+                    if concurrent_case:
+                        return _duplicate_result(concurrent_case)
+                    raise RuntimeError("Не удалось создать moderation-case")
+                ui_payload["case_id"] = moderation_case.get("id")
                 completed_steps.append(current_step)
 
-            if ModerationService.ACTION_DEMOTION in selected_actions:
-                current_step = "demotion_apply"
-                before_titles = AccountsService.get_account_titles(str(target_subject["account_id"]))
-                demotion_transition = ModerationService._resolve_demotion_transition(before_titles)
-                if not demotion_transition:
-                    logger.error(
-                        "moderation demotion apply failed: transition not found account_id=%s current_titles=%s case_id=%s",
-                        target_subject["account_id"],
-                        before_titles,
-                        moderation_case["id"],
-                    )
-                    raise RuntimeError("Не удалось определить ступень понижения")
-                demotion_from, demotion_to = demotion_transition
-                updated_titles: list[str] = []
-                removed_source = False
-                already_has_target = False
-                for title in before_titles:
-                    normalized = normalize_protected_profile_title(title)
-                    if normalized == demotion_from:
-                        removed_source = True
-                        continue
-                    if normalized == demotion_to:
-                        already_has_target = True
-                    updated_titles.append(title)
-                if not removed_source:
-                    logger.error(
-                        "moderation demotion apply failed: source title not present account_id=%s source=%s titles=%s case_id=%s",
-                        target_subject["account_id"],
-                        demotion_from,
-                        before_titles,
-                        moderation_case["id"],
-                    )
-                    raise RuntimeError("Не удалось выполнить понижение: исходное звание отсутствует")
-                if not already_has_target:
-                    updated_titles.append(demotion_to[:1].upper() + demotion_to[1:])
-                if not AccountsService.save_account_titles(
-                    str(target_subject["account_id"]),
-                    updated_titles,
-                    source="moderation_case_demotion",
-                ):
-                    logger.error(
-                        "moderation demotion apply failed: save_account_titles returned false account_id=%s from=%s to=%s case_id=%s",
-                        target_subject["account_id"],
-                        demotion_from,
-                        demotion_to,
-                        moderation_case["id"],
+                if ModerationService.ACTION_WARN in selected_actions:
+                    current_step = "create_moderation_actions"
+                    warn_expires_at = (now + timedelta(minutes=warn_ttl_minutes)).isoformat() if warn_ttl_minutes > 0 else None
+                    warn_action = ModerationService._create_action(
+                        case_id=moderation_case["id"],
+                        action_type=ModerationService.ACTION_WARN,
+                        op_key=moderation_op_key,
+                        value_numeric=warn_increment,
+                        value_text=rule.get("description_for_admin") or str(context.get("reason_text") or context.get("reason") or violation_code),
+                        starts_at=created_at,
+                        ends_at=warn_expires_at,
+                        created_at=created_at,
                     )
-                    raise RuntimeError("Не удалось сохранить новое звание после понижения")
-                demotion_action = ModerationService._create_action(
-                    case_id=moderation_case["id"],
-                    action_type=ModerationService.ACTION_DEMOTION,
-                    op_key=moderation_op_key,
-                    value_text=(
-                        f"{demotion_from} -> {demotion_to}; "
-                        f"reason={context.get('reason_text') or context.get('reason') or rule.get('description_for_user') or violation_code}"
-                    ),
-                    starts_at=created_at,
-                    created_at=created_at,
-                )
-                if not demotion_action:
-                    raise RuntimeError("Не удалось создать demotion action")
-                applied_actions.append(demotion_action)
-                ui_payload["demotion_transition_from"] = demotion_from
-                ui_payload["demotion_transition_to"] = demotion_to
-                completed_steps.append(current_step)
+                    if not warn_action:
+                        raise RuntimeError("Не удалось создать warn action")
+                    applied_actions.append(warn_action)
+                    completed_steps.append(current_step)
 
-            if ModerationService.ACTION_FINE_POINTS in selected_actions and fine_points > 0:
-                current_step = "fine_apply"
-                fine_reason = f"Модерация кейс #{moderation_case['id']}: {context.get('reason_text') or context.get('reason') or violation_code}"
-                bank_reason = f"Поступление штрафа moderation case #{moderation_case['id']} op_key={moderation_op_key}: {context.get('reason_text') or context.get('reason') or violation_code}"
-                if fine_payment_mode == ModerationService.FINE_PAYMENT_MODE_MANUAL:
-                    case_fine_row = ModerationService._create_case_fine_debt(
+                    current_step = "warn_update"
+                    warn_state = ModerationService._save_warn_state(
                         account_id=target_subject["account_id"],
-                        actor_account_id=actor_subject["account_id"],
+                        violation_type_id=violation_type["id"],
+                        per_violation_warn_count_after=warn_count_after,
+                        global_warn_count_after=global_warn_after,
                         case_id=moderation_case["id"],
-                        amount_total=fine_points,
-                        reason_text=fine_reason,
-                        created_at_iso=created_at,
+                        updated_at=created_at,
+                        has_prior_warns=True,
+                        has_prior_mutes=ModerationService._is_truthy(warn_state_before.get("has_prior_mutes")),
                     )
-                    if not case_fine_row:
-                        raise RuntimeError("Не удалось создать штраф к оплате")
-                else:
-                    if not db.add_action_by_account(
-                        target_subject["account_id"],
-                        -fine_points,
-                        fine_reason,
-                        actor_subject["account_id"],
-                        op_key=f"{moderation_op_key}:fine_points",
-                    ):
-                        logger.error(
-                            "❌ moderation fine apply failed case_id=%s op_key=%s target_account_id=%s amount=%s",
-                            moderation_case["id"],
-                            moderation_op_key,
-                            target_subject["account_id"],
-                            fine_points,
-                        )
-                        raise RuntimeError("Не удалось применить денежный штраф")
-                    fine_applied = True
-                fine_action = ModerationService._create_action(
-                    case_id=moderation_case["id"],
-                    action_type=ModerationService.ACTION_FINE_POINTS,
-                    op_key=moderation_op_key,
-                    value_numeric=fine_points,
-                    value_text=f"{fine_reason} payment_mode={fine_payment_mode}",
-                    starts_at=created_at,
-                    created_at=created_at,
-                )
-                if not fine_action:
-                    logger.error(
-                        "❌ moderation fine action create failed case_id=%s op_key=%s amount=%s",
-                        moderation_case["id"],
+                    if not warn_state:
+                        raise RuntimeError("Не удалось обновить состояние предупреждений")
+                    logger.info(
+                        "moderation apply counters account_id=%s violation_type_id=%s per_violation_before=%s per_violation_after=%s global_warn_before=%s global_warn_after=%s rule_id=%s case_id=%s op_key=%s",
+                        target_subject.get("account_id"),
+                        violation_type.get("id"),
+                        warn_count_before,
+                        warn_count_after,
+                        global_warn_before,
+                        global_warn_after,
+                        rule.get("id"),
+                        moderation_case.get("id"),
                         moderation_op_key,
-                        fine_points,
                     )
-                    raise RuntimeError("Не удалось создать fine_points action")
-                applied_actions.append(fine_action)
-                completed_steps.append(current_step)
+                    warn_changed = True
+                    completed_steps.append(current_step)
+                    ModerationService._journal_case_steps(moderation_case["id"], completed_steps)
+
+                mute_minutes = int(rule.get("mute_minutes") or 0)
+                if ModerationService.ACTION_MUTE in selected_actions and mute_minutes > 0:
+                    current_step = "mute_apply"
+                    mute_until = (now + timedelta(minutes=mute_minutes)).isoformat()
+                    mute_reason = str(context.get("reason_text") or context.get("reason") or rule.get("description_for_user") or violation_code)
+                    mute_row = ModerationService._insert_row(
+                        "moderation_mutes",
+                        {
+                            "account_id": target_subject["account_id"],
+                            "case_id": moderation_case["id"],
+                            "reason_text": mute_reason,
+                            "starts_at": created_at,
+                            "ends_at": mute_until,
+                            "is_active": True,
+                            "created_at": created_at,
+                            "op_key": moderation_op_key,
+                        },
+                    )
+                    if not mute_row:
+                        raise RuntimeError("Не удалось применить мут")
+                    mute_action = ModerationService._create_action(
+                        case_id=moderation_case["id"],
+                        action_type=ModerationService.ACTION_MUTE,
+                        op_key=moderation_op_key,
+                        value_numeric=mute_minutes,
+                        value_text=mute_reason,
+                        starts_at=created_at,
+                        ends_at=mute_until,
+                        created_at=created_at,
+                    )
+                    if not mute_action:
+                        raise RuntimeError("Не удалось создать mute action")
+                    applied_actions.append(mute_action)
+                    ModerationService._remember_mute_history(target_subject["account_id"], created_at)
+                    completed_steps.append(current_step)
+                    ModerationService._journal_case_steps(moderation_case["id"], completed_steps)
+
+                if ModerationService.ACTION_BAN in selected_actions:
+                    current_step = "ban_apply"
+                    ban_reason = str(context.get("reason_text") or context.get("reason") or rule.get("description_for_user") or violation_code)
+                    ban_until = (now + timedelta(minutes=ban_minutes)).isoformat() if ban_minutes > 0 else None
+                    ban_row = ModerationService._insert_row(
+                        "moderation_bans",
+                        {
+                            "account_id": target_subject["account_id"],
+                            "case_id": moderation_case["id"],
+                            "reason_text": ban_reason,
+                            "starts_at": created_at,
+                            "ends_at": ban_until,
+                            "is_active": True,
+                            "created_at": created_at,
+                            "op_key": moderation_op_key,
+                        },
+                    )
+                    if not ban_row:
+                        raise RuntimeError("Не удалось применить бан")
+                    ban_action = ModerationService._create_action(
+                        case_id=moderation_case["id"],
+                        action_type=ModerationService.ACTION_BAN,
+                        op_key=moderation_op_key,
+                        value_numeric=ban_minutes if ban_minutes > 0 else None,
+                        value_text=ban_reason,
+                        starts_at=created_at,
+                        ends_at=ban_until,
+                        created_at=created_at,
+                    )
+                    if not ban_action:
+                        raise RuntimeError("Не удалось создать ban action")
+                    applied_actions.append(ban_action)
+                    completed_steps.append(current_step)
+                    ModerationService._journal_case_steps(moderation_case["id"], completed_steps)
 
-                if fine_payment_mode == ModerationService.FINE_PAYMENT_MODE_INSTANT:
-                    current_step = "bank_income_apply"
-                    if not db.add_to_bank(fine_points):
-                        logger.error(
-                            "❌ moderation bank income apply failed case_id=%s op_key=%s amount=%s",
-                            moderation_case["id"],
-                            moderation_op_key,
-                            fine_points,
-                        )
-                        raise RuntimeError("Не удалось зачислить штраф в банк")
-                    bank_income_applied = True
+                if ModerationService.ACTION_KICK in selected_actions:
+                    current_step = "kick_apply"
+                    kick_action = ModerationService._create_action(
+                        case_id=moderation_case["id"],
+                        action_type=ModerationService.ACTION_KICK,
+                        op_key=moderation_op_key,
+                        value_text=str(context.get("reason_text") or context.get("reason") or rule.get("description_for_user") or violation_code),
+                        starts_at=created_at,
+                        created_at=created_at,
+                    )
+                    if not kick_action:
+                        raise RuntimeError("Не удалось создать kick action")
+                    applied_actions.append(kick_action)
                     completed_steps.append(current_step)
 
-                    current_step = "bank_income_log"
-                    log_bank_income_by_account = getattr(db, "log_bank_income_by_account", None)
-                    bank_logged = False
-                    if callable(log_bank_income_by_account):
-                        bank_logged = bool(log_bank_income_by_account(target_subject["account_id"], fine_points, bank_reason))
-                    else:
-                        provider_user_id = target_subject.get("provider_user_id")
-                        if provider_user_id is not None:
-                            try:
-                                bank_logged = bool(db.log_bank_income(int(provider_user_id), fine_points, bank_reason))
-                            except (TypeError, ValueError):
-                                logger.error(
-                                    "❌ moderation bank income fallback log failed invalid provider_user_id case_id=%s op_key=%s provider_user_id=%s",
-                                    moderation_case["id"],
-                                    moderation_op_key,
-                                    provider_user_id,
-                                )
-                    if not bank_logged:
+                if ModerationService.ACTION_DEMOTION in selected_actions:
+                    current_step = "demotion_apply"
+                    demotion_from, demotion_to, updated_titles = ModerationService._plan_demotion(
+                        str(target_subject["account_id"]),
+                        case_id=moderation_case["id"],
+                    )
+                    if not AccountsService.save_account_titles(
+                        str(target_subject["account_id"]),
+                        updated_titles,
+                        source="moderation_case_demotion",
+                    ):
                         logger.error(
-                            "❌ moderation bank income log failed case_id=%s op_key=%s target_account_id=%s amount=%s",
-                            moderation_case["id"],
-                            moderation_op_key,
+                            "moderation demotion apply failed: save_account_titles returned false account_id=%s from=%s to=%s case_id=%s",
                             target_subject["account_id"],
-                            fine_points,
+                            demotion_from,
+                            demotion_to,
+                            moderation_case["id"],
                         )
-                        raise RuntimeError("Не удалось записать поступление штрафа в банк")
+                        raise RuntimeError("Не удалось сохранить новое звание после понижения")
+                    demotion_action = ModerationService._create_action(
+                        case_id=moderation_case["id"],
+                        action_type=ModerationService.ACTION_DEMOTION,
+                        op_key=moderation_op_key,
+                        value_text=(
+                            f"{demotion_from} -> {demotion_to}; "
+                            f"reason={context.get('reason_text') or context.get('reason') or rule.get('description_for_user') or violation_code}"
+                        ),
+                        starts_at=created_at,
+                        created_at=created_at,
+                    )
+                    if not demotion_action:
+                        raise RuntimeError("Не удалось создать demotion action")
+                    applied_actions.append(demotion_action)
+                    ui_payload["demotion_transition_from"] = demotion_from
+                    ui_payload["demotion_transition_to"] = demotion_to
                     completed_steps.append(current_step)
-
-                    current_step = "bank_income_action"
-                    bank_action = ModerationService._create_action(
+                    ModerationService._journal_case_steps(moderation_case["id"], completed_steps)
+
+                if ModerationService.ACTION_FINE_POINTS in selected_actions and fine_points > 0:
+                    current_step = "fine_apply"
+                    fine_reason = f"Модерация кейс #{moderation_case['id']}: {context.get('reason_text') or context.get('reason') or violation_code}"
+                    bank_reason = f"Поступление штрафа moderation case #{moderation_case['id']} op_key={moderation_op_key}: {context.get('reason_text') or context.get('reason') or violation_code}"
+                    if fine_payment_mode == ModerationService.FINE_PAYMENT_MODE_MANUAL:
+                        case_fine_row = ModerationService._create_case_fine_debt(
+                            account_id=target_subject["account_id"],
+                            actor_account_id=actor_subject["account_id"],
+                            case_id=moderation_case["id"],
+                            amount_total=fine_points,
+                            reason_text=fine_reason,
+                            created_at_iso=created_at,
+                        )
+                        if not case_fine_row:
+                            raise RuntimeError("Не удалось создать штраф к оплате")
+                    else:
+                        ModerationService._journal_case_steps(moderation_case["id"], [*completed_steps, "fine_apply:started"])
+                        if not db.add_action_by_account(
+                            target_subject["account_id"],
+                            -fine_points,
+                            fine_reason,
+                            actor_subject["account_id"],
+                            op_key=f"{moderation_op_key}:fine_points",
+                        ):
+                            logger.error(
+                                "❌ moderation fine apply failed case_id=%s op_key=%s target_account_id=%s amount=%s",
+                                moderation_case["id"],
+                                moderation_op_key,
+                                target_subject["account_id"],
+                                fine_points,
+                            )
+                            raise RuntimeError("Не удалось применить денежный штраф")
+                        fine_applied = True
+                    fine_action = ModerationService._create_action(
                         case_id=moderation_case["id"],
-                        action_type=ModerationService.ACTION_BANK_INCOME,
+                        action_type=ModerationService.ACTION_FINE_POINTS,
                         op_key=moderation_op_key,
                         value_numeric=fine_points,
-                        value_text=bank_reason,
+                        value_text=f"{fine_reason} payment_mode={fine_payment_mode}",
                         starts_at=created_at,
                         created_at=created_at,
                     )
-                    if not bank_action:
+                    if not fine_action:
                         logger.error(
-                            "❌ moderation bank income action create failed case_id=%s op_key=%s amount=%s",
+                            "❌ moderation fine action create failed case_id=%s op_key=%s amount=%s",
                             moderation_case["id"],
                             moderation_op_key,
                             fine_points,
                         )
-                        raise RuntimeError("Не удалось привязать поступление штрафа к истории кейса")
-                    applied_actions.append(bank_action)
+                        raise RuntimeError("Не удалось создать fine_points action")
+                    applied_actions.append(fine_action)
                     completed_steps.append(current_step)
-
-            current_step = "finalize_case"
-            finalized_case_rows = ModerationService._update_rows(
-                "moderation_cases",
-                {"id": moderation_case["id"]},
-                {
-                    "status": ModerationService.STATUS_APPLIED,
-                    "applied_actions": ", ".join(selected_actions),
-                    "warnings_before": warn_count_before,
-                    "warnings_after": warn_count_after,
-                    "mute_until": mute_until,
-                    "ban_applied": ModerationService.ACTION_BAN in selected_actions,
-                    "ban_until": ban_until,
-                    "fine_points_applied": fine_points if fine_applied else 0,
-                    "updated_at": datetime.now(timezone.utc).isoformat(),
-                },
-            )
-            if not finalized_case_rows:
-                raise RuntimeError("Не удалось зафиксировать итоговый статус кейса")
-            moderation_case = finalized_case_rows[0]
-            completed_steps.append(current_step)
-        except Exception as exc:
-            error_code = f"{current_step}_failed"
-            ModerationService._log_case_event(
-                "exception",
-                message="moderation case apply failed",
-                provider=provider,
-                chat_id=chat_id,
-                actor_account_id=actor_subject.get("account_id"),
-                target_account_id=target_subject.get("account_id"),
-                violation_code=str(violation_type.get("code") or violation_code),
-                requested_action_set=selected_actions,
-                selected_rule_id=rule.get("id"),
-                case_id=moderation_case.get("id") if moderation_case else None,
-                op_key=moderation_op_key,
-                status=ModerationService.STATUS_FAILED,
-                error_code=error_code,
-                rollback_status="started",
-                step=current_step,
-            )
-            rollback_status, rolled_back_steps, dirty_state = ModerationService._rollback_case(
-                provider=provider,
-                chat_id=chat_id,
-                actor_subject=actor_subject,
-                target_subject=target_subject,
-                violation_code=str(violation_type.get("code") or violation_code),
-                selected_actions=selected_actions,
-                selected_rule_id=rule.get("id"),
-                case_row=moderation_case,
-                op_key=moderation_op_key,
-                warn_state_before=warn_state_before,
-                warn_changed=warn_changed,
-                mute_row=mute_row,
-                ban_row=ban_row,
-                fine_points=fine_points,
-                fine_applied=fine_applied,
-                bank_income_applied=bank_income_applied,
-                completed_steps=completed_steps,
-            )
-            moderator_message = (
-                f"Кейс модерации не завершён. Шаг сбоя: {current_step}. "
-                f"Rollback: {rollback_status}. Успешные шаги: {', '.join(completed_steps) or 'нет'}."
-            )
-            logger.error(
-                "moderation case apply exception step=%s op_key=%s error=%s rolled_back=%s dirty_state=%s",
-                current_step,
-                moderation_op_key,
-                exc,
-                rolled_back_steps,
-                dirty_state,
-            )
-            return ModerationService._build_result(
-                ok=False,
-                provider=provider,
-                actor_subject=actor_subject,
-                target_subject=target_subject,
-                violation_code=str(violation_type.get("code") or violation_code),
-                selected_actions=selected_actions,
-                op_key=moderation_op_key,
-                status=ModerationService.STATUS_FAILED,
-                error_code=error_code,
-                user_message=ModerationService.FRIENDLY_ERROR_MESSAGE,
-                moderator_message=moderator_message,
-                case_row=moderation_case,
-                ui_payload=ui_payload,
-                rule=rule,
-                violation_type=violation_type,
-                warnings_before=warn_count_before,
-                warnings_after=ModerationService._current_warn_count(
-                    ModerationService._load_warn_state(target_subject["account_id"], violation_type.get("id"))
-                ),
-                applied_actions=applied_actions,
-                mute_until=mute_until,
-                ban_applied=bool(ban_row),
-                fine_points_applied=fine_points if fine_applied else 0,
-                authority=authority,
-                rollback_status=rollback_status,
-            )
+                    ModerationService._journal_case_steps(moderation_case["id"], completed_steps)
+
+                    if fine_payment_mode == ModerationService.FINE_PAYMENT_MODE_INSTANT:
+                        current_step = "bank_income_apply"
+                        ModerationService._journal_case_steps(moderation_case["id"], [*completed_steps, "bank_income_apply:started"])
+                        apply_bank_delta = getattr(db, "apply_bank_delta", None)
+                        if callable(apply_bank_delta):
+                            # Зачисление вместе со строкой bank_history, идемпотентно по op_key.
+                            bank_applied = apply_bank_delta(
+                                fine_points,
+                                bank_reason,
+                                account_id=target_subject["account_id"],
+                                op_key=f"{moderation_op_key}:bank_income",
+                            )
+                        else:
+                            bank_applied = db.add_to_bank(fine_points)
+                        if not bank_applied:
+                            logger.error(
+                                "❌ moderation bank income apply failed case_id=%s op_key=%s amount=%s",
+                                moderation_case["id"],
+                                moderation_op_key,
+                                fine_points,
+                            )
+                            raise RuntimeError("Не удалось зачислить штраф в банк")
+                        bank_income_applied = True
+                        completed_steps.append(current_step)
+                        ModerationService._journal_case_steps(moderation_case["id"], completed_steps)
+
+                        current_step = "bank_income_log"
+                        log_bank_income_by_account = getattr(db, "log_bank_income_by_account", None)
+                        bank_logged = False
+                        if callable(apply_bank_delta):
+                            bank_logged = True
+                        elif callable(log_bank_income_by_account):
+                            bank_logged = bool(log_bank_income_by_account(target_subject["account_id"], fine_points, bank_reason))
+                        else:
+                            provider_user_id = target_subject.get("provider_user_id")
+                            if provider_user_id is not None:
+                                try:
+                                    bank_logged = bool(db.log_bank_income(int(provider_user_id), fine_points, bank_reason))
+                                except (TypeError, ValueError):
+                                    logger.error(
+                                        "❌ moderation bank income fallback log failed invalid provider_user_id case_id=%s op_key=%s provider_user_id=%s",
+                                        moderation_case["id"],
+                                        moderation_op_key,
+                                        provider_user_id,
+                                    )
+                        if not bank_logged:
+                            logger.error(
+                                "❌ moderation bank income log failed case_id=%s op_key=%s target_account_id=%s amount=%s",
+                                moderation_case["id"],
+                                moderation_op_key,
+                                target_subject["account_id"],
+                                fine_points,
+                            )
+                            raise RuntimeError("Не удалось записать поступление штрафа в банк")
+                        completed_steps.append(current_step)
+
+                        current_step = "bank_income_action"
+                        bank_action = ModerationService._create_action(
+                            case_id=moderation_case["id"],
+                            action_type=ModerationService.ACTION_BANK_INCOME,
+                            op_key=moderation_op_key,
+                            value_numeric=fine_points,
+                            value_text=bank_reason,
+                            starts_at=created_at,
+                            created_at=created_at,
+                        )
+                        if not bank_action:
+                            logger.error(
+                                "❌ moderation bank income action create failed case_id=%s op_key=%s amount=%s",
+                                moderation_case["id"],
+                                moderation_op_key,
+                                fine_points,
+                            )
+                            raise RuntimeError("Не удалось привязать поступление штрафа к истории кейса")
+                        applied_actions.append(bank_action)
+                        completed_steps.append(current_step)
+
+                current_step = "finalize_case"
+                # Условие status=pending: кейс, уже захваченный recover_stale_pending_cases, не станет applied.
+                finalized_case_rows = ModerationService._update_rows(
+                    "moderation_cases",
+                    {"id": moderation_case["id"], "status": ModerationService.STATUS_PENDING},
+                    {
+                        "status": ModerationService.STATUS_APPLIED,
+                        "applied_actions": ", ".join(selected_actions),
+                        "warnings_before": warn_count_before,
+                        "warnings_after": warn_count_after,
+                        "mute_until": mute_until,
+                        "ban_applied": ModerationService.ACTION_BAN in selected_actions,
+                        "ban_until": ban_until,
+                        "fine_points_applied": fine_points if fine_applied else 0,
+                        "updated_at": datetime.now(timezone.utc).isoformat(),
+                    },
+                )
+                if not finalized_case_rows:
+                    raise RuntimeError("Не удалось зафиксировать итоговый статус кейса")
+                moderation_case = finalized_case_rows[0]
+                completed_steps.append(current_step)
+            except Exception as exc:
+                error_code = f"{current_step}_failed"
+                ModerationService._log_case_event(
+                    "exception",
+                    message="moderation case apply failed",
+                    provider=provider,
+                    chat_id=chat_id,
+                    actor_account_id=actor_subject.get("account_id"),
+                    target_account_id=target_subject.get("account_id"),
+                    violation_code=str(violation_type.get("code") or violation_code),
+                    requested_action_set=selected_actions,
+                    selected_rule_id=rule.get("id"),
+                    case_id=moderation_case.get("id") if moderation_case else None,
+                    op_key=moderation_op_key,
+                    status=ModerationService.STATUS_FAILED,
+                    error_code=error_code,
+                    rollback_status="started",
+                    step=current_step,
+                )
+                if moderation_case and not ModerationService._claim_case_for_rollback(moderation_case):
+                    # Кейс забрал или закрыл другой владелец: повторная компенсация вернула бы штраф дважды.
+                    # Если claim просто не записался, кейс остался pending и его откатит recover_stale_pending_cases.
+                    current_case = ModerationService._select_single("moderation_cases", id=moderation_case.get("id")) or {}
+                    still_pending = str(current_case.get("status") or "").strip().lower() == ModerationService.STATUS_PENDING
+                    rollback_status = "recovery_pending" if still_pending else "recovered"
+                    rolled_back_steps, dirty_state = [], []
+                else:
+                    rollback_status, rolled_back_steps, dirty_state = ModerationService._rollback_case(
+                        provider=provider,
+                        chat_id=chat_id,
+                        actor_subject=actor_subject,
+                        target_subject=target_subject,
+                        violation_code=str(violation_type.get("code") or violation_code),
+                        selected_actions=selected_actions,
+                        selected_rule_id=rule.get("id"),
+                        case_row=moderation_case,
+                        op_key=moderation_op_key,
+                        warn_state_before=warn_state_before,
+                        warn_changed=warn_changed,
+                        mute_row=mute_row,
+                        ban_row=ban_row,
+                        fine_points=fine_points,
+                        fine_applied=fine_applied,
+                        bank_income_applied=bank_income_applied,
+                        completed_steps=completed_steps,
+                        case_fine_row=case_fine_row,
+                    )
+                moderator_message = (
+                    f"Кейс модерации не завершён. Шаг сбоя: {current_step}. "
+                    f"Rollback: {rollback_status}. Успешные шаги: {', '.join(completed_steps) or 'нет'}."
+                )
+                logger.error(
+                    "moderation case apply exception step=%s op_key=%s error=%s rolled_back=%s dirty_state=%s",
+                    current_step,
+                    moderation_op_key,
+                    exc,
+                    rolled_back_steps,
+                    dirty_state,
+                )
+                return ModerationService._build_result(
+                    ok=False,
+                    provider=provider,
+                    actor_subject=actor_subject,
+                    target_subject=target_subject,
+                    violation_code=str(violation_type.get("code") or violation_code),
+                    selected_actions=selected_actions,
+                    op_key=moderation_op_key,
+                    status=ModerationService.STATUS_FAILED,
+                    error_code=error_code,
+                    user_message=ModerationService.FRIENDLY_ERROR_MESSAGE,
+                    moderator_message=moderator_message,
+                    case_row=moderation_case,
+                    ui_payload=ui_payload,
+                    rule=rule,
+                    violation_type=violation_type,
+                    warnings_before=warn_count_before,
+                    warnings_after=ModerationService._current_warn_count(
+                        ModerationService._load_warn_state(target_subject["account_id"], violation_type.get("id"))
+                    ),
+                    applied_actions=applied_actions,
+                    mute_until=mute_until,
+                    ban_applied=bool(ban_row),
+                    fine_points_applied=fine_points if fine_applied else 0,
+                    authority=authority,
+                    rollback_status=rollback_status,
+                )
 
         result_lines = [f"Кейс #{moderation_case.get('id')} создан"]
         mute_minutes = int(rule.get("mute_minutes") or 0)
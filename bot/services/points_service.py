@@ -237,9 +237,46 @@ class PointsService:
         return PointsService._filter_positive_entries(entries, period)
 
     @staticmethod
-    def add_points_by_account(account_id: str, points: float, reason: str, author_account_id: str) -> bool:
+    def add_points_by_account(account_id: str, points: float, reason: str, author_account_id: str, op_key: str | None = None) -> bool:
+        if op_key:
+            return db.add_action_by_account(account_id, points, reason, author_account_id, op_key=op_key)
         return db.add_action_by_account(account_id, points, reason, author_account_id)
 
     @staticmethod
-    def remove_points_by_account(account_id: str, points: float, reason: str, author_account_id: str) -> bool:
+    def remove_points_by_account(account_id: str, points: float, reason: str, author_account_id: str, op_key: str | None = None) -> bool:
+        if op_key:
+            return db.add_action_by_account(account_id, -points, reason, author_account_id, op_key=op_key)
         return db.add_action_by_account(account_id, -points, reason, author_account_id)
+
+    @staticmethod
+    def get_balance_by_account(account_id: str) -> float:
+        """Текущий баланс из scores одной точечной выборкой, без сборки профиля."""
+
+        if not db.supabase or not account_id:
+            return 0.0
+        try:
+            response = db.supabase.table("scores").select("points").eq("account_id", str(account_id)).limit(1).execute()
+            rows = response.data or []
+            return float(rows[0].get("points") or 0) if rows else 0.0
+        except Exception:
+            logger.exception("points balance lookup failed account_id=%s", account_id)
+            return 0.0
+
+    @staticmethod
+    def get_action_op_keys(account_id: str, op_key_prefix: str) -> list[str] | None:
+        """op_key действий аккаунта с заданным префиксом; None — выборка не удалась (решение принимать нельзя)."""
+
+        if not db.supabase or not account_id or not op_key_prefix:
+            return []
+        try:
+            response = (
+                db.supabase.table("actions")
+                .select("op_key")
+                .eq("account_id", str(account_id))
+                .like("op_key", f"{op_key_prefix}%")
+                .execute()
+            )
+            return [str(row.get("op_key")) for row in response.data or [] if row.get("op_key")]
+        except Exception:
+            logger.exception("points op_key lookup failed account_id=%s op_key_prefix=%s", account_id, op_key_prefix)
+            return None
@@ -0,0 +1,86 @@
+"""
+Назначение: модуль "role fingerprint service" реализует продуктовый контур в зоне общая логика.
+Ответственность: персистентные отпечатки набора ролей участников Discord, чтобы сверка титулов пересчитывала только изменившихся.
+Где используется: Discord (`sync_discord_titles_once` в `bot/systems/profile_titles_logic.py`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from collections.abc import Iterable
+from datetime import datetime, timezone
+
+from bot.data import db
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_TABLE = "discord_member_role_fingerprints"
+
+
+class RoleFingerprintService:
+    """Per-member role fingerprints stored per guild; one paged preload and chunked upserts per pass."""
+
+    PRELOAD_PAGE_SIZE = 1000
+    UPSERT_BATCH_SIZE = 500
+
+    @staticmethod
+    def config_digest(role_mappings: dict[int, str], configured_role_names: Iterable[str]) -> str:
+        """Отпечаток конфигурации титулов: её изменение инвалидирует все сохранённые отпечатки."""
+
+        raw = "|".join(f"{role_id}={title}" for role_id, title in sorted(role_mappings.items()))
+        raw += "#" + "|".join(sorted(str(name) for name in configured_role_names))
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=4).hexdigest()
+
+    @staticmethod
+    def fingerprint(role_ids: Iterable[int], config_digest: str) -> str:
+        raw = ",".join(str(role_id) for role_id in sorted({int(role_id) for role_id in role_ids}))
+        return f"{config_digest}:" + hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+    @staticmethod
+    def load_guild(guild_id: int | str) -> dict[str, str]:
+        """Сохранённые отпечатки гильдии по member_id; без Supabase или при ошибке — пустой словарь."""
+
+        if not db.supabase:
+            return {}
+        fingerprints: dict[str, str] = {}
+        offset = 0
+        page_size = RoleFingerprintService.PRELOAD_PAGE_SIZE
+        try:
+            while True:
+                response = (
+                    db.supabase.table(FINGERPRINT_TABLE)
+                    .select("member_id,fingerprint")
+                    .eq("guild_id", str(guild_id))
+                    .order("member_id")
+                    .range(offset, offset + page_size - 1)
+                    .execute()
+                )
+                rows = response.data or []
+                for row in rows:
+                    member_id = str(row.get("member_id") or "").strip()
+                    if member_id:
+                        fingerprints[member_id] = str(row.get("fingerprint") or "")
+                if len(rows) < page_size:
+                    return fingerprints
+                offset += len(rows)
+        except Exception:
+            logger.exception("role fingerprints preload failed guild_id=%s", guild_id)
+            return {}
+
+    @staticmethod
+    def save_many(guild_id: int | str, fingerprints: dict[str, str]) -> None:
+        if not db.supabase or not fingerprints:
+            return
+        updated_at = datetime.now(timezone.utc).isoformat()
+        payloads = [
+            {"guild_id": str(guild_id), "member_id": member_id, "fingerprint": fingerprint, "updated_at": updated_at}
+            for member_id, fingerprint in sorted(fingerprints.items())
+        ]
+        batch_size = RoleFingerprintService.UPSERT_BATCH_SIZE
+        for index in range(0, len(payloads), batch_size):
+            chunk = payloads[index:index + batch_size]
+            try:
+                db.supabase.table(FINGERPRINT_TABLE).upsert(chunk, on_conflict="guild_id,member_id").execute()
+            except Exception:
+                logger.exception("role fingerprints upsert failed guild_id=%s rows=%s", guild_id, len(chunk))
@@ -6,6 +6,8 @@
 """
 
 import copy
+import hashlib
+import json
 import logging
 import os
 import time
@@ -13,6 +15,7 @@ from datetime import datetime, timezone
 from typing import Any, Callable
 
 from bot.data import db
+from bot.data.rpc_capabilities import rpc_capabilities
 from bot.systems.roles_catalog_shared import prepare_public_roles_catalog_pages
 from bot.services.accounts_service import AccountsService
 from bot.services.authority_service import AuthorityService
@@ -29,6 +32,8 @@ _LEGACY_POINTS_ROLE_NAMES = {
     1105906455233703989: "Хороший Помощник Бебр",
     1105906310131744868: "Новый волонтер",
 }
+# Таблицы, где роль хранится по имени: при переименовании роли каталога их строки переименовываются вместе с ней.
+_ROLE_NAME_DEPENDENT_TABLES = ("account_role_assignments", "role_permissions", "shop_items")
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +61,15 @@ class RoleManagementService:
     ROLE_CATALOG_CACHE_TTL_SEC = int(os.getenv("ROLE_CATALOG_CACHE_TTL_SEC", "30"))
     _grouped_roles_cache: tuple[float, list[dict[str, Any]]] | None = None
     _role_cache: dict[str, tuple[float, Any]] = {}
+    # Версии для зависимых кэшей (витрина магазина): растут при каждой явной инвалидации каталога
+    # и при выдаче/снятии роли конкретному аккаунту.
+    _catalog_version = 0
+    _account_roles_versions: dict[str, int] = {}
+    # Зависимые кэши (витрина магазина) сбрасываются вместе с каталогом: shop_service регистрирует себя при импорте.
+    _catalog_invalidation_listeners: list[Callable[..., None]] = []
+    # Хэш последнего синхронизированного списка ролей по набору гильдий: повтор того же списка пропускается.
+    _guild_roles_sync_hashes: dict[str, str] = {}
+    DISCORD_SYNC_BATCH_SIZE = 500
 
     @staticmethod
     def _catalog_cache_ttl_sec() -> int:
@@ -152,14 +166,41 @@ class RoleManagementService:
     @staticmethod
     def invalidate_catalog_cache(*, reason: str | None = None) -> None:
         cleared_role_entries = len(RoleManagementService._role_cache)
+        RoleManagementService._catalog_version += 1
         RoleManagementService._grouped_roles_cache = None
         RoleManagementService._role_cache = {}
+        RoleManagementService._guild_roles_sync_hashes = {}
+        for listener in list(RoleManagementService._catalog_invalidation_listeners):
+            try:
+                listener(reason=reason)
+            except Exception:
+                logger.exception("role catalog invalidation listener failed reason=%s", reason)
         logger.debug(
             "role catalog caches invalidated reason=%s cleared_role_entries=%s",
             str(reason or "unspecified"),
             cleared_role_entries,
         )
 
+    @staticmethod
+    def register_catalog_invalidation_listener(listener: Callable[..., None]) -> None:
+        if listener not in RoleManagementService._catalog_invalidation_listeners:
+            RoleManagementService._catalog_invalidation_listeners.append(listener)
+
+    @staticmethod
+    def catalog_version() -> int:
+        return RoleManagementService._catalog_version
+
+    @staticmethod
+    def account_roles_version(account_id: str | None) -> int:
+        return RoleManagementService._account_roles_versions.get(str(account_id or "").strip(), 0)
+
+    @staticmethod
+    def mark_account_roles_changed(account_id: str | None) -> None:
+        account_key = str(account_id or "").strip()
+        if account_key:
+            versions = RoleManagementService._account_roles_versions
+            versions[account_key] = versions.get(account_key, 0) + 1
+
     @staticmethod
     def _public_catalog_visibility(value: Any) -> bool:
         if value is None:
@@ -747,6 +788,31 @@ class RoleManagementService:
             logger.exception("external_role_bindings discord query failed command=%s", log_context or "n/a")
             return []
 
+    @staticmethod
+    def _discord_catalog_role_payload(
+        *,
+        role_id: str,
+        role_name: str,
+        existing: dict[str, Any] | None,
+        default_category: str,
+        default_position: int,
+    ) -> dict[str, Any]:
+        preserved_category = RoleManagementService._normalized_category((existing or {}).get("category_name"))
+        preserved_position = int((existing or {}).get("position") or default_position)
+        return {
+            "name": role_name,
+            "category_name": preserved_category if existing else default_category,
+            "position": preserved_position,
+            "is_discord_managed": True,
+            "discord_role_id": role_id,
+            "discord_role_name": role_name,
+            "is_privileged_discord_role": bool((existing or {}).get("is_privileged_discord_role")),
+            ROLE_SELLABLE_COLUMN: RoleManagementService._sellable_visibility((existing or {}).get(ROLE_SELLABLE_COLUMN)),
+            ROLE_PUBLIC_VISIBILITY_COLUMN: RoleManagementService._public_catalog_visibility(
+                (existing or {}).get(ROLE_PUBLIC_VISIBILITY_COLUMN)
+            ),
+        }
+
     @staticmethod
     def _upsert_discord_catalog_role(
         *,
@@ -773,21 +839,13 @@ class RoleManagementService:
                 source,
             )
 
-        preserved_category = RoleManagementService._normalized_category((existing or {}).get("category_name"))
-        preserved_position = int((existing or {}).get("position") or default_position)
-        payload = {
-            "name": role_name,
-            "category_name": preserved_category if existing else default_category,
-            "position": preserved_position,
-            "is_discord_managed": True,
-            "discord_role_id": role_id,
-            "discord_role_name": role_name,
-            "is_privileged_discord_role": bool((existing or {}).get("is_privileged_discord_role")),
-            ROLE_SELLABLE_COLUMN: RoleManagementService._sellable_visibility((existing or {}).get(ROLE_SELLABLE_COLUMN)),
-            ROLE_PUBLIC_VISIBILITY_COLUMN: RoleManagementService._public_catalog_visibility(
-                (existing or {}).get(ROLE_PUBLIC_VISIBILITY_COLUMN)
-            ),
-        }
+        payload = RoleManagementService._discord_catalog_role_payload(
+            role_id=role_id,
+            role_name=role_name,
+            existing=existing,
+            default_category=default_category,
+            default_position=default_position,
+        )
 
         try:
             RoleManagementService._ensure_category_exists(
@@ -1334,6 +1392,7 @@ class RoleManagementService:
                 before=before,
                 after=after,
             )
+            RoleManagementService.invalidate_catalog_cache(reason="upsert_shop_role_item")
             logger.info("shop_admin_showcase_change action=shop_item_upsert role_name=%s actor_user_id=%s actor_provider=%s source=%s", role_key, actor_user_id, actor_provider, source)
             return True
         except Exception:
@@ -1379,6 +1438,7 @@ class RoleManagementService:
                 before=before,
                 after=after,
             )
+            RoleManagementService.invalidate_catalog_cache(reason="deactivate_shop_role_item")
             logger.info(
                 "shop_admin_showcase_change action=shop_item_deactivate role_name=%s actor_user_id=%s actor_provider=%s source=%s",
                 role_key,
@@ -2227,6 +2287,55 @@ class RoleManagementService:
 
         return result
 
+    @staticmethod
+    def check_role_grant_guards(
+        role_name: str,
+        *,
+        actor_provider: str | None,
+        actor_user_id: str | None,
+        source: str = "unknown",
+        role_info: dict[str, Any] | None = None,
+        account_id: str | None = None,
+        target_provider: str | None = None,
+        target_user_id: str | None = None,
+    ) -> dict[str, Any]:
+        """Защищённые титулы, sync-only и привилегированные Discord-роли: общие проверки выдачи для ручной выдачи и магазина."""
+
+        if is_protected_profile_title(role_name):
+            logger.warning(
+                "assign_user_role_by_account denied protected profile title account_id=%s role_name=%s actor_provider=%s actor_user_id=%s target_provider=%s target_user_id=%s source=%s",
+                account_id,
+                role_name,
+                actor_provider,
+                actor_user_id,
+                target_provider,
+                target_user_id,
+                source,
+            )
+            return RoleManagementService._role_action_result(
+                False,
+                reason="protected_profile_title",
+                message=PROTECTED_PROFILE_TITLE_ROLE_MESSAGE,
+                role_name=role_name,
+            )
+        guard_result = RoleManagementService._check_sync_only_discord_role_access(
+            actor_provider=actor_provider,
+            actor_user_id=actor_user_id,
+            role_name=role_name,
+            role_info=role_info,
+            action="grant",
+            source=source,
+        )
+        if not guard_result["ok"]:
+            return guard_result
+        return RoleManagementService._check_privileged_discord_role_access(
+            actor_provider=actor_provider,
+            actor_user_id=actor_user_id,
+            role_name=role_name,
+            role_info=role_info,
+            action="grant",
+        )
+
     @staticmethod
     def assign_user_role_by_account(
         account_id: str,
@@ -2248,69 +2357,14 @@ class RoleManagementService:
             return RoleManagementService._role_action_result(False, role_name=role_key or role_name)
 
         try:
-            if is_protected_profile_title(role_key):
-                logger.warning(
-                    "assign_user_role_by_account denied protected profile title account_id=%s role_name=%s actor_provider=%s actor_user_id=%s target_provider=%s target_user_id=%s source=%s",
-                    account_key,
-                    role_key,
-                    actor_provider,
-                    actor_user_id,
-                    target_provider,
-                    target_user_id,
-                    source,
-                )
-                RoleManagementService.record_role_change_audit(
-                    action="role_grant_denied",
-                    role_name=role_key,
-                    source=source,
-                    actor_provider=actor_provider,
-                    actor_user_id=actor_user_id,
-                    actor_account_id=actor_account_id,
-                    target_provider=target_provider,
-                    target_user_id=target_user_id,
-                    target_account_id=account_key,
-                    before={"assigned": False},
-                    after={"assigned": False},
-                    status="denied",
-                    error_code="protected_profile_title",
-                    error_message=PROTECTED_PROFILE_TITLE_ROLE_MESSAGE,
-                )
-                return RoleManagementService._role_action_result(
-                    False,
-                    reason="protected_profile_title",
-                    message=PROTECTED_PROFILE_TITLE_ROLE_MESSAGE,
-                    role_name=role_key,
-                )
-            guard_result = RoleManagementService._check_sync_only_discord_role_access(
+            guard_result = RoleManagementService.check_role_grant_guards(
+                role_key,
                 actor_provider=actor_provider,
                 actor_user_id=actor_user_id,
-                role_name=role_key,
-                action="grant",
                 source=source,
-            )
-            if not guard_result["ok"]:
-                RoleManagementService.record_role_change_audit(
-                    action="role_grant_denied",
-                    role_name=role_key,
-                    source=source,
-                    actor_provider=actor_provider,
-                    actor_user_id=actor_user_id,
-                    actor_account_id=actor_account_id,
-                    target_provider=target_provider,
-                    target_user_id=target_user_id,
-                    target_account_id=account_key,
-                    before={"assigned": False},
-                    after={"assigned": False},
-                    status="denied",
-                    error_code=str(guard_result.get("reason") or "denied"),
-                    error_message=str(guard_result.get("message") or "role grant denied"),
-                )
-                return guard_result
-            guard_result = RoleManagementService._check_privileged_discord_role_access(
-                actor_provider=actor_provider,
-                actor_user_id=actor_user_id,
-                role_name=role_key,
-                action="grant",
+                account_id=account_key,
+                target_provider=target_provider,
+                target_user_id=target_user_id,
             )
             if not guard_result["ok"]:
                 RoleManagementService.record_role_change_audit(
@@ -2376,6 +2430,7 @@ class RoleManagementService:
                 },
                 on_conflict="account_id,role_name,source",
             ).execute()
+            RoleManagementService.mark_account_roles_changed(account_key)
             RoleManagementService.record_role_change_audit(
                 action="role_grant",
                 role_name=role_key,
@@ -2542,6 +2597,7 @@ class RoleManagementService:
                 )
                 return guard_result
             db.supabase.table("account_role_assignments").delete().eq("account_id", account_key).eq("role_name", role_key).execute()
+            RoleManagementService.mark_account_roles_changed(account_key)
             RoleManagementService.record_role_change_audit(
                 action="role_revoke",
                 role_name=role_key,
@@ -2939,114 +2995,367 @@ class RoleManagementService:
             return False
 
     @staticmethod
-    def sync_discord_guild_roles(guild_roles: list[dict[str, Any]]) -> dict[str, int]:
-        if not db.supabase:
-            return {"upserted": 0, "removed": 0}
+    def _guild_roles_sync_scope(guild_roles: list[dict[str, Any]]) -> str:
+        return ",".join(sorted({str(role.get("guild_id") or "").strip() for role in guild_roles}))
 
-        upserted = 0
-        removed = 0
-        active_ids: set[str] = set()
-        try:
-            db.supabase.table("role_categories").upsert({"name": _AUTO_DISCORD_CATEGORY, "position": 9999}).execute()
-            existing_managed_resp = (
+    @staticmethod
+    def _guild_roles_fingerprint(
+        guild_roles: list[dict[str, Any]],
+        external_bindings: list[dict[str, Any]] | None = None,
+    ) -> str:
+        normalized = sorted(
+            (
+                str(role.get("guild_id") or "").strip(),
+                str(role.get("id") or "").strip(),
+                str(role.get("name") or "").strip(),
+                int(role.get("position") or 0),
+            )
+            for role in guild_roles
+        )
+        # Привязки external_role_bindings тоже попадают в каталог: их изменение должно запускать синхронизацию.
+        bindings = sorted(
+            (
+                str(row.get("external_role_id") or "").strip(),
+                str(row.get("external_role_name") or "").strip(),
+                str(row.get("account_id") or "").strip(),
+            )
+            for row in external_bindings or []
+        )
+        return hashlib.sha256(json.dumps([normalized, bindings], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _load_discord_sync_snapshot(external_bindings: list[dict[str, Any]] | None = None) -> dict[str, Any]:
+        """One read per table: managed roles, categories, external bindings and profile title mappings."""
+
+        managed_rows = list(
+            (
                 db.supabase.table("roles")
-                .select("name,discord_role_id,category_name,position,is_privileged_discord_role,show_in_roles_catalog,is_sellable")
+                .select(
+                    "name,discord_role_id,discord_role_name,category_name,position,is_discord_managed,"
+                    "is_privileged_discord_role,show_in_roles_catalog,is_sellable"
+                )
                 .eq("is_discord_managed", True)
                 .execute()
-            )
-            existing_by_role_id: dict[str, dict[str, Any]] = {}
-            for row in existing_managed_resp.data or []:
-                existing_role_id = str(row.get("discord_role_id") or "").strip()
-                if existing_role_id and existing_role_id not in existing_by_role_id:
-                    existing_by_role_id[existing_role_id] = row
+            ).data
+            or []
+        )
+        existing_by_role_id: dict[str, dict[str, Any]] = {}
+        for row in managed_rows:
+            existing_role_id = str(row.get("discord_role_id") or "").strip()
+            if existing_role_id and existing_role_id not in existing_by_role_id:
+                existing_by_role_id[existing_role_id] = row
+
+        categories_resp = db.supabase.table("role_categories").select("name").execute()
+        known_categories = {
+            RoleManagementService._normalized_category(row.get("name"))
+            for row in categories_resp.data or []
+            if RoleManagementService._normalized_category(row.get("name"))
+        }
+        title_rows: dict[str, dict[str, Any]] = {}
+        try:
+            titles_resp = db.supabase.table("profile_title_roles").select("discord_role_id,title_name,is_active").execute()
+            title_rows = {str(row.get("discord_role_id") or "").strip(): row for row in titles_resp.data or []}
+        except Exception:
+            # Без снимка титулы просто перезаписываются целиком, как до пакетной синхронизации.
+            logger.exception("sync_discord_guild_roles profile_title_roles preload failed")
+        return {
+            "managed_rows": managed_rows,
+            "existing_by_role_id": existing_by_role_id,
+            "known_categories": known_categories,
+            "external_bindings": (
+                external_bindings
+                if external_bindings is not None
+                else RoleManagementService._load_external_discord_bindings(log_context="sync_discord_guild_roles")
+            ),
+            "title_rows": title_rows,
+        }
 
-            categories_resp = db.supabase.table("role_categories").select("name").execute()
-            known_categories = {
-                RoleManagementService._normalized_category(row.get("name"))
-                for row in categories_resp.data or []
-                if RoleManagementService._normalized_category(row.get("name"))
-            }
-            known_categories.add(RoleManagementService._normalized_category(_AUTO_DISCORD_CATEGORY))
+    @staticmethod
+    def _plan_discord_guild_roles_sync(guild_roles: list[dict[str, Any]], snapshot: dict[str, Any]) -> dict[str, Any]:
+        """Exact insert/update/rename/delete sets against the preloaded snapshot; no DB access."""
 
-            for role in guild_roles:
-                role_id = str(role.get("id") or "").strip()
-                role_name = str(role.get("name") or "").strip()
-                if not role_id or not role_name:
+        existing_by_role_id: dict[str, dict[str, Any]] = snapshot["existing_by_role_id"]
+        entries: list[tuple[str, str, int, str, str | None, str | None]] = [
+            (
+                str(role.get("id") or "").strip(),
+                str(role.get("name") or "").strip(),
+                int(role.get("position") or 0),
+                "guild_roles",
+                str(role.get("guild_id") or "").strip() or None,
+                None,
+            )
+            for role in guild_roles
+        ]
+        # Привязки external_role_bindings обрабатываются после ролей гильдии, как и раньше.
+        entries.extend(
+            (
+                str(row.get("external_role_id") or "").strip(),
+                str(row.get("external_role_name") or "").strip(),
+                0,
+                "external_role_bindings",
+                None,
+                str(row.get("account_id") or "").strip() or None,
+            )
+            for row in snapshot["external_bindings"]
+        )
+
+        desired: dict[str, dict[str, Any]] = {}
+        titles: dict[str, dict[str, Any]] = {}
+        active_ids: set[str] = set()
+        current = dict(existing_by_role_id)
+        for role_id, role_name, position, source, guild_id, account_id in entries:
+            if not role_id or not role_name:
+                continue
+            if is_protected_profile_title(role_name):
+                if not role_id.isdigit():
+                    logger.warning(
+                        "profile title role skipped: non-numeric discord role id role_name=%s external_role_id=%s source=%s",
+                        role_name,
+                        role_id,
+                        source,
+                    )
                     continue
-                if is_protected_profile_title(role_name):
-                    if RoleManagementService._upsert_profile_title_role_mapping(
-                        role_id=role_id,
-                        role_name=role_name,
-                        source="guild_roles",
-                        guild_id=str(role.get("guild_id") or "").strip() or None,
-                    ):
-                        logger.info(
-                            "discord role synced to profile_title_roles role_name=%s external_role_id=%s guild_id=%s source=%s",
-                            role_name,
-                            role_id,
-                            str(role.get("guild_id") or "").strip() or None,
-                            "guild_roles",
-                        )
+                title_name = RoleManagementService._resolve_profile_title_name(role_name)
+                stored = snapshot["title_rows"].get(role_id)
+                if stored and stored.get("title_name") == title_name and stored.get("is_active"):
                     continue
-                active_ids.add(role_id)
+                titles[role_id] = {
+                    "discord_role_id": int(role_id),
+                    "title_name": title_name,
+                    "is_active": True,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                }
+                continue
+            active_ids.add(role_id)
+            payload = RoleManagementService._discord_catalog_role_payload(
+                role_id=role_id,
+                role_name=role_name,
+                existing=current.get(role_id),
+                default_category=_AUTO_DISCORD_CATEGORY,
+                default_position=position,
+            )
+            desired[role_id] = payload
+            current[role_id] = payload
+            if role_id not in existing_by_role_id:
+                logger.warning(
+                    "discord role missing in catalog; creating canonical entry role_name=%s external_role_id=%s account_id=%s guild_id=%s source=%s",
+                    role_name,
+                    role_id,
+                    account_id,
+                    guild_id,
+                    source,
+                )
 
-                existing = existing_by_role_id.get(role_id)
-                if RoleManagementService._upsert_discord_catalog_role(
-                    role_id=role_id,
-                    role_name=role_name,
-                    existing=existing,
-                    default_category=_AUTO_DISCORD_CATEGORY,
-                    default_position=int(role.get("position") or 0),
-                    source="guild_roles",
-                    guild_id=str(role.get("guild_id") or "").strip() or None,
-                    known_categories=known_categories,
-                ):
-                    upserted += 1
-                    existing_by_role_id[role_id] = {
-                        "name": role_name,
-                        "discord_role_id": role_id,
-                        "category_name": (existing or {}).get("category_name") or _AUTO_DISCORD_CATEGORY,
-                        "position": int((existing or {}).get("position") or int(role.get("position") or 0)),
-                        "is_privileged_discord_role": bool((existing or {}).get("is_privileged_discord_role")),
-                        ROLE_SELLABLE_COLUMN: RoleManagementService._sellable_visibility(
-                            (existing or {}).get(ROLE_SELLABLE_COLUMN)
-                        ),
-                        ROLE_PUBLIC_VISIBILITY_COLUMN: RoleManagementService._public_catalog_visibility(
-                            (existing or {}).get(ROLE_PUBLIC_VISIBILITY_COLUMN)
-                        ),
-                    }
+        inserts: list[dict[str, Any]] = []
+        updates: list[dict[str, Any]] = []
+        renames: list[dict[str, Any]] = []
+        rename_from: dict[str, str] = {}
+        unchanged = 0
+        for role_id, payload in desired.items():
+            existing = existing_by_role_id.get(role_id)
+            if existing is None:
+                inserts.append(payload)
+            elif str(existing.get("name") or "").strip() != payload["name"]:
+                renames.append(payload)
+                rename_from[role_id] = str(existing.get("name") or "").strip()
+            elif any(existing.get(key) != value for key, value in payload.items()):
+                updates.append(payload)
+            else:
+                unchanged += 1
+
+        stale_names = sorted(
+            {
+                str(row.get("name") or "").strip()
+                for row in snapshot["managed_rows"]
+                if str(row.get("discord_role_id") or "").strip()
+                and str(row.get("discord_role_id") or "").strip() not in active_ids
+                and str(row.get("name") or "").strip()
+            }
+        )
+        return {
+            "inserts": inserts,
+            "updates": updates,
+            "renames": renames,
+            "rename_from": rename_from,
+            "unchanged": unchanged,
+            "titles": list(titles.values()),
+            "stale_names": stale_names,
+            "active_ids": active_ids,
+        }
 
-            external_upserted, external_active_ids = RoleManagementService._sync_discord_roles_from_external_bindings(
-                existing_by_role_id,
+    @staticmethod
+    def _rename_catalog_role(payload: dict[str, Any], old_name: str) -> None:
+        """Rename a catalog role together with rows keyed by role_name (RPC `rename_catalog_role`, sql/p25)."""
+
+        role_id = payload["discord_role_id"]
+        rpc_method = getattr(db.supabase, "rpc", None)
+        if callable(rpc_method) and rpc_capabilities.plan(db.supabase, "rename_catalog_role"):
+            try:
+                rpc_method("rename_catalog_role", {"p_discord_role_id": role_id, "p_payload": payload}).execute()
+            except Exception as error:
+                if not rpc_capabilities.record_error(db.supabase, "rename_catalog_role", error):
+                    raise
+                logger.warning("role rename rpc function missing; fallback to step-by-step path external_role_id=%s", role_id)
+            else:
+                rpc_capabilities.record_success(db.supabase, "rename_catalog_role")
+                return
+        rpc_capabilities.record_fallback(db.supabase, "rename_catalog_role")
+
+        new_name = payload["name"]
+        db.supabase.table("roles").update(payload).eq("discord_role_id", role_id).execute()
+        if not old_name or old_name == new_name:
+            return
+        renamed_tables: list[str] = []
+        try:
+            for table in _ROLE_NAME_DEPENDENT_TABLES:
+                db.supabase.table(table).update({"role_name": new_name}).eq("role_name", old_name).execute()
+                renamed_tables.append(table)
+        except Exception:
+            # Без транзакции откатываем уже сделанные шаги, чтобы строки не остались с разными именами роли.
+            for table in reversed(renamed_tables):
+                db.supabase.table(table).update({"role_name": old_name}).eq("role_name", new_name).execute()
+            db.supabase.table("roles").update({"name": old_name}).eq("discord_role_id", role_id).execute()
+            raise
+
+    @staticmethod
+    def _apply_discord_guild_roles_plan(plan: dict[str, Any], known_categories: set[str]) -> dict[str, int]:
+        """Counts only rows that were written; rows whose upsert or rename failed go to `failed`."""
+
+        applied = {"inserted": 0, "updated": 0, "renamed": 0, "profile_titles": 0, "removed": 0, "failed": 0}
+        batch_size = RoleManagementService.DISCORD_SYNC_BATCH_SIZE
+
+        if plan["titles"]:
+            db.supabase.table("profile_title_roles").upsert(plan["titles"], on_conflict="discord_role_id").execute()
+            applied["profile_titles"] = len(plan["titles"])
+
+        upserts = plan["inserts"] + plan["updates"] + plan["renames"]
+        for category in sorted({payload["category_name"] for payload in upserts}):
+            RoleManagementService._ensure_category_exists(
+                category,
+                default_position=9999,
+                log_context="sync_discord_guild_roles",
                 known_categories=known_categories,
             )
-            upserted += external_upserted
-            active_ids.update(external_active_ids)
 
-            existing_resp = (
-                db.supabase.table("roles")
-                .select("name,discord_role_id,category_name,show_in_roles_catalog")
-                .eq("is_discord_managed", True)
-                .execute()
-            )
-            for row in existing_resp.data or []:
-                role_id = str(row.get("discord_role_id") or "").strip()
-                role_name = str(row.get("name") or "").strip()
-                if role_id and role_id not in active_ids and role_name:
-                    RoleManagementService._delete_role_dependencies(role_name, log_context="sync_discord_guild_roles")
-                    db.supabase.table("roles").delete().eq("name", role_name).execute()
-                    removed += 1
+        # Роли с тем же именем пишутся одним upsert по name; дубли имени в пакете недопустимы.
+        by_name = {payload["name"]: payload for payload in plan["inserts"] + plan["updates"]}
+        batch_payloads = list(by_name.values())
+        insert_ids = {payload["discord_role_id"] for payload in plan["inserts"]}
 
-            if upserted or removed:
-                RoleManagementService.invalidate_catalog_cache(reason="sync_discord_guild_roles")
+        def _count_written(payload: dict[str, Any]) -> None:
+            applied["inserted" if payload["discord_role_id"] in insert_ids else "updated"] += 1
 
-            logger.info(
-                "sync_discord_guild_roles completed upserted=%s removed=%s active_ids=%s",
-                upserted,
-                removed,
-                len(active_ids),
-            )
-            return {"upserted": upserted, "removed": removed}
+        for offset in range(0, len(batch_payloads), batch_size):
+            chunk = batch_payloads[offset : offset + batch_size]
+            try:
+                db.supabase.table("roles").upsert(chunk, on_conflict="name").execute()
+            except Exception:
+                logger.exception("sync_discord_guild_roles batch upsert failed, retrying per row rows=%s", len(chunk))
+                for payload in chunk:
+                    try:
+                        db.supabase.table("roles").upsert(payload, on_conflict="name").execute()
+                    except Exception:
+                        applied["failed"] += 1
+                        logger.exception(
+                            "discord role catalog upsert failed role_name=%s external_role_id=%s source=%s",
+                            payload["name"],
+                            payload["discord_role_id"],
+                            "sync_discord_guild_roles",
+                        )
+                    else:
+                        _count_written(payload)
+            else:
+                for payload in chunk:
+                    _count_written(payload)
+
+        # Переименование меняет ключ upsert (name), поэтому обновляется по discord_role_id вместе со строками по role_name.
+        for payload in plan["renames"]:
+            old_name = plan["rename_from"].get(payload["discord_role_id"], "")
+            try:
+                RoleManagementService._rename_catalog_role(payload, old_name)
+                applied["renamed"] += 1
+            except Exception:
+                applied["failed"] += 1
+                logger.exception(
+                    "discord role catalog rename failed role_name=%s old_role_name=%s external_role_id=%s",
+                    payload["name"],
+                    old_name,
+                    payload["discord_role_id"],
+                )
+
+        stale_names = plan["stale_names"]
+        for offset in range(0, len(stale_names), batch_size):
+            chunk = stale_names[offset : offset + batch_size]
+            db.supabase.table("account_role_assignments").delete().in_("role_name", chunk).execute()
+            db.supabase.table("role_permissions").delete().in_("role_name", chunk).execute()
+            db.supabase.table("roles").delete().in_("name", chunk).execute()
+            logger.info("sync_discord_guild_roles deleted stale roles with dependent rows role_names=%s", chunk)
+        applied["removed"] = len(stale_names)
+        return applied
+
+    @staticmethod
+    def sync_discord_guild_roles(guild_roles: list[dict[str, Any]], *, force: bool = False) -> dict[str, Any]:
+        """Diff-based sync of guild roles into the catalog.
+
+        Returns change report: upserted/removed (totals) plus inserted, updated, renamed,
+        unchanged, profile_titles, removed_roles, failed and skipped_unchanged_snapshot.
+        The unchanged-snapshot hash is stored only after a clean apply, so failed rows are
+        retried on the next sync. Blocking: async handlers call it through `run_blocking_io`.
+        """
+
+        report: dict[str, Any] = {
+            "upserted": 0,
+            "removed": 0,
+            "inserted": 0,
+            "updated": 0,
+            "renamed": 0,
+            "unchanged": 0,
+            "profile_titles": 0,
+            "removed_roles": [],
+            "failed": 0,
+            "skipped_unchanged_snapshot": False,
+        }
+        if not db.supabase:
+            return report
+
+        scope = RoleManagementService._guild_roles_sync_scope(guild_roles)
+        external_bindings = RoleManagementService._load_external_discord_bindings(log_context="sync_discord_guild_roles")
+        fingerprint = RoleManagementService._guild_roles_fingerprint(guild_roles, external_bindings)
+        if not force and RoleManagementService._guild_roles_sync_hashes.get(scope) == fingerprint:
+            report["skipped_unchanged_snapshot"] = True
+            logger.info("sync_discord_guild_roles skipped: guild role list unchanged scope=%s roles=%s", scope, len(guild_roles))
+            return report
+
+        started_at = time.perf_counter()
+        try:
+            snapshot = RoleManagementService._load_discord_sync_snapshot(external_bindings)
+            plan = RoleManagementService._plan_discord_guild_roles_sync(guild_roles, snapshot)
+            applied = RoleManagementService._apply_discord_guild_roles_plan(plan, snapshot["known_categories"])
         except Exception:
-            logger.exception("sync_discord_guild_roles failed")
-            return {"upserted": upserted, "removed": removed}
+            logger.exception("sync_discord_guild_roles failed scope=%s", scope)
+            return report
+
+        report.update(applied)
+        report["unchanged"] = plan["unchanged"]
+        report["removed_roles"] = plan["stale_names"]
+        report["upserted"] = applied["inserted"] + applied["updated"] + applied["renamed"]
+        if report["upserted"] or report["removed"]:
+            RoleManagementService.invalidate_catalog_cache(reason="sync_discord_guild_roles")
+        if applied["failed"]:
+            RoleManagementService._guild_roles_sync_hashes.pop(scope, None)
+        else:
+            RoleManagementService._guild_roles_sync_hashes[scope] = fingerprint
+
+        logger.info(
+            "sync_discord_guild_roles completed inserted=%s updated=%s renamed=%s unchanged=%s removed=%s profile_titles=%s failed=%s active_ids=%s elapsed_ms=%.1f",
+            report["inserted"],
+            report["updated"],
+            report["renamed"],
+            report["unchanged"],
+            report["removed"],
+            report["profile_titles"],
+            report["failed"],
+            len(plan["active_ids"]),
+            (time.perf_counter() - started_at) * 1000,
+        )
+        return report
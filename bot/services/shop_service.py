@@ -6,8 +6,15 @@
 """
 
 import logging
-from dataclasses import dataclass
-
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+
+from bot.data import db
 from bot.services import AccountsService, PointsService, RoleManagementService
 from bot.services.ux_texts import compose_three_block_plain
 from bot.utils.roles_and_activities import ROLE_THRESHOLDS
@@ -35,6 +42,8 @@ SHOP_RENDER_ERROR_TEXT = (
     "Проверьте цену и нажмите «Купить», если готовы."
 )
 SHOP_PAGE_SIZE = 8
+SHOP_CATALOG_CACHE_TTL_SEC = int(os.getenv("SHOP_CATALOG_CACHE_TTL_SEC", "600"))
+SHOP_CATALOG_VIEW_LIMIT = 2048
 SHOP_TEXT_ITEM_PLACEHOLDER = "Описание скоро добавим."
 SHOP_TEXT_ACQUIRE_HINT_PLACEHOLDER = "Подсказка по получению скоро появится."
 SHOP_TEXT_CATEGORIES_HINT = compose_three_block_plain(
@@ -66,6 +75,9 @@ SHOP_TEXT_ALREADY_OWNED = "ℹ️ Эта роль уже есть у вас."
 SHOP_TEXT_INSUFFICIENT_POINTS = "❌ Не хватает баллов: нужно {required}, у вас {current}. Что дальше: выберите роль подешевле или накопите баллы."
 SHOP_TEXT_DEBIT_FAILED = "❌ Пока не удалось завершить покупку. Что дальше: попробуйте ещё раз чуть позже."
 SHOP_TEXT_GRANT_FAILED = "❌ Покупка не завершена, баллы уже возвращены. Что дальше: попробуйте ещё раз позже."
+SHOP_TEXT_OUT_OF_STOCK = "❌ Этот товар закончился. Что дальше: вернитесь в список и выберите другой."
+SHOP_TEXT_LIMIT_REACHED = "ℹ️ Вы уже купили этот товар максимальное число раз."
+SHOP_TEXT_PURCHASE_DUPLICATE = "ℹ️ Эта покупка уже обработана."
 SHOP_TEXT_UNEXPECTED_ERROR = "❌ Пока не удалось завершить покупку. Что дальше: попробуйте ещё раз чуть позже."
 SHOP_TEXT_PROTECTED_FAILURE = compose_three_block_plain(
     what="Экран магазина временно недоступен.",
@@ -175,6 +187,26 @@ class ShopPageSlice:
     total_pages: int
 
 
+class ShopCatalogItems(list):
+    """Витрина аккаунта из кэша с заранее нарезанными страницами; разделяется между вызовами, не изменять."""
+
+    def __init__(self, items=(), *, page_size: int = SHOP_PAGE_SIZE) -> None:
+        super().__init__(items)
+        self.page_size = max(int(page_size), 1)
+        total_pages = max((len(self) - 1) // self.page_size + 1, 1)
+        self.pages = tuple(
+            ShopPageSlice(items=self[page * self.page_size : (page + 1) * self.page_size], page=page, total_pages=total_pages)
+            for page in range(total_pages)
+        )
+
+
+_shop_catalog_lock = threading.Lock()
+# (версия каталога, срок жизни, общие позиции витрины) и LRU витрин по аккаунтам:
+# account_id -> ((версия каталога, версия ролей аккаунта), срок жизни, ShopCatalogItems).
+_shop_catalog_base: tuple[int, float, list[dict]] | None = None
+_shop_account_views: OrderedDict[str, tuple[tuple[int, int], float, ShopCatalogItems]] = OrderedDict()
+
+
 @dataclass(frozen=True)
 class ShopPurchaseResult:
     ok: bool
@@ -263,12 +295,44 @@ def _highest_owned_volunteer_rank(owned_roles: set[str]) -> int | None:
     return highest_rank
 
 
-def get_shop_catalog_items(*, log_context: str = "shop", account_id: str | None = None) -> list[ShopItem]:
-    items: list[ShopItem] = []
+def invalidate_shop_catalog_cache(*, reason: str | None = None) -> None:
+    global _shop_catalog_base
+    with _shop_catalog_lock:
+        cleared_views = len(_shop_account_views)
+        _shop_catalog_base = None
+        _shop_account_views.clear()
+    logger.debug("shop catalog cache invalidated reason=%s cleared_views=%s", str(reason or "unspecified"), cleared_views)
+
+
+# Правки цен, остатков и ролей витрины идут через RoleManagementService и сбрасывают его каталог — вместе с ним и кэш витрины.
+RoleManagementService.register_catalog_invalidation_listener(invalidate_shop_catalog_cache)
+
+
+def _seconds_until_next_sale_boundary(shop_rows: list[dict]) -> float | None:
+    now = datetime.now(timezone.utc)
+    boundaries = []
+    for row in shop_rows:
+        for field in ("sale_starts_at", "sale_ends_at"):
+            moment = RoleManagementService._parse_iso_datetime(row.get(field))
+            if moment and moment > now:
+                boundaries.append((moment - now).total_seconds())
+    return min(boundaries) if boundaries else None
+
+
+def _get_shop_catalog_base(log_context: str) -> tuple[list[dict], float] | None:
+    """Общая для всех аккаунтов часть витрины: строки shop_items, сведённые с каталогом ролей и отсортированные."""
+
+    global _shop_catalog_base
+    version = RoleManagementService.catalog_version()
+    now = time.monotonic()
+    with _shop_catalog_lock:
+        cached = _shop_catalog_base
+        if cached is not None and cached[0] == version and cached[1] > now:
+            return cached[2], cached[1]
+
     shop_rows = RoleManagementService.list_active_shop_role_items(category_code="roles")
     if not shop_rows:
-        logger.warning("shop_catalog_empty log_context=%s", log_context)
-        return []
+        return None
     grouped = RoleManagementService.list_public_roles_catalog(log_context=f"{log_context}:catalog", only_sellable=False)
     role_lookup: dict[str, dict] = {}
     category_pos: dict[str, int] = {}
@@ -280,15 +344,7 @@ def get_shop_catalog_items(*, log_context: str = "shop", account_id: str | None
             if role_name:
                 role_lookup[role_name.lower()] = {"role": role, "category": category_name}
 
-    owned_roles: set[str] = set()
-    account_key = str(account_id or "").strip()
-    if account_key:
-        owned_roles = _load_owned_role_names_for_account(account_key)
-    highest_owned_volunteer_rank = _highest_owned_volunteer_rank(owned_roles) if account_key else None
-
-    hidden_locked_roles = 0
-    hidden_downgraded_roles = 0
-    hidden_owned_roles = 0
+    entries: list[dict] = []
     for row in shop_rows:
         role_name = str(row.get("role_name") or "").strip()
         role_meta = role_lookup.get(role_name.lower())
@@ -297,6 +353,65 @@ def get_shop_catalog_items(*, log_context: str = "shop", account_id: str | None
             continue
         role = role_meta["role"]
         category_name = str(role_meta["category"])
+        item = ShopItem(
+            shop_item_id=f"{category_name}:{role_name}".lower(),
+            role_name=role_name,
+            short_name=_short_role_name(role_name),
+            category=category_name,
+            position=int(row.get("display_position") or 0),
+            category_position=category_pos.get(category_name, 0),
+            description=str(role.get("description") or "").strip(),
+            acquire_hint=str(role.get("acquire_hint") or "").strip(),
+            price_points=max(int(row.get("effective_price_points") or 0), 0),
+            base_price_points=max(int(row.get("base_price_points") or 0), 0),
+            sale_price_points=None if row.get("sale_price_points") is None else max(int(row.get("sale_price_points") or 0), 0),
+            is_sale_active=bool(row.get("is_sale_active")),
+        )
+        entries.append({"item": item, "role": role})
+    entries.sort(key=lambda entry: (entry["item"].category_position, entry["item"].position, entry["item"].role_name.lower()))
+
+    # TTL — только страховка; цена по акции меняется по расписанию, поэтому кэш живёт не дольше ближайшей границы акции.
+    ttl_sec = float(max(1, SHOP_CATALOG_CACHE_TTL_SEC))
+    sale_boundary_sec = _seconds_until_next_sale_boundary(shop_rows)
+    if sale_boundary_sec is not None:
+        ttl_sec = min(ttl_sec, max(sale_boundary_sec, 1.0))
+    expires_at = time.monotonic() + ttl_sec
+    with _shop_catalog_lock:
+        _shop_catalog_base = (version, expires_at, entries)
+    logger.debug("shop catalog base cache refreshed version=%s items=%s ttl_sec=%.0f", version, len(entries), ttl_sec)
+    return entries, expires_at
+
+
+def get_shop_catalog_items(*, log_context: str = "shop", account_id: str | None = None) -> list[ShopItem]:
+    account_key = str(account_id or "").strip()
+    # Версии читаются до сборки: инвалидация во время сборки оставит запись устаревшей, и следующий вызов её пересоберёт.
+    view_version = (RoleManagementService.catalog_version(), RoleManagementService.account_roles_version(account_key))
+    with _shop_catalog_lock:
+        cached = _shop_account_views.get(account_key)
+        if cached is not None and cached[0] == view_version and cached[1] > time.monotonic():
+            _shop_account_views.move_to_end(account_key)
+            logger.debug("shop catalog view cache hit log_context=%s account_id=%s items=%s", log_context, account_key or None, len(cached[2]))
+            return cached[2]
+
+    base = _get_shop_catalog_base(log_context)
+    if base is None:
+        logger.warning("shop_catalog_empty log_context=%s", log_context)
+        return []
+    entries, expires_at = base
+
+    owned_roles: set[str] = set()
+    if account_key:
+        owned_roles = _load_owned_role_names_for_account(account_key)
+    highest_owned_volunteer_rank = _highest_owned_volunteer_rank(owned_roles) if account_key else None
+
+    visible: list[ShopItem] = []
+    hidden_locked_roles = 0
+    hidden_downgraded_roles = 0
+    hidden_owned_roles = 0
+    for entry in entries:
+        item = entry["item"]
+        role = entry["role"]
+        role_name = item.role_name
         if account_key and role_name.lower() in owned_roles:
             hidden_owned_roles += 1
             logger.info(
@@ -332,43 +447,11 @@ def get_shop_catalog_items(*, log_context: str = "shop", account_id: str | None
                 role_name,
             )
             continue
-        effective_price = max(int(row.get("effective_price_points") or 0), 0)
-        items.append(
-            ShopItem(
-                shop_item_id=f"{category_name}:{role_name}".lower(),
-                role_name=role_name,
-                short_name=_short_role_name(role_name),
-                category=category_name,
-                position=int(row.get("display_position") or 0),
-                category_position=category_pos.get(category_name, 0),
-                description=str(role.get("description") or "").strip(),
-                acquire_hint=str(role.get("acquire_hint") or "").strip(),
-                price_points=effective_price,
-                base_price_points=max(int(row.get("base_price_points") or 0), 0),
-                sale_price_points=None if row.get("sale_price_points") is None else max(int(row.get("sale_price_points") or 0), 0),
-                is_sale_active=bool(row.get("is_sale_active")),
-            )
-        )
+        visible.append(item)
 
-    items.sort(key=lambda item: (item.category_position, item.position, item.role_name.lower()))
-    indexed_ids: list[ShopItem] = []
-    for index, item in enumerate(items):
-        indexed_ids.append(
-            ShopItem(
-                shop_item_id=f"shop_{index + 1}",
-                role_name=item.role_name,
-                short_name=item.short_name,
-                category=item.category,
-                position=item.position,
-                category_position=item.category_position,
-                description=item.description,
-                acquire_hint=item.acquire_hint,
-                price_points=item.price_points,
-                base_price_points=item.base_price_points,
-                sale_price_points=item.sale_price_points,
-                is_sale_active=item.is_sale_active,
-            )
-        )
+    indexed_ids = ShopCatalogItems(
+        replace(item, shop_item_id=f"shop_{index + 1}") for index, item in enumerate(visible)
+    )
     if hidden_locked_roles:
         logger.info(
             "shop_catalog_chain_filter_applied log_context=%s account_id=%s hidden_locked_roles=%s visible_items=%s",
@@ -393,6 +476,11 @@ def get_shop_catalog_items(*, log_context: str = "shop", account_id: str | None
             hidden_owned_roles,
             len(indexed_ids),
         )
+    with _shop_catalog_lock:
+        _shop_account_views[account_key] = (view_version, expires_at, indexed_ids)
+        _shop_account_views.move_to_end(account_key)
+        while len(_shop_account_views) > SHOP_CATALOG_VIEW_LIMIT:
+            _shop_account_views.popitem(last=False)
     return indexed_ids
 
 
@@ -430,6 +518,130 @@ def _required_previous_volunteer_role(
     return required_name, required_discord_id
 
 
+_SHOP_PURCHASE_REJECT_TEXTS = {
+    "duplicate_request": SHOP_TEXT_PURCHASE_DUPLICATE,
+    "item_unavailable": SHOP_TEXT_ITEM_UNAVAILABLE,
+    "price_changed": SHOP_TEXT_PRICE_CHANGED,
+    "already_owned": SHOP_TEXT_ALREADY_OWNED,
+    "out_of_stock": SHOP_TEXT_OUT_OF_STOCK,
+    "limit_reached": SHOP_TEXT_LIMIT_REACHED,
+    "grant_failed": SHOP_TEXT_GRANT_FAILED,
+}
+SHOP_RECENT_OP_KEYS_LIMIT = 4096
+_shop_purchase_locks: dict[str, threading.Lock] = {}
+_shop_purchase_locks_guard = threading.Lock()
+_shop_recent_op_keys: OrderedDict[str, None] = OrderedDict()
+
+
+def _shop_purchase_lock(account_id: str) -> threading.Lock:
+    with _shop_purchase_locks_guard:
+        lock = _shop_purchase_locks.get(account_id)
+        if lock is None:
+            lock = _shop_purchase_locks[account_id] = threading.Lock()
+        return lock
+
+
+def _shop_purchase_attempt_keys(op_key: str, attempt: int) -> tuple[str, str]:
+    # Первая попытка сохраняет прежние ключи, чтобы уже записанные списания и возвраты учитывались.
+    suffix = f":{attempt}" if attempt else ""
+    return f"{op_key}:debit{suffix}", f"{op_key}:refund{suffix}"
+
+
+def _next_shop_purchase_attempt(account_id: str, op_key: str) -> tuple[int, bool] | None:
+    """Номер попытки по уже возвращённым списаниям и признак, что её списание уже записано; None — история недоступна."""
+
+    existing = PointsService.get_action_op_keys(account_id, f"{op_key}:")
+    if existing is None:
+        return None
+    existing_keys = set(existing)
+    attempt = 0
+    while _shop_purchase_attempt_keys(op_key, attempt)[1] in existing_keys:
+        attempt += 1
+    return attempt, _shop_purchase_attempt_keys(op_key, attempt)[0] in existing_keys
+
+
+def _apply_shop_purchase_fallback(*, account_id: str, item: ShopItem, op_key: str, provider: str, actor_id: str) -> dict:
+    """Покупка без RPC shop_purchase_item: лок аккаунта сериализует списание, op_key отсекает повтор в этом процессе.
+
+    После возврата за невыданную роль повтор с тем же op_key списывает заново под ключом следующей попытки;
+    уже записанное списание текущей попытки означает дубликат, и роль без оплаты не выдаётся.
+    """
+
+    with _shop_purchase_lock(account_id):
+        with _shop_purchase_locks_guard:
+            if op_key in _shop_recent_op_keys:
+                return {"status": "duplicate", "new_points": None, "error_code": None}
+
+        current_points = PointsService.get_balance_by_account(account_id)
+        if current_points < float(item.price_points):
+            return {"status": "rejected", "new_points": current_points, "error_code": "insufficient_points"}
+
+        refund_key = f"{op_key}:refund"
+        if item.price_points > 0:
+            attempt_state = _next_shop_purchase_attempt(account_id, op_key)
+            if attempt_state is None:
+                return {"status": "failed", "new_points": current_points, "error_code": "debit_failed"}
+            attempt, already_debited = attempt_state
+            if already_debited:
+                # Списание этой попытки сделал другой процесс или прошлый запуск: роль выдаёт он.
+                return {"status": "duplicate", "new_points": None, "error_code": None}
+            debit_key, refund_key = _shop_purchase_attempt_keys(op_key, attempt)
+            charged = PointsService.remove_points_by_account(
+                account_id,
+                float(item.price_points),
+                f"Покупка роли в магазине: {item.role_name}",
+                account_id,
+                op_key=debit_key,
+            )
+            if not charged:
+                return {"status": "failed", "new_points": current_points, "error_code": "debit_failed"}
+
+        grant_result = RoleManagementService.assign_user_role_by_account(
+            account_id,
+            item.role_name,
+            category=item.category,
+            actor_account_id=account_id,
+            actor_provider=provider,
+            actor_user_id=actor_id,
+            target_provider=provider,
+            target_user_id=actor_id,
+            source=f"shop_purchase:{provider}",
+        )
+        if not bool(grant_result.get("ok")):
+            logger.error(
+                "shop_role_grant_error provider=%s actor_user_id=%s account_id=%s role_name=%s grant_reason=%s",
+                provider,
+                actor_id,
+                account_id,
+                item.role_name,
+                grant_result.get("reason"),
+            )
+            if item.price_points > 0:
+                rollback_ok = PointsService.add_points_by_account(
+                    account_id,
+                    float(item.price_points),
+                    f"Откат списания за роль {item.role_name}: не удалось выдать роль",
+                    account_id,
+                    op_key=refund_key,
+                )
+                logger.info(
+                    "shop_purchase_refund provider=%s actor_user_id=%s account_id=%s role_name=%s amount=%s rollback_ok=%s",
+                    provider,
+                    actor_id,
+                    account_id,
+                    item.role_name,
+                    item.price_points,
+                    rollback_ok,
+                )
+            return {"status": "failed", "new_points": current_points, "error_code": "grant_failed"}
+
+        with _shop_purchase_locks_guard:
+            _shop_recent_op_keys[op_key] = None
+            while len(_shop_recent_op_keys) > SHOP_RECENT_OP_KEYS_LIMIT:
+                _shop_recent_op_keys.popitem(last=False)
+        return {"status": "completed", "new_points": current_points - float(item.price_points), "error_code": None}
+
+
 def purchase_shop_item(
     *,
     account_id: str,
@@ -437,6 +649,7 @@ def purchase_shop_item(
     actor_provider: str,
     actor_user_id: str | int,
     expected_price_points: int | None = None,
+    idempotency_key: str | None = None,
 ) -> ShopPurchaseResult:
     account_key = str(account_id or "").strip()
     item_key = str(shop_item_id or "").strip()
@@ -498,6 +711,34 @@ def purchase_shop_item(
             )
             return ShopPurchaseResult(ok=False, message=SHOP_TEXT_ROLE_NOT_SELLABLE, reason="role_not_sellable")
 
+        # RPC shop_purchase_item выдаёт роль напрямую, минуя assign_user_role_by_account: те же проверки здесь.
+        grant_guard = RoleManagementService.check_role_grant_guards(
+            item.role_name,
+            actor_provider=provider,
+            actor_user_id=actor_id,
+            source=f"shop_purchase:{provider}",
+            role_info=role_state,
+            account_id=account_key,
+            target_provider=provider,
+            target_user_id=actor_id,
+        )
+        if not grant_guard.get("ok"):
+            logger.error(
+                "shop_purchase_filter_bypass_blocked provider=%s actor_user_id=%s account_id=%s shop_item_id=%s role_name=%s reason=%s",
+                provider,
+                actor_id,
+                account_key,
+                item_key,
+                item.role_name,
+                grant_guard.get("reason"),
+            )
+            return ShopPurchaseResult(
+                ok=False,
+                message=str(grant_guard.get("message") or SHOP_TEXT_ITEM_UNAVAILABLE),
+                reason=str(grant_guard.get("reason") or "item_unavailable"),
+                role_name=item.role_name,
+            )
+
         if expected_price_points is not None and int(expected_price_points) != int(item.price_points):
             logger.warning(
                 "shop_purchase_reject provider=%s actor_user_id=%s account_id=%s shop_item_id=%s reason=price_changed expected_price=%s actual_price=%s",
@@ -562,82 +803,60 @@ def purchase_shop_item(
                     role_name=item.role_name,
                 )
 
-        profile = AccountsService.get_profile_by_account(account_key) or {}
-        current_points = _parse_points(profile.get("points"))
-        if current_points < float(item.price_points):
-            logger.info(
-                "shop_purchase_reject provider=%s actor_user_id=%s account_id=%s shop_item_id=%s reason=insufficient_points current_points=%s required_points=%s",
-                provider,
-                actor_id,
-                account_key,
-                item_key,
-                current_points,
-                item.price_points,
+        op_key = f"shop_purchase:{account_key}:{item.role_name.lower()}:{idempotency_key or uuid.uuid4().hex}"
+        purchase = db.apply_shop_purchase(
+            account_id=account_key,
+            role_name=item.role_name,
+            category=RoleManagementService._normalized_category(item.category),
+            price_points=int(item.price_points),
+            reason=f"Покупка роли в магазине: {item.role_name}",
+            op_key=op_key,
+        )
+        if purchase is None:
+            # RPC ещё не развёрнут: прежние шаги, но под локом аккаунта и с op_key на списании.
+            purchase = _apply_shop_purchase_fallback(
+                account_id=account_key,
+                item=item,
+                op_key=op_key,
+                provider=provider,
+                actor_id=actor_id,
             )
-            return ShopPurchaseResult(
-                ok=False,
-                message=SHOP_TEXT_INSUFFICIENT_POINTS.format(required=item.price_points, current=int(current_points)),
-                reason="insufficient_points",
+        elif purchase.get("status") == "completed":
+            RoleManagementService.mark_account_roles_changed(account_key)
+            RoleManagementService.record_role_change_audit(
+                action="role_grant",
                 role_name=item.role_name,
+                source=f"shop_purchase:{provider}",
+                actor_provider=provider,
+                actor_user_id=actor_id,
+                actor_account_id=account_key,
+                target_provider=provider,
+                target_user_id=actor_id,
+                target_account_id=account_key,
+                before={"assigned": False, "category": item.category},
+                after={"assigned": True, "category": item.category},
             )
 
-        charged = True
-        if item.price_points > 0:
-            charged = PointsService.remove_points_by_account(
-                account_key,
-                float(item.price_points),
-                f"Покупка роли в магазине: {item.role_name}",
-                account_key,
-            )
-        if not charged:
-            logger.error(
-                "shop_purchase_reject provider=%s actor_user_id=%s account_id=%s shop_item_id=%s reason=debit_failed required_points=%s",
-                provider,
-                actor_id,
-                account_key,
-                item_key,
-                item.price_points,
-            )
-            return ShopPurchaseResult(ok=False, message=SHOP_TEXT_DEBIT_FAILED, reason="debit_failed")
-
-        grant_result = RoleManagementService.assign_user_role_by_account(
-            account_key,
-            item.role_name,
-            category=item.category,
-            actor_account_id=account_key,
-            actor_provider=provider,
-            actor_user_id=actor_id,
-            target_provider=provider,
-            target_user_id=actor_id,
-            source=f"shop_purchase:{provider}",
-        )
-        if not bool(grant_result.get("ok")):
-            logger.error(
-                "shop_role_grant_error provider=%s actor_user_id=%s account_id=%s shop_item_id=%s role_name=%s grant_reason=%s",
+        status = str(purchase.get("status") or "failed")
+        error_code = str(purchase.get("error_code") or "").strip() or None
+        if status != "completed":
+            reason = "duplicate_request" if status == "duplicate" else error_code or "debit_failed"
+            logger.info(
+                "shop_purchase_reject provider=%s actor_user_id=%s account_id=%s shop_item_id=%s reason=%s status=%s op_key=%s",
                 provider,
                 actor_id,
                 account_key,
                 item_key,
-                item.role_name,
-                grant_result.get("reason"),
+                reason,
+                status,
+                op_key,
             )
-            if item.price_points > 0:
-                rollback_ok = PointsService.add_points_by_account(
-                    account_key,
-                    float(item.price_points),
-                    f"Откат списания за роль {item.role_name}: не удалось выдать роль",
-                    account_key,
-                )
-                logger.info(
-                    "shop_purchase_refund provider=%s actor_user_id=%s account_id=%s shop_item_id=%s amount=%s rollback_ok=%s",
-                    provider,
-                    actor_id,
-                    account_key,
-                    item_key,
-                    item.price_points,
-                    rollback_ok,
-                )
-            return ShopPurchaseResult(ok=False, message=SHOP_TEXT_GRANT_FAILED, reason="grant_failed")
+            if reason == "insufficient_points":
+                current_points = _parse_points(purchase.get("new_points"))
+                message = SHOP_TEXT_INSUFFICIENT_POINTS.format(required=item.price_points, current=int(current_points))
+            else:
+                message = _SHOP_PURCHASE_REJECT_TEXTS.get(reason, SHOP_TEXT_DEBIT_FAILED)
+            return ShopPurchaseResult(ok=False, message=message, reason=reason, role_name=item.role_name)
 
         logger.info(
             "shop_purchase_audit_result provider=%s actor_user_id=%s account_id=%s shop_item_id=%s role_name=%s price_points=%s is_sale=%s role_grant_ok=true",
@@ -715,6 +934,8 @@ def purchase_shop_item(
 
 def get_shop_page_slice(items: list[ShopItem], requested_page: int, *, page_size: int = SHOP_PAGE_SIZE) -> ShopPageSlice:
     safe_page = _normalize_shop_page(requested_page, len(items), page_size=page_size)
+    if isinstance(items, ShopCatalogItems) and items.page_size == max(int(page_size), 1):
+        return items.pages[safe_page]
     safe_page_size = max(int(page_size), 1)
     total_pages = max((len(items) - 1) // safe_page_size + 1, 1)
     start = safe_page * safe_page_size
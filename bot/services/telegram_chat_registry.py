@@ -0,0 +1,113 @@
+"""
+Назначение: модуль "telegram chat registry" реализует продуктовый контур в зоне Telegram.
+Ответственность: память о последнем сохранённом состоянии чатов, чтобы запись в `bot_chat_registry` шла только при реальных изменениях.
+Где используется: Telegram (`bot/telegram_bot/chat_registry_router.py`).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_REFRESH_SECONDS = 6 * 60 * 60
+
+
+def _read_refresh_seconds() -> float:
+    raw_value = (os.getenv("TELEGRAM_CHAT_REGISTRY_REFRESH_SECONDS") or "").strip()
+    if not raw_value:
+        return float(_DEFAULT_REFRESH_SECONDS)
+    try:
+        return max(0.0, float(raw_value))
+    except ValueError:
+        logger.warning("telegram chat registry invalid refresh seconds value=%s fallback=%s", raw_value, _DEFAULT_REFRESH_SECONDS)
+        return float(_DEFAULT_REFRESH_SECONDS)
+
+
+@dataclass(frozen=True, slots=True)
+class _ChatSnapshot:
+    chat_title: str | None
+    chat_type: str
+    is_active: bool
+
+
+_lock = threading.Lock()
+_persisted: dict[str, tuple[_ChatSnapshot, float]] = {}
+_in_flight: dict[str, _ChatSnapshot] = {}
+_metrics: dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "write_failures": 0}
+
+
+class TelegramChatRegistry:
+    """Дедупликация записей реестра чатов: пишем при смене title/type/active или по истечении окна свежести."""
+
+    REFRESH_SECONDS = _read_refresh_seconds()
+
+    @staticmethod
+    def claim(chat_id: str | int | None, *, chat_title: str | None, chat_type: str | None, is_active: bool) -> bool:
+        """True — вызывающий должен записать чат и затем вызвать `complete`; False — запись не нужна."""
+
+        normalized_chat_id = str(chat_id or "").strip()
+        normalized_chat_type = str(chat_type or "").strip()
+        if not normalized_chat_id or not normalized_chat_type:
+            return False
+        snapshot = _ChatSnapshot(str(chat_title or "").strip() or None, normalized_chat_type, bool(is_active))
+        now = time.monotonic()
+        with _lock:
+            # Параллельные события того же чата не порождают вторую запись, пока первая в полёте.
+            if _in_flight.get(normalized_chat_id) == snapshot:
+                _metrics["hits"] += 1
+                return False
+            persisted = _persisted.get(normalized_chat_id)
+            if persisted is not None:
+                persisted_snapshot, persisted_at = persisted
+                if persisted_snapshot == snapshot and now - persisted_at < TelegramChatRegistry.REFRESH_SECONDS:
+                    _metrics["hits"] += 1
+                    return False
+            _metrics["misses"] += 1
+            _in_flight[normalized_chat_id] = snapshot
+            return True
+
+    @staticmethod
+    def complete(chat_id: str | int | None, *, chat_title: str | None, chat_type: str | None, is_active: bool, persisted: bool) -> None:
+        normalized_chat_id = str(chat_id or "").strip()
+        if not normalized_chat_id:
+            return
+        snapshot = _ChatSnapshot(str(chat_title or "").strip() or None, str(chat_type or "").strip(), bool(is_active))
+        with _lock:
+            # Claim мог снять `forget`: запись из полёта тогда не запоминается, следующее событие повторит её.
+            claimed = normalized_chat_id in _in_flight
+            if _in_flight.get(normalized_chat_id) == snapshot:
+                _in_flight.pop(normalized_chat_id, None)
+            if persisted:
+                _metrics["writes"] += 1
+                if claimed:
+                    _persisted[normalized_chat_id] = (snapshot, time.monotonic())
+            else:
+                # Неудачная запись не запоминается: следующее событие повторит её.
+                _metrics["write_failures"] += 1
+
+    @staticmethod
+    def forget(chat_id: str | int | None) -> None:
+        """Сбросить память о чате, если его состояние в таблице изменили в обход реестра; снимает и запись в полёте."""
+
+        normalized_chat_id = str(chat_id or "").strip()
+        with _lock:
+            _persisted.pop(normalized_chat_id, None)
+            _in_flight.pop(normalized_chat_id, None)
+
+    @staticmethod
+    def metrics_snapshot() -> dict[str, int]:
+        with _lock:
+            return {**_metrics, "known_chats": len(_persisted)}
+
+    @staticmethod
+    def reset() -> None:
+        with _lock:
+            _persisted.clear()
+            _in_flight.clear()
+            for key in _metrics:
+                _metrics[key] = 0
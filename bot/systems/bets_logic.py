@@ -340,8 +340,7 @@ def refund_all_bets(tournament_id: int, admin_id: int | None = None) -> None:
 
     remaining = tournament_db.close_bet_bank(tournament_id)
     if remaining > 0:
-        db.add_to_bank(remaining)
-        db.log_bank_income(
+        db.add_to_bank_with_history(
             admin_id or 0,
             remaining,
             f"Возврат банка ставок турнира #{tournament_id}",
@@ -505,51 +505,56 @@ async def check_overdue_fines(bot):
             continue
 
 # 📆 Ежедневное удержание по задолженностям
-async def debt_repayment_loop(bot):
+async def repay_debts_once(bot):
     await bot.wait_until_ready()
-    while True:
-        now = datetime.now(timezone.utc)
-        for fine in db.fines:
-            if not fine.get("is_overdue") or fine.get("is_paid") or fine.get("is_canceled"):
-                continue
+    now = datetime.now(timezone.utc)
+    for fine in db.fines:
+        if not fine.get("is_overdue") or fine.get("is_paid") or fine.get("is_canceled"):
+            continue
 
-            due_raw = fine.get("due_date")
-            if not isinstance(due_raw, str):
-                continue
-            due_date = datetime.fromisoformat(due_raw)
+        due_raw = fine.get("due_date")
+        if not isinstance(due_raw, str):
+            continue
+        due_date = datetime.fromisoformat(due_raw)
 
-            if (now - due_date).days < 10:
-                continue
+        if (now - due_date).days < 10:
+            continue
 
-            debt = create_debt_from_fine(fine)
-            account_id = debt.get("account_id")
-            if not account_id:
-                logger.warning("debt repayment skip: fine_id=%s without account_id", fine.get("id"))
-                continue
-            user_id = db._get_discord_user_for_account_id(account_id)
-            if user_id is None:
-                logger.warning("debt repayment skip: fine_id=%s unresolved discord user for account_id=%s", fine.get("id"), account_id)
-                continue
-            available = db.scores.get(user_id, 0)
-
-            if available > 0:
-                to_deduct = min(available, debt["total_due"])
-                db.update_scores(user_id, -to_deduct)
-                author_user_id = db._get_discord_user_for_account_id(fine.get("author_account_id")) or 0
-                db.add_action(user_id, -to_deduct, f"Погашение долга по штрафу ID #{debt['fine_id']}", author_user_id)
-                reason = str(fine.get("reason", ""))
-                if "test" not in reason.lower():
-                    db.add_to_bank(to_deduct)
-
-                fine['paid_amount'] = round(fine.get('paid_amount', 0) + to_deduct, 2)
-                if fine['paid_amount'] >= fine['amount']:
-                    fine['is_paid'] = True
-
-                if db.supabase:
-                    db.supabase.table("fines").update({
-                        "paid_amount": fine['paid_amount'],
-                        "is_paid": fine['is_paid']
-                    }).eq("id", fine['id']).execute()
+        debt = create_debt_from_fine(fine)
+        account_id = debt.get("account_id")
+        if not account_id:
+            logger.warning("debt repayment skip: fine_id=%s without account_id", fine.get("id"))
+            continue
+        user_id = db._get_discord_user_for_account_id(account_id)
+        if user_id is None:
+            logger.warning("debt repayment skip: fine_id=%s unresolved discord user for account_id=%s", fine.get("id"), account_id)
+            continue
+        available = db.scores.get(user_id, 0)
+
+        if available > 0:
+            to_deduct = min(available, debt["total_due"])
+            db.update_scores(user_id, -to_deduct)
+            author_user_id = db._get_discord_user_for_account_id(fine.get("author_account_id")) or 0
+            db.add_action(user_id, -to_deduct, f"Погашение долга по штрафу ID #{debt['fine_id']}", author_user_id)
+            reason = str(fine.get("reason", ""))
+            if "test" not in reason.lower():
+                db.add_to_bank(to_deduct, reason=f"Погашение долга по штрафу ID #{debt['fine_id']}")
+
+            fine['paid_amount'] = round(fine.get('paid_amount', 0) + to_deduct, 2)
+            if fine['paid_amount'] >= fine['amount']:
+                fine['is_paid'] = True
+
+            if db.supabase:
+                db.supabase.table("fines").update({
+                    "paid_amount": fine['paid_amount'],
+                    "is_paid": fine['is_paid']
+                }).eq("id", fine['id']).execute()
+
+
+async def debt_repayment_loop(bot):
+    await bot.wait_until_ready()
+    while True:
+        await repay_debts_once(bot)
         await asyncio.sleep(86400)
 
 # 🔔 Напоминания перед сроком
@@ -12,9 +12,17 @@ from collections.abc import Iterable
 import discord
 
 from bot.services import AccountsService
+from bot.services.role_fingerprint_service import RoleFingerprintService
+from bot.utils.blocking_io import run_blocking_io
 
 logger = logging.getLogger(__name__)
 
+SYNC_RESULT_UPDATED = "updated"
+SYNC_RESULT_UNCHANGED = "unchanged"
+SYNC_RESULT_SKIPPED = "skipped"
+SYNC_RESULT_NO_ACCOUNT = "no_account"
+SYNC_RESULT_FAILED = "failed"
+
 _member_title_role_state_cache: dict[tuple[int, int], tuple[str, ...]] = {}
 
 
@@ -51,8 +59,24 @@ async def sync_discord_member_titles(
     configured_role_names: set[str] | None = None,
     force: bool = False,
 ) -> bool:
+    result = await _sync_member_titles(
+        member,
+        role_mappings=role_mappings,
+        configured_role_names=configured_role_names,
+        force=force,
+    )
+    return result == SYNC_RESULT_UPDATED
+
+
+async def _sync_member_titles(
+    member: discord.Member,
+    *,
+    role_mappings: dict[int, str] | None,
+    configured_role_names: set[str] | None,
+    force: bool,
+) -> str:
     if getattr(member, "bot", False):
-        return False
+        return SYNC_RESULT_SKIPPED
 
     role_mappings = role_mappings if role_mappings is not None else AccountsService.get_configured_title_roles()
     configured_role_names = (
@@ -64,7 +88,7 @@ async def sync_discord_member_titles(
             getattr(member.guild, "id", "unknown"),
             getattr(member, "id", "unknown"),
         )
-        return False
+        return SYNC_RESULT_SKIPPED
 
     title_role_state = _build_title_role_state(
         member,
@@ -78,18 +102,18 @@ async def sync_discord_member_titles(
             member.id,
             list(title_role_state),
         )
-        return False
+        return SYNC_RESULT_UNCHANGED
 
     account_id = AccountsService.resolve_account_id("discord", str(member.id))
     if not account_id:
-        _member_title_role_state_cache[_member_cache_key(member)] = title_role_state
+        # Не кешируем: после привязки аккаунта следующий проход должен подтянуть титулы.
         logger.warning(
             "profile title sync skipped member without linked account guild_id=%s member_id=%s titles=%s",
             member.guild.id,
             member.id,
             list(title_role_state),
         )
-        return False
+        return SYNC_RESULT_NO_ACCOUNT
 
     saved_titles = tuple(AccountsService.get_account_titles(account_id))
     if saved_titles == title_role_state:
@@ -101,7 +125,7 @@ async def sync_discord_member_titles(
             account_id,
             list(title_role_state),
         )
-        return False
+        return SYNC_RESULT_UNCHANGED
 
     saved = AccountsService.save_account_titles(account_id, list(title_role_state), source="discord")
     if saved:
@@ -113,7 +137,7 @@ async def sync_discord_member_titles(
             account_id,
             list(title_role_state),
         )
-        return True
+        return SYNC_RESULT_UPDATED
 
     logger.error(
         "profile title sync failed to persist account titles guild_id=%s member_id=%s account_id=%s titles=%s",
@@ -122,10 +146,13 @@ async def sync_discord_member_titles(
         account_id,
         list(title_role_state),
     )
-    return False
+    return SYNC_RESULT_FAILED
+
 
+async def sync_discord_titles_once(bot: discord.Client) -> dict[str, int]:
+    """Reconciliation pass: пересчитываются только участники, чей отпечаток ролей изменился с прошлого прохода."""
 
-async def sync_discord_titles_once(bot: discord.Client) -> None:
+    stats = {"changed": 0, "unchanged": 0, "synced": 0, "failed": 0, "processed_members": 0}
     role_mappings = AccountsService.get_configured_title_roles()
     configured_role_names = AccountsService.get_configured_title_role_names()
 
@@ -133,48 +160,71 @@ async def sync_discord_titles_once(bot: discord.Client) -> None:
         logger.info(
             "profile title sync skipped: no DB mappings in profile_title_roles and env PROFILE_DISCORD_TITLE_ROLE_IDS/PROFILE_DISCORD_TITLE_ROLE_NAMES are empty"
         )
-        return
-
-    synced = 0
-    skipped_unchanged = 0
-    processed_members = 0
+        return stats
 
+    config_digest = RoleFingerprintService.config_digest(role_mappings, configured_role_names)
     for guild in bot.guilds:
+        stored_fingerprints = await run_blocking_io(
+            "profile_titles.load_fingerprints", RoleFingerprintService.load_guild, guild.id, logger=logger
+        )
+        pending_fingerprints: dict[str, str] = {}
         for member in guild.members:
             if getattr(member, "bot", False):
                 continue
 
-            processed_members += 1
+            stats["processed_members"] += 1
+            member_key = str(member.id)
+            fingerprint = RoleFingerprintService.fingerprint(
+                (role.id for role in getattr(member, "roles", []) or []),
+                config_digest,
+            )
+            if stored_fingerprints.get(member_key) == fingerprint:
+                stats["unchanged"] += 1
+                continue
+
+            stats["changed"] += 1
             try:
-                current_title_role_state = _build_title_role_state(
+                result = await _sync_member_titles(
                     member,
                     role_mappings=role_mappings,
                     configured_role_names=configured_role_names,
+                    force=False,
                 )
-                if _should_skip_member_sync(member, current_title_role_state):
-                    skipped_unchanged += 1
-                    continue
-
-                if await sync_discord_member_titles(
-                    member,
-                    role_mappings=role_mappings,
-                    configured_role_names=configured_role_names,
-                ):
-                    synced += 1
             except Exception:
+                result = SYNC_RESULT_FAILED
                 logger.exception(
                     "profile title sync member failed guild_id=%s member_id=%s",
                     guild.id,
                     getattr(member, "id", "unknown"),
                 )
+            if result == SYNC_RESULT_FAILED:
+                # Отпечаток не сохраняем: участник будет пересчитан на следующем проходе.
+                stats["failed"] += 1
+                continue
+            if result == SYNC_RESULT_UPDATED:
+                stats["synced"] += 1
+            if result != SYNC_RESULT_NO_ACCOUNT:
+                # Без привязанного аккаунта отпечаток не фиксируем, иначе после привязки титулы не подтянутся.
+                pending_fingerprints[member_key] = fingerprint
+
+        await run_blocking_io(
+            "profile_titles.save_fingerprints",
+            RoleFingerprintService.save_many,
+            guild.id,
+            pending_fingerprints,
+            logger=logger,
+        )
 
     logger.info(
-        "profile title reconciliation finished synced=%s skipped_unchanged=%s processed_members=%s guilds=%s",
-        synced,
-        skipped_unchanged,
-        processed_members,
+        "profile title reconciliation finished changed=%s unchanged=%s synced=%s failed=%s processed_members=%s guilds=%s",
+        stats["changed"],
+        stats["unchanged"],
+        stats["synced"],
+        stats["failed"],
+        stats["processed_members"],
         len(bot.guilds),
     )
+    return stats
 
 
 def _roles_changed(before_roles: Iterable[discord.Role], after_roles: Iterable[discord.Role]) -> bool:
@@ -1643,8 +1643,7 @@ async def finalize_tournament_logic(
 
     remaining = close_bet_bank(tournament_id)
     if remaining > 0:
-        _db.add_to_bank(remaining)
-        _db.log_bank_income(
+        _db.add_to_bank_with_history(
             admin_id,
             remaining,
             f"Возврат банка ставок турнира #{tournament_id}",
@@ -3301,30 +3300,35 @@ async def tournament_reminder_loop(bot: commands.Bot) -> None:
         await asyncio.sleep(21600)
 
 
+async def notify_expired_registrations(bot: commands.Bot) -> None:
+    """Уведомляет авторов турниров, у которых закончилась регистрация."""
+    expired = get_expired_registrations()
+    for t in expired:
+        tid = t.get("id")
+        if tid in expired_notified:
+            continue
+        admin_id = t.get("author_id") or get_tournament_author(tid)
+        admin = bot.get_user(admin_id) if admin_id else None
+        if admin:
+            try:
+                await safe_send(
+                    admin,
+                    f"Регистрация на турнир #{tid} завершилась. Продлить?",
+                    view=ExtendRegistrationView(tid),
+                )
+                await send_participation_confirmations(bot, tid, admin_id)
+                expired_notified.add(tid)
+            except Exception:
+                logger.exception(
+                    "Failed to notify admin about expired registration tournament_id=%s admin_id=%s",
+                    tid,
+                    admin_id,
+                )
+
+
 async def registration_deadline_loop(bot: commands.Bot) -> None:
     """Проверяет окончание регистрации турниров и уведомляет админа."""
     await bot.wait_until_ready()
     while not bot.is_closed():
-        expired = get_expired_registrations()
-        for t in expired:
-            tid = t.get("id")
-            if tid in expired_notified:
-                continue
-            admin_id = t.get("author_id") or get_tournament_author(tid)
-            admin = bot.get_user(admin_id) if admin_id else None
-            if admin:
-                try:
-                    await safe_send(
-                        admin,
-                        f"Регистрация на турнир #{tid} завершилась. Продлить?",
-                        view=ExtendRegistrationView(tid),
-                    )
-                    await send_participation_confirmations(bot, tid, admin_id)
-                    expired_notified.add(tid)
-                except Exception:
-                    logger.exception(
-                        "Failed to notify admin about expired registration tournament_id=%s admin_id=%s",
-                        tid,
-                        admin_id,
-                    )
+        await notify_expired_registrations(bot)
         await asyncio.sleep(3600)
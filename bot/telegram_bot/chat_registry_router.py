@@ -14,7 +14,9 @@ from aiogram.types import CallbackQuery, ChatMemberUpdated, Message
 
 from bot.services import AccountsService
 from bot.services import GuiyPublishDestinationsService
+from bot.services.telegram_chat_registry import TelegramChatRegistry
 from bot.telegram_bot.identity import persist_telegram_identity_from_user
+from bot.utils.blocking_io import run_blocking_io
 
 logger = logging.getLogger(__name__)
 router = Router(name="telegram_chat_registry")
@@ -22,14 +24,35 @@ _GROUP_CHAT_TYPES = {"group", "supergroup"}
 _TRACKED_CHAT_TYPES = _GROUP_CHAT_TYPES | {"channel"}
 
 
-def _remember_chat(chat) -> None:
+async def _persist_chat(*, chat_id, chat_title, chat_type, is_active: bool) -> None:
+    # Реестр меняется редко: пишем только при изменении или по окну свежести и не блокируем event loop.
+    if not TelegramChatRegistry.claim(chat_id, chat_title=chat_title, chat_type=chat_type, is_active=is_active):
+        return
+    persisted = False
+    try:
+        persisted = bool(
+            await run_blocking_io(
+                "telegram.chat_registry.register",
+                GuiyPublishDestinationsService.register_telegram_chat,
+                chat_id=chat_id,
+                chat_title=chat_title,
+                chat_type=chat_type,
+                is_active=is_active,
+                logger=logger,
+            )
+        )
+    finally:
+        TelegramChatRegistry.complete(chat_id, chat_title=chat_title, chat_type=chat_type, is_active=is_active, persisted=persisted)
+
+
+async def _remember_chat(chat) -> None:
     if chat is None:
         return
     chat_type = str(getattr(chat, "type", "") or "").strip()
     if chat_type not in _TRACKED_CHAT_TYPES:
         return
     try:
-        GuiyPublishDestinationsService.register_telegram_chat(
+        await _persist_chat(
             chat_id=getattr(chat, "id", None),
             chat_title=getattr(chat, "title", None),
             chat_type=chat_type,
@@ -46,7 +69,7 @@ def _remember_chat(chat) -> None:
 
 @router.message(F.chat.type.in_(_GROUP_CHAT_TYPES), flags={"block": False})
 async def remember_group_message(message: Message) -> None:
-    _remember_chat(message.chat)
+    await _remember_chat(message.chat)
     logger.info(
         "telegram chat registry pass-through event=message chat_id=%s chat_type=%s",
         getattr(message.chat, "id", None),
@@ -57,7 +80,7 @@ async def remember_group_message(message: Message) -> None:
 
 @router.edited_message(F.chat.type.in_(_GROUP_CHAT_TYPES), flags={"block": False})
 async def remember_group_edited_message(message: Message) -> None:
-    _remember_chat(message.chat)
+    await _remember_chat(message.chat)
     logger.info(
         "telegram chat registry pass-through event=edited_message chat_id=%s chat_type=%s",
         getattr(message.chat, "id", None),
@@ -68,7 +91,7 @@ async def remember_group_edited_message(message: Message) -> None:
 
 @router.channel_post(F.chat.type == "channel", flags={"block": False})
 async def remember_channel_post(message: Message) -> None:
-    _remember_chat(message.chat)
+    await _remember_chat(message.chat)
     logger.info(
         "telegram chat registry pass-through event=channel_post chat_id=%s chat_type=%s",
         getattr(message.chat, "id", None),
@@ -79,7 +102,7 @@ async def remember_channel_post(message: Message) -> None:
 
 @router.edited_channel_post(F.chat.type == "channel", flags={"block": False})
 async def remember_channel_edited_post(message: Message) -> None:
-    _remember_chat(message.chat)
+    await _remember_chat(message.chat)
     logger.info(
         "telegram chat registry pass-through event=edited_channel_post chat_id=%s chat_type=%s",
         getattr(message.chat, "id", None),
@@ -90,7 +113,7 @@ async def remember_channel_edited_post(message: Message) -> None:
 
 @router.callback_query(F.message, F.message.chat.type.in_(_GROUP_CHAT_TYPES), flags={"block": False})
 async def remember_group_callback(callback: CallbackQuery) -> None:
-    _remember_chat(callback.message.chat if callback.message else None)
+    await _remember_chat(callback.message.chat if callback.message else None)
     logger.info(
         "telegram chat registry pass-through event=callback chat_id=%s chat_type=%s",
         getattr(getattr(callback.message, "chat", None), "id", None),
@@ -112,7 +135,7 @@ async def remember_bot_membership(update: ChatMemberUpdated) -> None:
         status,
         is_active,
     )
-    GuiyPublishDestinationsService.register_telegram_chat(
+    await _persist_chat(
         chat_id=getattr(chat, "id", None),
         chat_title=getattr(chat, "title", None),
         chat_type=getattr(chat, "type", None),
@@ -122,7 +145,7 @@ async def remember_bot_membership(update: ChatMemberUpdated) -> None:
 
 @router.chat_member(F.chat.type.in_(_GROUP_CHAT_TYPES))
 async def remember_user_membership(update: ChatMemberUpdated) -> None:
-    _remember_chat(update.chat)
+    await _remember_chat(update.chat)
 
     old_status = str(getattr(getattr(update, "old_chat_member", None), "status", "") or "").strip()
     new_status = str(getattr(getattr(update, "new_chat_member", None), "status", "") or "").strip()
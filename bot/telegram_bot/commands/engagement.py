@@ -20,11 +20,13 @@ from bot.services import AccountsService, AuthorityService, PointsService, Ticke
 from bot.services.profile_titles import normalize_protected_profile_title
 from bot.telegram_bot.identity import persist_telegram_identity_from_user
 from bot.utils.blocking_io import run_blocking_io
+from bot.utils.flow_state import FlowStateNamespace, register_flow_state_type
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 
+@register_flow_state_type
 @dataclass
 class PendingAction:
     domain: str
@@ -36,21 +38,21 @@ class PendingAction:
     flow_message_id: Optional[int] = None
 
 
-_PENDING_ACTIONS: dict[int, PendingAction] = {}
-
-
 PENDING_ACTION_TTL_SECONDS = 600
 
+_PENDING_ACTIONS = FlowStateNamespace("telegram.engagement.pending_action", ttl_seconds=PENDING_ACTION_TTL_SECONDS)
+
 
 def _is_pending_action_expired(pending: PendingAction) -> bool:
     return (time.time() - pending.created_at) > PENDING_ACTION_TTL_SECONDS
 
 
 def has_pending_action(telegram_user_id: int | None) -> bool:
+    # Вызывается фильтром на каждом сообщении: читаем только локальный индекс namespace, без I/O.
     if telegram_user_id is None:
         return False
 
-    pending = _PENDING_ACTIONS.get(telegram_user_id)
+    pending = _PENDING_ACTIONS.peek(telegram_user_id)
     if not pending:
         return False
 
@@ -62,7 +64,7 @@ def has_pending_action(telegram_user_id: int | None) -> bool:
             pending.operation,
             PENDING_ACTION_TTL_SECONDS,
         )
-        _PENDING_ACTIONS.pop(telegram_user_id, None)
+        _PENDING_ACTIONS.discard(telegram_user_id)
         return False
 
     return True
@@ -622,13 +624,16 @@ async def points_callback(callback: CallbackQuery) -> None:
 
         flow_message_id = callback.message.message_id if callback.message else None
         flow_chat_id = callback.message.chat.id if callback.message and callback.message.chat else None
-        _PENDING_ACTIONS[callback.from_user.id] = PendingAction(
-            domain="points",
-            operation=action,
-            target_provider_user_id=target_id,
-            actor_provider_user_id=actor_id,
-            chat_id=flow_chat_id,
-            flow_message_id=flow_message_id,
+        await _PENDING_ACTIONS.aset(
+            callback.from_user.id,
+            PendingAction(
+                domain="points",
+                operation=action,
+                target_provider_user_id=target_id,
+                actor_provider_user_id=actor_id,
+                chat_id=flow_chat_id,
+                flow_message_id=flow_message_id,
+            ),
         )
         if callback.message is not None:
             try:
@@ -707,13 +712,16 @@ async def tickets_callback(callback: CallbackQuery) -> None:
 
         flow_message_id = callback.message.message_id if callback.message else None
         flow_chat_id = callback.message.chat.id if callback.message and callback.message.chat else None
-        _PENDING_ACTIONS[callback.from_user.id] = PendingAction(
-            domain="tickets",
-            operation=action,
-            target_provider_user_id=target_id,
-            actor_provider_user_id=actor_id,
-            chat_id=flow_chat_id,
-            flow_message_id=flow_message_id,
+        await _PENDING_ACTIONS.aset(
+            callback.from_user.id,
+            PendingAction(
+                domain="tickets",
+                operation=action,
+                target_provider_user_id=target_id,
+                actor_provider_user_id=actor_id,
+                chat_id=flow_chat_id,
+                flow_message_id=flow_message_id,
+            ),
         )
         if callback.message is not None:
             try:
@@ -822,13 +830,16 @@ async def bank_callback(callback: CallbackQuery) -> None:
 
         flow_message_id = callback.message.message_id if callback.message else None
         flow_chat_id = callback.message.chat.id if callback.message and callback.message.chat else None
-        _PENDING_ACTIONS[callback.from_user.id] = PendingAction(
-            domain="bank",
-            operation=action,
-            target_provider_user_id=actor_id,
-            actor_provider_user_id=actor_id,
-            chat_id=flow_chat_id,
-            flow_message_id=flow_message_id,
+        await _PENDING_ACTIONS.aset(
+            callback.from_user.id,
+            PendingAction(
+                domain="bank",
+                operation=action,
+                target_provider_user_id=actor_id,
+                actor_provider_user_id=actor_id,
+                chat_id=flow_chat_id,
+                flow_message_id=flow_message_id,
+            ),
         )
         if callback.message:
             await callback.message.edit_text(
@@ -853,7 +864,14 @@ async def pending_action_handler(message: Message) -> None:
         )
         return
 
-    pending = _PENDING_ACTIONS.get(message.from_user.id)
+    pending = await _PENDING_ACTIONS.aget(message.from_user.id)
+    if pending is None:
+        logger.warning(
+            "pending action handler found no stored state user_id=%s chat_id=%s",
+            message.from_user.id,
+            message.chat.id if message.chat else None,
+        )
+        return
     try:
         authority = await run_blocking_io(
             "telegram.pending_action.resolve_authority",
@@ -865,23 +883,23 @@ async def pending_action_handler(message: Message) -> None:
         if pending.domain == "points" and not _can_manage_points(authority.level):
             logger.warning("pending points action denied by authority actor_id=%s", message.from_user.id)
             await message.answer("❌ Недостаточно полномочий для редактирования баллов.")
-            _PENDING_ACTIONS.pop(message.from_user.id, None)
+            await _PENDING_ACTIONS.apop(message.from_user.id)
             return
         if pending.domain == "tickets" and not _can_manage_tickets(authority.titles, authority.level):
             logger.warning("pending tickets action denied by authority actor_id=%s", message.from_user.id)
             await message.answer("❌ Недостаточно полномочий для редактирования билетов.")
-            _PENDING_ACTIONS.pop(message.from_user.id, None)
+            await _PENDING_ACTIONS.apop(message.from_user.id)
             return
         if pending.domain == "bank":
             if message.chat.type != "private":
                 logger.warning("pending bank action denied non-private actor_id=%s", message.from_user.id)
                 await message.answer("❌ Настройка банка доступна только в ЛС с ботом.")
-                _PENDING_ACTIONS.pop(message.from_user.id, None)
+                await _PENDING_ACTIONS.apop(message.from_user.id)
                 return
             if not _is_super_admin_titles(authority.titles):
                 logger.warning("pending bank action denied non-super-admin actor_id=%s", message.from_user.id)
                 await message.answer("❌ Настройка банка доступна только суперадмину.")
-                _PENDING_ACTIONS.pop(message.from_user.id, None)
+                await _PENDING_ACTIONS.apop(message.from_user.id)
                 return
         else:
             if str(pending.target_provider_user_id) == str(message.from_user.id):
@@ -892,7 +910,7 @@ async def pending_action_handler(message: Message) -> None:
                         pending.domain,
                     )
                     await message.answer("❌ Нельзя редактировать себя. Доступно только Главе клуба и Главному вице.")
-                    _PENDING_ACTIONS.pop(message.from_user.id, None)
+                    await _PENDING_ACTIONS.apop(message.from_user.id)
                     return
             elif not await run_blocking_io(
                 "telegram.pending_action.can_manage_target",
@@ -910,7 +928,7 @@ async def pending_action_handler(message: Message) -> None:
                     pending.domain,
                 )
                 await message.answer("❌ Нельзя выполнять действие для пользователя с равным/более высоким званием.")
-                _PENDING_ACTIONS.pop(message.from_user.id, None)
+                await _PENDING_ACTIONS.apop(message.from_user.id)
                 return
 
         raw = (message.text or "").strip()
@@ -922,7 +940,7 @@ async def pending_action_handler(message: Message) -> None:
             amount_raw, reason_raw = [part.strip() for part in raw.split("|", 1)]
             if not reason_raw:
                 await _respond_in_flow(message, pending, "❌ Причина обязательна. Изменение отменено.")
-                _PENDING_ACTIONS.pop(message.from_user.id, None)
+                await _PENDING_ACTIONS.apop(message.from_user.id)
                 return
             amount = float(amount_raw.replace(",", "."))
             if amount <= 0:
@@ -961,7 +979,7 @@ async def pending_action_handler(message: Message) -> None:
             reason_raw = raw
             if not reason_raw:
                 await _respond_in_flow(message, pending, "❌ Причина обязательна. Изменение отменено.")
-                _PENDING_ACTIONS.pop(message.from_user.id, None)
+                await _PENDING_ACTIONS.apop(message.from_user.id)
                 return
             amount = 1
             mapping = {
@@ -1010,7 +1028,7 @@ async def pending_action_handler(message: Message) -> None:
             amount_raw, reason_raw = [part.strip() for part in raw.split("|", 1)]
             if not reason_raw:
                 await _respond_in_flow(message, pending, "❌ Причина обязательна. Изменение отменено.")
-                _PENDING_ACTIONS.pop(message.from_user.id, None)
+                await _PENDING_ACTIONS.apop(message.from_user.id)
                 return
             amount = float(amount_raw.replace(",", "."))
             if amount <= 0:
@@ -1055,11 +1073,11 @@ async def pending_action_handler(message: Message) -> None:
                     ),
                 )
 
-        _PENDING_ACTIONS.pop(message.from_user.id, None)
+        await _PENDING_ACTIONS.apop(message.from_user.id)
     except ValueError:
         logger.exception("pending action parse failed user_id=%s text=%s", message.from_user.id, message.text)
         await _respond_in_flow(message, pending, "❌ Ошибка формата количества. Проверьте число.")
     except Exception:
         logger.exception("pending action failed user_id=%s", message.from_user.id)
         await _respond_in_flow(message, pending, "❌ Ошибка выполнения операции.")
-        _PENDING_ACTIONS.pop(message.from_user.id, None)
+        await _PENDING_ACTIONS.apop(message.from_user.id)
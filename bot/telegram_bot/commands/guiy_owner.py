@@ -32,6 +32,7 @@ from bot.services.guiy_publish_destinations_service import (
     GuiyPublishDestinationsService,
 )
 from bot.telegram_bot.identity import persist_telegram_identity_from_user
+from bot.utils.flow_state import FlowStateNamespace, register_flow_state_type
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -41,6 +42,7 @@ _VISIBLE_ROLES_PAGE_SIZE = 10
 _DESTINATIONS_PAGE_SIZE = 8
 
 
+@register_flow_state_type
 @dataclass(slots=True)
 class PendingGuiyOwnerAction:
     selected_action: str
@@ -55,9 +57,18 @@ class PendingGuiyOwnerAction:
     target_destination_label: str | None = None
 
 
-_PENDING_GUIY_OWNER_ACTIONS: dict[int, PendingGuiyOwnerAction] = {}
-_PENDING_GUIY_OWNER_VISIBLE_ROLES: dict[int, dict[str, object]] = {}
-_PENDING_GUIY_OWNER_DESTINATIONS: dict[int, dict[str, object]] = {}
+_PENDING_GUIY_OWNER_ACTIONS = FlowStateNamespace(
+    "telegram.guiy_owner.action",
+    ttl_seconds=PENDING_GUIY_OWNER_TTL_SECONDS,
+)
+_PENDING_GUIY_OWNER_VISIBLE_ROLES = FlowStateNamespace(
+    "telegram.guiy_owner.visible_roles",
+    ttl_seconds=PENDING_GUIY_OWNER_TTL_SECONDS,
+)
+_PENDING_GUIY_OWNER_DESTINATIONS = FlowStateNamespace(
+    "telegram.guiy_owner.destinations",
+    ttl_seconds=PENDING_GUIY_OWNER_TTL_SECONDS,
+)
 
 
 def _log_guiy_owner_info(
@@ -104,29 +115,29 @@ def _log_guiy_owner_warning(
     )
 
 
-def _clear_pending_state(actor_user_id: int | None) -> None:
+async def _clear_pending_state(actor_user_id: int | None) -> None:
     if actor_user_id is None:
         return
-    _PENDING_GUIY_OWNER_ACTIONS.pop(actor_user_id, None)
-    _PENDING_GUIY_OWNER_VISIBLE_ROLES.pop(actor_user_id, None)
-    _PENDING_GUIY_OWNER_DESTINATIONS.pop(actor_user_id, None)
+    await _PENDING_GUIY_OWNER_ACTIONS.apop(actor_user_id)
+    await _PENDING_GUIY_OWNER_VISIBLE_ROLES.apop(actor_user_id)
+    await _PENDING_GUIY_OWNER_DESTINATIONS.apop(actor_user_id)
 
 
-def _has_any_pending_state(actor_user_id: int | None) -> bool:
+async def _has_any_pending_state(actor_user_id: int | None) -> bool:
     if actor_user_id is None:
         return False
-    _get_non_expired_pending_action(actor_user_id)
+    await _get_non_expired_pending_action(actor_user_id)
     return (
-        actor_user_id in _PENDING_GUIY_OWNER_ACTIONS
-        or actor_user_id in _PENDING_GUIY_OWNER_VISIBLE_ROLES
-        or actor_user_id in _PENDING_GUIY_OWNER_DESTINATIONS
+        await _PENDING_GUIY_OWNER_ACTIONS.acontains(actor_user_id)
+        or await _PENDING_GUIY_OWNER_VISIBLE_ROLES.acontains(actor_user_id)
+        or await _PENDING_GUIY_OWNER_DESTINATIONS.acontains(actor_user_id)
     )
 
 
 async def _cancel_owner_flow_via_message(message: Message) -> None:
     actor_user_id = message.from_user.id if message.from_user else None
-    had_pending_state = _has_any_pending_state(actor_user_id)
-    _clear_pending_state(actor_user_id)
+    had_pending_state = await _has_any_pending_state(actor_user_id)
+    await _clear_pending_state(actor_user_id)
     _log_guiy_owner_info(
         provider="telegram",
         actor_user_id=actor_user_id,
@@ -151,29 +162,49 @@ async def _cancel_owner_flow_via_message(message: Message) -> None:
     )
 
 
-def _get_non_expired_pending_action(actor_user_id: int | None) -> PendingGuiyOwnerAction | None:
+def _log_pending_state_expired(actor_user_id: int, pending: PendingGuiyOwnerAction) -> None:
+    _log_guiy_owner_info(
+        provider="telegram",
+        actor_user_id=actor_user_id,
+        selected_action=pending.selected_action,
+        target_chat_or_guild=pending.target_chat_or_guild,
+        target_message_id=pending.target_message_id,
+        guiy_account_id=None,
+        message="telegram guiy owner pending state expired",
+    )
+
+
+async def _get_non_expired_pending_action(actor_user_id: int | None) -> PendingGuiyOwnerAction | None:
     if actor_user_id is None:
         return None
-    pending = _PENDING_GUIY_OWNER_ACTIONS.get(actor_user_id)
+    pending = await _PENDING_GUIY_OWNER_ACTIONS.aget(actor_user_id)
     if not pending:
         return None
     if (time.time() - pending.created_at) > PENDING_GUIY_OWNER_TTL_SECONDS:
-        _log_guiy_owner_info(
-            provider="telegram",
-            actor_user_id=actor_user_id,
-            selected_action=pending.selected_action,
-            target_chat_or_guild=pending.target_chat_or_guild,
-            target_message_id=pending.target_message_id,
-            guiy_account_id=None,
-            message="telegram guiy owner pending state expired",
-        )
-        _clear_pending_state(actor_user_id)
+        _log_pending_state_expired(actor_user_id, pending)
+        await _clear_pending_state(actor_user_id)
+        return None
+    return pending
+
+
+def _peek_non_expired_pending_action(actor_user_id: int | None) -> PendingGuiyOwnerAction | None:
+    # Фильтр вызывается на каждом сообщении: только локальный индекс namespace, без обращения к хранилищу.
+    if actor_user_id is None:
+        return None
+    pending = _PENDING_GUIY_OWNER_ACTIONS.peek(actor_user_id)
+    if not pending:
+        return None
+    if (time.time() - pending.created_at) > PENDING_GUIY_OWNER_TTL_SECONDS:
+        _log_pending_state_expired(actor_user_id, pending)
+        _PENDING_GUIY_OWNER_ACTIONS.discard(actor_user_id)
+        _PENDING_GUIY_OWNER_VISIBLE_ROLES.discard(actor_user_id)
+        _PENDING_GUIY_OWNER_DESTINATIONS.discard(actor_user_id)
         return None
     return pending
 
 
 def has_pending_guiy_owner_action(actor_user_id: int | None) -> bool:
-    return _get_non_expired_pending_action(actor_user_id) is not None
+    return _peek_non_expired_pending_action(actor_user_id) is not None
 
 
 def _is_command_message(message: Message) -> bool:
@@ -183,7 +214,7 @@ def _is_command_message(message: Message) -> bool:
 
 def _is_pending_guiy_owner_input_message(message: Message) -> bool:
     actor_user_id = getattr(getattr(message, "from_user", None), "id", None)
-    pending = _get_non_expired_pending_action(actor_user_id)
+    pending = _peek_non_expired_pending_action(actor_user_id)
     if pending is None:
         return False
     if _is_command_message(message):
@@ -446,16 +477,19 @@ async def _show_destination_picker(
         )
         return
 
-    _PENDING_GUIY_OWNER_DESTINATIONS[actor_user_id] = {
-        "destinations": destinations,
-        "page": 0,
-        "selected_destination_id": None,
-        "bot_user_id": str(bot_user_id),
-        "target_message_id": target_message_id,
-        "reply_author_user_id": reply_author_user_id,
-        "created_at": time.time(),
-        "target_chat_or_guild": str(message.chat.id if message.chat else ""),
-    }
+    await _PENDING_GUIY_OWNER_DESTINATIONS.aset(
+        actor_user_id,
+        {
+            "destinations": destinations,
+            "page": 0,
+            "selected_destination_id": None,
+            "bot_user_id": str(bot_user_id),
+            "target_message_id": target_message_id,
+            "reply_author_user_id": reply_author_user_id,
+            "created_at": time.time(),
+            "target_chat_or_guild": str(message.chat.id if message.chat else ""),
+        },
+    )
     await message.answer(
         _build_destination_text(destinations, page=0, selected_destination_id=None),
         parse_mode="HTML",
@@ -629,7 +663,7 @@ async def guiy_owner_command(message: Message, command: CommandObject) -> None:
 async def guiy_owner_cancel_callback(callback: CallbackQuery) -> None:
     try:
         actor_user_id = callback.from_user.id if callback.from_user else None
-        _clear_pending_state(actor_user_id)
+        await _clear_pending_state(actor_user_id)
         _log_guiy_owner_info(
             provider="telegram",
             actor_user_id=actor_user_id,
@@ -661,7 +695,7 @@ async def guiy_owner_cancel_callback(callback: CallbackQuery) -> None:
 @router.callback_query(F.data == "guiy_owner:action:profile")
 async def guiy_owner_profile_menu_callback(callback: CallbackQuery) -> None:
     try:
-        _clear_pending_state(callback.from_user.id if callback.from_user else None)
+        await _clear_pending_state(callback.from_user.id if callback.from_user else None)
         if callback.message:
             await _open_profile_menu(
                 callback.message,
@@ -770,7 +804,7 @@ async def guiy_owner_action_callback(callback: CallbackQuery) -> None:
             return
 
         if selected_action == "say":
-            _clear_pending_state(callback.from_user.id)
+            await _clear_pending_state(callback.from_user.id)
             _log_guiy_owner_info(
                 provider="telegram",
                 actor_user_id=actor_user_id,
@@ -790,16 +824,19 @@ async def guiy_owner_action_callback(callback: CallbackQuery) -> None:
             await callback.answer()
             return
 
-        _PENDING_GUIY_OWNER_ACTIONS[callback.from_user.id] = PendingGuiyOwnerAction(
-            selected_action=selected_action,
-            bot_user_id=str(bot_user.id),
-            target_message_id=target_message_id,
-            reply_author_user_id=reply_author_user_id,
-            created_at=time.time(),
-            target_chat_or_guild=str(target_chat_or_guild),
-            control_chat_id=str(target_chat_or_guild),
+        await _PENDING_GUIY_OWNER_ACTIONS.aset(
+            callback.from_user.id,
+            PendingGuiyOwnerAction(
+                selected_action=selected_action,
+                bot_user_id=str(bot_user.id),
+                target_message_id=target_message_id,
+                reply_author_user_id=reply_author_user_id,
+                created_at=time.time(),
+                target_chat_or_guild=str(target_chat_or_guild),
+                control_chat_id=str(target_chat_or_guild),
+            ),
         )
-        _PENDING_GUIY_OWNER_VISIBLE_ROLES.pop(callback.from_user.id, None)
+        await _PENDING_GUIY_OWNER_VISIBLE_ROLES.apop(callback.from_user.id)
         _log_guiy_owner_info(
             provider="telegram",
             actor_user_id=actor_user_id,
@@ -835,7 +872,7 @@ async def guiy_owner_destination_callback(callback: CallbackQuery) -> None:
         if callback.from_user is None or callback.message is None:
             await callback.answer("Не удалось определить контекст", show_alert=True)
             return
-        state = _PENDING_GUIY_OWNER_DESTINATIONS.get(callback.from_user.id)
+        state = await _PENDING_GUIY_OWNER_DESTINATIONS.aget(callback.from_user.id)
         if not state:
             _log_guiy_owner_warning(
                 provider="telegram",
@@ -849,13 +886,13 @@ async def guiy_owner_destination_callback(callback: CallbackQuery) -> None:
             await callback.answer("Список мест устарел. Откройте /guiy_owner заново.", show_alert=True)
             return
         if (time.time() - float(state.get("created_at") or 0)) > PENDING_GUIY_OWNER_TTL_SECONDS:
-            _clear_pending_state(callback.from_user.id)
+            await _clear_pending_state(callback.from_user.id)
             await callback.answer("Список мест устарел. Откройте /guiy_owner заново.", show_alert=True)
             return
 
         destinations = [item for item in state.get("destinations", []) if isinstance(item, GuiyPublishDestination)]
         if not destinations:
-            _clear_pending_state(callback.from_user.id)
+            await _clear_pending_state(callback.from_user.id)
             await callback.answer("Список мест больше недоступен. Откройте /guiy_owner заново.", show_alert=True)
             return
 
@@ -898,8 +935,8 @@ async def guiy_owner_destination_callback(callback: CallbackQuery) -> None:
                 target_destination_id=str(selected.destination_id),
                 target_destination_label=selected.display_label,
             )
-            _PENDING_GUIY_OWNER_ACTIONS[callback.from_user.id] = pending
-            _PENDING_GUIY_OWNER_DESTINATIONS.pop(callback.from_user.id, None)
+            await _PENDING_GUIY_OWNER_ACTIONS.aset(callback.from_user.id, pending)
+            await _PENDING_GUIY_OWNER_DESTINATIONS.apop(callback.from_user.id)
             _log_guiy_owner_info(
                 provider="telegram",
                 actor_user_id=actor_user_id,
@@ -925,7 +962,7 @@ async def guiy_owner_destination_callback(callback: CallbackQuery) -> None:
 
         state["page"] = page
         state["selected_destination_id"] = selected_destination_id
-        _PENDING_GUIY_OWNER_DESTINATIONS[callback.from_user.id] = state
+        await _PENDING_GUIY_OWNER_DESTINATIONS.aset(callback.from_user.id, state)
         await callback.message.edit_text(
             _build_destination_text(destinations, page=page, selected_destination_id=selected_destination_id),
             parse_mode="HTML",
@@ -974,7 +1011,7 @@ async def guiy_owner_field_callback(callback: CallbackQuery) -> None:
             control_chat_id=str(target_chat_or_guild),
             selected_field=field_name,
         )
-        _PENDING_GUIY_OWNER_ACTIONS[callback.from_user.id] = pending
+        await _PENDING_GUIY_OWNER_ACTIONS.aset(callback.from_user.id, pending)
 
         if field_name == "visible_roles":
             profile, catalog, selected_roles = resolve_guiy_profile_catalog(
@@ -998,15 +1035,18 @@ async def guiy_owner_field_callback(callback: CallbackQuery) -> None:
                 )
                 await callback.answer()
                 return
-            _PENDING_GUIY_OWNER_VISIBLE_ROLES[callback.from_user.id] = {
-                "catalog": catalog,
-                "selected_roles": selected_roles,
-                "page": 0,
-                "created_at": time.time(),
-                "bot_user_id": str(bot_user.id),
-                "target_message_id": pending.target_message_id,
-                "reply_author_user_id": pending.reply_author_user_id,
-            }
+            await _PENDING_GUIY_OWNER_VISIBLE_ROLES.aset(
+                callback.from_user.id,
+                {
+                    "catalog": catalog,
+                    "selected_roles": selected_roles,
+                    "page": 0,
+                    "created_at": time.time(),
+                    "bot_user_id": str(bot_user.id),
+                    "target_message_id": pending.target_message_id,
+                    "reply_author_user_id": pending.reply_author_user_id,
+                },
+            )
             total_pages = max((len(catalog) - 1) // _VISIBLE_ROLES_PAGE_SIZE + 1, 1)
             await callback.message.answer(
                 _build_visible_roles_text(selected_roles, 0, total_pages),
@@ -1052,8 +1092,8 @@ async def guiy_owner_visible_roles_callback(callback: CallbackQuery) -> None:
         if callback.from_user is None:
             await callback.answer("Не удалось определить пользователя", show_alert=True)
             return
-        state = _PENDING_GUIY_OWNER_VISIBLE_ROLES.get(callback.from_user.id)
-        pending = _get_non_expired_pending_action(callback.from_user.id)
+        state = await _PENDING_GUIY_OWNER_VISIBLE_ROLES.aget(callback.from_user.id)
+        pending = await _get_non_expired_pending_action(callback.from_user.id)
         if not state or not pending:
             _log_guiy_owner_warning(
                 provider="telegram",
@@ -1067,7 +1107,7 @@ async def guiy_owner_visible_roles_callback(callback: CallbackQuery) -> None:
             await callback.answer("Меню ролей устарело. Откройте /guiy_owner заново.", show_alert=True)
             return
         if (time.time() - float(state.get("created_at") or 0)) > PENDING_GUIY_OWNER_TTL_SECONDS:
-            _clear_pending_state(callback.from_user.id)
+            await _clear_pending_state(callback.from_user.id)
             await callback.answer("Меню ролей устарело. Откройте /guiy_owner заново.", show_alert=True)
             return
 
@@ -1124,7 +1164,7 @@ async def guiy_owner_visible_roles_callback(callback: CallbackQuery) -> None:
                 guiy_account_id=result.guiy_account_id,
                 message="telegram guiy owner visible roles saved",
             )
-            _clear_pending_state(callback.from_user.id)
+            await _clear_pending_state(callback.from_user.id)
             if callback.message:
                 await callback.message.edit_text(result.message, reply_markup=None)
             await callback.answer("Сохранено" if result.ok else "Ошибка", show_alert=not result.ok)
@@ -1135,7 +1175,7 @@ async def guiy_owner_visible_roles_callback(callback: CallbackQuery) -> None:
 
         state["selected_roles"] = selected_roles
         state["page"] = page
-        _PENDING_GUIY_OWNER_VISIBLE_ROLES[callback.from_user.id] = state
+        await _PENDING_GUIY_OWNER_VISIBLE_ROLES.aset(callback.from_user.id, state)
         total_pages = max((len(catalog) - 1) // _VISIBLE_ROLES_PAGE_SIZE + 1, 1)
         safe_page = min(max(page, 0), total_pages - 1)
         if callback.message:
@@ -1163,7 +1203,7 @@ async def guiy_owner_pending_input_handler(message: Message) -> None:
     persist_telegram_identity_from_user(message.from_user)
     actor_user_id = message.from_user.id if message.from_user else None
     target_chat_or_guild = message.chat.id if message.chat else None
-    pending = _get_non_expired_pending_action(actor_user_id)
+    pending = await _get_non_expired_pending_action(actor_user_id)
     if not pending:
         _log_guiy_owner_warning(
             provider="telegram",
@@ -1200,7 +1240,7 @@ async def guiy_owner_pending_input_handler(message: Message) -> None:
             guiy_account_id=result.guiy_account_id,
             message="telegram guiy owner pending input processed",
         )
-        _clear_pending_state(actor_user_id)
+        await _clear_pending_state(actor_user_id)
         if not result.ok:
             await message.answer(result.message)
             return
@@ -1273,5 +1313,5 @@ async def guiy_owner_pending_input_handler(message: Message) -> None:
             pending.target_message_id,
             None,
         )
-        _clear_pending_state(actor_user_id)
+        await _clear_pending_state(actor_user_id)
         await message.answer("❌ Не удалось выполнить действие. Попробуйте позже.")
@@ -44,11 +44,13 @@ from bot.services.proposal_ui_texts import (
     render_submit_review_text,
     render_events_pick_confirmation_text,
 )
+from bot.utils.flow_state import FlowStateNamespace, register_flow_state_type
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 
+@register_flow_state_type
 @dataclass(slots=True)
 class PendingProposal:
     title: str
@@ -56,11 +58,14 @@ class PendingProposal:
     created_at: float
 
 
-_PENDING_PROPOSAL_INPUT: dict[int, float] = {}
-_PENDING_PROPOSAL_CONFIRM: dict[int, PendingProposal] = {}
-_PENDING_ADMIN_CONFIRM: dict[int, str] = {}
-_PENDING_EVENTS_DESTINATION_PICKER: dict[int, dict[str, object]] = {}
 _PENDING_TTL_SECONDS = 900
+_PENDING_PROPOSAL_INPUT = FlowStateNamespace("telegram.proposal.input", ttl_seconds=_PENDING_TTL_SECONDS)
+_PENDING_PROPOSAL_CONFIRM = FlowStateNamespace("telegram.proposal.confirm", ttl_seconds=_PENDING_TTL_SECONDS)
+_PENDING_ADMIN_CONFIRM = FlowStateNamespace("telegram.proposal.admin_confirm", ttl_seconds=_PENDING_TTL_SECONDS)
+_PENDING_EVENTS_DESTINATION_PICKER = FlowStateNamespace(
+    "telegram.proposal.events_destination_picker",
+    ttl_seconds=_PENDING_TTL_SECONDS,
+)
 _ARCHIVE_FILTERS_BY_USER: dict[int, dict[str, str]] = {}
 _TELEGRAM_EVENTS_DESTINATIONS_PAGE_SIZE = 6
 
@@ -131,11 +136,11 @@ def _confirm_keyboard() -> InlineKeyboardMarkup:
     )
 
 
-def _cleanup_pending(user_id: int) -> None:
-    _PENDING_PROPOSAL_INPUT.pop(user_id, None)
-    _PENDING_PROPOSAL_CONFIRM.pop(user_id, None)
-    _PENDING_ADMIN_CONFIRM.pop(user_id, None)
-    _PENDING_EVENTS_DESTINATION_PICKER.pop(user_id, None)
+async def _cleanup_pending(user_id: int) -> None:
+    await _PENDING_PROPOSAL_INPUT.apop(user_id)
+    await _PENDING_PROPOSAL_CONFIRM.apop(user_id)
+    await _PENDING_ADMIN_CONFIRM.apop(user_id)
+    await _PENDING_EVENTS_DESTINATION_PICKER.apop(user_id)
 
 
 def _is_alive(created_at: float | None) -> bool:
@@ -305,7 +310,7 @@ async def proposal_command(message: Message) -> None:
             await message.answer("❌ Не удалось определить пользователя.")
             return
         is_superadmin = AuthorityService.is_super_admin("telegram", str(message.from_user.id))
-        _cleanup_pending(message.from_user.id)
+        await _cleanup_pending(message.from_user.id)
         await message.answer(
             "🗂 <b>Меню предложений</b>\n"
             + render_menu_overview()
@@ -331,7 +336,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
 
     try:
         if action == "menu":
-            _cleanup_pending(actor_id)
+            await _cleanup_pending(actor_id)
             is_superadmin = AuthorityService.is_super_admin("telegram", str(actor_id))
             await callback.message.edit_text(
                 "🗂 <b>Меню предложений</b>\n"
@@ -356,7 +361,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 )
                 await callback.answer("Доступно только суперадмину.", show_alert=True)
                 return
-            _PENDING_ADMIN_CONFIRM.pop(actor_id, None)
+            await _PENDING_ADMIN_CONFIRM.apop(actor_id)
             await callback.message.edit_text(
                 render_admin_root_text(),
                 reply_markup=_admin_root_keyboard(),
@@ -378,7 +383,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 await callback.answer("Доступно только суперадмину.", show_alert=True)
                 return
             section_code = action.split(":", 1)[1]
-            _PENDING_ADMIN_CONFIRM.pop(actor_id, None)
+            await _PENDING_ADMIN_CONFIRM.apop(actor_id)
             await callback.message.edit_text(
                 render_admin_section_text(section_code),
                 reply_markup=_admin_section_keyboard(section_code),
@@ -414,7 +419,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 await callback.answer("Действие не найдено.", show_alert=True)
                 return
             if admin_action.requires_confirmation:
-                _PENDING_ADMIN_CONFIRM[actor_id] = action_code
+                await _PENDING_ADMIN_CONFIRM.aset(actor_id, action_code)
                 section = next((item for item in PROPOSAL_ADMIN_SECTIONS if any(action.code == action_code for action in item.actions)), None)
                 section_code = section.code if section else "events"
                 await callback.message.edit_text(
@@ -426,11 +431,14 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 return
             if action_code == "events_set_channel_here":
                 destinations = await _collect_writable_telegram_destinations(callback.message.bot)
-                _PENDING_EVENTS_DESTINATION_PICKER[actor_id] = {
-                    "destinations": destinations,
-                    "page": 0,
-                    "selected_destination_id": None,
-                }
+                await _PENDING_EVENTS_DESTINATION_PICKER.aset(
+                    actor_id,
+                    {
+                        "destinations": destinations,
+                        "page": 0,
+                        "selected_destination_id": None,
+                    },
+                )
                 await callback.message.edit_text(
                     _events_picker_text(destinations, 0),
                     parse_mode="HTML",
@@ -466,7 +474,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 await callback.answer("Доступно только суперадмину.", show_alert=True)
                 return
             action_code = action.split(":", 1)[1]
-            pending = _PENDING_ADMIN_CONFIRM.get(actor_id)
+            pending = await _PENDING_ADMIN_CONFIRM.aget(actor_id)
             if pending != action_code:
                 CouncilSystemEventsService.record_admin_action(
                     provider="telegram",
@@ -479,7 +487,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 )
                 await callback.answer("Подтверждение устарело. Откройте действие снова.", show_alert=True)
                 return
-            _PENDING_ADMIN_CONFIRM.pop(actor_id, None)
+            await _PENDING_ADMIN_CONFIRM.apop(actor_id)
             result_text = _execute_admin_action(
                 actor_id,
                 action_code,
@@ -498,7 +506,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
             if not AuthorityService.is_super_admin("telegram", str(actor_id)):
                 await callback.answer("Доступно только суперадмину.", show_alert=True)
                 return
-            pending = _PENDING_EVENTS_DESTINATION_PICKER.get(actor_id) or {}
+            pending = await _PENDING_EVENTS_DESTINATION_PICKER.aget(actor_id) or {}
             destinations = list(pending.get("destinations") or [])
             page_raw = action.split(":", 1)[1]
             try:
@@ -506,7 +514,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
             except ValueError:
                 page = 0
             pending["page"] = page
-            _PENDING_EVENTS_DESTINATION_PICKER[actor_id] = pending
+            await _PENDING_EVENTS_DESTINATION_PICKER.aset(actor_id, pending)
             await callback.message.edit_text(
                 _events_picker_text(destinations, page),
                 parse_mode="HTML",
@@ -518,7 +526,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
             if not AuthorityService.is_super_admin("telegram", str(actor_id)):
                 await callback.answer("Доступно только суперадмину.", show_alert=True)
                 return
-            pending = _PENDING_EVENTS_DESTINATION_PICKER.get(actor_id)
+            pending = await _PENDING_EVENTS_DESTINATION_PICKER.aget(actor_id)
             if not pending:
                 await callback.answer("Список устарел. Откройте выбор заново.", show_alert=True)
                 return
@@ -530,7 +538,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 await callback.answer("Этот чат больше недоступен. Выберите другой.", show_alert=True)
                 return
             pending["selected_destination_id"] = selected.destination_id
-            _PENDING_EVENTS_DESTINATION_PICKER[actor_id] = pending
+            await _PENDING_EVENTS_DESTINATION_PICKER.aset(actor_id, pending)
             await callback.message.edit_text(
                 render_events_pick_confirmation_text(destination_label=selected.display_label),
                 parse_mode="HTML",
@@ -551,7 +559,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 )
                 await callback.answer("Доступно только суперадмину.", show_alert=True)
                 return
-            pending = _PENDING_EVENTS_DESTINATION_PICKER.get(actor_id)
+            pending = await _PENDING_EVENTS_DESTINATION_PICKER.aget(actor_id)
             destination_id = str((pending or {}).get("selected_destination_id") or "").strip()
             if not destination_id:
                 CouncilSystemEventsService.record_admin_action(
@@ -577,7 +585,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                     destination_id,
                     result.get("message"),
                 )
-            _PENDING_EVENTS_DESTINATION_PICKER.pop(actor_id, None)
+            await _PENDING_EVENTS_DESTINATION_PICKER.apop(actor_id)
             result_text = render_admin_action_result(
                 "events_set_channel_here",
                 custom_result=str(result.get("message") or ("✅ Канал уведомлений сохранён." if result.get("ok") else "❌ Не удалось сохранить канал уведомлений.")),
@@ -590,7 +598,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
             await callback.answer()
             return
         if action == "events_cancel":
-            _PENDING_EVENTS_DESTINATION_PICKER.pop(actor_id, None)
+            await _PENDING_EVENTS_DESTINATION_PICKER.apop(actor_id)
             await callback.message.edit_text(
                 f"{render_admin_section_text('events')}\n\n{render_admin_action_cancelled_text()}",
                 parse_mode="HTML",
@@ -600,8 +608,8 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
             return
 
         if action == "submit":
-            _PENDING_PROPOSAL_INPUT[actor_id] = time.time()
-            _PENDING_PROPOSAL_CONFIRM.pop(actor_id, None)
+            await _PENDING_PROPOSAL_INPUT.aset(actor_id, time.time())
+            await _PENDING_PROPOSAL_CONFIRM.apop(actor_id)
             await callback.message.edit_text(
                 render_submit_form_text(),
                 parse_mode="HTML",
@@ -613,9 +621,9 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
             return
 
         if action == "confirm_send":
-            pending = _PENDING_PROPOSAL_CONFIRM.get(actor_id)
+            pending = await _PENDING_PROPOSAL_CONFIRM.aget(actor_id)
             if not pending or not _is_alive(pending.created_at):
-                _cleanup_pending(actor_id)
+                await _cleanup_pending(actor_id)
                 await callback.answer("Черновик устарел. Откройте форму снова.", show_alert=True)
                 return
             result = CouncilFeedbackService.submit_proposal(
@@ -633,7 +641,7 @@ async def proposal_callbacks(callback: CallbackQuery) -> None:
                 await callback.message.edit_text(str(result.get("message") or "Не удалось отправить предложение."))
                 await callback.answer()
                 return
-            _cleanup_pending(actor_id)
+            await _cleanup_pending(actor_id)
             success_parts = build_submit_success_parts(
                 proposal_id=result.get("proposal_id"),
                 status_label=result.get("status_label"),
@@ -790,10 +798,13 @@ async def proposal_pending_input(message: Message) -> None:
     if not message.from_user:
         raise SkipHandler()
     actor_id = message.from_user.id
-    started_at = _PENDING_PROPOSAL_INPUT.get(actor_id)
+    # Обработчик видит каждое сообщение: без записи в локальном индексе хранилище не трогаем.
+    if _PENDING_PROPOSAL_INPUT.peek(actor_id) is None:
+        raise SkipHandler()
+    started_at = await _PENDING_PROPOSAL_INPUT.aget(actor_id)
     if not _is_alive(started_at):
         if started_at:
-            _cleanup_pending(actor_id)
+            await _cleanup_pending(actor_id)
         raise SkipHandler()
     text = str(message.text or "").strip()
     if not text or text.startswith("/"):
@@ -810,8 +821,8 @@ async def proposal_pending_input(message: Message) -> None:
             title, body = parts[0], parts[1]
 
         pending = PendingProposal(title=title.strip(), proposal_text=body.strip(), created_at=time.time())
-        _PENDING_PROPOSAL_CONFIRM[actor_id] = pending
-        _PENDING_PROPOSAL_INPUT.pop(actor_id, None)
+        await _PENDING_PROPOSAL_CONFIRM.aset(actor_id, pending)
+        await _PENDING_PROPOSAL_INPUT.apop(actor_id)
 
         await message.answer(
             render_submit_review_text(title=pending.title, proposal_text=pending.proposal_text),
@@ -18,6 +18,7 @@ from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMar
 from bot.data import db
 from bot.services import AccountsService, AuthorityService, RoleManagementService
 from bot.telegram_bot.identity import persist_telegram_identity_from_user
+from bot.utils.blocking_io import run_blocking_io
 from bot.services.role_management_service import (
     DELETE_ROLE_REASON_DISCORD_MANAGED,
     DELETE_ROLE_REASON_NOT_FOUND,
@@ -357,7 +358,13 @@ async def _sync_discord_roles_catalog(*, force: bool = False, trigger: str = "im
             )
             return False
 
-        result = RoleManagementService.sync_discord_guild_roles(guild_roles)
+        result = await run_blocking_io(
+            "telegram_roles_admin.sync_discord_guild_roles",
+            RoleManagementService.sync_discord_guild_roles,
+            guild_roles,
+            force=force,
+            logger=logger,
+        )
         _LAST_DISCORD_CATALOG_SYNC_AT = time.monotonic()
         logger.info(
             "telegram roles_admin discord catalog sync completed trigger=%s guild_count=%s roles=%s upserted=%s removed=%s",
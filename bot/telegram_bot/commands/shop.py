@@ -647,6 +647,10 @@ async def shop_callback(callback: CallbackQuery) -> None:
                 actor_provider="telegram",
                 actor_user_id=callback.from_user.id,
                 expected_price_points=expected_price_points,
+                # Повторное нажатие той же кнопки подтверждения даёт тот же ключ и не списывает баллы дважды.
+                idempotency_key=(
+                    f"telegram:{callback.message.chat.id}:{callback.message.message_id}" if callback.message else f"telegram:{callback.id}"
+                ),
             )
             if not result.ok:
                 logger.warning(
@@ -26,7 +26,11 @@ from aiogram.types import BotCommand, BotCommandScopeChat
 
 from bot.telegram_bot.commands import get_commands_router
 from bot.telegram_bot.config import TELEGRAM_BOT_TOKEN_ENV, get_telegram_bot_token
+from bot.telegram_bot.send_governor import telegram_send_governor
+from bot.graceful_shutdown import GracefulShutdown, shutdown_deadline_sec
+from bot.hot_path_logging import HotPathLogging
 from bot.services.guiy_admin_service import resolve_guiy_owner_telegram_ids
+from bot.utils.flow_state import warm_flow_state_namespaces
 
 logger = logging.getLogger(__name__)
 _DISPATCHER: Dispatcher | None = None
@@ -52,6 +56,40 @@ class TelegramPollingTransientNetworkError(RuntimeError):
     """Raised when Telegram polling exceeds bounded transient network retries."""
 
 
+# Состояние остановки polling: приём останавливается раньше, а сессия и lock освобождаются после дренажа.
+_POLLING_ACTIVE = False
+_INTAKE_STOPPED = False
+_SHUTDOWN_DRAINED: asyncio.Event | None = None
+_POLLING_RELEASED: asyncio.Event | None = None
+
+
+async def stop_polling_intake(_timeout_sec: float) -> int:
+    """Шаг остановки: прекратить getUpdates, не закрывая сессию Bot — ответы ещё уходят."""
+
+    global _INTAKE_STOPPED
+    if not _POLLING_ACTIVE or _DISPATCHER is None:
+        return 0
+    _INTAKE_STOPPED = True
+    with contextlib.suppress(RuntimeError):
+        await _DISPATCHER.stop_polling()
+    logger.info("telegram polling intake stopped")
+    return 0
+
+
+async def release_polling_lock(timeout_sec: float) -> int:
+    """Шаг остановки: после дренажа закрыть сессию Bot и освободить polling lock; 1 — lock не освобождён."""
+
+    if not _POLLING_ACTIVE or _SHUTDOWN_DRAINED is None or _POLLING_RELEASED is None:
+        return 0
+    _SHUTDOWN_DRAINED.set()
+    try:
+        await asyncio.wait_for(_POLLING_RELEASED.wait(), timeout=max(timeout_sec, 0.001))
+    except asyncio.TimeoutError:
+        logger.warning("telegram polling lock release timed out timeout_sec=%.1f", timeout_sec)
+        return 1
+    return 0
+
+
 def _is_local_process_alive(pid: int) -> bool:
     """Best-effort check for local process existence."""
 
@@ -106,6 +144,7 @@ def _configure_logging() -> None:
         level=logging.INFO,
         format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
     )
+    HotPathLogging.install()
 
 
 def _patch_aiogram_conflict_behavior() -> None:
@@ -296,9 +335,15 @@ async def run_polling(token: str) -> None:
     )
 
     bot: Bot | None = None
+    global _POLLING_ACTIVE, _INTAKE_STOPPED, _SHUTDOWN_DRAINED, _POLLING_RELEASED
+    _POLLING_ACTIVE = True
+    _INTAKE_STOPPED = False
+    _SHUTDOWN_DRAINED = asyncio.Event()
+    _POLLING_RELEASED = asyncio.Event()
 
     try:
         bot = Bot(token=token)
+        bot.session.middleware(telegram_send_governor)
 
         global _DISPATCHER
         if _DISPATCHER is None:
@@ -340,6 +385,9 @@ async def run_polling(token: str) -> None:
         # Start clean in polling mode.
         await bot.delete_webhook(drop_pending_updates=True)
 
+        # Фильтры pending-сценариев читают только локальный индекс: подтягиваем состояния, пережившие рестарт.
+        await warm_flow_state_namespaces()
+
         # Fast-fail before Dispatcher's internal long backoff loop if another
         # process is already consuming updates for the same bot token.
         # `timeout=0` keeps this check instantaneous.
@@ -355,7 +403,9 @@ async def run_polling(token: str) -> None:
             ) from exc
 
         try:
-            await dp.start_polling(bot)
+            # Сигналы и закрытие сессии берёт на себя GracefulShutdown, если launcher его установил.
+            shutdown_managed = GracefulShutdown.signal_handlers_installed()
+            await dp.start_polling(bot, handle_signals=not shutdown_managed, close_bot_session=not shutdown_managed)
         except TelegramConflictError as exc:
             logger.error(
                 "telegram polling conflict detected: another instance is already consuming updates; "
@@ -364,6 +414,12 @@ async def run_polling(token: str) -> None:
             raise TelegramPollingConflictDetectedError(
                 "telegram polling conflict detected while running dispatcher polling"
             ) from exc
+        if _INTAKE_STOPPED:
+            # Обработчики ещё отвечают пользователям: сессия нужна до конца дренажа очередей.
+            try:
+                await asyncio.wait_for(_SHUTDOWN_DRAINED.wait(), timeout=shutdown_deadline_sec())
+            except asyncio.TimeoutError:
+                logger.warning("telegram polling drain wait timed out; closing session")
     finally:
         if bot is not None:
             await bot.session.close()
@@ -371,6 +427,9 @@ async def run_polling(token: str) -> None:
             os.ftruncate(lock_fd, 0)
             fcntl.flock(lock_fd, fcntl.LOCK_UN)
             os.close(lock_fd)
+        logger.info("telegram polling lock released (lock=%s)", lock_path)
+        _POLLING_ACTIVE = False
+        _POLLING_RELEASED.set()
 
 
 def main() -> None:
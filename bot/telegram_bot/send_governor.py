@@ -0,0 +1,255 @@
+"""
+Назначение: модуль "send governor" реализует продуктовый контур в зоне Telegram.
+Ответственность: темп исходящих сообщений Telegram (глобальный и по чату), обработка retry_after и учёт отброшенных отправок.
+Где используется: Telegram (middleware сессии `Bot` в `bot/telegram_bot/main.py`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from bot.metrics import CollectedMetric, metrics
+
+logger = logging.getLogger(__name__)
+
+_telegram_request_seconds = metrics.histogram(
+    "telegram_request_duration_seconds",
+    "Telegram Bot API call latency by method and outcome, excluding pacing waits.",
+    ("method", "status"),
+)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name) or default))
+    except ValueError:
+        logger.warning("invalid %s, using default value=%s", name, default)
+        return default
+
+
+class TelegramSendDropped(RuntimeError):
+    """Отправка отброшена губернатором: очередь чата переполнена или retry_after не уложился в лимиты."""
+
+    def __init__(self, reason: str, chat_id: Any) -> None:
+        super().__init__(f"telegram send dropped reason={reason} chat_id={chat_id}")
+        self.reason = reason
+        self.chat_id = chat_id
+
+
+class _TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: float, now: float) -> None:
+        self.rate = max(rate_per_sec, 1e-6)
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def reserve(self, now: float) -> float:
+        """Занять токен и вернуть, сколько ждать до его появления (токены могут уйти в минус — это очередь)."""
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1.0
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+
+class TelegramSendGovernor(BaseRequestMiddleware):
+    """Request-middleware aiogram: все методы Bot API проходят здесь, отправки в чат — через лимиты.
+
+    Лимиты Telegram: около 30 сообщений в секунду на бота, около 1 в секунду в личный чат
+    и 20 в минуту в группу. Редактирования и ответы на callback не замедляются, но retry_after
+    для них тоже соблюдается.
+    """
+
+    PACED_METHOD_PREFIXES = ("Send", "Copy", "Forward")
+    MAX_TRACKED_CHATS = 10000
+
+    def __init__(
+        self,
+        *,
+        global_per_sec: float = 25.0,
+        private_per_sec: float = 1.0,
+        group_per_min: float = 20.0,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+        max_retry_after_sec: float = 60.0,
+        max_pending_per_chat: int = 30,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        self.private_per_sec = private_per_sec
+        self.group_per_sec = group_per_min / 60.0
+        self.chat_burst = chat_burst
+        self.max_retries = max(0, int(max_retries))
+        self.max_retry_after_sec = max_retry_after_sec
+        self.max_pending_per_chat = max(1, int(max_pending_per_chat))
+        self._clock = clock
+        self._sleep = sleep
+        self._global = _TokenBucket(global_per_sec, global_per_sec, clock())
+        self._chats: dict[str, _TokenBucket] = {}
+        self._pending: dict[str, int] = defaultdict(int)
+        self._metrics: dict[str, float] = {"sent": 0, "delayed": 0, "wait_sec_total": 0.0, "retry_after": 0}
+        self._dropped: dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def from_env(cls) -> "TelegramSendGovernor":
+        return cls(
+            global_per_sec=_env_float("TELEGRAM_SEND_GLOBAL_PER_SEC", 25.0),
+            private_per_sec=_env_float("TELEGRAM_SEND_PRIVATE_PER_SEC", 1.0),
+            group_per_min=_env_float("TELEGRAM_SEND_GROUP_PER_MIN", 20.0),
+            chat_burst=_env_float("TELEGRAM_SEND_CHAT_BURST", 3.0),
+            max_retries=int(_env_float("TELEGRAM_SEND_MAX_RETRIES", 3)),
+            max_retry_after_sec=_env_float("TELEGRAM_SEND_MAX_RETRY_AFTER_SEC", 60.0),
+            max_pending_per_chat=int(_env_float("TELEGRAM_SEND_MAX_PENDING_PER_CHAT", 30)),
+        )
+
+    def _prune_idle_chats(self, now: float) -> None:
+        idle = [
+            key
+            for key, bucket in self._chats.items()
+            if key not in self._pending and bucket.blocked_until <= now and (now - bucket.updated) * bucket.rate >= bucket.capacity
+        ]
+        for key in idle:
+            del self._chats[key]
+
+    def _chat_bucket(self, chat_key: str) -> _TokenBucket:
+        bucket = self._chats.get(chat_key)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_TRACKED_CHATS:
+                self._prune_idle_chats(self._clock())
+            # Отрицательный chat_id — группа или канал, у них лимит в минуту строже.
+            rate = self.group_per_sec if chat_key.startswith("-") else self.private_per_sec
+            bucket = self._chats[chat_key] = _TokenBucket(rate, self.chat_burst, self._clock())
+        return bucket
+
+    def _drop(self, reason: str, method_name: str, chat_key: str | None) -> TelegramSendDropped:
+        self._dropped[reason] += 1
+        logger.warning(
+            "telegram send dropped reason=%s method=%s chat_id=%s dropped_total=%s",
+            reason,
+            method_name,
+            chat_key,
+            sum(self._dropped.values()),
+        )
+        return TelegramSendDropped(reason, chat_key)
+
+    async def _pace(self, chat_key: str | None) -> None:
+        waited = 0.0
+        if chat_key is not None:
+            delay = self._chat_bucket(chat_key).reserve(self._clock())
+            if delay > 0:
+                await self._sleep(delay)
+                waited += delay
+        delay = self._global.reserve(self._clock())
+        if delay > 0:
+            await self._sleep(delay)
+            waited += delay
+        if waited > 0:
+            self._metrics["delayed"] += 1
+            self._metrics["wait_sec_total"] += waited
+
+    async def __call__(self, make_request, bot, method):
+        method_name = type(method).__name__
+        chat_id = getattr(method, "chat_id", None)
+        chat_key = None if chat_id is None else str(chat_id)
+        paced = method_name.startswith(self.PACED_METHOD_PREFIXES)
+
+        if paced and chat_key is not None:
+            if self._pending[chat_key] >= self.max_pending_per_chat:
+                raise self._drop("chat_queue_full", method_name, chat_key)
+            self._pending[chat_key] += 1
+        try:
+            attempt = 0
+            while True:
+                if paced:
+                    await self._pace(chat_key)
+                started_at = time.perf_counter()
+                try:
+                    response = await make_request(bot, method)
+                except TelegramRetryAfter as error:
+                    _telegram_request_seconds.observe(time.perf_counter() - started_at, method=method_name, status="retry_after")
+                    self._metrics["retry_after"] += 1
+                    retry_after = float(error.retry_after)
+                    logger.warning(
+                        "telegram send retry_after method=%s chat_id=%s retry_after=%s attempt=%s",
+                        method_name,
+                        chat_key,
+                        retry_after,
+                        attempt + 1,
+                    )
+                    if attempt >= self.max_retries or retry_after > self.max_retry_after_sec:
+                        self._drop("retry_after_exhausted", method_name, chat_key)
+                        raise
+                    # Пауза распространяется на чат (или на весь бот, если чата нет), чтобы очередь не билась в лимит.
+                    bucket = self._chat_bucket(chat_key) if chat_key is not None else self._global
+                    bucket.blocked_until = max(bucket.blocked_until, self._clock() + retry_after)
+                    if not paced:
+                        await self._sleep(retry_after)
+                    attempt += 1
+                    continue
+                except Exception:
+                    _telegram_request_seconds.observe(time.perf_counter() - started_at, method=method_name, status="error")
+                    raise
+                _telegram_request_seconds.observe(time.perf_counter() - started_at, method=method_name, status="ok")
+                if paced:
+                    self._metrics["sent"] += 1
+                return response
+        finally:
+            if paced and chat_key is not None:
+                self._pending[chat_key] -= 1
+                if self._pending[chat_key] <= 0:
+                    self._pending.pop(chat_key, None)
+
+    async def drain(self, timeout_sec: float) -> int:
+        """Дождаться отправок, стоящих в очередях чатов; вернуть, сколько не успело уйти до дедлайна."""
+
+        deadline = time.monotonic() + max(0.0, timeout_sec)
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        pending = sum(self._pending.values())
+        if pending:
+            logger.warning("telegram send drain incomplete pending=%s chats=%s", pending, len(self._pending))
+        return pending
+
+    def metrics_snapshot(self) -> dict[str, Any]:
+        return {
+            "sent": int(self._metrics["sent"]),
+            "delayed": int(self._metrics["delayed"]),
+            "wait_sec_total": round(self._metrics["wait_sec_total"], 3),
+            "retry_after": int(self._metrics["retry_after"]),
+            "dropped": dict(self._dropped),
+            "pending": sum(self._pending.values()),
+            "tracked_chats": len(self._chats),
+        }
+
+
+telegram_send_governor = TelegramSendGovernor.from_env()
+
+
+def _collect_send_governor_metrics() -> list[CollectedMetric]:
+    snapshot = telegram_send_governor.metrics_snapshot()
+    return [
+        CollectedMetric("telegram_sends_total", "counter", "Telegram messages delivered through the send governor.", [({}, snapshot["sent"])]),
+        CollectedMetric("telegram_sends_delayed_total", "counter", "Telegram sends that waited for a rate limit slot.", [({}, snapshot["delayed"])]),
+        CollectedMetric("telegram_send_wait_seconds_total", "counter", "Total pacing wait of Telegram sends.", [({}, snapshot["wait_sec_total"])]),
+        CollectedMetric("telegram_retry_after_total", "counter", "Telegram 429 retry_after responses.", [({}, snapshot["retry_after"])]),
+        CollectedMetric(
+            "telegram_sends_dropped_total",
+            "counter",
+            "Telegram sends dropped by the governor by reason.",
+            [({"reason": reason}, count) for reason, count in sorted(snapshot["dropped"].items())],
+        ),
+        CollectedMetric("telegram_sends_pending", "gauge", "Telegram sends queued per chat right now.", [({}, snapshot["pending"])]),
+    ]
+
+
+metrics.register_collector("telegram_send_governor", _collect_send_governor_metrics)
@@ -1,40 +1,250 @@
 """
 Назначение: модуль "api monitor" реализует продуктовый контур в зоне общая логика.
-Ответственность: единая точка для сценариев и правил модуля без дублирования логики между платформами.
-Где используется: общая логика.
+Ответственность: скользящие окна запросов к Discord API по шаблону маршрута, статусу и признаку бана Cloudflare с запросами для алертов и ограничителя отправок.
+Где используется: общая логика (trace-хук HTTP в `bot/commands/base.py`, `bot/utils/rate_limiter.py`, метрики).
 """
 
 import logging
+import re
+import threading
 import time
-from collections import deque
-from typing import Deque
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping
+from urllib.parse import urlsplit
+
+from bot.metrics import CollectedMetric, metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKET_SEC = 5
+DEFAULT_BUCKET_COUNT = 72  # 6 минут истории при шаге 5 с
+DEFAULT_MAX_SERIES = 1024
+
+_API_PREFIX_RE = re.compile(r"^/api(?:/v\d+)?")
+_SNOWFLAKE_RE = re.compile(r"^\d{5,25}$")
+# Сегменты, за которыми идёт major-параметр Discord: лимиты считаются отдельно на каждый такой id.
+_MAJOR_SEGMENTS = {"channels": "channel_id", "guilds": "guild_id", "webhooks": "webhook_id"}
+_TOKEN_PARENTS = {"webhooks", "interactions"}
+
+
+def route_template(method: str, url: Any) -> tuple[str, str]:
+    """("POST /channels/{channel_id}/messages", "<channel id>") из URL запроса; id и токены не попадают в шаблон."""
+
+    path = _API_PREFIX_RE.sub("", urlsplit(str(url)).path) or "/"
+    segments = [segment for segment in path.split("/") if segment]
+    template: list[str] = []
+    major = ""
+    previous = ""
+    for index, segment in enumerate(segments):
+        if previous == "reactions":
+            template.append("{emoji}")
+        elif _SNOWFLAKE_RE.match(segment):
+            name = _MAJOR_SEGMENTS.get(previous) or (f"{previous.rstrip('s')}_id" if previous else "id")
+            if previous in _MAJOR_SEGMENTS and not major:
+                major = segment
+            template.append("{" + name + "}")
+        elif index >= 2 and segments[index - 2] in _TOKEN_PARENTS and _SNOWFLAKE_RE.match(previous):
+            template.append("{token}")
+        else:
+            template.append(segment)
+        previous = segment
+    return f"{method.upper()} /{'/'.join(template)}", major
+
+
+@dataclass(frozen=True)
+class SeriesKey:
+    route: str
+    major: str
+    status: int
+    cloudflare: bool
+    global_limit: bool = False
+
+
+class _RollingSeries:
+    """Кольцо из bucket_count счётчиков: запись и чтение окна не зависят от числа запросов."""
+
+    __slots__ = ("counts", "epochs")
+
+    def __init__(self, bucket_count: int) -> None:
+        self.counts = [0] * bucket_count
+        self.epochs = [-1] * bucket_count
+
+    def add(self, epoch: int, amount: int = 1) -> None:
+        slot = epoch % len(self.counts)
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+        self.counts[slot] += amount
+
+    def total(self, first_epoch: int, last_epoch: int) -> int:
+        return sum(count for count, epoch in zip(self.counts, self.epochs) if first_epoch <= epoch <= last_epoch)
 
 
 class APIMonitor:
-    """Tracks API request counts and rate limit hits."""
+    """Tracks Discord API requests per route/status/Cloudflare classification in fixed-memory rolling windows."""
 
-    def __init__(self, window: int = 60) -> None:
+    def __init__(
+        self,
+        window: int = 60,
+        *,
+        bucket_sec: int = DEFAULT_BUCKET_SEC,
+        bucket_count: int = DEFAULT_BUCKET_COUNT,
+        max_series: int = DEFAULT_MAX_SERIES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
         self.window = window
-        self.requests: Deque[float] = deque()
+        self.bucket_sec = max(1, int(bucket_sec))
+        self.bucket_count = max(2, int(bucket_count))
+        self.max_series = max(1, int(max_series))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._series: OrderedDict[SeriesKey, _RollingSeries] = OrderedDict()
         self.ratelimited = 0
+        self.cloudflare_ratelimited = 0
 
-    def _trim(self) -> None:
-        cutoff = time.time() - self.window
-        while self.requests and self.requests[0] < cutoff:
-            self.requests.popleft()
+    @property
+    def history_sec(self) -> int:
+        return self.bucket_sec * self.bucket_count
 
-    def record_request(self, status: int) -> None:
-        """Record a request and its status code."""
-        self.requests.append(time.time())
-        if status == 429:
-            self.ratelimited += 1
-            logging.warning("API rate limited (HTTP 429)")
-        self._trim()
+    def _epoch(self) -> int:
+        return int(self._clock() // self.bucket_sec)
+
+    def record_request(
+        self,
+        status: int,
+        *,
+        method: str = "GET",
+        url: Any = "",
+        route: str | None = None,
+        major: str = "",
+        cloudflare: bool = False,
+        global_limit: bool = False,
+    ) -> None:
+        """Record a request and its status code; route is derived from url when not given."""
+
+        if route is None:
+            route, major = route_template(method, url) if url else ("unknown", major)
+        key = SeriesKey(
+            route=route,
+            major=major,
+            status=int(status),
+            cloudflare=bool(cloudflare),
+            global_limit=bool(global_limit) and int(status) == 429,
+        )
+        epoch = self._epoch()
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    # Вытесняем самый давно не обновлявшийся ряд: память ограничена max_series кольцами.
+                    self._series.popitem(last=False)
+                series = self._series[key] = _RollingSeries(self.bucket_count)
+            else:
+                self._series.move_to_end(key)
+            series.add(epoch)
+            if status == 429 or cloudflare:
+                self.ratelimited += 1
+                if cloudflare:
+                    self.cloudflare_ratelimited += 1
+        if status == 429 or cloudflare:
+            logger.warning(
+                "API rate limited (HTTP %s) route=%s major=%s cloudflare=%s global=%s",
+                status,
+                route,
+                major or "-",
+                cloudflare,
+                key.global_limit,
+            )
+
+    def _window_epochs(self, window_sec: float) -> tuple[int, int]:
+        last_epoch = self._epoch()
+        buckets = max(1, min(self.bucket_count, int(-(-window_sec // self.bucket_sec))))
+        return last_epoch - buckets + 1, last_epoch
+
+    def query(
+        self,
+        window_sec: float,
+        *,
+        route: str | None = None,
+        major: str | None = None,
+        status: int | None = None,
+        rate_limited: bool | None = None,
+        cloudflare: bool | None = None,
+        global_limit: bool | None = None,
+        group_by: tuple[str, ...] = (),
+    ) -> dict[tuple, int]:
+        """Число запросов за последние window_sec (с точностью до bucket_sec), сгруппированное по полям SeriesKey."""
+
+        first_epoch, last_epoch = self._window_epochs(window_sec)
+        result: dict[tuple, int] = {}
+        with self._lock:
+            items = list(self._series.items())
+        for key, series in items:
+            if route is not None and key.route != route:
+                continue
+            if major is not None and key.major != major:
+                continue
+            if status is not None and key.status != status:
+                continue
+            if cloudflare is not None and key.cloudflare != cloudflare:
+                continue
+            if global_limit is not None and key.global_limit != global_limit:
+                continue
+            if rate_limited is not None and (key.status == 429 or key.cloudflare) != rate_limited:
+                continue
+            total = series.total(first_epoch, last_epoch)
+            if total:
+                group = tuple(getattr(key, field) for field in group_by)
+                result[group] = result.get(group, 0) + total
+        return result
+
+    def count(self, window_sec: float, **filters: Any) -> int:
+        return sum(self.query(window_sec, **filters).values())
+
+    def rate_limited_count(self, window_sec: float, *, route: str | None = None, major: str | None = None) -> int:
+        return self.count(window_sec, route=route, major=major, rate_limited=True)
+
+    def top_rate_limited(self, window_sec: float, *, limit: int = 5) -> list[dict[str, Any]]:
+        """Маршруты и major-id с наибольшим числом 429/банов Cloudflare — для алертов и логов."""
+
+        grouped = self.query(window_sec, rate_limited=True, group_by=("route", "major", "cloudflare"))
+        ranked = sorted(grouped.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [
+            {"route": route, "major": major, "cloudflare": cloudflare, "count": count}
+            for (route, major, cloudflare), count in ranked
+        ]
+
+    def status_breakdown(self, window_sec: float) -> Mapping[tuple, int]:
+        return self.query(window_sec, group_by=("route", "status", "cloudflare"))
 
     def request_rate(self) -> int:
         """Return number of requests in the monitoring window."""
-        self._trim()
-        return len(self.requests)
+        return self.count(self.window)
 
 
 monitor = APIMonitor()
+
+
+def _collect_api_monitor_metrics() -> list[CollectedMetric]:
+    breakdown = monitor.status_breakdown(monitor.window)
+    return [
+        CollectedMetric(
+            "discord_api_window_requests",
+            "gauge",
+            "Discord REST requests in the monitor window by route template, status and Cloudflare ban flag.",
+            [
+                ({"route": route, "status": str(status), "cloudflare": str(cloudflare).lower()}, count)
+                for (route, status, cloudflare), count in sorted(breakdown.items())
+            ],
+        ),
+        CollectedMetric(
+            "discord_api_rate_limited_total",
+            "counter",
+            "Discord REST responses classified as rate limited (429 or Cloudflare ban).",
+            [({}, monitor.ratelimited)],
+        ),
+    ]
+
+
+metrics.register_collector("api_monitor", _collect_api_monitor_metrics)
@@ -6,7 +6,7 @@
 
 import logging
 import re
-from typing import Any
+from typing import Any, Mapping
 
 import discord
 
@@ -107,6 +107,24 @@ def is_cloudflare_rate_limited_http_exception(exc: discord.HTTPException) -> boo
     return "cloudflare" in server and ("rate limit" in error_text or "access denied" in error_text)
 
 
+def is_cloudflare_rate_limited_response(status: int, headers: Mapping[str, str] | None) -> bool:
+    """Header-only variant for trace hooks: edge bans lack Discord's own X-RateLimit-* headers."""
+    if status not in {403, 429} or not headers:
+        return False
+    if any(headers.get(name) for name in ("X-RateLimit-Scope", "X-RateLimit-Bucket", "X-RateLimit-Global")):
+        return False
+    server = (headers.get("Server") or headers.get("server") or "").lower()
+    content_type = (headers.get("Content-Type") or headers.get("content-type") or "").lower()
+    return "cloudflare" in server and (status == 429 or "text/html" in content_type)
+
+
+def is_global_rate_limited_response(status: int, headers: Mapping[str, str] | None) -> bool:
+    """Discord marks bot-wide 429s with X-RateLimit-Global / X-RateLimit-Scope: global; the rest are per route."""
+    if status != 429 or not headers:
+        return False
+    return (headers.get("X-RateLimit-Global") or "").lower() == "true" or (headers.get("X-RateLimit-Scope") or "").lower() == "global"
+
+
 def is_transient_rate_limit_error(exc: Exception) -> bool:
     if isinstance(exc, discord.HTTPException):
         return getattr(exc, "status", None) == 429 or is_cloudflare_rate_limited_http_exception(exc)
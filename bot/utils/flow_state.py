@@ -0,0 +1,512 @@
+"""
+Назначение: модуль "flow state" реализует продуктовый контур в зоне общая логика.
+Ответственность: общее хранилище состояния многошаговых UI-сценариев с TTL, независимое от процесса.
+Где используется: Telegram (pending-состояния команд), общая логика.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections.abc import Iterator, MutableMapping
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from .blocking_io import run_blocking_io
+
+logger = logging.getLogger(__name__)
+
+FLOW_STATE_TABLE = "bot_flow_state"
+_DEFAULT_TTL_SECONDS = 900
+_PURGE_INTERVAL_SECONDS = 300
+
+# Реестр dataclass-типов, которые можно сериализовать в компактный JSON.
+_REGISTERED_TYPES: dict[str, type] = {}
+# Все созданные namespace: при старте их локальные индексы прогреваются из общего хранилища.
+_NAMESPACES: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+
+def register_flow_state_type(cls: type) -> type:
+    """Register dataclass so it survives encode/decode through a shared backend."""
+
+    if not dataclasses.is_dataclass(cls):
+        raise TypeError(f"flow state type must be a dataclass: {cls!r}")
+    _REGISTERED_TYPES[cls.__name__] = cls
+    return cls
+
+
+def _to_jsonable(value: Any) -> Any:
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        type_name = type(value).__name__
+        if _REGISTERED_TYPES.get(type_name) is not type(value):
+            raise TypeError(f"flow state dataclass is not registered: {type_name}")
+        return {
+            "__t": type_name,
+            "f": {field.name: _to_jsonable(getattr(value, field.name)) for field in dataclasses.fields(value)},
+        }
+    if isinstance(value, dict):
+        return {str(key): _to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(item) for item in value]
+    return value
+
+
+def _from_jsonable(value: Any) -> Any:
+    if isinstance(value, dict):
+        type_name = value.get("__t")
+        if type_name is not None and set(value) == {"__t", "f"}:
+            cls = _REGISTERED_TYPES.get(type_name)
+            if cls is None:
+                raise TypeError(f"unknown flow state type: {type_name}")
+            return cls(**{key: _from_jsonable(item) for key, item in value["f"].items()})
+        return {key: _from_jsonable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_from_jsonable(item) for item in value]
+    return value
+
+
+def encode_flow_state(value: Any) -> str:
+    """Serialize state into compact JSON (dataclasses must be registered)."""
+
+    return json.dumps(_to_jsonable(value), ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_flow_state(payload: str) -> Any:
+    return _from_jsonable(json.loads(payload))
+
+
+class FlowStateStore(ABC):
+    """Key/value хранилище состояния сценариев с разбиением на namespace и TTL."""
+
+    backend_name = "abstract"
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Any | None:
+        """Return live value or None when missing/expired."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, *, ttl_seconds: float) -> None:
+        """Store value until now + ttl_seconds."""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None:
+        """Remove value if present."""
+
+    @abstractmethod
+    def clear(self, namespace: str) -> None:
+        """Remove all values of namespace."""
+
+    @abstractmethod
+    def keys(self, namespace: str) -> list[str]:
+        """Return keys of live values in namespace."""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Delete expired values and return the number of removed entries."""
+
+
+class InMemoryFlowStateStore(FlowStateStore):
+    """Хранилище в памяти процесса: хранит живые объекты, поведение как у прежних dict.
+
+    Срок жизни считается по monotonic-часам, поэтому патчи `time.time` в тестах его не задевают.
+    """
+
+    backend_name = "memory"
+
+    def __init__(self) -> None:
+        self._items: dict[tuple[str, str], tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Any | None:
+        with self._lock:
+            item = self._items.get((namespace, key))
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                self._items.pop((namespace, key), None)
+                return None
+            return value
+
+    def set(self, namespace: str, key: str, value: Any, *, ttl_seconds: float) -> None:
+        with self._lock:
+            self._items[(namespace, key)] = (time.monotonic() + max(0.0, float(ttl_seconds)), value)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._items.pop((namespace, key), None)
+
+    def clear(self, namespace: str) -> None:
+        with self._lock:
+            for item_key in [item_key for item_key in self._items if item_key[0] == namespace]:
+                self._items.pop(item_key, None)
+
+    def keys(self, namespace: str) -> list[str]:
+        now = time.monotonic()
+        with self._lock:
+            return [key for (ns, key), (expires_at, _) in self._items.items() if ns == namespace and expires_at > now]
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            stale = [item_key for item_key, (expires_at, _) in self._items.items() if expires_at <= now]
+            for item_key in stale:
+                self._items.pop(item_key, None)
+        return len(stale)
+
+
+class SqliteFlowStateStore(FlowStateStore):
+    """Хранилище в файле SQLite (WAL): общее для нескольких процессов на одном хосте."""
+
+    backend_name = "sqlite"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_purge_at = 0.0
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {FLOW_STATE_TABLE} ("
+            "namespace TEXT NOT NULL, state_key TEXT NOT NULL, payload TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (namespace, state_key))"
+        )
+
+    def get(self, namespace: str, key: str) -> Any | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT payload FROM {FLOW_STATE_TABLE} WHERE namespace = ? AND state_key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return decode_flow_state(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, *, ttl_seconds: float) -> None:
+        payload = encode_flow_state(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO {FLOW_STATE_TABLE} (namespace, state_key, payload, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, state_key) DO UPDATE SET payload = excluded.payload, expires_at = excluded.expires_at",
+                (namespace, key, payload, now + max(0.0, float(ttl_seconds))),
+            )
+        if now - self._last_purge_at >= _PURGE_INTERVAL_SECONDS:
+            self.purge_expired()
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM {FLOW_STATE_TABLE} WHERE namespace = ? AND state_key = ?",
+                (namespace, key),
+            )
+
+    def clear(self, namespace: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {FLOW_STATE_TABLE} WHERE namespace = ?", (namespace,))
+
+    def keys(self, namespace: str) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT state_key FROM {FLOW_STATE_TABLE} WHERE namespace = ? AND expires_at > ?",
+                (namespace, time.time()),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge_expired(self) -> int:
+        self._last_purge_at = time.time()
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM {FLOW_STATE_TABLE} WHERE expires_at <= ?", (self._last_purge_at,))
+        return int(cursor.rowcount or 0)
+
+
+class SupabaseFlowStateStore(FlowStateStore):
+    """Хранилище в таблице Postgres `bot_flow_state` (см. sql/p15_flow_state.sql): общее для реплик."""
+
+    backend_name = "supabase"
+
+    def __init__(self, supabase_provider: Callable[[], Any] | None = None) -> None:
+        self._supabase_provider = supabase_provider or _default_supabase_client
+        self._last_purge_at = 0.0
+
+    @staticmethod
+    def _iso(epoch_seconds: float) -> str:
+        return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).isoformat()
+
+    def _table(self):
+        supabase = self._supabase_provider()
+        if supabase is None:
+            raise RuntimeError("flow state supabase backend is not configured")
+        return supabase.table(FLOW_STATE_TABLE)
+
+    def get(self, namespace: str, key: str) -> Any | None:
+        response = (
+            self._table()
+            .select("payload")
+            .eq("namespace", namespace)
+            .eq("state_key", key)
+            .gt("expires_at", self._iso(time.time()))
+            .limit(1)
+            .execute()
+        )
+        rows = response.data or []
+        return decode_flow_state(rows[0]["payload"]) if rows else None
+
+    def set(self, namespace: str, key: str, value: Any, *, ttl_seconds: float) -> None:
+        now = time.time()
+        self._table().upsert(
+            {
+                "namespace": namespace,
+                "state_key": key,
+                "payload": encode_flow_state(value),
+                "expires_at": self._iso(now + max(0.0, float(ttl_seconds))),
+                "updated_at": self._iso(now),
+            },
+            on_conflict="namespace,state_key",
+        ).execute()
+        if now - self._last_purge_at >= _PURGE_INTERVAL_SECONDS:
+            try:
+                self.purge_expired()
+            except Exception:
+                logger.exception("flow state purge failed backend=%s", self.backend_name)
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._table().delete().eq("namespace", namespace).eq("state_key", key).execute()
+
+    def clear(self, namespace: str) -> None:
+        self._table().delete().eq("namespace", namespace).execute()
+
+    def keys(self, namespace: str) -> list[str]:
+        response = (
+            self._table()
+            .select("state_key")
+            .eq("namespace", namespace)
+            .gt("expires_at", self._iso(time.time()))
+            .execute()
+        )
+        return [str(row["state_key"]) for row in (response.data or [])]
+
+    def purge_expired(self) -> int:
+        self._last_purge_at = time.time()
+        response = self._table().delete().lte("expires_at", self._iso(self._last_purge_at)).execute()
+        return len(response.data or [])
+
+
+def _default_supabase_client() -> Any:
+    from bot.data import db
+
+    return db.supabase
+
+
+_STORE: FlowStateStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def _build_store_from_env() -> FlowStateStore:
+    backend = (os.getenv("FLOW_STATE_BACKEND") or "memory").strip().lower()
+    if backend == "sqlite":
+        path = (os.getenv("FLOW_STATE_SQLITE_PATH") or "").strip() or "flow_state.sqlite3"
+        logger.info("flow state backend selected backend=sqlite path=%s", path)
+        return SqliteFlowStateStore(path)
+    if backend == "supabase":
+        logger.info("flow state backend selected backend=supabase table=%s", FLOW_STATE_TABLE)
+        return SupabaseFlowStateStore()
+    if backend != "memory":
+        logger.warning("flow state backend unknown, fallback to memory backend=%s", backend)
+    return InMemoryFlowStateStore()
+
+
+def get_flow_state_store() -> FlowStateStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = _build_store_from_env()
+    return _STORE
+
+
+def set_flow_state_store(store: FlowStateStore | None) -> None:
+    """Replace process-wide store (None resets to env-based selection on next access)."""
+
+    global _STORE
+    with _STORE_LOCK:
+        _STORE = store
+
+
+class FlowStateNamespace(MutableMapping):
+    """Dict-подобное представление namespace в общем хранилище.
+
+    Позволяет заменить модульные `dict` pending-состояний без переписывания
+    обработчиков: `get/pop/[]=/in` работают как раньше, но данные лежат в
+    выбранном backend. Значения, изменённые после `get`, нужно записать обратно.
+
+    Из async-обработчиков используйте `aget/aset/apop/acontains`: обращение к SQLite
+    или Supabase уходит в поток и не блокирует event loop. Для фильтров, которые
+    срабатывают на каждом сообщении, есть `peek` — он читает только локальный индекс
+    ключей, записанных или прочитанных этим процессом (плюс прогретых при старте).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        ttl_seconds: float = _DEFAULT_TTL_SECONDS,
+        key_type: Callable[[str], Any] = int,
+        store: FlowStateStore | None = None,
+    ) -> None:
+        self.name = name
+        self.ttl_seconds = float(ttl_seconds)
+        self._key_type = key_type
+        self._store = store
+        # Локальный индекс: ключ -> (monotonic-срок, значение); без I/O, как и InMemory-хранилище.
+        self._local: dict[str, tuple[float, Any]] = {}
+        self._background: set[asyncio.Task] = set()
+        _NAMESPACES[name] = self
+
+    @property
+    def store(self) -> FlowStateStore:
+        return self._store or get_flow_state_store()
+
+    def _remember(self, key: str, value: Any) -> None:
+        if value is None:
+            self._local.pop(key, None)
+            return
+        self._local[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def peek(self, key: Any, default: Any = None) -> Any:
+        """Значение из локального индекса без обращения к хранилищу (для фильтров на каждом сообщении)."""
+
+        item = self._local.get(str(key))
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            self._local.pop(str(key), None)
+            return default
+        return value
+
+    def discard(self, key: Any) -> None:
+        """Удалить ключ, не дожидаясь хранилища: внутри event loop удаление уходит в фоновую задачу."""
+
+        self._local.pop(str(key), None)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.store.delete(self.name, str(key))
+            return
+        task = loop.create_task(
+            run_blocking_io(f"flow_state.{self.name}.delete", self.store.delete, self.name, str(key), logger=logger)
+        )
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def aget(self, key: Any, default: Any = None) -> Any:
+        value = await run_blocking_io(f"flow_state.{self.name}.get", self.store.get, self.name, str(key), logger=logger)
+        self._remember(str(key), value)
+        return default if value is None else value
+
+    async def aset(self, key: Any, value: Any) -> None:
+        await run_blocking_io(
+            f"flow_state.{self.name}.set",
+            self.store.set,
+            self.name,
+            str(key),
+            value,
+            ttl_seconds=self.ttl_seconds,
+            logger=logger,
+        )
+        self._remember(str(key), value)
+
+    async def apop(self, key: Any, default: Any = None) -> Any:
+        self._local.pop(str(key), None)
+        value = await run_blocking_io(f"flow_state.{self.name}.get", self.store.get, self.name, str(key), logger=logger)
+        if value is None:
+            return default
+        await run_blocking_io(f"flow_state.{self.name}.delete", self.store.delete, self.name, str(key), logger=logger)
+        return value
+
+    async def acontains(self, key: Any) -> bool:
+        return await self.aget(key) is not None
+
+    async def awarm(self) -> int:
+        """Загрузить в локальный индекс живые ключи namespace из хранилища (после рестарта процесса)."""
+
+        def _load() -> dict[str, Any]:
+            store = self.store
+            loaded = {}
+            for key in store.keys(self.name):
+                value = store.get(self.name, key)
+                if value is not None:
+                    loaded[key] = value
+            return loaded
+
+        loaded = await run_blocking_io(f"flow_state.{self.name}.warm", _load, logger=logger)
+        for key, value in loaded.items():
+            self._remember(key, value)
+        return len(loaded)
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        value = self.store.get(self.name, str(key))
+        self._remember(str(key), value)
+        return default if value is None else value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.store.set(self.name, str(key), value, ttl_seconds=self.ttl_seconds)
+        self._remember(str(key), value)
+
+    def __delitem__(self, key: Any) -> None:
+        self._local.pop(str(key), None)
+        if self.store.get(self.name, str(key)) is None:
+            raise KeyError(key)
+        self.store.delete(self.name, str(key))
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        self._local.pop(str(key), None)
+        value = self.store.get(self.name, str(key))
+        if value is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self.store.delete(self.name, str(key))
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter([self._key_type(key) for key in self.store.keys(self.name)])
+
+    def __len__(self) -> int:
+        return len(self.store.keys(self.name))
+
+    def clear(self) -> None:
+        self._local.clear()
+        self.store.clear(self.name)
+
+    def __repr__(self) -> str:
+        return f"FlowStateNamespace(name={self.name!r}, backend={self.store.backend_name!r})"
+
+
+async def warm_flow_state_namespaces() -> int:
+    """Прогреть локальные индексы всех namespace; ошибка одного namespace не мешает остальным."""
+
+    total = 0
+    for namespace in list(_NAMESPACES.values()):
+        try:
+            total += await namespace.awarm()
+        except Exception:
+            logger.exception("flow state warm failed namespace=%s", namespace.name)
+    logger.info("flow state indexes warmed namespaces=%s keys=%s", len(_NAMESPACES), total)
+    return total
@@ -10,6 +10,15 @@ import random
 import time
 from dataclasses import dataclass
 
+from bot.metrics import metrics
+from bot.utils.api_monitor import APIMonitor, monitor
+
+_rate_limiter_wait_seconds = metrics.histogram(
+    "discord_rate_limiter_wait_seconds",
+    "Time Discord sends waited in a rate limiter bucket before the request.",
+    ("bucket",),
+)
+
 
 @dataclass(frozen=True)
 class RateLimitWaitResult:
@@ -18,12 +27,13 @@ class RateLimitWaitResult:
     effective_delay: float
     waited_for: float
     next_available_at: float
+    pressure_delay: float = 0.0
 
 
 class RateLimiter:
     """Ensures independent pacing buckets for different Discord API request types."""
 
-    def __init__(self):
+    def __init__(self, api_monitor: APIMonitor | None = None):
         default_delay = max(0.5, float(os.getenv("BOT_API_DELAY_SECONDS", "1.5")))
         default_jitter = max(0.0, float(os.getenv("BOT_API_DELAY_JITTER", "0.5")))
 
@@ -41,6 +51,13 @@ class RateLimiter:
                 "jitter": default_jitter,
             },
         }
+        # Недавние 429/баны Cloudflare из APIMonitor замедляют фоновые отправки; ack взаимодействий не трогаем,
+        # у него жёсткий дедлайн Discord в 3 секунды. Бан Cloudflare и глобальные 429 тормозят весь bucket,
+        # а 429 отдельного маршрута — только отправки в тот же маршрут/major-параметр (канал, webhook).
+        self._monitor = api_monitor or monitor
+        self._pressure_step = default_delay
+        self._pressure_window = max(1.0, float(os.getenv("BOT_API_PRESSURE_WINDOW_SECONDS", "30")))
+        self._pressure_max = max(0.0, float(os.getenv("BOT_API_PRESSURE_MAX_DELAY_SECONDS", "10")))
         self._bucket_states = {
             name: {"lock": asyncio.Lock(), "next_time": 0.0}
             for name in self._bucket_defaults
@@ -59,8 +76,39 @@ class RateLimiter:
             return base
         return base + random.uniform(0, jitter)
 
-    async def wait(self, bucket: str, delay: float | None = None) -> RateLimitWaitResult:
-        effective_delay = self._normalize_delay(bucket, delay)
+    def _global_pressure_delay(self, bucket: str) -> float:
+        if bucket == "interaction_ack" or self._pressure_max <= 0:
+            return 0.0
+        if self._monitor.count(self._pressure_window, cloudflare=True):
+            return self._pressure_max
+        hits = self._monitor.count(self._pressure_window, global_limit=True)
+        return min(self._pressure_max, self._pressure_step * hits)
+
+    def _scoped_pressure_delay(self, bucket: str, route: str | None, major: str | None) -> float:
+        if bucket == "interaction_ack" or self._pressure_max <= 0 or (route is None and major is None):
+            return 0.0
+        hits = self._monitor.count(self._pressure_window, route=route, major=major, status=429, global_limit=False)
+        return min(self._pressure_max, self._pressure_step * hits)
+
+    def pressure_delay(self, bucket: str, *, route: str | None = None, major: str | None = None) -> float:
+        """Extra delay derived from rate-limit hits recorded by the API monitor in the pressure window.
+
+        Cloudflare bans and global 429s count for every send; other 429s only for the given route/major.
+        """
+
+        return min(self._pressure_max, self._global_pressure_delay(bucket) + self._scoped_pressure_delay(bucket, route, major))
+
+    async def wait(
+        self,
+        bucket: str,
+        delay: float | None = None,
+        *,
+        route: str | None = None,
+        major: str | None = None,
+    ) -> RateLimitWaitResult:
+        global_pressure = self._global_pressure_delay(bucket)
+        scoped_pressure = min(self._pressure_max - global_pressure, self._scoped_pressure_delay(bucket, route, major))
+        effective_delay = self._normalize_delay(bucket, delay) + global_pressure
         state = self._bucket_states[bucket]
 
         async with state["lock"]:
@@ -69,13 +117,20 @@ class RateLimiter:
             if waited_for > 0:
                 await asyncio.sleep(waited_for)
             state["next_time"] = time.monotonic() + effective_delay
-            return RateLimitWaitResult(
-                bucket=bucket,
-                requested_delay=delay,
-                effective_delay=effective_delay,
-                waited_for=waited_for,
-                next_available_at=state["next_time"],
-            )
+            next_available_at = state["next_time"]
+        # Задержку по маршруту ждёт только этот запрос: отправки в другие каналы bucket не задерживает.
+        if scoped_pressure > 0:
+            await asyncio.sleep(scoped_pressure)
+            waited_for += scoped_pressure
+        _rate_limiter_wait_seconds.observe(waited_for, bucket=bucket)
+        return RateLimitWaitResult(
+            bucket=bucket,
+            requested_delay=delay,
+            effective_delay=effective_delay + scoped_pressure,
+            waited_for=waited_for,
+            next_available_at=next_available_at,
+            pressure_delay=global_pressure + scoped_pressure,
+        )
 
     def snapshot(self) -> dict[str, float]:
         return {
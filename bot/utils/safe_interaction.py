@@ -24,6 +24,12 @@ def _interaction_id(interaction: discord.Interaction) -> str:
     return str(getattr(interaction, "id", None) or "unknown")
 
 
+def _followup_major(interaction: discord.Interaction) -> str | None:
+    """Followup и правки ответа идут в /webhooks/{application_id}/{token}: major-параметр лимитов — id приложения."""
+    application_id = getattr(interaction, "application_id", None)
+    return str(application_id) if application_id else None
+
+
 def _log_ack_attempt(operation: str, interaction: discord.Interaction, ack_started_at: float) -> None:
     ack_wait = max(0.0, time.monotonic() - ack_started_at)
     logger.info(
@@ -89,7 +95,7 @@ async def safe_response_send(interaction: discord.Interaction, *args, delay: flo
 
 
 async def safe_followup_send(interaction: discord.Interaction, *args, delay: float | None = None, **kwargs):
-    wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay)
+    wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay, major=_followup_major(interaction))
     _log_bucket_wait("safe_followup_send", interaction, wait_result)
     try:
         return await interaction.followup.send(*args, **kwargs)
@@ -102,14 +108,14 @@ async def safe_followup_send(interaction: discord.Interaction, *args, delay: flo
                 operation_id=_interaction_id(interaction),
                 interaction_id=getattr(interaction, "id", None),
             )
-            retry_wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay)
+            retry_wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay, major=_followup_major(interaction))
             _log_bucket_wait("safe_followup_send retry throttled", interaction, retry_wait_result)
             return None
         raise
 
 
 async def safe_edit_original_response(interaction: discord.Interaction, *args, delay: float | None = None, **kwargs):
-    wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay)
+    wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay, major=_followup_major(interaction))
     _log_bucket_wait("safe_edit_original_response", interaction, wait_result)
     try:
         return await interaction.edit_original_response(*args, **kwargs)
@@ -122,7 +128,7 @@ async def safe_edit_original_response(interaction: discord.Interaction, *args, d
                 operation_id=_interaction_id(interaction),
                 interaction_id=getattr(interaction, "id", None),
             )
-            retry_wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay)
+            retry_wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay, major=_followup_major(interaction))
             _log_bucket_wait("safe_edit_original_response retry throttled", interaction, retry_wait_result)
             return None
         raise
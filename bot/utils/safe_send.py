@@ -6,9 +6,11 @@
 
 import logging
 
+import discord
 from discord.errors import HTTPException
 from discord.ext import commands
 
+from bot.hot_path_logging import HOT_PATH
 from bot.services.accounts_service import AccountsService
 
 from .discord_http import is_cloudflare_rate_limited_http_exception, log_discord_http_exception
@@ -25,6 +27,23 @@ def _destination_operation_id(destination) -> str:
     return str(getattr(destination, "id", None) or getattr(getattr(destination, "channel", None), "id", None) or "unknown")
 
 
+def _destination_major(destination) -> str | None:
+    """Major-параметр лимитов Discord для отправки: id приложения для followup, иначе id канала."""
+    interaction = getattr(destination, "interaction", None) if isinstance(destination, commands.Context) else None
+    if interaction is not None:
+        application_id = getattr(interaction, "application_id", None)
+        return str(application_id) if application_id else None
+    if isinstance(destination, commands.Context):
+        channel = destination.channel
+    elif isinstance(destination, discord.abc.User):
+        # DM-канал может быть ещё не открыт: тогда маршрут неизвестен и учитываются только глобальные 429.
+        channel = getattr(destination, "dm_channel", None)
+    else:
+        channel = destination
+    channel_id = getattr(channel, "id", None)
+    return str(channel_id) if channel_id else None
+
+
 def _log_send_wait(operation: str, destination, wait_result: RateLimitWaitResult) -> None:
     logger.info(
         "%s rate limiter bucket=%s operation_id=%s destination_type=%s waited=%.4fs effective_delay=%.4fs requested_delay=%s",
@@ -35,6 +54,7 @@ def _log_send_wait(operation: str, destination, wait_result: RateLimitWaitResult
         wait_result.waited_for,
         wait_result.effective_delay,
         wait_result.requested_delay,
+        extra=HOT_PATH,
     )
 
 
@@ -46,6 +66,7 @@ def _log_interaction_ack_fast_path(destination) -> None:
         interaction_id or "unknown",
         _ACK_BUCKET,
         False,
+        extra=HOT_PATH,
     )
 
 
@@ -72,7 +93,7 @@ async def safe_send(destination, *args, delay: float | None = None, **kwargs):
             delete_after = kwargs.pop("delete_after", None)
 
             async def _send_followup():
-                wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay)
+                wait_result = await rate_limiter.wait(_FOLLOWUP_BUCKET, delay, major=_destination_major(destination))
                 _log_send_wait("safe_send followup", destination, wait_result)
                 message = await destination.interaction.followup.send(*args, **kwargs)
                 if delete_after is not None:
@@ -110,7 +131,7 @@ async def safe_send(destination, *args, delay: float | None = None, **kwargs):
                     return await _send_followup()
                 raise
 
-        wait_result = await rate_limiter.wait(_CHANNEL_SEND_BUCKET, delay)
+        wait_result = await rate_limiter.wait(_CHANNEL_SEND_BUCKET, delay, major=_destination_major(destination))
         _log_send_wait("safe_send channel/user", destination, wait_result)
         return await destination.send(*args, **kwargs)
     except HTTPException as e:
@@ -123,7 +144,7 @@ async def safe_send(destination, *args, delay: float | None = None, **kwargs):
                 destination_type=type(destination).__name__,
             )
             retry_bucket = _FOLLOWUP_BUCKET if isinstance(destination, commands.Context) and getattr(destination, "interaction", None) else _CHANNEL_SEND_BUCKET
-            retry_wait_result = await rate_limiter.wait(retry_bucket, delay)
+            retry_wait_result = await rate_limiter.wait(retry_bucket, delay, major=_destination_major(destination))
             _log_send_wait("safe_send retry throttled", destination, retry_wait_result)
             return None
         raise
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Назначение: модуль "benchmark identity lookup" реализует продуктовый контур в зоне общая логика.
+Ответственность: офлайн-замер задержки поиска identity по имени: индекс против полного скана при росте числа identity.
+Где используется: общая логика (ручной запуск `python scripts/benchmark_identity_lookup.py`).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bot.services import accounts_service
+from bot.services.accounts_service import AccountsService
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = {}
+        self.offset = 0
+        self.limit_value = None
+
+    def select(self, _fields):
+        return self
+
+    def eq(self, key, value):
+        self.filters[key] = str(value)
+        return self
+
+    def order(self, _key, desc=False):
+        return self
+
+    def range(self, start, end):
+        self.offset, self.limit_value = start, end - start + 1
+        return self
+
+    def limit(self, value):
+        self.limit_value = value
+        return self
+
+    def execute(self):
+        if set(self.filters) == {"provider"}:
+            selected = self.rows
+        else:
+            selected = [row for row in self.rows if all(str(row.get(k)) == v for k, v in self.filters.items())]
+        if self.limit_value is not None:
+            selected = selected[self.offset : self.offset + self.limit_value]
+        return _Resp([dict(row) for row in selected])
+
+
+class _FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, _name):
+        return _Query(self.rows)
+
+
+def _rows(count: int) -> list[dict]:
+    return [
+        {
+            "account_id": f"acc-{number}",
+            "provider": "telegram",
+            "provider_user_id": str(100000 + number),
+            "username": f"user_{number:07d}",
+            "display_name": f"User {number}",
+        }
+        for number in range(count)
+    ]
+
+
+def _scan_lookup(rows: list[dict], username: str) -> list[dict]:
+    """Прежний путь: полный casefold-скан всех identity провайдера на каждый поиск."""
+
+    needle = username.lstrip("@").casefold()
+    return [
+        row
+        for row in rows
+        if any(str(row.get(field) or "").strip().lstrip("@").casefold() == needle for field in ("username", "display_name"))
+    ]
+
+
+def _median_us(func, queries: list[str]) -> float:
+    samples = []
+    for query in queries:
+        started_at = time.perf_counter()
+        func(query)
+        samples.append((time.perf_counter() - started_at) * 1_000_000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'identities':>10} {'index_exact_us':>15} {'index_prefix_us':>16} {'full_scan_us':>13}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        rows = _rows(size)
+        accounts_service.db = SimpleNamespace(supabase=_FakeSupabase(rows))
+        AccountsService._identity_username_indexes = {}
+        AccountsService.find_accounts_by_identity_username("telegram", "warmup")
+        step = max(1, size // args.queries)
+        queries = [f"@user_{number:07d}" for number in range(0, size, step)][: args.queries]
+
+        exact_us = _median_us(lambda query: AccountsService.find_accounts_by_identity_username("telegram", query), queries)
+        prefix_us = _median_us(lambda query: AccountsService.search_identity_usernames("telegram", query[:-2]), queries)
+        scan_us = _median_us(lambda query: _scan_lookup(rows, query), queries[:20])
+        print(f"{size:>10} {exact_us:>15.1f} {prefix_us:>16.1f} {scan_us:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
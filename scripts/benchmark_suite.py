@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Назначение: модуль "benchmark suite" реализует продуктовый контур в зоне общая логика.
+Ответственность: офлайн-замер горячих путей (загрузка кеша баллов, профиль аккаунта, сетка турнира, страница модерации) на сгенерированных данных с подсчётом round trip и сравнением с сохранёнными baseline.
+Где используется: общая логика (ручной запуск и CI: `python scripts/benchmark_suite.py --profile smoke`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bot.data import db
+from bot.data.db import LazyDict, LazyList
+from scripts.fake_postgrest import FakePostgrest
+
+DEFAULT_BASELINE_PATH = os.path.join(ROOT, "scripts", "benchmark_baselines.json")
+# Число round trip детерминировано: в репозитории хранится только оно и сравнивается строго.
+# Время зависит от машины, поэтому медианы лежат в локальном файле (в .gitignore) и сверяются
+# только с --time-check: регрессия — рост больше чем в TIME_TOLERANCE раз плюс TIME_SLACK_MS на шум.
+DEFAULT_TIMING_BASELINE_PATH = os.path.join(ROOT, "scripts", "benchmark_timings.local.json")
+DEFAULT_TIME_TOLERANCE = 1.5
+DEFAULT_TIME_SLACK_MS = 5.0
+
+HOT_ACCOUNT_ID = "00000000-0000-4000-8000-000000000000"
+BRACKET_TOURNAMENT_ID = 1
+_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass(frozen=True)
+class BenchmarkProfile:
+    accounts: int
+    actions: int
+    tournament_players: int
+    hot_account_cases: int
+    repeats: int
+
+
+PROFILES = {
+    "smoke": BenchmarkProfile(accounts=2_000, actions=40_000, tournament_players=64, hot_account_cases=60, repeats=5),
+    "large": BenchmarkProfile(accounts=50_000, actions=1_000_000, tournament_players=512, hot_account_cases=1_000, repeats=3),
+}
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    round_trips: int
+    rows_returned: int
+    median_ms: float
+    p95_ms: float
+    simulated_latency_ms: float
+    by_table: dict[str, int]
+
+    @property
+    def modeled_ms(self) -> float:
+        """Медиана CPU плюс round trip × задержка сети: оценка того, что увидит пользователь."""
+
+        return self.median_ms + self.simulated_latency_ms
+
+
+def _iso(moment: datetime) -> str:
+    return moment.isoformat()
+
+
+def seed_dataset(profile: BenchmarkProfile, *, seed: int = 42) -> dict[str, list[dict]]:
+    """Детерминированный набор таблиц: у первых аккаунтов больше всего действий и дел, как у активных игроков."""
+
+    rng = random.Random(seed)
+    account_ids = [f"00000000-0000-4000-8000-{number:012d}" for number in range(profile.accounts)]
+    accounts, identities = [], []
+    for number, account_id in enumerate(account_ids):
+        accounts.append(
+            {
+                "id": account_id,
+                "custom_nick": f"Player {number}",
+                "description": None,
+                "nulls_brawl_id": None,
+                "profile_visible_roles": [],
+                "titles": ["Ветеран"] if number % 50 == 0 else [],
+                "titles_source": "manual" if number % 50 == 0 else None,
+                "titles_updated_at": None,
+            }
+        )
+        if number % 10 < 7:
+            identities.append(
+                {
+                    "account_id": account_id,
+                    "provider": "discord",
+                    "provider_user_id": str(10**17 + number),
+                    "username": f"discord_{number:07d}",
+                    "display_name": f"Player {number}",
+                }
+            )
+        if number % 2 == 0:
+            identities.append(
+                {
+                    "account_id": account_id,
+                    "provider": "telegram",
+                    "provider_user_id": str(10**9 + number),
+                    "username": f"tg_{number:07d}",
+                    "display_name": f"Player {number}",
+                }
+            )
+
+    actions = []
+    points_by_account: dict[str, float] = {}
+    for number in range(profile.actions):
+        # Квадрат равномерной величины смещает распределение к первым (активным) аккаунтам.
+        account_id = account_ids[int(profile.accounts * rng.random() ** 2)]
+        points = float(rng.randint(-3, 10))
+        points_by_account[account_id] = points_by_account.get(account_id, 0.0) + points
+        actions.append(
+            {
+                "id": number + 1,
+                "account_id": account_id,
+                "points": points,
+                "reason": "benchmark",
+                "author_account_id": account_ids[number % 97 % profile.accounts],
+                "timestamp": _iso(_EPOCH + timedelta(seconds=number)),
+            }
+        )
+    scores = [{"account_id": account_id, "points": points} for account_id, points in points_by_account.items()]
+
+    role_names = [f"role_{number:02d}" for number in range(30)]
+    roles = [{"name": name, "category_name": f"category_{number % 5}", "description": f"Role {name}"} for number, name in enumerate(role_names)]
+    role_permissions = [{"role_name": name, "permission_name": f"perm_{number % 7}", "effect": "allow"} for number, name in enumerate(role_names)]
+    assignments = [
+        {
+            "account_id": account_id,
+            "role_name": role_names[(number + offset) % len(role_names)],
+            "source": "custom",
+            "external_id": None,
+            "expires_at": None,
+            "metadata": {},
+            "origin_label": None,
+            "synced_at": None,
+        }
+        for number, account_id in enumerate(account_ids)
+        for offset in range(number % 4)
+    ]
+    bindings = [
+        {
+            "account_id": account_id,
+            "source": "discord",
+            "external_role_id": str(5000 + number % 30),
+            "external_role_name": role_names[number % 30],
+            "last_synced_at": _iso(_EPOCH),
+            "deleted_at": None,
+        }
+        for number, account_id in enumerate(account_ids[::3])
+    ]
+
+    players = [{"id": number + 1, "nick": f"nick_{number}"} for number in range(profile.tournament_players)]
+    participants = [
+        {"tournament_id": BRACKET_TOURNAMENT_ID, "player_id": player["id"], "discord_user_id": None, "team_id": None, "team_name": None}
+        for player in players
+    ]
+    matches = []
+    alive = [player["id"] for player in players]
+    round_number = 1
+    while len(alive) > 1:
+        winners = []
+        for first, second in zip(alive[::2], alive[1::2]):
+            results = [rng.choice((1, 2)) for _ in range(3)]
+            for result in results:
+                matches.append(
+                    {
+                        "id": len(matches) + 1,
+                        "tournament_id": BRACKET_TOURNAMENT_ID,
+                        "round_number": round_number,
+                        "player1_id": first,
+                        "player2_id": second,
+                        "mode": "duel",
+                        "map_id": None,
+                        "result": result,
+                    }
+                )
+            winners.append(first if results.count(1) >= 2 else second)
+        alive = winners
+        round_number += 1
+    tournaments = [
+        {
+            "id": BRACKET_TOURNAMENT_ID,
+            "name": "Benchmark Cup",
+            "type": "duel",
+            "size": profile.tournament_players,
+            "bank_type": 1,
+            "manual_amount": 0,
+            "status": "active",
+            "start_time": _iso(_EPOCH),
+            "team_auto": False,
+        }
+    ]
+
+    cases, case_actions = [], []
+    case_accounts = [HOT_ACCOUNT_ID] * profile.hot_account_cases + account_ids[1 : profile.accounts // 10]
+    for number, account_id in enumerate(case_accounts):
+        case_id = f"case-{number:07d}"
+        created_at = _EPOCH + timedelta(minutes=number)
+        cases.append({"id": case_id, "account_id": account_id, "status": "closed", "created_at": _iso(created_at)})
+        for step in range(2):
+            case_actions.append(
+                {
+                    "id": f"{case_id}-{step}",
+                    "case_id": case_id,
+                    "action": "warn" if step == 0 else "close",
+                    "created_at": _iso(created_at + timedelta(seconds=step)),
+                }
+            )
+
+    return {
+        "accounts": accounts,
+        "account_identities": identities,
+        "scores": scores,
+        "actions": actions,
+        "roles": roles,
+        "role_permissions": role_permissions,
+        "account_role_assignments": assignments,
+        "external_role_bindings": bindings,
+        "players": players,
+        "tournaments": tournaments,
+        "tournament_participants": participants,
+        "tournament_matches": matches,
+        "moderation_cases": cases,
+        "moderation_actions": case_actions,
+        # Справочники, которые модули читают при импорте; пустые, чтобы не было шума PGRST205.
+        "maps": [],
+        "profile_title_roles": [],
+    }
+
+
+@contextmanager
+def patched_backend(backend: FakePostgrest) -> Iterator[None]:
+    """Подменить клиент Supabase и кеши общего `db` на время замера и вернуть всё обратно."""
+
+    saved_db = {
+        name: getattr(db, name)
+        for name in ("supabase", "scores", "actions", "history", "_core_data_loaded", "_core_data_loading", "_account_to_discord_cache", "_dirty_score_keys")
+    }
+    # players_db проверяет клиент при импорте и кеширует его в модуле: импортируем уже с заглушкой.
+    db.supabase = backend
+    import bot.data.players_db as players_db
+    import bot.data.tournament_db as tournament_db
+
+    saved_modules = {module: module.supabase for module in (players_db, tournament_db)}
+    try:
+        db.scores = LazyDict(db.ensure_core_data_loaded)
+        db.actions = LazyList(db.ensure_core_data_loaded)
+        db.history = LazyDict(db.ensure_core_data_loaded)
+        db._dirty_score_keys = set()
+        for module in saved_modules:
+            module.supabase = backend
+        yield
+    finally:
+        for name, value in saved_db.items():
+            setattr(db, name, value)
+        for module, value in saved_modules.items():
+            module.supabase = value
+
+
+def _reset_caches() -> None:
+    """Каждый замер — холодный путь: кеши процесса не должны прятать round trip."""
+
+    import bot.data.tournament_db as tournament_db
+    from bot.services.accounts_service import AccountsService
+
+    db._core_data_loaded = False
+    db._core_data_loading = False
+    db._account_to_discord_cache = {}
+    AccountsService._account_titles_cache = {}
+    AccountsService._account_id_cache = {}
+    AccountsService._title_roles_cache = None
+    tournament_db._account_to_discord_cache.clear()
+
+
+def _scenario_load_data() -> None:
+    db.load_data()
+
+
+def _scenario_get_profile() -> None:
+    from bot.services.accounts_service import AccountsService
+
+    AccountsService.get_profile_by_account(HOT_ACCOUNT_ID)
+
+
+def _scenario_bracket_embed() -> None:
+    from bot.systems.tournament_logic import build_tournament_bracket_embed
+
+    asyncio.run(build_tournament_bracket_embed(BRACKET_TOURNAMENT_ID))
+
+
+def _scenario_recent_cases() -> None:
+    from bot.services.moderation_service import ModerationService
+
+    first_page = ModerationService.list_recent_cases(HOT_ACCOUNT_ID, limit=5)
+    ModerationService.list_recent_cases(HOT_ACCOUNT_ID, limit=5, cursor=first_page.get("next_cursor"))
+
+
+SCENARIOS: dict[str, Callable[[], None]] = {
+    "database_load_data": _scenario_load_data,
+    "accounts_get_profile_by_account": _scenario_get_profile,
+    "tournament_bracket_embed": _scenario_bracket_embed,
+    "moderation_list_recent_cases": _scenario_recent_cases,
+}
+
+
+def run_scenario(name: str, backend: FakePostgrest, *, repeats: int) -> ScenarioResult:
+    scenario = SCENARIOS[name]
+    samples: list[float] = []
+    stats: dict[str, Any] = {}
+    # Прогрев: ленивые импорты и разбор конфигов не должны попасть в медиану.
+    _reset_caches()
+    scenario()
+    for _ in range(max(1, repeats)):
+        _reset_caches()
+        backend.reset_stats()
+        started_at = time.perf_counter()
+        scenario()
+        samples.append((time.perf_counter() - started_at) * 1000)
+        stats = backend.stats()
+    ordered = sorted(samples)
+    return ScenarioResult(
+        name=name,
+        round_trips=stats["round_trips"],
+        rows_returned=stats["rows_returned"],
+        median_ms=round(statistics.median(samples), 3),
+        p95_ms=round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        simulated_latency_ms=stats["simulated_latency_ms"],
+        by_table=stats["by_table"],
+    )
+
+
+def run_suite(
+    profile: BenchmarkProfile,
+    *,
+    scenarios: list[str] | None = None,
+    latency_ms: float = 1.0,
+    repeats: int | None = None,
+    seed: int = 42,
+) -> dict[str, ScenarioResult]:
+    backend = FakePostgrest(seed_dataset(profile, seed=seed), latency_ms=latency_ms)
+    results: dict[str, ScenarioResult] = {}
+    with patched_backend(backend):
+        for name in scenarios or list(SCENARIOS):
+            results[name] = run_scenario(name, backend, repeats=repeats or profile.repeats)
+    return results
+
+
+def find_regressions(
+    results: dict[str, ScenarioResult],
+    baseline: dict[str, dict[str, Any]],
+    *,
+    timings: dict[str, dict[str, Any]] | None = None,
+    time_tolerance: float = DEFAULT_TIME_TOLERANCE,
+    time_slack_ms: float = DEFAULT_TIME_SLACK_MS,
+) -> list[str]:
+    """Round trip сверяются с baseline всегда, медианы — только с переданными локальными timings."""
+
+    regressions: list[str] = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected and result.round_trips > int(expected["round_trips"]):
+            regressions.append(f"{name}: round_trips {result.round_trips} > baseline {expected['round_trips']}")
+        expected_time = (timings or {}).get(name)
+        if not expected_time:
+            continue
+        limit_ms = float(expected_time["median_ms"]) * time_tolerance + time_slack_ms
+        if result.median_ms > limit_ms:
+            regressions.append(f"{name}: median_ms {result.median_ms:.1f} > limit {limit_ms:.1f} (baseline {expected_time['median_ms']})")
+    return regressions
+
+
+def load_baselines(path: str) -> dict[str, dict[str, dict[str, Any]]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_baselines(path: str, profile_name: str, results: dict[str, ScenarioResult]) -> None:
+    _save_profile(
+        path,
+        profile_name,
+        {name: {"round_trips": result.round_trips, "rows_returned": result.rows_returned} for name, result in results.items()},
+    )
+
+
+def save_timings(path: str, profile_name: str, results: dict[str, ScenarioResult]) -> None:
+    _save_profile(path, profile_name, {name: {"median_ms": result.median_ms} for name, result in results.items()})
+
+
+def _save_profile(path: str, profile_name: str, entries: dict[str, dict[str, Any]]) -> None:
+    baselines = load_baselines(path)
+    baselines[profile_name] = entries
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(baselines, handle, ensure_ascii=False, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="smoke")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="можно указать несколько раз")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="моделируемая задержка одного round trip")
+    parser.add_argument("--repeats", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--timing-baseline", default=DEFAULT_TIMING_BASELINE_PATH, help="медианы этой машины, не коммитятся")
+    parser.add_argument("--update-baseline", action="store_true", help="записать round trip в --baseline и медианы в --timing-baseline")
+    parser.add_argument("--update-timings", action="store_true", help="записать только медианы этой машины")
+    parser.add_argument("--time-check", action="store_true", help="сверять медианы с --timing-baseline")
+    parser.add_argument("--time-tolerance", type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument("--json", action="store_true", help="вывести результаты в JSON")
+    args = parser.parse_args()
+
+    # Сервисы пишут warning на каждый fallback; в замере это шум и лишнее время.
+    logging.disable(logging.WARNING)
+    results = run_suite(
+        PROFILES[args.profile],
+        scenarios=args.scenario,
+        latency_ms=args.latency_ms,
+        repeats=args.repeats,
+        seed=args.seed,
+    )
+    logging.disable(logging.NOTSET)
+
+    if args.json:
+        print(json.dumps({name: asdict(result) for name, result in results.items()}, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'scenario':<34} {'round_trips':>11} {'rows':>9} {'median_ms':>10} {'p95_ms':>9} {'modeled_ms':>11}")
+        for result in results.values():
+            print(
+                f"{result.name:<34} {result.round_trips:>11} {result.rows_returned:>9} "
+                f"{result.median_ms:>10.1f} {result.p95_ms:>9.1f} {result.modeled_ms:>11.1f}"
+            )
+
+    if args.update_baseline or args.update_timings:
+        if args.update_baseline:
+            save_baselines(args.baseline, args.profile, results)
+            print(f"baseline updated profile={args.profile} path={args.baseline}")
+        save_timings(args.timing_baseline, args.profile, results)
+        print(f"timings updated profile={args.profile} path={args.timing_baseline}")
+        return 0
+
+    baseline = load_baselines(args.baseline).get(args.profile, {})
+    if not baseline:
+        print(f"no baseline for profile={args.profile}; run with --update-baseline")
+        return 0
+    timings = None
+    if args.time_check:
+        timings = load_baselines(args.timing_baseline).get(args.profile)
+        if not timings:
+            print(f"no timings for profile={args.profile} on this machine; run with --update-timings")
+    regressions = find_regressions(results, baseline, timings=timings, time_tolerance=args.time_tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
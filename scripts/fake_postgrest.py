@@ -0,0 +1,476 @@
+"""
+Назначение: модуль "fake postgrest" реализует продуктовый контур в зоне общая логика (офлайн-замеры).
+Ответственность: in-memory замена клиента Supabase с синтаксисом построителя PostgREST, подсчётом round trip, моделируемой сетевой задержкой и уникальными индексами.
+Где используется: общая логика (`scripts/benchmark_suite.py`, тесты бенчмарков и атомарных операций `Database`).
+"""
+
+from __future__ import annotations
+
+import copy
+import fnmatch
+import threading
+from collections import Counter
+from typing import Any, Callable, Iterable
+
+from postgrest.exceptions import APIError
+
+_MISSING = object()
+
+
+class _Response:
+    def __init__(self, data: Any, count: int | None = None) -> None:
+        self.data = data
+        self.count = count
+
+
+def _api_error(message: str, code: str) -> APIError:
+    return APIError({"message": message, "code": code, "details": None, "hint": None})
+
+
+def _split_top_level(expr: str) -> list[str]:
+    """Разбить `a.eq.1,and(b.eq.2,c.eq.3)` по запятым верхнего уровня с учётом скобок и кавычек."""
+
+    parts: list[str] = []
+    depth = 0
+    quoted = False
+    current: list[str] = []
+    for char in expr:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _comparable(row_value: Any, filter_value: Any) -> tuple[Any, Any] | None:
+    """PostgREST сравнивает в типе колонки: приводим значение фильтра к типу значения строки."""
+
+    if row_value is None or filter_value is None:
+        return None
+    if isinstance(row_value, bool):
+        return row_value, str(filter_value).lower() in {"true", "t", "1"}
+    if isinstance(row_value, (int, float)):
+        try:
+            return row_value, float(filter_value)
+        except (TypeError, ValueError):
+            return None
+    return str(row_value), str(filter_value)
+
+
+def _like(value: Any, pattern: str, *, casefold: bool) -> bool:
+    if value is None:
+        return False
+    text, pattern = str(value), pattern.replace("%", "*").replace("_", "?")
+    if casefold:
+        text, pattern = text.casefold(), pattern.casefold()
+    return fnmatch.fnmatchcase(text, pattern)
+
+
+def _index_key(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _match(row: dict, column: str, op: str, value: Any) -> bool:
+    row_value = row.get(column)
+    if op == "is":
+        normalized = str(value).lower()
+        if normalized == "null":
+            return row_value is None
+        return row_value is (normalized == "true")
+    if op == "in":
+        # value — заранее нормализованное множество ключей (см. in_ и _parse_condition).
+        return _index_key(row_value) in value
+    if op == "like":
+        return _like(row_value, str(value), casefold=False)
+    if op == "ilike":
+        return _like(row_value, str(value), casefold=True)
+    if op == "cs":
+        return isinstance(row_value, list) and all(item in row_value for item in value)
+    pair = _comparable(row_value, value)
+    if pair is None:
+        return False
+    left, right = pair
+    if op == "eq":
+        return left == right
+    if op == "neq":
+        return left != right
+    if op == "gt":
+        return left > right
+    if op == "gte":
+        return left >= right
+    if op == "lt":
+        return left < right
+    if op == "lte":
+        return left <= right
+    raise _api_error(f"fake postgrest: unsupported operator {op}", "PGRST100")
+
+
+def _parse_condition(term: str) -> Callable[[dict], bool]:
+    """Один элемент or()/and(): `col.op.value`, `col.not.op.value` или вложенные and(...)/or(...)."""
+
+    for group, combine in (("and(", all), ("or(", any)):
+        if term.startswith(group) and term.endswith(")"):
+            children = [_parse_condition(part) for part in _split_top_level(term[len(group) : -1])]
+            return lambda row, children=children, combine=combine: combine(child(row) for child in children)
+    column, _, rest = term.partition(".")
+    negate = rest.startswith("not.")
+    if negate:
+        rest = rest[len("not.") :]
+    op, _, raw_value = rest.partition(".")
+    if op == "in":
+        value: Any = frozenset(_index_key(_unquote(item)) for item in _split_top_level(raw_value.strip("()")))
+    else:
+        value = _unquote(raw_value)
+    return lambda row: _match(row, column, op, value) != negate
+
+
+def _project(row: dict, columns: list[str] | None) -> dict:
+    if columns is None:
+        return dict(row)
+    projected = {}
+    for column in columns:
+        alias, _, source = column.partition(":")
+        if not source:
+            alias = source = column
+        projected[alias] = copy.copy(row.get(source))
+    return projected
+
+
+class FakeQuery:
+    """Построитель запроса: цепочка фильтров копит условия, execute() — один round trip."""
+
+    def __init__(self, backend: "FakePostgrest", table: str, *, rpc: tuple[str, dict] | None = None) -> None:
+        self._backend = backend
+        self._table = table
+        self._rpc = rpc
+        self._operation = "select"
+        self._columns: list[str] | None = None
+        self._count: str | None = None
+        self._payload: Any = None
+        self._on_conflict: list[str] = []
+        self._filters: list[tuple[str, str, Any, bool]] = []
+        self._or_groups: list[Callable[[dict], bool]] = []
+        self._order: list[tuple[str, bool]] = []
+        self._offset = 0
+        self._limit: int | None = None
+        self._single: str | None = None
+        self._negate_next = False
+
+    # --- операции -------------------------------------------------------------
+    def select(self, columns: str = "*", *, count: str | None = None, **_kwargs: Any) -> "FakeQuery":
+        if self._operation == "select":
+            columns = columns.strip()
+            self._columns = None if columns in {"", "*"} else [part.strip() for part in columns.split(",") if part.strip()]
+        self._count = count
+        return self
+
+    def insert(self, rows: dict | list[dict], **_kwargs: Any) -> "FakeQuery":
+        self._operation, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows: dict | list[dict], *, on_conflict: str = "id", **_kwargs: Any) -> "FakeQuery":
+        self._operation, self._payload = "upsert", rows
+        self._on_conflict = [part.strip() for part in on_conflict.split(",") if part.strip()]
+        return self
+
+    def update(self, values: dict, **_kwargs: Any) -> "FakeQuery":
+        self._operation, self._payload = "update", values
+        return self
+
+    def delete(self, **_kwargs: Any) -> "FakeQuery":
+        self._operation = "delete"
+        return self
+
+    # --- фильтры --------------------------------------------------------------
+    @property
+    def not_(self) -> "FakeQuery":
+        self._negate_next = True
+        return self
+
+    def _filter(self, column: str, op: str, value: Any) -> "FakeQuery":
+        self._filters.append((column, op, value, self._negate_next))
+        self._negate_next = False
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "lte", value)
+
+    def like(self, column: str, pattern: str) -> "FakeQuery":
+        return self._filter(column, "like", pattern)
+
+    def ilike(self, column: str, pattern: str) -> "FakeQuery":
+        return self._filter(column, "ilike", pattern)
+
+    def is_(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "is", "null" if value is None else value)
+
+    def in_(self, column: str, values: Iterable[Any]) -> "FakeQuery":
+        return self._filter(column, "in", frozenset(_index_key(item) for item in values))
+
+    def contains(self, column: str, values: Iterable[Any]) -> "FakeQuery":
+        return self._filter(column, "cs", list(values))
+
+    def or_(self, filters: str, **_kwargs: Any) -> "FakeQuery":
+        children = [_parse_condition(part) for part in _split_top_level(filters)]
+        self._or_groups.append(lambda row: any(child(row) for child in children))
+        return self
+
+    # --- модификаторы ---------------------------------------------------------
+    def order(self, column: str, *, desc: bool = False, **_kwargs: Any) -> "FakeQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **_kwargs: Any) -> "FakeQuery":
+        self._limit = int(size)
+        return self
+
+    def range(self, start: int, end: int, **_kwargs: Any) -> "FakeQuery":
+        self._offset, self._limit = int(start), int(end) - int(start) + 1
+        return self
+
+    def single(self) -> "FakeQuery":
+        self._single = "single"
+        return self
+
+    def maybe_single(self) -> "FakeQuery":
+        self._single = "maybe"
+        return self
+
+    # --- выполнение -----------------------------------------------------------
+    def _matches(self, row: dict) -> bool:
+        for column, op, value, negate in self._filters:
+            if _match(row, column, op, value) == negate:
+                return False
+        return all(group(row) for group in self._or_groups)
+
+    def _candidates(self) -> list[dict]:
+        # Фильтры eq/in по индексу: иначе каждый запрос к 1M actions был бы полным сканом в Python,
+        # и замер показывал бы стоимость заглушки, а не кода бота.
+        buckets = []
+        for column, op, value, negate in self._filters:
+            if negate:
+                continue
+            if op == "eq":
+                buckets.append(self._backend._lookup(self._table, column, value))
+            elif op == "in":
+                buckets.append([row for key in value for row in self._backend._lookup(self._table, column, key)])
+        return min(buckets, key=len) if buckets else self._backend._rows(self._table)
+
+    def _select(self) -> tuple[list[dict], int]:
+        rows = [row for row in self._candidates() if self._matches(row)]
+        for column, desc in reversed(self._order):
+            # NULL в конце при asc и в начале при desc, как в PostgreSQL по умолчанию.
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column) if row.get(column) is not None else 0), reverse=desc)
+        total = len(rows)
+        end = None if self._limit is None else self._offset + self._limit
+        return rows[self._offset : end], total
+
+    def execute(self) -> _Response:
+        # Задержка — до блокировки: параллельные потоки успевают вклиниться между чтением и записью, как в сети.
+        self._backend._round_trip(self._table if self._rpc is None else f"rpc:{self._rpc[0]}", self._operation)
+        with self._backend._lock:
+            return self._execute()
+
+    def _execute(self) -> _Response:
+        if self._rpc is not None:
+            name, params = self._rpc
+            handler = self._backend._rpcs.get(name)
+            if handler is None:
+                raise _api_error(f"Could not find the function public.{name}", "PGRST202")
+            return self._backend._respond(handler(self._backend, **params))
+        if self._table not in self._backend.tables:
+            raise _api_error(f"Could not find the table 'public.{self._table}' in the schema cache", "PGRST205")
+
+        if self._operation == "select":
+            rows, total = self._select()
+            data: Any = [_project(row, self._columns) for row in rows]
+            if self._single is not None:
+                if len(data) != 1 and (self._single == "single" or len(data) > 1):
+                    raise _api_error(f"JSON object requested, {len(data)} rows returned", "PGRST116")
+                data = data[0] if data else None
+            return self._backend._respond(data, total if self._count else None)
+        if self._operation in {"insert", "upsert"}:
+            payload = self._payload if isinstance(self._payload, list) else [self._payload]
+            return self._backend._respond(self._backend._write(self._table, payload, self._on_conflict if self._operation == "upsert" else None))
+        matched = [row for row in self._candidates() if self._matches(row)]
+        if self._operation == "update":
+            for row in matched:
+                row.update(copy.deepcopy(self._payload))
+        else:
+            ids = {id(row) for row in matched}
+            self._backend.tables[self._table] = [row for row in self._backend.tables[self._table] if id(row) not in ids]
+        self._backend._invalidate(self._table)
+        return self._backend._respond([dict(row) for row in matched])
+
+
+class FakePostgrest:
+    """Клиент с интерфейсом supabase-py поверх словаря таблиц; считает round trip по таблицам и операциям."""
+
+    def __init__(
+        self,
+        tables: dict[str, list[dict]] | None = None,
+        *,
+        latency_ms: float = 0.0,
+        sleep: Callable[[float], None] | None = None,
+        unique: dict[str, Iterable[Iterable[str]]] | None = None,
+    ) -> None:
+        self.tables: dict[str, list[dict]] = {name: list(rows) for name, rows in (tables or {}).items()}
+        # Уникальные индексы: строки с NULL в любой колонке ключа не конфликтуют (как частичный индекс WHERE ... IS NOT NULL).
+        self.unique: dict[str, list[tuple[str, ...]]] = {
+            name: [tuple(columns) for columns in constraints] for name, constraints in (unique or {}).items()
+        }
+        # insert/upsert в эти таблицы завершаются ошибкой сервера: для проверки откатов.
+        self.failing_inserts: set[str] = set()
+        self._lock = threading.RLock()
+        self.latency_ms = max(0.0, float(latency_ms))
+        # sleep=None: задержка только моделируется (simulated_latency_ms), замер не ждёт сеть.
+        self._sleep = sleep
+        self._indexes: dict[tuple[str, str], dict[str, list[dict]]] = {}
+        self._rpcs: dict[str, Callable[..., Any]] = {}
+        self.round_trips: Counter[tuple[str, str]] = Counter()
+        self.rows_returned = 0
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def from_(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: dict | None = None, **_kwargs: Any) -> FakeQuery:
+        return FakeQuery(self, name, rpc=(name, dict(params or {})))
+
+    def register_rpc(self, name: str, handler: Callable[..., Any]) -> None:
+        """handler(backend, **params) возвращает data ответа."""
+
+        self._rpcs[name] = handler
+
+    # --- статистика -----------------------------------------------------------
+    @property
+    def total_round_trips(self) -> int:
+        return sum(self.round_trips.values())
+
+    @property
+    def simulated_latency_ms(self) -> float:
+        return self.total_round_trips * self.latency_ms
+
+    def reset_stats(self) -> None:
+        self.round_trips.clear()
+        self.rows_returned = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "round_trips": self.total_round_trips,
+            "rows_returned": self.rows_returned,
+            "simulated_latency_ms": round(self.simulated_latency_ms, 3),
+            "by_table": {f"{table}:{op}": count for (table, op), count in sorted(self.round_trips.items())},
+        }
+
+    # --- внутреннее -----------------------------------------------------------
+    def _round_trip(self, table: str, operation: str) -> None:
+        with self._lock:
+            self.round_trips[(table, operation)] += 1
+        if self._sleep is not None and self.latency_ms:
+            self._sleep(self.latency_ms / 1000)
+
+    def _respond(self, data: Any, count: int | None = None) -> _Response:
+        if isinstance(data, list):
+            self.rows_returned += len(data)
+        elif data is not None:
+            self.rows_returned += 1
+        return _Response(data, count)
+
+    def _rows(self, table: str) -> list[dict]:
+        return self.tables.get(table, [])
+
+    def _lookup(self, table: str, column: str, value: Any) -> list[dict]:
+        index = self._indexes.get((table, column))
+        if index is None:
+            index = {}
+            for row in self._rows(table):
+                value_at = row.get(column, _MISSING)
+                if value_at is not _MISSING and value_at is not None:
+                    index.setdefault(_index_key(value_at), []).append(row)
+            self._indexes[(table, column)] = index
+        return index.get(_index_key(value), [])
+
+    def _invalidate(self, table: str) -> None:
+        for key in [key for key in self._indexes if key[0] == table]:
+            del self._indexes[key]
+
+    def _unique_conflict(self, table: str, rows: list[dict], item: dict) -> tuple[str, ...] | None:
+        for columns in self.unique.get(table, ()):
+            if any(item.get(column) is None for column in columns):
+                continue
+            key = tuple(_index_key(item.get(column)) for column in columns)
+            if any(tuple(_index_key(row.get(column)) for column in columns) == key for row in rows):
+                return columns
+        return None
+
+    def _write(self, table: str, payload: list[dict], on_conflict: list[str] | None) -> list[dict]:
+        if table in self.failing_inserts:
+            raise _api_error(f"fake postgrest: {table} write failed", "XX000")
+        rows = self.tables.setdefault(table, [])
+        # Сначала весь пакет сверяется с уникальными индексами: при конфликте не пишется ни одна строка.
+        plan: list[tuple[dict | None, dict]] = []
+        staged: list[dict] = []
+        for item in payload:
+            existing = None
+            if on_conflict:
+                existing = next(
+                    (row for row in rows if all(_index_key(row.get(key)) == _index_key(item.get(key)) for key in on_conflict)),
+                    None,
+                )
+            if existing is None:
+                columns = self._unique_conflict(table, rows + staged, item)
+                if columns is not None:
+                    raise _api_error(
+                        f'duplicate key value violates unique constraint "{table}_{"_".join(columns)}_key"', "23505"
+                    )
+                staged.append(item)
+            plan.append((existing, item))
+        written = []
+        for existing, item in plan:
+            if existing is not None:
+                existing.update(copy.deepcopy(item))
+                written.append(dict(existing))
+            else:
+                row = copy.deepcopy(item)
+                rows.append(row)
+                written.append(dict(row))
+        self._invalidate(table)
+        return written
@@ -0,0 +1,21 @@
+-- P15: общее хранилище состояния многошаговых UI-сценариев (pending-состояния команд).
+-- Используется при FLOW_STATE_BACKEND=supabase, чтобы Discord/Telegram runtime
+-- могли работать отдельными процессами/репликами с согласованным состоянием.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS bot_flow_state (
+    namespace TEXT NOT NULL,
+    state_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (namespace, state_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_flow_state_expires_at
+    ON bot_flow_state (expires_at);
+
+COMMENT ON TABLE bot_flow_state IS 'Pending-состояния UI-сценариев с TTL; payload — компактный JSON.';
+
+COMMIT;
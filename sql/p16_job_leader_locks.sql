@@ -0,0 +1,17 @@
+-- P16: leader lock (lease) для фоновых задач процесса роли jobs.
+-- Несколько jobs-worker могут работать одновременно: каждую задачу выполняет
+-- только владелец непросроченной строки, остальные ждут в standby.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS bot_job_locks (
+    job_name TEXT PRIMARY KEY,
+    owner_id TEXT NOT NULL,
+    acquired_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE bot_job_locks IS 'Lease фоновых задач: владелец продлевает expires_at, просроченный lease может захватить другой процесс.';
+
+COMMIT;
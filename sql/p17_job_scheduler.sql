@@ -0,0 +1,37 @@
+-- P17: состояние и история запусков фоновых задач (bot/services/job_scheduler.py).
+-- next_run_at переживает рестарт бота, поэтому суточные и двухсуточные задачи
+-- больше не сбрасывают таймер; running_until защищает от наложения запусков.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS bot_scheduled_jobs (
+    job_name TEXT PRIMARY KEY,
+    next_run_at TIMESTAMPTZ NOT NULL,
+    running_until TIMESTAMPTZ,
+    last_started_at TIMESTAMPTZ,
+    last_finished_at TIMESTAMPTZ,
+    last_status TEXT,
+    last_duration_ms INTEGER,
+    last_error TEXT,
+    last_owner_id TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS bot_job_run_history (
+    id BIGSERIAL PRIMARY KEY,
+    job_name TEXT NOT NULL,
+    owner_id TEXT,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    status TEXT NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_job_run_history_job_started
+    ON bot_job_run_history (job_name, started_at DESC);
+
+COMMENT ON TABLE bot_scheduled_jobs IS 'Расписание фоновых задач: следующий запуск, lease выполнения и итог последнего запуска.';
+COMMENT ON TABLE bot_job_run_history IS 'История запусков фоновых задач: статус и длительность.';
+
+COMMIT;
@@ -0,0 +1,21 @@
+-- P18: контрольные точки полного скана участников (bot/services/identity_scan_service.py).
+-- Прерванный скан продолжается с cursor (id последнего полностью пройденного участника),
+-- завершённый не повторяется раньше DISCORD_FULL_SCAN_MIN_INTERVAL_SECONDS.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS bot_identity_scan_state (
+    provider TEXT NOT NULL,
+    scope_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    cursor TEXT,
+    processed INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ,
+    completed_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (provider, scope_id)
+);
+
+COMMENT ON TABLE bot_identity_scan_state IS 'Прогресс полного скана identity по гильдии: курсор, статус, время завершения.';
+
+COMMIT;
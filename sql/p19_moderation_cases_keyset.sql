@@ -0,0 +1,13 @@
+-- P19: индексы для постраничного чтения кейсов модерации (ModerationService.list_recent_cases).
+-- Страница кейсов берётся keyset-фильтром по (created_at, id) внутри account_id,
+-- действия страницы — одним запросом по case_id.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_moderation_cases_account_created_id
+    ON moderation_cases (account_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_moderation_actions_case_created
+    ON moderation_actions (case_id, created_at, id);
+
+COMMIT;
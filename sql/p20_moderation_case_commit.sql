@@ -0,0 +1,21 @@
+-- P20: атомарная фиксация кейса модерации (ModerationService.commit_case).
+-- Строка кейса — идемпотентный захват по op_key: повтор с тем же ключом упирается в уникальный индекс.
+-- commit_plan хранит снимок плана, commit_steps — журнал выполненных шагов; по ним
+-- recover_stale_pending_cases компенсирует кейсы, зависшие в pending после падения процесса.
+
+BEGIN;
+
+ALTER TABLE moderation_cases ADD COLUMN IF NOT EXISTS commit_plan jsonb;
+ALTER TABLE moderation_cases ADD COLUMN IF NOT EXISTS commit_steps text;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_moderation_cases_op_key
+    ON moderation_cases (op_key)
+    WHERE op_key IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_moderation_cases_pending_created
+    ON moderation_cases (created_at)
+    WHERE status = 'pending';
+
+ALTER TABLE moderation_case_fines ADD COLUMN IF NOT EXISTS rollback_op_key text;
+
+COMMIT;
@@ -0,0 +1,95 @@
+-- P21: атомарное изменение билетов вместе с записью в ticket_actions (Database.apply_ticket_delta_by_account).
+-- Раньше баланс читался, складывался в Python и перезаписывался upsert-ом, а лог писался отдельным
+-- запросом: параллельные выдачи из Discord и Telegram теряли начисления.
+-- apply_ticket_action блокирует строку scores, применяет дельту (не ниже нуля) и пишет строку
+-- журнала в той же транзакции; повтор с тем же op_key ничего не меняет.
+
+BEGIN;
+
+ALTER TABLE IF EXISTS ticket_actions
+  ADD COLUMN IF NOT EXISTS op_key text;
+
+ALTER TABLE IF EXISTS ticket_actions
+  ADD COLUMN IF NOT EXISTS balance_after integer;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_ticket_actions_op_key
+  ON ticket_actions(op_key)
+  WHERE op_key IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.apply_ticket_action(
+  p_account_id uuid,
+  p_ticket_type text,
+  p_delta integer,
+  p_reason text,
+  p_author_account_id uuid,
+  p_author_id bigint DEFAULT 0,
+  p_op_key text DEFAULT NULL
+)
+RETURNS TABLE(applied boolean, new_value integer)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_current integer;
+  v_new integer;
+BEGIN
+  IF p_account_id IS NULL THEN
+    RAISE EXCEPTION 'p_account_id must be provided';
+  END IF;
+  IF p_ticket_type NOT IN ('normal', 'gold') THEN
+    RAISE EXCEPTION 'unsupported ticket type: %', p_ticket_type;
+  END IF;
+
+  INSERT INTO scores (account_id, points, tickets_normal, tickets_gold)
+  VALUES (p_account_id, 0, 0, 0)
+  ON CONFLICT (account_id) DO NOTHING;
+
+  -- Блокировка строки сериализует конкурентные изменения одного аккаунта.
+  SELECT CASE WHEN p_ticket_type = 'gold' THEN s.tickets_gold ELSE s.tickets_normal END
+    INTO v_current
+  FROM scores s
+  WHERE s.account_id = p_account_id
+  FOR UPDATE;
+
+  -- Идемпотентность проверяется под блокировкой, чтобы два повтора не прошли оба.
+  IF p_op_key IS NOT NULL AND EXISTS (
+    SELECT 1 FROM ticket_actions t WHERE t.op_key = p_op_key
+  ) THEN
+    RETURN QUERY SELECT false, COALESCE(v_current, 0);
+    RETURN;
+  END IF;
+
+  v_new := GREATEST(COALESCE(v_current, 0) + p_delta, 0);
+
+  IF p_ticket_type = 'gold' THEN
+    UPDATE scores SET tickets_gold = v_new WHERE account_id = p_account_id;
+  ELSE
+    UPDATE scores SET tickets_normal = v_new WHERE account_id = p_account_id;
+  END IF;
+
+  INSERT INTO ticket_actions (
+    account_id,
+    ticket_type,
+    amount,
+    reason,
+    author_id,
+    author_account_id,
+    op_key,
+    balance_after
+  )
+  VALUES (
+    p_account_id,
+    p_ticket_type,
+    p_delta,
+    p_reason,
+    COALESCE(p_author_id, 0),
+    p_author_account_id,
+    p_op_key,
+    v_new
+  );
+
+  RETURN QUERY SELECT true, v_new;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,110 @@
+-- P22: единый атомарный примитив изменения банка и append-only журнал bank_ledger.
+-- Раньше add_to_bank/add_to_bank_with_history/spend_from_bank читали total и перезаписывали его upsert-ом,
+-- поэтому параллельные выплаты турниров и доход от штрафов затирали друг друга.
+-- apply_bank_ledger_delta блокирует строку bank, применяет дельту и в той же транзакции пишет
+-- строку bank_ledger (и, по запросу, bank_history). verify_bank_ledger сверяет total с суммой журнала.
+
+BEGIN;
+
+INSERT INTO bank (id, total)
+VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS bank_ledger (
+  id bigserial PRIMARY KEY,
+  delta numeric NOT NULL,
+  balance_after numeric NOT NULL,
+  reason text NOT NULL DEFAULT '',
+  account_id uuid NULL,
+  user_id bigint NULL,
+  op_key text NULL,
+  created_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_bank_ledger_op_key
+  ON bank_ledger(op_key)
+  WHERE op_key IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.bank_ledger_append_only()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RAISE EXCEPTION 'bank_ledger is append-only';
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_bank_ledger_append_only ON bank_ledger;
+CREATE TRIGGER trg_bank_ledger_append_only
+  BEFORE UPDATE OR DELETE ON bank_ledger
+  FOR EACH ROW EXECUTE FUNCTION public.bank_ledger_append_only();
+
+-- Стартовый остаток: с этого момента total обязан совпадать с суммой журнала.
+INSERT INTO bank_ledger (delta, balance_after, reason, op_key)
+SELECT b.total, b.total, 'opening_balance', 'bank:opening_balance'
+FROM bank b
+WHERE b.id = 1
+ON CONFLICT (op_key) WHERE op_key IS NOT NULL DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.apply_bank_ledger_delta(
+  p_delta numeric,
+  p_reason text,
+  p_account_id uuid DEFAULT NULL,
+  p_user_id bigint DEFAULT NULL,
+  p_op_key text DEFAULT NULL,
+  p_allow_overdraft boolean DEFAULT false,
+  p_write_history boolean DEFAULT true
+)
+RETURNS TABLE(applied boolean, new_total numeric, error_code text)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_total numeric;
+BEGIN
+  SELECT b.total INTO v_total FROM bank b WHERE b.id = 1 FOR UPDATE;
+  v_total := COALESCE(v_total, 0);
+
+  -- Идемпотентность проверяется под блокировкой банка.
+  IF p_op_key IS NOT NULL AND EXISTS (
+    SELECT 1 FROM bank_ledger l WHERE l.op_key = p_op_key
+  ) THEN
+    RETURN QUERY SELECT false, v_total, 'duplicate'::text;
+    RETURN;
+  END IF;
+
+  IF p_delta < 0 AND NOT p_allow_overdraft AND v_total + p_delta < 0 THEN
+    RETURN QUERY SELECT false, v_total, 'insufficient_funds'::text;
+    RETURN;
+  END IF;
+
+  v_total := v_total + p_delta;
+  UPDATE bank SET total = v_total, updated_at = now() WHERE id = 1;
+
+  INSERT INTO bank_ledger (delta, balance_after, reason, account_id, user_id, op_key)
+  VALUES (p_delta, v_total, COALESCE(p_reason, ''), p_account_id, p_user_id, p_op_key);
+
+  IF p_write_history THEN
+    INSERT INTO bank_history (account_id, user_id, amount, reason, timestamp)
+    VALUES (p_account_id, CASE WHEN p_account_id IS NULL THEN p_user_id END, p_delta, p_reason, now());
+  END IF;
+
+  RETURN QUERY SELECT true, v_total, NULL::text;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.verify_bank_ledger()
+RETURNS TABLE(bank_total numeric, ledger_total numeric, drift numeric, ledger_rows bigint)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT b.total,
+         COALESCE(l.total, 0),
+         b.total - COALESCE(l.total, 0),
+         COALESCE(l.cnt, 0)
+  FROM bank b
+  LEFT JOIN (SELECT SUM(delta) AS total, COUNT(*) AS cnt FROM bank_ledger) l ON true
+  WHERE b.id = 1;
+$$;
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- P23: отпечатки набора ролей участников Discord для сверки титулов (sync_discord_titles_once).
+-- Проход пересчитывает титулы и пишет в БД только для участников, чей отпечаток изменился.
+-- Префикс отпечатка — хэш конфигурации титульных ролей, поэтому смена конфигурации пересчитывает всех.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS discord_member_role_fingerprints (
+  guild_id text NOT NULL,
+  member_id text NOT NULL,
+  fingerprint text NOT NULL,
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (guild_id, member_id)
+);
+
+COMMIT;
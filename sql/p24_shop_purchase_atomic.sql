@@ -0,0 +1,138 @@
+-- P24: атомарная покупка в магазине ролей.
+-- Раньше покупка шла отдельными шагами (чтение баланса через профиль, списание, выдача роли, откат при ошибке):
+-- двойной клик мог списать баллы дважды, а падение между шагами теряло баллы.
+-- shop_purchase_item под блокировкой строки scores аккаунта и строки shop_items проверяет баланс, цену,
+-- остаток и лимит на аккаунт, списывает баллы, пишет actions, выдаёт роль и фиксирует покупку с op_key
+-- (ключ идемпотентности из взаимодействия) одной транзакцией.
+
+BEGIN;
+
+ALTER TABLE public.shop_items
+  ADD COLUMN IF NOT EXISTS stock_remaining integer NULL,
+  ADD COLUMN IF NOT EXISTS per_account_limit integer NULL;
+
+COMMENT ON COLUMN public.shop_items.stock_remaining IS 'Остаток товара; NULL — без ограничения.';
+COMMENT ON COLUMN public.shop_items.per_account_limit IS 'Максимум покупок товара одним аккаунтом; NULL — без ограничения.';
+
+CREATE TABLE IF NOT EXISTS public.shop_purchases (
+  id bigserial PRIMARY KEY,
+  op_key text NOT NULL,
+  account_id uuid NOT NULL,
+  shop_item_id bigint NULL,
+  role_name text NOT NULL,
+  category_code text NOT NULL DEFAULT 'roles',
+  price_points integer NOT NULL,
+  status text NOT NULL DEFAULT 'completed',
+  created_at timestamptz NOT NULL DEFAULT now(),
+  CONSTRAINT shop_purchases_status_valid CHECK (status IN ('completed', 'refunded'))
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_shop_purchases_op_key
+  ON public.shop_purchases(op_key);
+
+CREATE INDEX IF NOT EXISTS idx_shop_purchases_account_role
+  ON public.shop_purchases(account_id, role_name)
+  WHERE status = 'completed';
+
+CREATE OR REPLACE FUNCTION public.shop_purchase_item(
+  p_op_key text,
+  p_account_id uuid,
+  p_role_name text,
+  p_category text,
+  p_price_points integer,
+  p_reason text,
+  p_category_code text DEFAULT 'roles'
+)
+RETURNS TABLE(status text, new_points numeric, error_code text)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_points numeric;
+  v_item shop_items%ROWTYPE;
+  v_price integer;
+  v_purchased integer;
+BEGIN
+  -- Блокировка строки баланса сериализует все покупки одного аккаунта.
+  SELECT s.points INTO v_points FROM scores s WHERE s.account_id = p_account_id FOR UPDATE;
+  v_points := COALESCE(v_points, 0);
+
+  IF EXISTS (SELECT 1 FROM shop_purchases sp WHERE sp.op_key = p_op_key) THEN
+    RETURN QUERY SELECT 'duplicate'::text, v_points, NULL::text;
+    RETURN;
+  END IF;
+
+  SELECT * INTO v_item
+  FROM shop_items si
+  WHERE si.category_code = p_category_code
+    AND si.role_name = p_role_name
+    AND si.is_active
+  FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN QUERY SELECT 'rejected'::text, v_points, 'item_unavailable'::text;
+    RETURN;
+  END IF;
+
+  v_price := GREATEST(v_item.base_price_points, 0);
+  IF v_item.sale_price_points IS NOT NULL
+     AND v_item.sale_starts_at IS NOT NULL
+     AND v_item.sale_ends_at IS NOT NULL
+     AND now() BETWEEN v_item.sale_starts_at AND v_item.sale_ends_at THEN
+    v_price := GREATEST(v_item.sale_price_points, 0);
+  END IF;
+  IF v_price <> p_price_points THEN
+    RETURN QUERY SELECT 'rejected'::text, v_points, 'price_changed'::text;
+    RETURN;
+  END IF;
+
+  IF EXISTS (
+    SELECT 1 FROM account_role_assignments a
+    WHERE a.account_id = p_account_id AND lower(a.role_name) = lower(p_role_name)
+  ) THEN
+    RETURN QUERY SELECT 'rejected'::text, v_points, 'already_owned'::text;
+    RETURN;
+  END IF;
+
+  IF v_item.per_account_limit IS NOT NULL THEN
+    SELECT COUNT(*) INTO v_purchased
+    FROM shop_purchases sp
+    WHERE sp.account_id = p_account_id AND sp.role_name = p_role_name AND sp.status = 'completed';
+    IF v_purchased >= v_item.per_account_limit THEN
+      RETURN QUERY SELECT 'rejected'::text, v_points, 'limit_reached'::text;
+      RETURN;
+    END IF;
+  END IF;
+
+  IF v_item.stock_remaining IS NOT NULL AND v_item.stock_remaining <= 0 THEN
+    RETURN QUERY SELECT 'rejected'::text, v_points, 'out_of_stock'::text;
+    RETURN;
+  END IF;
+
+  IF v_points < v_price THEN
+    RETURN QUERY SELECT 'rejected'::text, v_points, 'insufficient_points'::text;
+    RETURN;
+  END IF;
+
+  IF v_price > 0 THEN
+    v_points := v_points - v_price;
+    UPDATE scores SET points = v_points WHERE account_id = p_account_id;
+    INSERT INTO actions (account_id, points, reason, author_account_id, action_type, op_key)
+    VALUES (p_account_id, -v_price, p_reason, p_account_id, 'remove', p_op_key || ':debit');
+  END IF;
+
+  IF v_item.stock_remaining IS NOT NULL THEN
+    UPDATE shop_items SET stock_remaining = stock_remaining - 1 WHERE id = v_item.id;
+  END IF;
+
+  INSERT INTO account_role_assignments (account_id, role_name, source, metadata, origin_label)
+  VALUES (p_account_id, p_role_name, 'custom', jsonb_build_object('category', p_category), 'shop purchase')
+  ON CONFLICT (account_id, role_name, source) DO NOTHING;
+
+  INSERT INTO shop_purchases (op_key, account_id, shop_item_id, role_name, category_code, price_points)
+  VALUES (p_op_key, p_account_id, v_item.id, p_role_name, p_category_code, v_price);
+
+  RETURN QUERY SELECT 'completed'::text, v_points, NULL::text;
+END;
+$$;
+
+COMMIT;
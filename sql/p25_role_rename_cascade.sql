@@ -0,0 +1,61 @@
+-- P25: переименование роли каталога вместе с зависимыми строками.
+-- Синхронизация ролей Discord меняла только roles.name, а account_role_assignments, role_permissions
+-- и shop_items оставались привязаны к старому role_name: выдачи, права и товары роли терялись.
+-- rename_catalog_role под блокировкой строки роли обновляет roles и все строки, ссылающиеся на
+-- старое имя, одной транзакцией.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.rename_catalog_role(
+  p_discord_role_id text,
+  p_payload jsonb
+)
+RETURNS TABLE(status text, renamed_assignments integer, renamed_permissions integer, renamed_shop_items integer)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_new_name text := NULLIF(btrim(p_payload->>'name'), '');
+  v_current_name text;
+  v_assignments integer := 0;
+  v_permissions integer := 0;
+  v_shop_items integer := 0;
+BEGIN
+  IF v_new_name IS NULL THEN
+    RETURN QUERY SELECT 'rejected'::text, 0, 0, 0;
+    RETURN;
+  END IF;
+
+  SELECT r.name INTO v_current_name FROM roles r WHERE r.discord_role_id = p_discord_role_id FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN QUERY SELECT 'not_found'::text, 0, 0, 0;
+    RETURN;
+  END IF;
+  -- Повтор после уже применённого переименования ничего не меняет.
+  IF v_current_name = v_new_name THEN
+    RETURN QUERY SELECT 'unchanged'::text, 0, 0, 0;
+    RETURN;
+  END IF;
+
+  UPDATE roles SET
+    name = v_new_name,
+    discord_role_name = COALESCE(p_payload->>'discord_role_name', discord_role_name),
+    category_name = COALESCE(p_payload->>'category_name', category_name),
+    position = COALESCE((p_payload->>'position')::integer, position),
+    is_privileged_discord_role = COALESCE((p_payload->>'is_privileged_discord_role')::boolean, is_privileged_discord_role),
+    is_sellable = COALESCE((p_payload->>'is_sellable')::boolean, is_sellable),
+    show_in_roles_catalog = COALESCE((p_payload->>'show_in_roles_catalog')::boolean, show_in_roles_catalog)
+  WHERE discord_role_id = p_discord_role_id;
+
+  UPDATE account_role_assignments SET role_name = v_new_name WHERE role_name = v_current_name;
+  GET DIAGNOSTICS v_assignments = ROW_COUNT;
+  UPDATE role_permissions SET role_name = v_new_name WHERE role_name = v_current_name;
+  GET DIAGNOSTICS v_permissions = ROW_COUNT;
+  UPDATE shop_items SET role_name = v_new_name WHERE role_name = v_current_name;
+  GET DIAGNOSTICS v_shop_items = ROW_COUNT;
+
+  RETURN QUERY SELECT 'renamed'::text, v_assignments, v_permissions, v_shop_items;
+END;
+$$;
+
+COMMIT;
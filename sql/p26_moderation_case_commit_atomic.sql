@@ -0,0 +1,215 @@
+-- P26: фиксация кейса модерации одной транзакцией (ModerationService.commit_case).
+-- Пошаговый путь из P20 — компенсирующая сага: между шагами мут, штраф или поступление в банк уже видны,
+-- а при сбое их снимает откат или recover_stale_pending_cases спустя минуты.
+-- commit_moderation_case под advisory-блокировкой op_key вставляет кейс, его действия, состояние
+-- предупреждений, мут, бан, понижение, штраф (баллы или долг к оплате) и доход банка и помечает кейс
+-- applied. Любая ошибка откатывает всё целиком; повтор с тем же op_key возвращает уже созданный кейс.
+-- Журнал commit_steps и восстановление остаются только для пошагового пути без этой функции.
+
+BEGIN;
+
+-- Вставка или обновление строки по jsonb с набором колонок из ключей: payload-ы те же, что пишет
+-- пошаговый путь через PostgREST, поэтому типы колонок приводит jsonb_populate_record.
+CREATE OR REPLACE FUNCTION public.moderation_commit_write(
+  p_table text,
+  p_row jsonb,
+  p_keys text[] DEFAULT NULL,
+  p_insert_extra jsonb DEFAULT '{}'::jsonb
+)
+RETURNS TABLE(row_data jsonb, inserted boolean)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_insert jsonb := COALESCE(p_insert_extra, '{}'::jsonb) || p_row;
+  v_cols text;
+  v_set text;
+  v_where text;
+  v_row jsonb;
+BEGIN
+  IF p_table NOT IN (
+    'moderation_cases', 'moderation_actions', 'moderation_mutes', 'moderation_bans',
+    'moderation_warn_state', 'moderation_warn_state_by_violation', 'moderation_case_fines', 'fines'
+  ) THEN
+    RAISE EXCEPTION 'moderation_commit_write: table % is not allowed', p_table;
+  END IF;
+
+  IF p_keys IS NOT NULL THEN
+    SELECT string_agg(format('%1$I = r.%1$I', k), ', ') INTO v_set FROM jsonb_object_keys(p_row) AS k;
+    SELECT string_agg(format('t.%1$I = r.%1$I', k), ' AND ') INTO v_where FROM unnest(p_keys) AS k;
+    EXECUTE format(
+      'UPDATE public.%1$I AS t SET %2$s FROM jsonb_populate_record(NULL::public.%1$I, $1) AS r WHERE %3$s RETURNING to_jsonb(t.*)',
+      p_table, v_set, v_where
+    ) INTO v_row USING p_row;
+    IF v_row IS NOT NULL THEN
+      RETURN QUERY SELECT v_row, false;
+      RETURN;
+    END IF;
+  END IF;
+
+  SELECT string_agg(quote_ident(k), ', ') INTO v_cols FROM jsonb_object_keys(v_insert) AS k;
+  EXECUTE format(
+    'INSERT INTO public.%1$I AS t (%2$s) SELECT %2$s FROM jsonb_populate_record(NULL::public.%1$I, $1) RETURNING to_jsonb(t.*)',
+    p_table, v_cols
+  ) INTO v_row USING v_insert;
+  RETURN QUERY SELECT v_row, true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.commit_moderation_case(
+  p_case jsonb,
+  p_plan jsonb
+)
+RETURNS TABLE(status text, case_row jsonb, action_rows jsonb, fine_row jsonb, new_points numeric)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_op_key text := NULLIF(p_case->>'op_key', '');
+  v_account_id uuid := (p_case->>'account_id')::uuid;
+  v_case jsonb;
+  v_case_ref jsonb;
+  v_step jsonb;
+  v_row jsonb;
+  v_inserted boolean;
+  v_actions jsonb := '[]'::jsonb;
+  v_fine_row jsonb;
+  v_amount numeric;
+  v_fine_reason text;
+  v_bank_reason text;
+  v_points numeric;
+  v_bank_applied boolean;
+  v_bank_error text;
+BEGIN
+  IF v_op_key IS NULL OR v_account_id IS NULL THEN
+    RAISE EXCEPTION 'commit_moderation_case: op_key and account_id are required';
+  END IF;
+
+  -- Параллельные отправки одного кейса сериализуются по op_key: вторая увидит строку первой.
+  PERFORM pg_advisory_xact_lock(hashtext('moderation_case:' || v_op_key));
+  SELECT to_jsonb(mc.*) INTO v_case FROM moderation_cases mc WHERE mc.op_key = v_op_key LIMIT 1;
+  IF v_case IS NOT NULL THEN
+    RETURN QUERY SELECT 'duplicate'::text, v_case, '[]'::jsonb, NULL::jsonb, NULL::numeric;
+    RETURN;
+  END IF;
+
+  SELECT w.row_data INTO v_case FROM moderation_commit_write('moderation_cases', p_case) w;
+  v_case_ref := jsonb_build_object('case_id', v_case->'id');
+
+  IF p_plan ? 'warn' THEN
+    v_step := p_plan->'warn';
+    SELECT w.row_data INTO v_row FROM moderation_commit_write('moderation_actions', (v_step->'action') || v_case_ref) w;
+    v_actions := v_actions || jsonb_build_array(v_row);
+    SELECT w.inserted INTO v_inserted
+    FROM moderation_commit_write(
+      'moderation_warn_state_by_violation',
+      (v_step->'state_by_violation') || jsonb_build_object('last_case_id', v_case->'id'),
+      ARRAY['account_id', 'violation_type_id']
+    ) w;
+    -- Как и пошаговый путь: общий счётчик пишется вместе с первой записью по этому типу нарушения.
+    IF v_inserted THEN
+      PERFORM * FROM moderation_commit_write(
+        'moderation_warn_state',
+        (v_step->'state_global') || jsonb_build_object('last_case_id', v_case->'id'),
+        ARRAY['account_id']
+      );
+    END IF;
+  END IF;
+
+  IF p_plan ? 'mute' THEN
+    v_step := p_plan->'mute';
+    PERFORM * FROM moderation_commit_write('moderation_mutes', (v_step->'row') || v_case_ref);
+    SELECT w.row_data INTO v_row FROM moderation_commit_write('moderation_actions', (v_step->'action') || v_case_ref) w;
+    v_actions := v_actions || jsonb_build_array(v_row);
+    PERFORM * FROM moderation_commit_write(
+      'moderation_warn_state',
+      v_step->'history',
+      ARRAY['account_id'],
+      jsonb_build_object('active_warn_count', 0, 'has_prior_warns', false)
+    );
+  END IF;
+
+  IF p_plan ? 'ban' THEN
+    v_step := p_plan->'ban';
+    PERFORM * FROM moderation_commit_write('moderation_bans', (v_step->'row') || v_case_ref);
+    SELECT w.row_data INTO v_row FROM moderation_commit_write('moderation_actions', (v_step->'action') || v_case_ref) w;
+    v_actions := v_actions || jsonb_build_array(v_row);
+  END IF;
+
+  IF p_plan ? 'kick' THEN
+    SELECT w.row_data INTO v_row FROM moderation_commit_write('moderation_actions', (p_plan->'kick'->'action') || v_case_ref) w;
+    v_actions := v_actions || jsonb_build_array(v_row);
+  END IF;
+
+  IF p_plan ? 'demotion' THEN
+    v_step := p_plan->'demotion';
+    UPDATE accounts a SET
+      titles = ARRAY(SELECT jsonb_array_elements_text(v_step->'titles')),
+      titles_updated_at = now(),
+      titles_source = v_step->>'titles_source'
+    WHERE a.id = v_account_id;
+    IF NOT FOUND THEN
+      RAISE EXCEPTION 'commit_moderation_case: account % not found', v_account_id;
+    END IF;
+    SELECT w.row_data INTO v_row FROM moderation_commit_write('moderation_actions', (v_step->'action') || v_case_ref) w;
+    v_actions := v_actions || jsonb_build_array(v_row);
+  END IF;
+
+  IF p_plan ? 'fine' THEN
+    v_step := p_plan->'fine';
+    v_amount := (v_step->>'amount')::numeric;
+    v_fine_reason := format('Модерация кейс #%s: %s', v_case->>'id', v_step->>'reason_text');
+    IF v_step->>'payment_mode' = 'manual' THEN
+      SELECT w.row_data INTO v_fine_row
+      FROM moderation_commit_write('fines', (v_step->'legacy_fine') || jsonb_build_object('reason', v_fine_reason)) w;
+      PERFORM * FROM moderation_commit_write(
+        'moderation_case_fines',
+        (v_step->'case_fine') || jsonb_build_object('source_case_id', v_case->'id', 'legacy_fine_id', v_fine_row->'id')
+      );
+    ELSE
+      INSERT INTO scores (account_id, points, tickets_normal, tickets_gold)
+      VALUES (v_account_id, 0, 0, 0)
+      ON CONFLICT (account_id) DO NOTHING;
+
+      SELECT s.points INTO v_points FROM scores s WHERE s.account_id = v_account_id FOR UPDATE;
+      v_points := GREATEST(COALESCE(v_points, 0) - v_amount, 0);
+      UPDATE scores s SET points = v_points WHERE s.account_id = v_account_id;
+      INSERT INTO actions (account_id, points, reason, author_account_id, action_type, op_key)
+      VALUES (v_account_id, -v_amount, v_fine_reason, (v_step->>'author_account_id')::uuid, 'remove', v_op_key || ':fine_points');
+    END IF;
+    SELECT w.row_data INTO v_row
+    FROM moderation_commit_write(
+      'moderation_actions',
+      (v_step->'action') || v_case_ref
+        || jsonb_build_object('value_text', format('%s payment_mode=%s', v_fine_reason, v_step->>'payment_mode'))
+    ) w;
+    v_actions := v_actions || jsonb_build_array(v_row);
+  END IF;
+
+  IF p_plan ? 'bank_income' THEN
+    v_step := p_plan->'bank_income';
+    v_bank_reason := format(
+      'Поступление штрафа moderation case #%s op_key=%s: %s', v_case->>'id', v_op_key, v_step->>'reason_text'
+    );
+    SELECT b.applied, b.error_code INTO v_bank_applied, v_bank_error
+    FROM apply_bank_ledger_delta(
+      (v_step->>'amount')::numeric, v_bank_reason, v_account_id, NULL, v_op_key || ':bank_income', false, true
+    ) b;
+    IF NOT v_bank_applied AND v_bank_error IS DISTINCT FROM 'duplicate' THEN
+      RAISE EXCEPTION 'commit_moderation_case: bank income rejected: %', v_bank_error;
+    END IF;
+    SELECT w.row_data INTO v_row
+    FROM moderation_commit_write(
+      'moderation_actions',
+      (v_step->'action') || v_case_ref || jsonb_build_object('value_text', v_bank_reason)
+    ) w;
+    v_actions := v_actions || jsonb_build_array(v_row);
+  END IF;
+
+  SELECT w.row_data INTO v_case
+  FROM moderation_commit_write('moderation_cases', (p_plan->'finalize') || jsonb_build_object('id', v_case->'id'), ARRAY['id']) w;
+
+  RETURN QUERY SELECT 'applied'::text, v_case, v_actions, v_fine_row, v_points;
+END;
+$$;
+
+COMMIT;
@@ -24,6 +24,7 @@ class _TableOp:
         self.table_name = table_name
         self._filters = []
         self._limit = None
+        self._offset = 0
         self._payload = None
         self._action = "select"
 
@@ -39,6 +40,14 @@ class _TableOp:
         self._limit = n
         return self
 
+    def order(self, _key, desc=False):
+        return self
+
+    def range(self, start, end):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
     def is_(self, key, value):
         self._filters.append((key, None if str(value).lower() == "null" else value))
         return self
@@ -141,7 +150,7 @@ class _TableOp:
             if all(str(row.get(k)) == str(v) for k, v in self._filters):
                 selected.append(dict(row))
         if self._limit is not None:
-            selected = selected[: self._limit]
+            selected = selected[self._offset : self._offset + self._limit]
         return _Resp(selected)
 
 
@@ -212,6 +221,7 @@ class AccountsServiceTests(unittest.TestCase):
         AccountsService._account_id_cache = {}
         AccountsService._title_roles_cache = None
         AccountsService._account_identities_account_id_required_cache = None
+        AccountsService._identity_username_indexes = {}
 
     def tearDown(self):
         self.patcher.stop()
@@ -337,6 +347,53 @@ class AccountsServiceTests(unittest.TestCase):
         self.assertEqual(lookup["result"]["provider"], "discord")
         self.assertEqual(lookup["result"]["provider_user_id"], "333")
 
+    def test_identity_username_index_is_built_once_and_refreshed_on_identity_write(self):
+        self.fake_db.tables["account_identities"] = [
+            {"account_id": "acc-1", "provider": "discord", "provider_user_id": "111", "username": "OldName"},
+            {"account_id": "acc-2", "provider": "discord", "provider_user_id": "222", "username": "other"},
+        ]
+
+        self.assertEqual(AccountsService.find_accounts_by_identity_username("discord", "oldname")[0]["provider_user_id"], "111")
+        AccountsService.persist_identity_lookup_fields("discord", "111", username="NewName")
+        self.fake_db.operations.clear()
+
+        self.assertEqual(AccountsService.find_accounts_by_identity_username("discord", "oldname"), [])
+        renamed = AccountsService.find_accounts_by_identity_username("discord", "NEWNAME")
+        AccountsService.find_accounts_by_identity_username("discord", "other")
+
+        self.assertEqual([(item["provider_user_id"], item["matched_by"]) for item in renamed], [("111", "username")])
+        identity_reads = [op for op in self.fake_db.operations if op["table"] == "account_identities" and op["action"] == "select"]
+        # Только точечное перечитывание изменённой identity, без повторной загрузки всей таблицы.
+        self.assertEqual(len(identity_reads), 1)
+        self.assertIn(("provider_user_id", "111"), identity_reads[0]["filters"])
+
+    def test_identity_username_index_keeps_dirty_row_when_reread_fails(self):
+        self.fake_db.tables["account_identities"] = [
+            {"account_id": "acc-1", "provider": "discord", "provider_user_id": "111", "username": "Keeper"},
+        ]
+        self.assertEqual(len(AccountsService.find_accounts_by_identity_username("discord", "keeper")), 1)
+        AccountsService._mark_identity_index_dirty("discord", "111")
+
+        with patch.object(AccountsService, "_fetch_identity_row", return_value=(None, False)):
+            during_outage = AccountsService.find_accounts_by_identity_username("discord", "keeper")
+        self.fake_db.tables["account_identities"][0]["username"] = "Renamed"
+        after_outage = AccountsService.find_accounts_by_identity_username("discord", "renamed")
+
+        self.assertEqual([item["provider_user_id"] for item in during_outage], ["111"])
+        self.assertEqual([item["provider_user_id"] for item in after_outage], ["111"])
+
+    def test_search_identity_usernames_matches_prefix_case_insensitively(self):
+        self.fake_db.tables["account_identities"] = [
+            {"account_id": "acc-1", "provider": "telegram", "provider_user_id": "1", "username": "@BebraAdmin"},
+            {"account_id": "acc-2", "provider": "telegram", "provider_user_id": "2", "display_name": "bebra fan"},
+            {"account_id": "acc-3", "provider": "telegram", "provider_user_id": "3", "username": "someone"},
+        ]
+
+        matches = AccountsService.search_identity_usernames("telegram", "@BEBRA")
+
+        self.assertEqual({item["provider_user_id"] for item in matches}, {"1", "2"})
+        self.assertEqual(len(AccountsService.search_identity_usernames("telegram", "bebra", limit=1)), 1)
+
     def test_persist_identity_lookup_fields_updates_existing_identity(self):
         self.fake_db.tables["account_identities"] = [
             {"account_id": "acc-1", "provider": "discord", "provider_user_id": "111"}
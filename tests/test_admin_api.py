@@ -4,15 +4,58 @@
 Где используется: Discord/Telegram/общая логика (тесты).
 """
 
+import json
+import os
+import time
 import unittest
 from unittest.mock import patch
 
 from bot.admin_api.app import admin_app
+from bot.admin_api.auth import AdminApiGuard, sign_admin_request
+
+_SECRET = "test-secret-0123456789"
+_KEYS = [
+    {
+        "key_id": "ops",
+        "secret": _SECRET,
+        "actor_provider": "discord",
+        "actor_user_id": "999",
+        "scopes": ["read", "roles:write"],
+        "rate_per_minute": 600,
+    },
+    {"key_id": "viewer", "secret": _SECRET, "actor_provider": "discord", "actor_user_id": "1", "scopes": ["read"], "rate_per_minute": 2},
+]
+
+
+class _SignedClient:
+    def __init__(self, client, key_id="ops"):
+        self.client = client
+        self.key_id = key_id
+
+    def get(self, path, **kwargs):
+        headers = sign_admin_request(_SECRET, "GET", path, key_id=self.key_id)
+        return self.client.get(path, headers=headers, **kwargs)
+
+    def post(self, path, *, json=None, headers=None):
+        body = _json_bytes(json)
+        signed = sign_admin_request(_SECRET, "POST", path, body, key_id=self.key_id)
+        signed.update(headers or {})
+        return self.client.post(path, data=body, content_type="application/json", headers=signed)
+
+
+def _json_bytes(payload) -> bytes:
+    return json.dumps(payload).encode("utf-8")
 
 
 class AdminApiTests(unittest.TestCase):
     def setUp(self):
-        self.client = admin_app.test_client()
+        env = patch.dict(os.environ, {"ADMIN_API_KEYS": json.dumps(_KEYS)})
+        env.start()
+        self.addCleanup(env.stop)
+        AdminApiGuard.reset()
+        self.addCleanup(AdminApiGuard.reset)
+        self.raw_client = admin_app.test_client()
+        self.client = _SignedClient(self.raw_client)
 
     @patch("bot.admin_api.app._build_user_payload")
     @patch("bot.admin_api.app._resolve_account_id")
@@ -159,5 +202,66 @@ class AdminApiTests(unittest.TestCase):
         self.assertIn("2026-04-13T12:00:00+00:00", body)
 
 
+    def test_requests_without_valid_signature_are_rejected(self):
+        path = "/admin/api/council/pause"
+        self.assertEqual(self.raw_client.get(path).status_code, 401)
+
+        headers = sign_admin_request("wrong-secret-0123456789", "GET", path, key_id="ops")
+        self.assertEqual(self.raw_client.get(path, headers=headers).get_json()["error"], "unauthorized")
+
+        stale = sign_admin_request(_SECRET, "GET", path, key_id="ops", timestamp=int(time.time()) - 3600)
+        self.assertEqual(self.raw_client.get(path, headers=stale).get_json()["error"], "signature_expired")
+
+    @patch("bot.admin_api.app.CouncilPauseService.get_pause_status_for_admin", return_value={"paused": False})
+    def test_replayed_nonce_is_rejected(self, _mock_pause_status):
+        path = "/admin/api/council/pause"
+        headers = sign_admin_request(_SECRET, "GET", path, key_id="ops")
+
+        self.assertEqual(self.raw_client.get(path, headers=headers).status_code, 200)
+        replay = self.raw_client.get(path, headers=headers)
+
+        self.assertEqual(replay.status_code, 401)
+        self.assertEqual(replay.get_json()["error"], "replayed_request")
+
+    def test_tampered_body_fails_signature(self):
+        path = "/admin/api/users/telegram/200/roles/custom"
+        signed_body = _json_bytes({"action": "assign", "role_name": "оператор"})
+        headers = sign_admin_request(_SECRET, "POST", path, signed_body, key_id="ops")
+
+        response = self.raw_client.post(
+            path,
+            data=_json_bytes({"action": "assign", "role_name": "админ"}),
+            content_type="application/json",
+            headers=headers,
+        )
+
+        self.assertEqual(response.status_code, 401)
+
+    @patch("bot.admin_api.app.AuthorityService.can_manage_role", return_value=False)
+    def test_actor_comes_from_key_not_from_body(self, mock_can_manage):
+        mismatch = self.client.post(
+            "/admin/api/users/telegram/200/roles/custom",
+            json={"action": "assign", "role_name": "оператор", "actor_provider": "discord", "actor_user_id": "1"},
+        )
+        self.assertEqual(mismatch.status_code, 403)
+        self.assertEqual(mismatch.get_json()["error"], "actor_mismatch")
+
+        self.client.post("/admin/api/users/telegram/200/roles/custom", json={"action": "assign", "role_name": "оператор"})
+        mock_can_manage.assert_called_once_with("discord", "999", "оператор")
+
+    @patch("bot.admin_api.app.CouncilPauseService.get_pause_status_for_admin", return_value={"paused": False})
+    def test_read_key_scope_and_rate_limit(self, _mock_pause_status):
+        viewer = _SignedClient(self.raw_client, key_id="viewer")
+        denied = viewer.post("/admin/api/users/telegram/200/roles/custom", json={"action": "assign", "role_name": "оператор"})
+        self.assertEqual(denied.status_code, 403)
+        self.assertEqual(denied.get_json()["error"], "scope_forbidden")
+
+        bearer = {"Authorization": f"Bearer viewer:{_SECRET}"}
+        self.assertEqual(self.raw_client.get("/admin/api/council/pause", headers=bearer).status_code, 200)
+        limited = self.raw_client.get("/admin/api/council/pause", headers=bearer)
+        self.assertEqual(limited.status_code, 429)
+        self.assertTrue(limited.headers.get("Retry-After"))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,136 @@
+"""
+Назначение: модуль "test api monitor" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: проверка шаблонов маршрутов, скользящих окон по маршруту/статусу и реакции ограничителя на недавние 429.
+Где используется: общая логика (тесты).
+"""
+
+import asyncio
+
+from bot.utils.api_monitor import APIMonitor, route_template
+from bot.utils.discord_http import is_cloudflare_rate_limited_response, is_global_rate_limited_response
+from bot.utils.rate_limiter import RateLimiter
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_route_template_hides_ids_and_tokens():
+    assert route_template("post", "https://discord.com/api/v10/channels/123456789012345678/messages") == (
+        "POST /channels/{channel_id}/messages",
+        "123456789012345678",
+    )
+    assert route_template("POST", "https://discord.com/api/v10/webhooks/123456789012345678/aW50ZXJhY3Rpb24") == (
+        "POST /webhooks/{webhook_id}/{token}",
+        "123456789012345678",
+    )
+    assert route_template(
+        "PUT", "/api/v10/channels/111111111111/messages/222222222222/reactions/%F0%9F%91%8D/@me"
+    ) == ("PUT /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me", "111111111111")
+
+
+def test_windows_split_by_route_status_and_expire():
+    clock = _Clock()
+    api = APIMonitor(window=60, bucket_sec=5, bucket_count=12, clock=clock)
+    url = "https://discord.com/api/v10/channels/123456789012345678/messages"
+
+    for _ in range(3):
+        api.record_request(200, method="POST", url=url)
+    api.record_request(429, method="POST", url=url)
+    clock.now += 30
+    api.record_request(403, method="GET", url="/api/v10/guilds/123456789012345678", cloudflare=True)
+
+    assert api.request_rate() == 5
+    assert api.count(60, route="POST /channels/{channel_id}/messages", status=200) == 3
+    assert api.rate_limited_count(60) == 2
+    assert api.rate_limited_count(10) == 1
+    assert api.count(10, cloudflare=True) == 1
+    assert api.top_rate_limited(60)[0]["count"] == 1
+    assert api.ratelimited == 2 and api.cloudflare_ratelimited == 1
+
+    clock.now += 61
+    assert api.request_rate() == 0
+    assert api.rate_limited_count(60) == 0
+
+
+def test_series_count_is_bounded():
+    api = APIMonitor(max_series=3, clock=_Clock())
+
+    for index in range(10):
+        api.record_request(200, route=f"GET /route{index}")
+
+    assert len(api._series) == 3
+    assert api.count(60) == 3
+
+
+def test_rate_limiter_adds_pressure_delay_except_for_interaction_ack():
+    clock = _Clock()
+    api = APIMonitor(clock=clock)
+    limiter = RateLimiter(api_monitor=api)
+    assert limiter.pressure_delay("followup") == 0.0
+
+    api.record_request(429, route="POST /channels/{channel_id}/messages", major="111")
+    assert 0.0 < limiter.pressure_delay("channel_send", major="111") <= limiter._pressure_max
+    assert limiter.pressure_delay("interaction_ack", major="111") == 0.0
+
+    api.record_request(403, route="GET /gateway/bot", cloudflare=True)
+    assert limiter.pressure_delay("followup") == limiter._pressure_max
+
+
+def test_route_429_delays_only_sends_to_the_same_major():
+    api = APIMonitor(clock=_Clock())
+    limiter = RateLimiter(api_monitor=api)
+
+    api.record_request(429, route="POST /channels/{channel_id}/messages", major="111")
+
+    assert limiter.pressure_delay("channel_send", major="111") > 0.0
+    assert limiter.pressure_delay("channel_send", major="222") == 0.0
+    assert limiter.pressure_delay("followup") == 0.0
+
+
+def test_global_429_delays_every_send():
+    api = APIMonitor(clock=_Clock())
+    limiter = RateLimiter(api_monitor=api)
+
+    api.record_request(429, route="POST /channels/{channel_id}/messages", major="111", global_limit=True)
+
+    assert limiter.pressure_delay("channel_send", major="222") > 0.0
+    assert limiter.pressure_delay("followup") > 0.0
+    assert api.count(60, global_limit=True) == 1
+
+
+def test_route_pressure_does_not_hold_the_bucket_for_other_channels():
+    api = APIMonitor(clock=_Clock())
+    limiter = RateLimiter(api_monitor=api)
+    limiter._pressure_step = 0.05
+    limiter._bucket_defaults["channel_send"]["jitter"] = 0.0
+    api.record_request(429, route="POST /channels/{channel_id}/messages", major="111")
+
+    async def _send_both():
+        throttled = await limiter.wait("channel_send", delay=0.0, major="111")
+        other = await limiter.wait("channel_send", delay=0.0, major="222")
+        return throttled, other
+
+    throttled, other = asyncio.run(_send_both())
+
+    assert throttled.pressure_delay == 0.05 and throttled.waited_for >= 0.05
+    assert other.pressure_delay == 0.0 and other.waited_for == 0.0
+
+
+def test_global_rate_limit_classification_uses_headers():
+    assert is_global_rate_limited_response(429, {"X-RateLimit-Global": "true"})
+    assert is_global_rate_limited_response(429, {"X-RateLimit-Scope": "global"})
+    assert not is_global_rate_limited_response(429, {"X-RateLimit-Scope": "user"})
+    assert not is_global_rate_limited_response(200, {"X-RateLimit-Global": "true"})
+
+
+def test_cloudflare_response_classification_uses_headers():
+    assert is_cloudflare_rate_limited_response(429, {"Server": "cloudflare", "Content-Type": "text/html"})
+    assert not is_cloudflare_rate_limited_response(
+        429, {"Server": "cloudflare", "X-RateLimit-Scope": "user", "Content-Type": "application/json"}
+    )
+    assert not is_cloudflare_rate_limited_response(200, {"Server": "cloudflare"})
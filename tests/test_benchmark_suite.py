@@ -0,0 +1,100 @@
+"""
+Назначение: модуль "test benchmark suite" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: проверка in-memory PostgREST (фильтры, индексы, подсчёт round trip) и поиска регрессий в офлайн-бенчмарках.
+Где используется: общая логика (тесты).
+"""
+
+import pytest
+from postgrest.exceptions import APIError
+
+from bot.data import db
+from scripts.benchmark_suite import (
+    DEFAULT_BASELINE_PATH,
+    BenchmarkProfile,
+    ScenarioResult,
+    find_regressions,
+    load_baselines,
+    run_suite,
+)
+from scripts.fake_postgrest import FakePostgrest
+
+
+def _backend():
+    return FakePostgrest(
+        {
+            "cases": [
+                {"id": "a", "account_id": "1", "created_at": "2026-01-01T00:00:03", "closed_at": None},
+                {"id": "b", "account_id": "1", "created_at": "2026-01-01T00:00:02", "closed_at": "x"},
+                {"id": "c", "account_id": "1", "created_at": "2026-01-01T00:00:02", "closed_at": None},
+                {"id": "d", "account_id": "2", "created_at": "2026-01-01T00:00:01", "closed_at": None},
+            ]
+        },
+        latency_ms=2.0,
+    )
+
+
+def test_fake_postgrest_filters_orders_and_counts_round_trips():
+    backend = _backend()
+
+    page = (
+        backend.table("cases")
+        .select("id")
+        .eq("account_id", 1)
+        .or_('created_at.lt."2026-01-01T00:00:03",and(created_at.eq."2026-01-01T00:00:03",id.lt."a")')
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(1)
+        .execute()
+    )
+    open_cases = backend.table("cases").select("id").not_.is_("closed_at", "null").execute()
+    single = backend.table("cases").select("*").in_("id", ["d"]).single().execute()
+
+    assert page.data == [{"id": "c"}]
+    assert open_cases.data == [{"id": "b"}]
+    assert single.data["account_id"] == "2"
+    assert backend.stats()["round_trips"] == 3
+    assert backend.simulated_latency_ms == 6.0
+    with pytest.raises(APIError):
+        backend.table("missing").select("*").execute()
+
+
+def test_fake_postgrest_writes_invalidate_indexes():
+    backend = _backend()
+    assert len(backend.table("cases").select("*").eq("account_id", "2").execute().data) == 1
+
+    backend.table("cases").upsert({"id": "d", "account_id": "1"}, on_conflict="id").execute()
+    backend.table("cases").delete().eq("id", "a").execute()
+
+    assert backend.table("cases").select("*").eq("account_id", "2").execute().data == []
+    assert {row["id"] for row in backend.table("cases").select("id").eq("account_id", "1").execute().data} == {"b", "c", "d"}
+
+
+def test_suite_counts_round_trips_and_restores_shared_db():
+    original_supabase = db.supabase
+    profile = BenchmarkProfile(accounts=40, actions=400, tournament_players=8, hot_account_cases=12, repeats=1)
+
+    results = run_suite(profile, scenarios=["moderation_list_recent_cases", "tournament_bracket_embed"])
+
+    # Две страницы дел: по запросу на дела и на их действия.
+    assert results["moderation_list_recent_cases"].round_trips == 4
+    assert results["tournament_bracket_embed"].round_trips > 0
+    assert db.supabase is original_supabase
+
+
+def test_find_regressions_flags_round_trips_strictly_and_time_only_against_local_timings():
+    result = ScenarioResult("scenario", round_trips=5, rows_returned=1, median_ms=20.0, p95_ms=20.0, simulated_latency_ms=0.0, by_table={})
+    baseline = {"scenario": {"round_trips": 4}}
+    timings = {"scenario": {"median_ms": 10.0}}
+
+    regressions = find_regressions({"scenario": result}, baseline, timings=timings, time_tolerance=1.5, time_slack_ms=1.0)
+
+    assert len(regressions) == 2
+    assert len(find_regressions({"scenario": result}, baseline)) == 1
+    assert find_regressions({"scenario": result}, {"scenario": {"round_trips": 5}}, timings={"scenario": {"median_ms": 15.0}}) == []
+
+
+def test_committed_baselines_hold_only_round_trip_counts():
+    for profile in load_baselines(DEFAULT_BASELINE_PATH).values():
+        for entry in profile.values():
+            assert "median_ms" not in entry
+            assert isinstance(entry["round_trips"], int)
@@ -84,7 +84,7 @@ def test_submit_proposal_when_pause_enabled_sets_waiting_launch_status(monkeypat
 
     monkeypatch.setattr("bot.services.council_feedback_service.db.supabase", _Supabase())
     monkeypatch.setattr(
-        "bot.services.council_feedback_service.CouncilPauseService.sync_pause_state",
+        "bot.services.council_feedback_service.CouncilPauseService.get_pause_status",
         staticmethod(lambda **_kwargs: {"paused": True, "reason": "term_ended_without_launch_confirmation"}),
     )
     monkeypatch.setattr(
@@ -68,6 +68,8 @@ def test_sync_pause_state_writes_required_audit_fields(monkeypatch):
     monkeypatch.setattr("bot.services.council_pause_service.db.supabase", _Supabase())
 
     state = CouncilPauseService.sync_pause_state(platform="telegram", user_id="321")
+    cached_status = CouncilPauseService.get_pause_status()
+    CouncilPauseService.invalidate_status_cache()
 
     assert state["paused"] is True
     assert audit_rows
@@ -77,3 +79,54 @@ def test_sync_pause_state_writes_required_audit_fields(monkeypatch):
     assert details["platform"] == "telegram"
     assert details["user_id"] == "321"
     assert str(details["entity_id"]) == "10"
+    assert cached_status["paused"] is True
+
+
+def test_get_pause_status_is_read_only_and_cached(monkeypatch):
+    calls: list[str] = []
+
+    class _AuditQuery:
+        def select(self, *_args, **_kwargs):
+            return self
+
+        def eq(self, *_args, **_kwargs):
+            return self
+
+        def order(self, *_args, **_kwargs):
+            return self
+
+        def limit(self, *_args, **_kwargs):
+            return self
+
+        def insert(self, _payload):
+            raise AssertionError("read path must not write")
+
+        def execute(self):
+            return SimpleNamespace(
+                data=[
+                    {
+                        "action": "pause_enabled",
+                        "details": {"reason": "term_ended_without_launch_confirmation"},
+                        "created_at": "2026-04-13T12:00:00+00:00",
+                    }
+                ]
+            )
+
+    class _Supabase:
+        def table(self, name: str):
+            calls.append(name)
+            if name == "council_audit_log":
+                return _AuditQuery()
+            raise AssertionError(name)
+
+    monkeypatch.setattr("bot.services.council_pause_service.db.supabase", _Supabase())
+    CouncilPauseService.invalidate_status_cache()
+
+    first = CouncilPauseService.get_pause_status()
+    second = CouncilPauseService.get_pause_status()
+    CouncilPauseService.invalidate_status_cache()
+
+    assert first == second
+    assert first["paused"] is True
+    assert first["reason"] == "term_ended_without_launch_confirmation"
+    assert calls == ["council_audit_log"]
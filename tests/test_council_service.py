@@ -535,7 +535,7 @@ def test_council_service_blocks_question_voting_start_when_pause_enabled(monkeyp
 
     monkeypatch.setattr(
         council_service_module.CouncilPauseService,
-        "sync_pause_state",
+        "get_pause_status",
         staticmethod(lambda **_kwargs: {"paused": True, "reason": "term_ended_without_launch_confirmation"}),
     )
 
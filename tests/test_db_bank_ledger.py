@@ -0,0 +1,148 @@
+"""
+Назначение: модуль "test db bank ledger" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: атомарные изменения банка через единый примитив с журналом bank_ledger и его сверка.
+Где используется: общая логика (тесты).
+"""
+
+import threading
+import time
+import unittest
+
+from bot.data.db import Database
+from scripts.fake_postgrest import FakePostgrest
+
+
+def _fake_supabase(total=0.0, *, verify_row=None):
+    # Задержка каждого round trip провоцирует гонку параллельных вызовов между чтением и записью.
+    fake = FakePostgrest(
+        {"bank": [{"id": 1, "total": total}], "bank_ledger": [], "bank_history": []},
+        latency_ms=1,
+        sleep=time.sleep,
+        unique={"bank_ledger": [("op_key",)]},
+    )
+    if verify_row is not None:
+        fake.register_rpc("verify_bank_ledger", lambda _backend, **_params: [verify_row])
+    return fake
+
+
+def _database(fake):
+    database = object.__new__(Database)
+    database.supabase = fake
+    database._account_metrics = {}
+    database._get_account_id_for_discord_user = lambda user_id: f"acc-{user_id}"
+    return database
+
+
+def _total(fake):
+    return fake.tables["bank"][0]["total"]
+
+
+class BankLedgerTests(unittest.TestCase):
+    def test_parallel_credits_and_spends_keep_total_equal_to_ledger(self):
+        fake = _fake_supabase(total=100.0)
+        database = _database(fake)
+        # Под искусственной гонкой поток может проиграть подряд больше попыток, чем в проде.
+        database.BANK_CAS_ATTEMPTS = 100
+        errors = []
+
+        def _credit():
+            for _ in range(5):
+                if not database.add_to_bank_with_history(1, 2.0, "fine income"):
+                    errors.append("credit")
+
+        def _spend():
+            for _ in range(5):
+                if not database.spend_from_bank(1.0, 2, "tournament payout"):
+                    errors.append("spend")
+
+        threads = [threading.Thread(target=target) for target in (_credit, _spend) * 4]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(_total(fake), 100.0 + 4 * 5 * 2.0 - 4 * 5 * 1.0)
+        self.assertEqual(len(fake.tables["bank_ledger"]), 40)
+        self.assertEqual(sum(row["delta"] for row in fake.tables["bank_ledger"]), _total(fake) - 100.0)
+
+    def test_spend_is_rejected_without_funds_and_leaves_no_ledger_row(self):
+        fake = _fake_supabase(total=5.0)
+        database = _database(fake)
+
+        self.assertFalse(database.spend_from_bank(10.0, 1, "bets bank"))
+
+        self.assertEqual(_total(fake), 5.0)
+        self.assertEqual(fake.tables["bank_ledger"], [])
+
+    def test_failed_history_write_rolls_back_total(self):
+        fake = _fake_supabase(total=5.0)
+        fake.failing_inserts.add("bank_history")
+        database = _database(fake)
+
+        with self.assertLogs("bot.data.db", level="ERROR"):
+            self.assertFalse(database.add_to_bank_with_history(1, 3.0, "fine income"))
+
+        self.assertEqual(_total(fake), 5.0)
+
+    def test_repeated_op_key_is_applied_once(self):
+        fake = _fake_supabase()
+        database = _database(fake)
+
+        self.assertTrue(database.apply_bank_delta(3.0, "case", account_id="acc-1", op_key="case-1:bank_income"))
+        self.assertTrue(database.apply_bank_delta(3.0, "case", account_id="acc-1", op_key="case-1:bank_income"))
+
+        self.assertEqual(_total(fake), 3.0)
+        self.assertEqual(len(fake.tables["bank_history"]), 1)
+
+    def test_failed_ledger_write_rolls_back_total_and_reverses_history(self):
+        fake = _fake_supabase(total=5.0)
+        fake.failing_inserts.add("bank_ledger")
+        database = _database(fake)
+
+        with self.assertLogs("bot.data.db", level="ERROR"):
+            self.assertFalse(database.apply_bank_delta(3.0, "fine income", account_id="acc-1", op_key="fine-1"))
+
+        self.assertEqual(_total(fake), 5.0)
+        self.assertEqual(sum(row["amount"] for row in fake.tables["bank_history"]), 0)
+        fake.failing_inserts.clear()
+        # Откат не оставил op_key в журнале, поэтому повтор применяется.
+        self.assertTrue(database.apply_bank_delta(3.0, "fine income", account_id="acc-1", op_key="fine-1"))
+        self.assertEqual(_total(fake), 8.0)
+        self.assertEqual(sum(row["delta"] for row in fake.tables["bank_ledger"]), 3.0)
+
+    def test_parallel_calls_with_same_op_key_apply_once(self):
+        fake = _fake_supabase(total=10.0)
+        database = _database(fake)
+        database.BANK_CAS_ATTEMPTS = 100
+        # Проверка журнала до записи видит пустой журнал у всех потоков: гонку решает только уникальный индекс.
+        database._bank_ledger_has_op_key = lambda _op_key: False
+        results = []
+
+        def _apply():
+            results.append(database.apply_bank_delta(3.0, "case", account_id="acc-1", op_key="case-2:bank_income"))
+
+        threads = [threading.Thread(target=_apply) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [True] * 6)
+        self.assertEqual(_total(fake), 13.0)
+        self.assertEqual(len(fake.tables["bank_ledger"]), 1)
+        self.assertEqual(sum(row["amount"] for row in fake.tables["bank_history"]), 3.0)
+
+    def test_verify_reports_drift(self):
+        fake = _fake_supabase(verify_row={"bank_total": 10, "ledger_total": 7, "drift": 3, "ledger_rows": 4})
+        database = _database(fake)
+
+        with self.assertLogs("bot.data.db", level="ERROR"):
+            result = database.verify_bank_ledger()
+
+        self.assertEqual(result["drift"], 3.0)
+        self.assertEqual(database._account_metrics["bank_ledger_drift_detected"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
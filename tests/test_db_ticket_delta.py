@@ -0,0 +1,119 @@
+"""
+Назначение: модуль "test db ticket delta" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: атомарное изменение билетов вместе с записью ticket_actions и отсутствие потерянных начислений.
+Где используется: общая логика (тесты).
+"""
+
+import threading
+import time
+import unittest
+
+from bot.data.db import Database
+from scripts.fake_postgrest import FakePostgrest
+
+
+def _fake_supabase(*, rpc_result=None):
+    # Задержка каждого round trip провоцирует гонку параллельных вызовов между чтением и записью.
+    fake = FakePostgrest(
+        {"scores": [{"account_id": "acc-1", "tickets_normal": 0, "tickets_gold": 0}], "ticket_actions": []},
+        latency_ms=1,
+        sleep=time.sleep,
+        unique={"scores": [("account_id",)], "ticket_actions": [("op_key",)]},
+    )
+    fake.rpc_calls = []
+    if rpc_result is not None:
+
+        def _apply_ticket_action(_backend, **params):
+            fake.rpc_calls.append(("apply_ticket_action", params))
+            return rpc_result
+
+        fake.register_rpc("apply_ticket_action", _apply_ticket_action)
+    return fake
+
+
+def _database(fake):
+    database = object.__new__(Database)
+    database.supabase = fake
+    return database
+
+
+def _tickets(fake, field="tickets_normal"):
+    return fake.tables["scores"][0][field]
+
+
+class TicketDeltaTests(unittest.TestCase):
+    def test_parallel_gives_do_not_lose_increments(self):
+        fake = _fake_supabase()
+        database = _database(fake)
+        # Под искусственной гонкой поток может проиграть подряд больше попыток, чем в проде.
+        database.TICKET_CAS_ATTEMPTS = 100
+        errors = []
+
+        def _worker():
+            for _ in range(5):
+                if not database.give_ticket_by_account("acc-1", "normal", 1, "menu", "acc-admin"):
+                    errors.append("give failed")
+
+        threads = [threading.Thread(target=_worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(_tickets(fake), 40)
+        self.assertEqual(len(fake.tables["ticket_actions"]), 40)
+
+    def test_failed_ledger_write_rolls_back_clamped_delta(self):
+        fake = _fake_supabase()
+        fake.tables["scores"][0]["tickets_gold"] = 2
+        fake.failing_inserts.add("ticket_actions")
+        database = _database(fake)
+
+        with self.assertLogs("bot.data.db", level="ERROR"):
+            result = database.remove_ticket_by_account("acc-1", "gold", 5, "shop", "acc-admin")
+
+        self.assertFalse(result)
+        self.assertEqual(_tickets(fake, "tickets_gold"), 2)
+
+    def test_fallback_writes_op_key_and_skips_repeat(self):
+        fake = _fake_supabase()
+        database = _database(fake)
+
+        self.assertTrue(database.apply_ticket_delta_by_account("acc-1", "normal", 2, "menu", "acc-admin", op_key="op-1"))
+        with self.assertLogs("bot.data.db", level="WARNING"):
+            self.assertTrue(database.apply_ticket_delta_by_account("acc-1", "normal", 2, "menu", "acc-admin", op_key="op-1"))
+
+        self.assertEqual(_tickets(fake), 2)
+        self.assertEqual([row["op_key"] for row in fake.tables["ticket_actions"]], ["op-1"])
+
+    def test_fallback_rolls_back_delta_when_op_key_written_concurrently(self):
+        fake = _fake_supabase()
+        database = _database(fake)
+        # Строку журнала успел записать параллельный вызов уже после проверки op_key.
+        database._ticket_actions_has_op_key = lambda _op_key: False
+        fake.tables["ticket_actions"].append({"account_id": "acc-1", "amount": 3, "op_key": "op-1"})
+
+        with self.assertLogs("bot.data.db", level="WARNING"):
+            result = database.apply_ticket_delta_by_account("acc-1", "normal", 3, "menu", "acc-admin", op_key="op-1")
+
+        self.assertTrue(result)
+        self.assertEqual(_tickets(fake), 0)
+        self.assertEqual(len(fake.tables["ticket_actions"]), 1)
+
+    def test_rpc_path_applies_delta_and_ledger_in_one_call(self):
+        fake = _fake_supabase(rpc_result=[{"applied": True, "new_value": 3}])
+        database = _database(fake)
+
+        self.assertTrue(database.give_ticket_by_account("acc-1", "normal", 3, "menu", "acc-admin"))
+
+        name, payload = fake.rpc_calls[0]
+        self.assertEqual(name, "apply_ticket_action")
+        self.assertEqual(payload["p_delta"], 3)
+        self.assertTrue(payload["p_op_key"])
+        self.assertEqual(fake.tables["ticket_actions"], [])
+        self.assertEqual(_tickets(fake), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,6 +14,8 @@ from unittest.mock import AsyncMock, patch
 import discord
 import pytest
 
+from bot.runtime_supervisor import runtime_health_snapshot
+
 
 class _FakeQuery:
     def select(self, *_args, **_kwargs):
@@ -137,6 +139,55 @@ def test_run_both_async_stops_discord_when_telegram_fails():
     asyncio.run(_exercise())
 
 
+def test_run_both_async_isolated_mode_restarts_telegram_without_stopping_discord():
+    bot_main = load_bot_main()
+    bot_main.RUNTIME_RESTART_BASE_DELAY_SEC = 0.01
+    bot_main.RUNTIME_RESTART_MAX_DELAY_SEC = 0.01
+
+    async def _exercise() -> None:
+        telegram_attempts = []
+        discord_cancelled = asyncio.Event()
+
+        async def fake_run_telegram_polling(_token: str) -> None:
+            telegram_attempts.append(1)
+            if len(telegram_attempts) < 3:
+                raise RuntimeError("telegram outage")
+            await asyncio.Event().wait()
+
+        async def fake_discord_start(_token: str) -> None:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                discord_cancelled.set()
+                raise
+
+        with (
+            patch.dict(os.environ, {"RUNTIME_SUPERVISION_MODE": "isolated"}, clear=False),
+            patch("bot.main.run_telegram_polling", side_effect=fake_run_telegram_polling),
+            patch("bot.main.autosave_task", AsyncMock()),
+            patch.object(bot_main.bot, "start", AsyncMock(side_effect=fake_discord_start)) as start_mock,
+            patch.object(bot_main.bot, "close", AsyncMock()),
+        ):
+            runner = asyncio.create_task(bot_main._run_both_async("discord-token", "telegram-token"))
+            for _ in range(100):
+                if len(telegram_attempts) >= 3:
+                    break
+                await asyncio.sleep(0.01)
+
+            assert len(telegram_attempts) == 3
+            assert not discord_cancelled.is_set()
+            assert start_mock.await_count == 1
+            health = runtime_health_snapshot()
+            assert health["telegram-runtime"]["restarts"] == 2
+            assert health["discord-runtime"]["restarts"] == 0
+
+            runner.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await runner
+
+    asyncio.run(_exercise())
+
+
 def test_restore_runtime_views_once_skips_duplicate_db_reads_on_reconnect():
     bot_main = load_bot_main()
     bot_main.runtime_views_restored = False
@@ -182,36 +233,34 @@ def test_on_member_remove_triggers_unlinked_identity_purge():
 
 
 class _FakeGuild:
-    def __init__(self, guild_id: int, members: list[object]):
+    def __init__(self, guild_id: int):
         self.id = guild_id
-        self.member_count = len(members)
-        self._members = members
-
-    async def fetch_members(self, limit=None):  # noqa: ANN001
-        for member in self._members:
-            yield member
 
 
-def test_full_identity_scan_collects_statuses_and_batches():
+def test_full_identity_scan_delegates_each_guild_to_scan_engine():
     bot_main = load_bot_main()
-    members = [type("Member", (), {"id": idx})() for idx in range(1, 6)]
-    guild = _FakeGuild(77, members)
+    guilds = [_FakeGuild(77), _FakeGuild(78)]
     bot_main.DISCORD_FULL_SCAN_BATCH_SIZE = 2
     bot_main.DISCORD_FULL_SCAN_PAUSE_SECONDS = 0.01
-
-    statuses = ["inserted", "updated", "skipped", "updated", "inserted"]
+    bot_main.DISCORD_FULL_SCAN_MIN_INTERVAL_SECONDS = 60
 
     async def _exercise() -> None:
         with (
-            patch("bot.main.bot", SimpleNamespace(guilds=[guild])),
-            patch("bot.main.asyncio.sleep", AsyncMock()) as sleep_mock,
+            patch("bot.main.bot", SimpleNamespace(guilds=guilds)),
             patch(
-                "bot.services.AccountsService.refresh_identity_from_platform_user",
-                side_effect=statuses,
-            ) as refresh_mock,
+                "bot.services.identity_scan_service.IdentityScanService.scan_discord_guild",
+                AsyncMock(side_effect=[{"updated": 2, "inserted": 1, "skipped": 3, "processed": 6}, RuntimeError("boom")]),
+            ) as scan_mock,
         ):
             await bot_main._run_discord_full_identity_scan_once()
-            assert refresh_mock.call_count == 5
-            assert sleep_mock.await_count == 2
+            assert scan_mock.await_count == 2
+            first_kwargs = scan_mock.await_args_list[0].kwargs
+            assert {key: value for key, value in first_kwargs.items() if key != "shared_preload"} == {
+                "chunk_size": 2,
+                "pause_seconds": 0.01,
+                "min_interval_seconds": 60,
+            }
+            # Один preload identity на весь проход: обе гильдии получают общий словарь.
+            assert first_kwargs["shared_preload"] is scan_mock.await_args_list[1].kwargs["shared_preload"]
 
     asyncio.run(_exercise())
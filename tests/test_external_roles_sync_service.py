@@ -5,9 +5,10 @@
 """
 
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch
 
-from bot.services.external_roles_sync_service import ExternalRolesSyncService
+from bot.services.external_roles_sync_service import SYNC_MODE_ACCOUNT, ExternalRolesSyncService
 
 
 class _FakeDb:
@@ -18,6 +19,63 @@ class _BotWithoutGuilds:
     pass
 
 
+class _RecordingQuery:
+    def __init__(self, supabase, table):
+        self.supabase = supabase
+        self.table = table
+        self.call = {"table": table, "action": "select", "filters": []}
+
+    def __getattr__(self, name):
+        if name == "not_":
+            return self
+
+        def _method(*args, **_kwargs):
+            if name in ("update", "upsert"):
+                self.call["action"] = name
+                self.call["payload"] = args[0]
+            elif name in ("eq", "in_", "is_", "range"):
+                self.call["filters"].append((name, *args))
+            return self
+
+        return _method
+
+    def execute(self):
+        self.supabase.calls.append(self.call)
+        rows = [] if self.call["action"] != "select" else self.supabase.rows.get(self.table, [])
+        in_filter = next((args for name, *args in self.call["filters"] if name == "in_"), None)
+        if in_filter and self.call["action"] == "select":
+            rows = [row for row in rows if row.get(in_filter[0]) in in_filter[1]]
+        return SimpleNamespace(data=[dict(row) for row in rows])
+
+
+class _RecordingSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def table(self, name):
+        return _RecordingQuery(self, name)
+
+    def writes(self, action):
+        return [call for call in self.calls if call["action"] == action]
+
+
+def _role(role_id, name, default=False):
+    return SimpleNamespace(id=role_id, name=name, is_default=lambda: default)
+
+
+class _Guild:
+    def __init__(self, members):
+        self._members = {member.id: member for member in members}
+
+    @property
+    def members(self):
+        raise AssertionError("member-scoped sync must not walk guild members")
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+
 class ExternalRolesSyncServiceTests(unittest.TestCase):
     def test_collect_discord_roles_handles_bot_without_guilds(self):
         bot = _BotWithoutGuilds()
@@ -63,6 +121,61 @@ class ExternalRolesSyncServiceTests(unittest.TestCase):
 
         self.assertFalse(changed)
 
+    def test_account_sync_reads_only_the_member_and_records_metrics(self):
+        member = SimpleNamespace(id=111, bot=False, roles=[_role(1, "@everyone", default=True), _role(7, "Captain")])
+        bot = SimpleNamespace(guilds=[_Guild([member]), _Guild([])])
+        supabase = _RecordingSupabase(
+            {"account_links_registry": [{"account_id": "acc-1", "discord_user_id": "111", "telegram_user_id": "222"}]}
+        )
+        fake_db = _FakeDb()
+        fake_db.supabase = supabase
+        runs_before = ExternalRolesSyncService.metrics_snapshot().get(SYNC_MODE_ACCOUNT, {}).get("runs", 0)
+
+        with patch("bot.services.external_roles_sync_service.db", fake_db):
+            changed = ExternalRolesSyncService.sync_account_by_account_id(bot, "acc-1")
+
+        self.assertTrue(changed)
+        upserted = supabase.writes("upsert")[0]["payload"]
+        self.assertEqual(
+            sorted((row["source"], row["external_role_id"]) for row in upserted),
+            [("discord", "7"), ("telegram", "linked")],
+        )
+        metrics = ExternalRolesSyncService.metrics_snapshot()[SYNC_MODE_ACCOUNT]
+        self.assertEqual(metrics["runs"], runs_before + 1)
+        self.assertEqual(metrics["last_members_scanned"], 2)
+        self.assertEqual(metrics["last_db_writes"], 1)
+
+    def test_full_sync_reads_bindings_in_chunks_and_soft_deletes_per_role(self):
+        linked = [
+            {"account_id": f"acc-{index}", "discord_user_id": str(100 + index), "telegram_user_id": str(200 + index)}
+            for index in range(3)
+        ]
+        bindings = [
+            {"account_id": row["account_id"], "source": source, "external_role_id": role_id, "external_role_name": name}
+            for row in linked
+            for source, role_id, name in (("discord", "9", "Old"), ("telegram", "linked", "Telegram linked"))
+        ]
+        supabase = _RecordingSupabase({"account_links_registry": linked, "external_role_bindings": bindings})
+        fake_db = _FakeDb()
+        fake_db.supabase = supabase
+        bot = SimpleNamespace(guilds=[SimpleNamespace(members=[])])
+
+        with patch("bot.services.external_roles_sync_service.db", fake_db), patch.object(
+            ExternalRolesSyncService, "READ_CHUNK_SIZE", 2
+        ):
+            stats = ExternalRolesSyncService.sync_all_linked_accounts(bot)
+
+        self.assertEqual(stats, {"processed": 3, "synced": 3, "errors": 0})
+        binding_reads = [call for call in supabase.calls if call["table"] == "external_role_bindings" and call["action"] == "select"]
+        self.assertEqual(len(binding_reads), 2)
+        soft_deletes = supabase.writes("update")
+        self.assertEqual(len(soft_deletes), 2)
+        deleted_accounts = sorted(
+            account_id for call in soft_deletes for name, *args in call["filters"] if name == "in_" for account_id in args[1]
+        )
+        self.assertEqual(deleted_accounts, ["acc-0", "acc-1", "acc-2"])
+        self.assertTrue(all(("eq", "external_role_id", "9") in call["filters"] for call in soft_deletes))
+
 
 if __name__ == "__main__":
     unittest.main()
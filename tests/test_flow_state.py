@@ -0,0 +1,267 @@
+"""
+Назначение: модуль "test flow state" реализует продуктовый контур в зоне Discord/Telegram/общая логика (тесты).
+Ответственность: единая точка для сценариев и правил модуля без дублирования логики между платформами.
+Где используется: Discord/Telegram/общая логика (тесты).
+"""
+
+import asyncio
+import threading
+from dataclasses import dataclass
+from unittest.mock import patch
+
+from bot.services.guiy_publish_destinations_service import GuiyPublishDestination
+from bot.telegram_bot.commands.engagement import PendingAction
+from bot.utils import flow_state
+from bot.utils.flow_state import (
+    FlowStateNamespace,
+    InMemoryFlowStateStore,
+    SqliteFlowStateStore,
+    decode_flow_state,
+    encode_flow_state,
+    register_flow_state_type,
+)
+
+
+@register_flow_state_type
+@dataclass
+class _Draft:
+    title: str
+    tags: list[str]
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class _FakeFlowTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self._filters = []
+        self._action = "select"
+        self._payload = None
+
+    def select(self, _fields):
+        self._action = "select"
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self._action = "upsert"
+        self._payload = payload
+        return self
+
+    def delete(self):
+        self._action = "delete"
+        return self
+
+    def eq(self, key, value):
+        self._filters.append(lambda row, key=key, value=value: row[key] == value)
+        return self
+
+    def gt(self, key, value):
+        self._filters.append(lambda row, key=key, value=value: row[key] > value)
+        return self
+
+    def lte(self, key, value):
+        self._filters.append(lambda row, key=key, value=value: row[key] <= value)
+        return self
+
+    def limit(self, _n):
+        return self
+
+    def execute(self):
+        if self._action == "upsert":
+            key = (self._payload["namespace"], self._payload["state_key"])
+            self.rows[key] = dict(self._payload)
+            return _Resp([dict(self._payload)])
+        matched = [key for key, row in self.rows.items() if all(check(row) for check in self._filters)]
+        if self._action == "delete":
+            return _Resp([self.rows.pop(key) for key in matched])
+        return _Resp([dict(self.rows[key]) for key in matched])
+
+
+class _FakeSupabase:
+    def __init__(self):
+        self.rows = {}
+
+    def table(self, name):
+        assert name == flow_state.FLOW_STATE_TABLE
+        return _FakeFlowTable(self.rows)
+
+
+def test_encode_roundtrip_keeps_registered_dataclasses_compact():
+    value = {
+        "draft": _Draft(title="Заголовок", tags=["a", "b"]),
+        "destinations": [
+            GuiyPublishDestination(
+                provider="telegram",
+                destination_id="-100",
+                title="Chat",
+                subtitle="",
+                destination_type="supergroup",
+            )
+        ],
+        "page": 2,
+    }
+
+    payload = encode_flow_state(value)
+
+    assert " " not in payload.replace("Заголовок", "")
+    assert decode_flow_state(payload) == value
+
+
+def test_encode_rejects_unregistered_dataclass():
+    @dataclass
+    class _Unregistered:
+        value: int
+
+    try:
+        encode_flow_state(_Unregistered(value=1))
+    except TypeError as exc:
+        assert "not registered" in str(exc)
+    else:
+        raise AssertionError("expected TypeError")
+
+
+def test_in_memory_store_expires_by_ttl():
+    store = InMemoryFlowStateStore()
+    with patch("bot.utils.flow_state.time.monotonic", return_value=100.0):
+        store.set("ns", "1", "value", ttl_seconds=10)
+    with patch("bot.utils.flow_state.time.monotonic", return_value=105.0):
+        assert store.get("ns", "1") == "value"
+        assert store.keys("ns") == ["1"]
+    with patch("bot.utils.flow_state.time.monotonic", return_value=111.0):
+        assert store.get("ns", "1") is None
+        assert store.purge_expired() == 0
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "flow_state.sqlite3")
+    writer = SqliteFlowStateStore(path)
+    reader = SqliteFlowStateStore(path)
+    pending = PendingAction(
+        domain="points",
+        operation="add",
+        target_provider_user_id="2",
+        actor_provider_user_id="1",
+        created_at=10.0,
+    )
+
+    writer.set("telegram.engagement.pending_action", "1", pending, ttl_seconds=60)
+
+    assert reader.get("telegram.engagement.pending_action", "1") == pending
+    reader.delete("telegram.engagement.pending_action", "1")
+    assert writer.get("telegram.engagement.pending_action", "1") is None
+
+
+def test_sqlite_store_hides_expired_rows(tmp_path):
+    store = SqliteFlowStateStore(str(tmp_path / "flow_state.sqlite3"))
+    with patch("bot.utils.flow_state.time.time", return_value=1_000.0):
+        store.set("ns", "1", {"page": 1}, ttl_seconds=5)
+    with patch("bot.utils.flow_state.time.time", return_value=1_010.0):
+        assert store.get("ns", "1") is None
+        assert store.keys("ns") == []
+        assert store.purge_expired() == 1
+
+
+def test_supabase_store_upserts_and_filters_expired_rows():
+    fake = _FakeSupabase()
+    store = flow_state.SupabaseFlowStateStore(lambda: fake)
+
+    store.set("ns", "7", _Draft(title="t", tags=[]), ttl_seconds=60)
+
+    assert store.get("ns", "7") == _Draft(title="t", tags=[])
+    assert store.keys("ns") == ["7"]
+    row = fake.rows[("ns", "7")]
+    row["expires_at"] = "2000-01-01T00:00:00+00:00"
+    assert store.get("ns", "7") is None
+    assert store.purge_expired() == 1
+    assert fake.rows == {}
+
+
+def test_namespace_behaves_like_pending_dict():
+    namespace = FlowStateNamespace("test.ns", ttl_seconds=60, store=InMemoryFlowStateStore())
+
+    namespace[5] = "value"
+
+    assert 5 in namespace
+    assert namespace.get(5) == "value"
+    assert list(namespace) == [5]
+    assert len(namespace) == 1
+    assert namespace.pop(5, None) == "value"
+    assert namespace.pop(5, None) is None
+    assert namespace.get(5) is None
+    namespace[6] = "other"
+    namespace.clear()
+    assert len(namespace) == 0
+
+
+def test_namespace_uses_process_store_selected_by_env(tmp_path):
+    namespace = FlowStateNamespace("test.env", ttl_seconds=60)
+    try:
+        with patch.dict(
+            "os.environ",
+            {"FLOW_STATE_BACKEND": "sqlite", "FLOW_STATE_SQLITE_PATH": str(tmp_path / "shared.sqlite3")},
+        ):
+            flow_state.set_flow_state_store(None)
+            namespace[1] = {"step": "confirm"}
+            assert isinstance(flow_state.get_flow_state_store(), SqliteFlowStateStore)
+            other_process_view = SqliteFlowStateStore(str(tmp_path / "shared.sqlite3"))
+            assert other_process_view.get("test.env", "1") == {"step": "confirm"}
+    finally:
+        flow_state.set_flow_state_store(None)
+
+
+class _CountingStore(InMemoryFlowStateStore):
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def get(self, namespace, key):
+        self.threads.append(threading.get_ident())
+        return super().get(namespace, key)
+
+
+def test_namespace_async_api_runs_store_off_loop_and_peek_has_no_io():
+    store = _CountingStore()
+    namespace = FlowStateNamespace("test.async", ttl_seconds=60, store=store)
+
+    async def _scenario():
+        await namespace.aset(3, {"step": "input"})
+        assert await namespace.acontains(3)
+        assert await namespace.aget(3) == {"step": "input"}
+        calls_before_peek = len(store.threads)
+        assert namespace.peek(3) == {"step": "input"}
+        assert namespace.peek(4) is None
+        assert len(store.threads) == calls_before_peek
+        assert await namespace.apop(3) == {"step": "input"}
+        assert namespace.peek(3) is None
+        assert await namespace.apop(3, "missing") == "missing"
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(_scenario())
+
+    assert store.threads
+    assert loop_thread not in store.threads
+
+
+def test_namespace_discard_and_warm_rebuild_local_index():
+    store = InMemoryFlowStateStore()
+    writer = FlowStateNamespace("test.warm", ttl_seconds=60, store=store)
+    writer[1] = "first"
+    writer[2] = "second"
+    # После рестарта процесса локальный индекс пуст, пока его не прогреют из хранилища.
+    restarted = FlowStateNamespace("test.warm", ttl_seconds=60, store=store)
+    assert restarted.peek(1) is None
+
+    async def _scenario():
+        assert await restarted.awarm() == 2
+        assert restarted.peek(1) == "first"
+        restarted.discard(1)
+        assert restarted.peek(1) is None
+        await asyncio.gather(*list(restarted._background))
+
+    asyncio.run(_scenario())
+
+    assert store.get("test.warm", "1") is None
+    assert store.get("test.warm", "2") == "second"
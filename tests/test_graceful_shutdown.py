@@ -0,0 +1,108 @@
+"""
+Назначение: модуль "test graceful shutdown" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: проверка порядка шагов остановки, дедлайна с резервом и дренажа очереди AI-запросов.
+Где используется: общая логика (тесты).
+"""
+
+import asyncio
+
+import pytest
+
+from bot.graceful_shutdown import GracefulShutdown
+from bot.services import ai_request_scheduler
+from bot.services.ai_request_scheduler import AIRequestScheduler
+
+
+@pytest.fixture(autouse=True)
+def _reset_shutdown_state():
+    GracefulShutdown.reset()
+    yield
+    GracefulShutdown.reset()
+
+
+def test_steps_run_in_order_and_report_pending_and_timeouts():
+    calls = []
+
+    async def _intake(budget):
+        calls.append(("intake", budget))
+        return 0
+
+    async def _stuck_drain(budget):
+        calls.append(("drain", budget))
+        await asyncio.sleep(budget + 5)
+
+    async def _flush(budget):
+        calls.append(("flush", budget))
+        return 2
+
+    GracefulShutdown.register_step("intake", _intake)
+    GracefulShutdown.register_step("drain", _stuck_drain)
+    GracefulShutdown.register_step("flush", _flush, reserve_sec=0.5)
+
+    async def _run():
+        first = await GracefulShutdown.run("test", deadline_sec=0.6)
+        second = await GracefulShutdown.run("again")
+        return first, second
+
+    report, repeated = asyncio.run(_run())
+
+    assert [name for name, _budget in calls] == ["intake", "drain", "flush"]
+    # Зависший дренаж получил бюджет за вычетом резерва сброса и не съел время следующего шага.
+    assert calls[1][1] <= 0.11
+    assert report.steps["drain"].status == "timeout"
+    assert report.steps["flush"].status == "ok"
+    assert report.steps["flush"].pending == 2
+    assert report.pending_total == 3
+    assert repeated is report
+    assert GracefulShutdown.is_stopping()
+
+
+def test_ai_scheduler_drain_finishes_queue_then_rejects_new_requests(monkeypatch):
+    async def _fake_reply(text, **_kwargs):
+        await asyncio.sleep(0.01)
+        return f"reply:{text}"
+
+    monkeypatch.setattr(ai_request_scheduler, "generate_guiy_reply", _fake_reply)
+
+    async def _run():
+        scheduler = AIRequestScheduler()
+        pending = [
+            asyncio.create_task(
+                scheduler.enqueue(platform="telegram", conversation_id=1, user_id=index, payload={"text": str(index)})
+            )
+            for index in range(3)
+        ]
+        await asyncio.sleep(0)
+        abandoned = await scheduler.drain(2.0)
+        late = await scheduler.enqueue(platform="telegram", conversation_id=1, user_id=9, payload={"text": "late"})
+        return abandoned, await asyncio.gather(*pending), late
+
+    abandoned, replies, late = asyncio.run(_run())
+
+    assert abandoned == 0
+    assert replies == ["reply:0", "reply:1", "reply:2"]
+    assert late is None
+
+
+def test_ai_scheduler_drain_deadline_resolves_abandoned_requests(monkeypatch):
+    async def _slow_reply(_text, **_kwargs):
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(ai_request_scheduler, "generate_guiy_reply", _slow_reply)
+
+    async def _run():
+        scheduler = AIRequestScheduler()
+        pending = [
+            asyncio.create_task(
+                scheduler.enqueue(platform="discord", conversation_id=index, user_id=index, payload={"text": "x"})
+            )
+            for index in range(4)
+        ]
+        await asyncio.sleep(0.01)
+        abandoned = await scheduler.drain(0.05)
+        return abandoned, await asyncio.wait_for(asyncio.gather(*pending), timeout=1)
+
+    abandoned, replies = asyncio.run(_run())
+
+    assert abandoned == 4
+    assert replies == [None, None, None, None]
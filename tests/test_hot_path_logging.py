@@ -0,0 +1,115 @@
+"""
+Назначение: модуль "test hot path logging" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: проверка выборки и token bucket по call site, итогов подавления, полной записи WARNING+ и фоновой очереди логов.
+Где используется: общая логика (тесты).
+"""
+
+import logging
+
+from bot.hot_path_logging import HOT_PATH, HotPathLogFilter, HotPathLogging, hot_path
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages: list[str] = []
+
+    def emit(self, record):
+        self.messages.append(f"{record.levelname} {record.getMessage()}")
+
+
+def _logger(name, hot_filter):
+    handler = _ListHandler()
+    handler.addFilter(hot_filter)
+    test_logger = logging.getLogger(name)
+    test_logger.handlers = [handler]
+    test_logger.propagate = False
+    test_logger.setLevel(logging.DEBUG)
+    return test_logger, handler
+
+
+def _send_waited(test_logger, index):
+    test_logger.info("send waited index=%s", index, extra=HOT_PATH)
+
+
+def test_token_bucket_is_per_call_site_and_reports_suppressed_count():
+    clock = _Clock()
+    hot_filter = HotPathLogFilter(rate_per_sec=1.0, burst=2, sample_every=1, summary_interval=600, clock=clock)
+    test_logger, handler = _logger("tests.hot_path.bucket", hot_filter)
+
+    for index in range(5):
+        _send_waited(test_logger, index)
+    test_logger.info("other site", extra=HOT_PATH)
+    clock.now += 1.0
+    _send_waited(test_logger, 5)
+
+    # Первые два из горячего цикла, отдельный call site не делит с ним bucket, затем итог в суффиксе.
+    assert handler.messages[:3] == ["INFO send waited index=0", "INFO send waited index=1", "INFO other site"]
+    assert handler.messages[3] == "INFO send waited index=5 [3 similar messages suppressed]"
+    assert hot_filter.snapshot()["suppressed"] == 3
+
+
+def test_warnings_and_unmarked_records_keep_full_fidelity():
+    hot_filter = HotPathLogFilter(rate_per_sec=0.0, burst=1, sample_every=1, clock=_Clock())
+    test_logger, handler = _logger("tests.hot_path.fidelity", hot_filter)
+
+    for _ in range(3):
+        test_logger.warning("send failed", extra=HOT_PATH)
+        test_logger.info("startup step")
+        test_logger.info("hot", extra=HOT_PATH)
+
+    assert handler.messages.count("WARNING send failed") == 3
+    assert handler.messages.count("INFO startup step") == 3
+    assert handler.messages.count("INFO hot") == 1
+
+
+def test_sampling_and_idle_site_summary():
+    clock = _Clock()
+    hot_filter = HotPathLogFilter(rate_per_sec=100.0, burst=100, summary_interval=60, clock=clock)
+    test_logger, handler = _logger("tests.hot_path.sampling", hot_filter)
+
+    for index in range(8):
+        test_logger.info("message index=%s", index, extra=hot_path(sample_every=3))
+    clock.now += 61.0
+    test_logger.info("unrelated", extra=HOT_PATH)
+
+    assert handler.messages[:3] == [
+        "INFO message index=0",
+        "INFO message index=3 [2 similar messages suppressed]",
+        "INFO message index=6 [2 similar messages suppressed]",
+    ]
+    # Сообщение index=7 выпало из выборки, а call site затих — итог приходит отдельной записью.
+    assert any(message.startswith("INFO 1 similar messages suppressed site=test_hot_path_logging.py:") for message in handler.messages)
+
+
+def test_install_moves_root_handlers_behind_queue_and_restores_them():
+    root_logger = logging.getLogger()
+    previous_handlers = list(root_logger.handlers)
+    previous_level = root_logger.level
+    handler = _ListHandler()
+    root_logger.handlers = [handler]
+    root_logger.setLevel(logging.INFO)
+    try:
+        HotPathLogging.install(use_queue=True, log_filter=HotPathLogFilter(rate_per_sec=0.0, burst=1, clock=_Clock()))
+        assert handler not in root_logger.handlers
+        for _ in range(3):
+            logging.getLogger("tests.hot_path.queue").info("queued", extra=HOT_PATH)
+        logging.getLogger("tests.hot_path.queue").error("failure")
+        HotPathLogging.uninstall()
+
+        assert root_logger.handlers == [handler]
+        assert handler.messages.count("INFO queued") == 1
+        assert "ERROR failure" in handler.messages
+        assert any("2 similar messages suppressed" in message for message in handler.messages)
+    finally:
+        HotPathLogging.uninstall()
+        root_logger.handlers = previous_handlers
+        root_logger.setLevel(previous_level)
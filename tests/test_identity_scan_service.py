@@ -0,0 +1,310 @@
+"""
+Назначение: модуль "test identity scan service" реализует продуктовый контур в зоне Discord/общая логика (тесты).
+Ответственность: единая точка для сценариев и правил модуля без дублирования логики между платформами.
+Где используется: Discord/общая логика (тесты).
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from bot.services import identity_scan_service
+from bot.services.accounts_service import AccountsService
+from bot.services.identity_scan_service import SCAN_STATE_TABLE, IdentityScanService
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, fake, table):
+        self.fake = fake
+        self.table = table
+        self.action = "select"
+        self.payload = None
+        self.filters = {}
+        self.bounds = None
+
+    def select(self, _fields):
+        return self
+
+    def eq(self, key, value):
+        self.filters[key] = value
+        return self
+
+    def order(self, _column):
+        return self
+
+    def limit(self, _n):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.action = "upsert"
+        self.payload = payload
+        return self
+
+    def execute(self):
+        rows = self.fake.tables.setdefault(self.table, [])
+        if self.action == "upsert":
+            payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+            self.fake.upserts.append((self.table, len(payloads)))
+            keys = ("provider", "provider_user_id") if self.table == "account_identities" else ("provider", "scope_id")
+            for payload in payloads:
+                existing = next((row for row in rows if all(row.get(k) == payload[k] for k in keys)), None)
+                if existing is None:
+                    rows.append(dict(payload))
+                else:
+                    existing.update(payload)
+            return _Resp(payloads)
+        matched = [row for row in rows if all(row.get(k) == v for k, v in self.filters.items())]
+        if self.bounds:
+            matched = matched[self.bounds[0] : self.bounds[1] + 1]
+        self.fake.selects.append(self.table)
+        return _Resp([dict(row) for row in matched])
+
+
+class _FakeSupabase:
+    def __init__(self, identities):
+        self.tables = {"account_identities": identities}
+        self.upserts = []
+        self.selects = []
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+class _Guild:
+    def __init__(self, members, *, fail_after=None):
+        self.id = 77
+        self.member_count = len(members)
+        self.members = members
+        self.fail_after = fail_after
+        self.after_calls = []
+
+    async def fetch_members(self, limit=None, after=None):
+        self.after_calls.append(getattr(after, "id", None))
+        start = getattr(after, "id", 0) or 0
+        for index, member in enumerate(m for m in self.members if m.id > start):
+            if self.fail_after is not None and index >= self.fail_after:
+                raise RuntimeError("gateway dropped")
+            yield member
+
+
+def _member(member_id, name, display=None):
+    return SimpleNamespace(id=member_id, name=name, display_name=display or name, global_name=None)
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _scan(guild, chunk_size=2, min_interval_seconds=3600):
+    return IdentityScanService.scan_discord_guild(
+        guild,
+        chunk_size=chunk_size,
+        pause_seconds=0,
+        min_interval_seconds=min_interval_seconds,
+    )
+
+
+def test_plan_keeps_stored_values_and_skips_unchanged_rows():
+    index = {
+        "1": {"provider_user_id": "1", "username": "alice", "display_name": "Alice", "global_username": "Al"},
+        "2": {"provider_user_id": "2", "username": "bob", "display_name": "Bob", "global_username": None},
+    }
+    members = [
+        ("1", {"username": "alice", "display_name": "Alice", "global_username": None}),
+        ("2", {"username": "bobby", "display_name": "Bob", "global_username": None}),
+        ("3", {"username": "carol", "display_name": None, "global_username": None}),
+    ]
+
+    payloads, stats = IdentityScanService.plan_identity_upserts(
+        "discord",
+        members,
+        index,
+        columns=("username", "display_name", "global_username"),
+        account_id_required=False,
+    )
+
+    assert stats == {"updated": 1, "inserted": 1, "skipped": 1}
+    assert payloads[0] == {
+        "provider": "discord",
+        "provider_user_id": "2",
+        "username": "bobby",
+        "display_name": "Bob",
+        "global_username": None,
+    }
+    assert payloads[1]["provider_user_id"] == "3"
+
+    _, required_stats = IdentityScanService.plan_identity_upserts(
+        "discord",
+        [("4", {"username": "dave", "display_name": None, "global_username": None})],
+        index,
+        columns=("username", "display_name", "global_username"),
+        account_id_required=True,
+    )
+    assert required_stats == {"updated": 0, "inserted": 1, "skipped": 0}
+
+
+def test_plan_carries_account_id_of_bound_identities():
+    index = {"1": {"provider_user_id": "1", "account_id": "acc-1", "username": "alice", "display_name": "Alice"}}
+
+    payloads, _ = IdentityScanService.plan_identity_upserts(
+        "discord",
+        [("1", {"username": "alicia", "display_name": "Alice"})],
+        index,
+        columns=("username", "display_name"),
+        account_id_required=True,
+    )
+
+    assert payloads == [
+        {"provider": "discord", "provider_user_id": "1", "account_id": "acc-1", "username": "alicia", "display_name": "Alice"}
+    ]
+
+
+def test_chunk_registers_new_identities_when_account_id_is_required(monkeypatch):
+    fake = _FakeSupabase([])
+    monkeypatch.setattr(identity_scan_service.db, "supabase", fake)
+    registered = []
+    persisted = []
+    monkeypatch.setattr(
+        AccountsService, "register_identity", staticmethod(lambda provider, user_id: registered.append(user_id) or (True, "ok"))
+    )
+    monkeypatch.setattr(
+        AccountsService,
+        "persist_identity_lookup_fields",
+        staticmethod(lambda provider, user_id, **fields: persisted.append((user_id, fields["username"]))),
+    )
+    payloads = [
+        {"provider": "discord", "provider_user_id": "1", "account_id": "acc-1", "username": "alice"},
+        {"provider": "discord", "provider_user_id": "2", "username": "bob"},
+    ]
+
+    IdentityScanService.upsert_identity_chunk("discord", payloads, account_id_required=True)
+
+    assert fake.upserts == [("account_identities", 1)]
+    assert fake.tables["account_identities"][0]["account_id"] == "acc-1"
+    assert registered == ["2"]
+    assert persisted == [("2", "bob")]
+
+
+def test_scan_writes_only_changed_identities_in_chunks(monkeypatch):
+    identities = [
+        {"provider": "discord", "provider_user_id": str(i), "username": f"user{i}", "display_name": f"user{i}", "global_username": None}
+        for i in range(1, 5)
+    ]
+    fake = _FakeSupabase(identities)
+    monkeypatch.setattr(identity_scan_service.db, "supabase", fake)
+    monkeypatch.setattr(AccountsService, "_is_account_id_required_for_account_identities", staticmethod(lambda: False))
+    members = [_member(i, f"user{i}") for i in range(1, 5)] + [_member(5, "new"), _member(6, "renamed")]
+
+    totals = _run(_scan(_Guild(members)))
+
+    assert totals == {"updated": 0, "inserted": 2, "skipped": 4, "processed": 6}
+    identity_upserts = [size for table, size in fake.upserts if table == "account_identities"]
+    assert identity_upserts == [2]
+    assert fake.selects.count("account_identities") == 1
+    state = fake.tables[SCAN_STATE_TABLE][0]
+    assert state["status"] == "completed"
+    assert state["cursor"] is None
+
+
+def test_shared_preload_reads_identities_once_for_all_guilds(monkeypatch):
+    fake = _FakeSupabase([])
+    monkeypatch.setattr(identity_scan_service.db, "supabase", fake)
+    monkeypatch.setattr(AccountsService, "_is_account_id_required_for_account_identities", staticmethod(lambda: False))
+    shared_preload = {}
+    first = _Guild([_member(1, "user1")])
+    second = _Guild([_member(1, "user1"), _member(2, "user2")])
+    second.id = 78
+
+    for guild in (first, second):
+        _run(
+            IdentityScanService.scan_discord_guild(
+                guild, chunk_size=2, pause_seconds=0, min_interval_seconds=3600, shared_preload=shared_preload
+            )
+        )
+
+    assert fake.selects.count("account_identities") == 1
+    # Участник первой гильдии уже в индексе: во второй записывается только новый.
+    assert [size for table, size in fake.upserts if table == "account_identities"] == [1, 1]
+
+
+def test_interrupted_scan_resumes_from_checkpoint(monkeypatch):
+    fake = _FakeSupabase([])
+    monkeypatch.setattr(identity_scan_service.db, "supabase", fake)
+    monkeypatch.setattr(AccountsService, "_is_account_id_required_for_account_identities", staticmethod(lambda: False))
+    members = [_member(i, f"user{i}") for i in range(1, 8)]
+
+    broken = _Guild(members, fail_after=5)
+    try:
+        _run(_scan(broken))
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("expected interrupted scan")
+
+    state = fake.tables[SCAN_STATE_TABLE][0]
+    assert state["status"] == "running"
+    assert state["cursor"] == "3"
+
+    resumed = _Guild(members)
+    totals = _run(_scan(resumed))
+
+    assert resumed.after_calls == [3]
+    assert totals["processed"] == 8
+    assert fake.tables[SCAN_STATE_TABLE][0]["status"] == "completed"
+    assert sorted(row["provider_user_id"] for row in fake.tables["account_identities"]) == [str(i) for i in range(1, 8)]
+
+
+def test_recent_completed_scan_is_skipped(monkeypatch):
+    fake = _FakeSupabase([])
+    fake.tables[SCAN_STATE_TABLE] = [
+        {
+            "provider": "discord",
+            "scope_id": "77",
+            "status": "completed",
+            "completed_at": (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat(),
+        }
+    ]
+    monkeypatch.setattr(identity_scan_service.db, "supabase", fake)
+    guild = _Guild([_member(1, "user1")])
+
+    totals = _run(_scan(guild))
+
+    assert totals["processed"] == 0
+    assert guild.after_calls == []
+    assert "account_identities" not in fake.selects
+
+
+def test_cursor_only_covers_fully_processed_pages(monkeypatch):
+    fake = _FakeSupabase([])
+    monkeypatch.setattr(identity_scan_service.db, "supabase", fake)
+    monkeypatch.setattr(AccountsService, "_is_account_id_required_for_account_identities", staticmethod(lambda: False))
+
+    class _PagedGuild(_Guild):
+        async def fetch_members(self, limit=None, after=None):
+            # Как discord.py: страницы по возрастанию id, внутри страницы — в обратном порядке.
+            for page in ([3, 2, 1], [6, 5, 4]):
+                for member_id in page:
+                    yield _member(member_id, f"user{member_id}")
+
+    cursors = []
+    original_save = IdentityScanService.save_checkpoint
+
+    def _record(provider, scope_id, **fields):
+        cursors.append(fields.get("cursor"))
+        original_save(provider, scope_id, **fields)
+
+    monkeypatch.setattr(IdentityScanService, "save_checkpoint", staticmethod(_record))
+
+    _run(_scan(_PagedGuild([]), chunk_size=2))
+
+    # После [3, 2] страница не закончена; после [1, 6] первая страница пройдена целиком.
+    assert cursors == [None, "3", "3", None]
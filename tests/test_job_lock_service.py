@@ -0,0 +1,220 @@
+"""
+Назначение: модуль "test job lock service" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: единая точка для сценариев и правил модуля без дублирования логики между платформами.
+Где используется: общая логика (тесты).
+"""
+
+import asyncio
+
+from bot import process_supervisor
+from bot.services.job_lock_service import JOB_LOCKS_TABLE, JobLeaderLock, run_with_leader_lock
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class _FakeLockTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self._filters = []
+        self._action = None
+        self._payload = None
+
+    def update(self, payload):
+        self._action = "update"
+        self._payload = payload
+        return self
+
+    def insert(self, payload):
+        self._action = "insert"
+        self._payload = payload
+        return self
+
+    def delete(self):
+        self._action = "delete"
+        return self
+
+    def eq(self, key, value):
+        self._filters.append(lambda row, key=key, value=value: row[key] == value)
+        return self
+
+    def or_(self, expression):
+        checks = []
+        for part in expression.split(","):
+            key, op, value = part.split(".", 2)
+            if op == "eq":
+                checks.append(lambda row, key=key, value=value: row[key] == value)
+            else:
+                checks.append(lambda row, key=key, value=value: row[key] < value)
+        self._filters.append(lambda row: any(check(row) for check in checks))
+        return self
+
+    def execute(self):
+        if self._action == "insert":
+            if self._payload["job_name"] in self.rows:
+                raise RuntimeError("duplicate key value violates unique constraint")
+            self.rows[self._payload["job_name"]] = dict(self._payload)
+            return _Resp([dict(self._payload)])
+        matched = [name for name, row in self.rows.items() if all(check(row) for check in self._filters)]
+        if self._action == "delete":
+            return _Resp([self.rows.pop(name) for name in matched])
+        for name in matched:
+            self.rows[name].update(self._payload)
+        return _Resp([dict(self.rows[name]) for name in matched])
+
+
+class _FakeSupabase:
+    def __init__(self):
+        self.rows = {}
+
+    def table(self, name):
+        assert name == JOB_LOCKS_TABLE
+        return _FakeLockTable(self.rows)
+
+
+def test_only_one_owner_holds_lease_until_release():
+    fake = _FakeSupabase()
+    first = JobLeaderLock("reminder_loop", owner_id="a", supabase=fake)
+    second = JobLeaderLock("reminder_loop", owner_id="b", supabase=fake)
+
+    assert first.try_acquire() is True
+    assert second.try_acquire() is False
+    assert first.try_acquire() is True
+
+    first.release()
+
+    assert second.try_acquire() is True
+    assert fake.rows["reminder_loop"]["owner_id"] == "b"
+
+
+def test_expired_lease_is_taken_over():
+    fake = _FakeSupabase()
+    JobLeaderLock("fines_summary_loop", owner_id="a", supabase=fake).try_acquire()
+    fake.rows["fines_summary_loop"]["expires_at"] = "2000-01-01T00:00:00.000000Z"
+
+    assert JobLeaderLock("fines_summary_loop", owner_id="b", supabase=fake).try_acquire() is True
+    assert fake.rows["fines_summary_loop"]["owner_id"] == "b"
+
+
+def test_lock_without_supabase_is_never_acquired(monkeypatch):
+    from bot.data import db
+
+    monkeypatch.setattr(db, "supabase", None)
+
+    assert JobLeaderLock("reminder_loop", owner_id="a").try_acquire() is False
+
+
+class _ScriptedLock:
+    owner_id = "a"
+    ttl_seconds = 0.03
+
+    def __init__(self, answers, *, default=False):
+        self.answers = list(answers)
+        self.default = default
+        self.released = False
+
+    def try_acquire(self):
+        return self.answers.pop(0) if self.answers else self.default
+
+    def release(self):
+        self.released = True
+
+
+async def _run_until_job_event(lock, *, stop_on_start: bool):
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def _job():
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    runner = asyncio.create_task(run_with_leader_lock("job", _job, lock=lock))
+    await asyncio.wait_for((started if stop_on_start else cancelled).wait(), timeout=2)
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+    return started.is_set(), cancelled.is_set()
+
+
+def test_run_with_leader_lock_stops_job_when_lease_lost():
+    lock = _ScriptedLock([True, True, False])
+
+    started, cancelled = asyncio.run(_run_until_job_event(lock, stop_on_start=False))
+
+    assert started is True
+    assert cancelled is True
+    # Lease уже у другого владельца — освобождать нечего.
+    assert lock.released is False
+
+
+def test_run_with_leader_lock_releases_lease_on_shutdown():
+    lock = _ScriptedLock([], default=True)
+
+    started, cancelled = asyncio.run(_run_until_job_event(lock, stop_on_start=True))
+
+    assert started is True
+    assert cancelled is True
+    assert lock.released is True
+
+
+def test_run_with_leader_lock_survives_transient_renewal_error_and_logs_completion_as_info(caplog):
+    lock = _ScriptedLock([True, False, True], default=True)
+    lock.ttl_seconds = 0.3
+    finished = []
+
+    async def _job():
+        try:
+            await asyncio.sleep(0.4)
+        except asyncio.CancelledError:
+            finished.append("cancelled")
+            raise
+        finished.append("done")
+
+    with caplog.at_level("INFO", logger="bot.services.job_lock_service"):
+        asyncio.run(asyncio.wait_for(run_with_leader_lock("job", _job, lock=lock), timeout=2))
+
+    assert finished == ["done"]
+    assert lock.released is True
+    assert any("renewal failed" in record.getMessage() for record in caplog.records)
+    completion = [record for record in caplog.records if "job finished" in record.getMessage()]
+    assert [record.levelname for record in completion] == ["INFO"]
+    assert not any(record.levelname == "ERROR" for record in caplog.records)
+
+
+def test_supervisor_roles_from_tokens_and_env(monkeypatch):
+    monkeypatch.delenv(process_supervisor.SUPERVISOR_ROLES_ENV, raising=False)
+    assert process_supervisor.resolve_supervisor_roles(discord_token_present=True, telegram_token_present=True) == [
+        "discord",
+        "jobs",
+        "telegram",
+        "ai",
+    ]
+    assert process_supervisor.resolve_supervisor_roles(discord_token_present=False, telegram_token_present=False) == []
+
+    monkeypatch.setenv(process_supervisor.SUPERVISOR_ROLES_ENV, " Telegram, ai,telegram ")
+    assert process_supervisor.resolve_supervisor_roles(discord_token_present=True, telegram_token_present=False) == [
+        "telegram",
+        "ai",
+    ]
+
+
+def test_supervisor_backoff_is_capped_and_children_get_ai_worker_url(monkeypatch):
+    assert process_supervisor.restart_delay_seconds(0) == 0.0
+    assert process_supervisor.restart_delay_seconds(1) == 1.0
+    assert process_supervisor.restart_delay_seconds(3) == 4.0
+    assert process_supervisor.restart_delay_seconds(30) == process_supervisor.SUPERVISOR_RESTART_MAX_DELAY_SEC
+
+    monkeypatch.delenv("AI_WORKER_URL", raising=False)
+    monkeypatch.setenv("AI_WORKER_HOST", "0.0.0.0")
+    monkeypatch.setenv("AI_WORKER_PORT", "9000")
+    monkeypatch.setenv("BOT_PROCESS_ROLE", "supervisor")
+
+    env = process_supervisor.build_child_env(["discord", "ai"])
+
+    assert env["AI_WORKER_URL"] == "http://127.0.0.1:9000"
+    assert "BOT_PROCESS_ROLE" not in env
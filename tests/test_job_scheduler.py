@@ -0,0 +1,251 @@
+"""
+Назначение: модуль "test job scheduler" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: единая точка для сценариев и правил модуля без дублирования логики между платформами.
+Где используется: общая логика (тесты).
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bot.services.job_scheduler import (
+    STATUS_FAILED,
+    STATUS_SUCCESS,
+    STATUS_TIMEOUT,
+    CronSchedule,
+    InMemoryJobStateStore,
+    IntervalSchedule,
+    JobScheduler,
+    ScheduledJob,
+    SupabaseJobStateStore,
+    parse_schedule,
+)
+
+NOW = datetime(2026, 3, 2, 10, 30, tzinfo=timezone.utc)  # понедельник
+
+
+class _Clock:
+    def __init__(self, moment):
+        self.moment = moment
+
+    def __call__(self):
+        return self.moment
+
+
+def _scheduler(store, clock):
+    return JobScheduler(store, jitter_seconds=0, stagger_seconds=15, clock=clock)
+
+
+def test_cron_schedule_next_occurrences():
+    assert CronSchedule("0 9 * * *").next_after(NOW) == datetime(2026, 3, 3, 9, 0, tzinfo=timezone.utc)
+    assert CronSchedule("*/15 * * * *").next_after(NOW) == datetime(2026, 3, 2, 10, 45, tzinfo=timezone.utc)
+    assert CronSchedule("0 12 * * 0").next_after(NOW) == datetime(2026, 3, 8, 12, 0, tzinfo=timezone.utc)
+    assert CronSchedule("0 0 1 1 *").next_after(NOW) == datetime(2027, 1, 1, 0, 0, tzinfo=timezone.utc)
+    # Как в cron: при заданных дне месяца и дне недели достаточно любого совпадения.
+    assert CronSchedule("0 0 15 * 1").next_after(NOW) == datetime(2026, 3, 9, 0, 0, tzinfo=timezone.utc)
+
+
+def test_parse_schedule_accepts_seconds_and_cron():
+    assert isinstance(parse_schedule("3600"), IntervalSchedule)
+    assert isinstance(parse_schedule(60), IntervalSchedule)
+    assert isinstance(parse_schedule("0 9 */2 * *"), CronSchedule)
+    with pytest.raises(ValueError):
+        parse_schedule("0 25 * * *")
+    with pytest.raises(ValueError):
+        parse_schedule("every day")
+
+
+def test_schedule_override_from_env(monkeypatch):
+    async def _noop():
+        return None
+
+    monkeypatch.setenv("JOB_SCHEDULE_FINES_SUMMARY", "0 9 */2 * *")
+    job = ScheduledJob.from_env("fines_summary", _noop, 172800)
+    assert isinstance(job.schedule, CronSchedule)
+
+    monkeypatch.setenv("JOB_SCHEDULE_FINES_SUMMARY", "broken")
+    job = ScheduledJob.from_env("fines_summary", _noop, 172800)
+    assert job.schedule.seconds == 172800
+
+
+def test_first_runs_are_staggered_and_state_survives_restart():
+    store = InMemoryJobStateStore()
+    clock = _Clock(NOW)
+    calls = []
+
+    async def _job():
+        calls.append(clock())
+
+    async def _scenario():
+        scheduler = _scheduler(store, clock)
+        jobs = [ScheduledJob(name, _job, IntervalSchedule(86400)) for name in ("a", "b")]
+        states = [await scheduler.ensure_state(job, index) for index, job in enumerate(jobs)]
+        assert states[1]["next_run_at"] > states[0]["next_run_at"]
+
+        scheduler.register(jobs[0])
+        clock.moment = NOW + timedelta(seconds=1)
+        assert await scheduler.run_due(jobs[0], states[0]["next_run_at"]) == STATUS_SUCCESS
+
+        # «Рестарт»: новый планировщик видит сохранённый next_run_at, а не запускает задачу сразу.
+        restarted = _scheduler(store, clock)
+        state = await restarted.ensure_state(jobs[0], 0)
+        return state
+
+    state = asyncio.run(_scenario())
+
+    assert len(calls) == 1
+    assert state["next_run_at"] == "2026-03-03T10:30:01.000000Z"
+    assert store.rows["a"]["last_status"] == STATUS_SUCCESS
+    assert store.history[0]["job_name"] == "a"
+
+
+def test_occurrence_runs_once_across_processes():
+    store = InMemoryJobStateStore()
+    clock = _Clock(NOW)
+    calls = []
+
+    async def _job():
+        calls.append(1)
+
+    async def _scenario():
+        first, second = _scheduler(store, clock), _scheduler(store, clock)
+        job = ScheduledJob("debt_repayment", _job, IntervalSchedule(86400))
+        first.register(job)
+        second.register(job)
+        state = await first.ensure_state(job, 0)
+        return await first.run_due(job, state["next_run_at"]), await second.run_due(job, state["next_run_at"]), second
+
+    first_status, second_status, second = asyncio.run(_scenario())
+
+    assert (first_status, second_status) == (STATUS_SUCCESS, None)
+    assert calls == [1]
+    assert second.metrics_snapshot()["debt_repayment"]["skipped"] == 1
+
+
+def test_running_lease_blocks_overlapping_run():
+    store = InMemoryJobStateStore()
+    clock = _Clock(NOW)
+    store.rows["sync"] = {
+        "job_name": "sync",
+        "next_run_at": "2026-03-02T10:00:00.000000Z",
+        "running_until": "2026-03-02T10:40:00.000000Z",
+    }
+
+    async def _job():
+        raise AssertionError("must not run while previous run holds the lease")
+
+    scheduler = _scheduler(store, clock)
+    job = ScheduledJob("sync", _job, IntervalSchedule(60))
+    scheduler.register(job)
+
+    assert asyncio.run(scheduler.run_due(job, "2026-03-02T10:00:00.000000Z")) is None
+
+    clock.moment = NOW + timedelta(minutes=11)
+    assert asyncio.run(scheduler.run_due(job, "2026-03-02T10:00:00.000000Z")) == STATUS_FAILED
+
+
+def test_blocked_claim_waits_for_lease_instead_of_spinning(monkeypatch):
+    store = InMemoryJobStateStore()
+    clock = _Clock(NOW)
+    # Владелец упал посреди запуска: слот в прошлом, lease живёт ещё 10 минут.
+    store.rows["sync"] = {
+        "job_name": "sync",
+        "next_run_at": "2026-03-02T10:00:00.000000Z",
+        "running_until": "2026-03-02T10:40:00.000000Z",
+    }
+    claims = []
+    original_claim = store.claim
+
+    def _claim(*args, **kwargs):
+        claims.append(clock.moment)
+        return original_claim(*args, **kwargs)
+
+    store.claim = _claim
+    sleeps = []
+
+    async def _sleep(delay):
+        sleeps.append(delay)
+        clock.moment += timedelta(seconds=delay)
+        if len(sleeps) >= 3:
+            raise asyncio.CancelledError
+
+    async def _job():
+        raise AssertionError("must not run while the lease is held")
+
+    scheduler = _scheduler(store, clock)
+    job = ScheduledJob("sync", _job, IntervalSchedule(60))
+    scheduler.register(job)
+    monkeypatch.setattr(asyncio, "sleep", _sleep)
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(scheduler._job_loop(job, 0))
+
+    assert len(claims) == len(sleeps) == 3
+    assert sleeps[0] == 300.0
+    assert all(delay >= 1.0 for delay in sleeps)
+
+
+def test_timeout_and_failure_are_recorded_in_metrics():
+    store = InMemoryJobStateStore()
+    clock = _Clock(NOW)
+
+    async def _slow():
+        await asyncio.sleep(5)
+
+    async def _broken():
+        raise RuntimeError("boom")
+
+    async def _scenario():
+        scheduler = _scheduler(store, clock)
+        slow = ScheduledJob("slow", _slow, IntervalSchedule(60), max_runtime_seconds=0.01)
+        broken = ScheduledJob("broken", _broken, IntervalSchedule(60))
+        for index, job in enumerate((slow, broken)):
+            scheduler.register(job)
+            state = await scheduler.ensure_state(job, index)
+            await scheduler.run_due(job, state["next_run_at"])
+        return scheduler.metrics_snapshot()
+
+    metrics = asyncio.run(_scenario())
+
+    assert metrics["slow"]["timeouts"] == 1
+    assert metrics["slow"]["last_status"] == STATUS_TIMEOUT
+    assert metrics["broken"]["failures"] == 1
+    assert store.rows["broken"]["last_error"] == "RuntimeError: boom"
+    assert store.rows["broken"]["running_until"] is None
+
+
+def test_supabase_store_claims_with_conditional_update():
+    calls = []
+
+    class _Query:
+        def __init__(self, table):
+            self.table = table
+
+        def __getattr__(self, name):
+            def _method(*args, **kwargs):
+                calls.append((self.table, name, args))
+                return self
+
+            return _method
+
+        def execute(self):
+            calls.append((self.table, "execute", ()))
+            return type("Resp", (), {"data": [{"job_name": "a"}]})()
+
+    class _Supabase:
+        def table(self, name):
+            return _Query(name)
+
+    store = SupabaseJobStateStore(lambda: _Supabase())
+
+    assert store.claim(
+        "a",
+        due_at="2026-03-02T10:00:00+00:00",
+        next_run_at=NOW + timedelta(days=1),
+        running_until=NOW + timedelta(minutes=30),
+        now=NOW,
+    )
+    filters = [(name, args) for _table, name, args in calls if name in ("eq", "or_")]
+    assert ("eq", ("next_run_at", "2026-03-02T10:00:00+00:00")) in filters
+    assert ("or_", ("running_until.is.null,running_until.lt.2026-03-02T10:30:00.000000Z",)) in filters
@@ -0,0 +1,104 @@
+"""
+Назначение: модуль "test metrics" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: проверка реестра метрик, текстового формата Prometheus, учёта вызовов Supabase и scrape endpoint.
+Где используется: общая логика (тесты).
+"""
+
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.data.supabase_metrics import InstrumentedSupabaseClient
+from bot.metrics import CollectedMetric, MetricsRegistry, build_metrics_app, metrics
+
+
+def test_registry_renders_counters_gauges_histograms_and_collectors():
+    registry = MetricsRegistry(prefix="test_")
+    sends = registry.counter("sends_total", "Sends.", ("platform",))
+    depth = registry.gauge("queue_depth", "Depth.")
+    latency = registry.histogram("latency_seconds", "Latency.", ("op",), buckets=(0.1, 1.0))
+    registry.register_collector(
+        "extra",
+        lambda: [CollectedMetric("restarts_total", "counter", "Restarts.", [({"runtime": 'tele"gram'}, 2)])],
+    )
+
+    sends.inc(platform="discord")
+    sends.inc(2, platform="discord")
+    depth.set(5)
+    latency.observe(0.05, op="select")
+    latency.observe(0.5, op="select")
+
+    text = registry.render_text()
+
+    assert "# TYPE test_sends_total counter" in text
+    assert 'test_sends_total{platform="discord"} 3' in text
+    assert "test_queue_depth 5" in text
+    assert 'test_latency_seconds_bucket{op="select",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{op="select",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{op="select",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{op="select"} 2' in text
+    assert 'test_restarts_total{runtime="tele\\"gram"} 2' in text
+
+
+def test_registry_rejects_wrong_labels_and_kind_conflicts():
+    registry = MetricsRegistry(prefix="test_")
+    counter = registry.counter("events_total", "Events.", ("kind",))
+
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Events.")
+    assert registry.counter("events_total", "Events.", ("kind",)) is counter
+
+
+class _Builder:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def select(self, *_args):
+        return self
+
+    def eq(self, *_args):
+        return self
+
+    def execute(self):
+        if self.fail:
+            raise RuntimeError("boom")
+        return "rows"
+
+
+class _Client:
+    def table(self, _name):
+        return _Builder()
+
+    def rpc(self, _fn, _params):
+        return _Builder(fail=True)
+
+
+def test_instrumented_supabase_counts_execute_per_table_and_rpc():
+    client = InstrumentedSupabaseClient(_Client())
+
+    assert client.table("metrics_test_scores").select("*").eq("id", 1).execute() == "rows"
+    with pytest.raises(RuntimeError):
+        client.rpc("metrics_test_fn", {}).execute()
+
+    text = metrics.render_text()
+    assert 'bebrobot_db_call_duration_seconds_count{table="metrics_test_scores",status="ok"} 1' in text
+    assert 'bebrobot_db_call_duration_seconds_count{table="rpc:metrics_test_fn",status="error"} 1' in text
+
+
+def test_scrape_endpoint_serves_text_exposition():
+    registry = MetricsRegistry(prefix="scrape_")
+    registry.counter("hits_total", "Hits.").inc()
+
+    async def _run():
+        async with TestClient(TestServer(build_metrics_app(registry))) as client:
+            response = await client.get("/metrics")
+            return response.status, response.headers["Content-Type"], await response.text()
+
+    status, content_type, body = asyncio.run(_run())
+
+    assert status == 200
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert "scrape_hits_total 1" in body
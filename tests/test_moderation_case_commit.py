@@ -0,0 +1,307 @@
+"""
+Назначение: модуль "test moderation case commit" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: стенд с внедрением сбоев между шагами commit_case: кейс либо применён целиком, либо не оставляет следов.
+Где используется: общая логика (тесты).
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bot.services import moderation_service
+from bot.services.accounts_service import AccountsService
+from bot.services.moderation_service import ModerationService
+
+FINE_POINTS = 3.0
+
+
+class _ProcessCrash(BaseException):
+    """Имитация падения процесса: не перехватывается `except Exception` внутри сервиса."""
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, stand, table):
+        self.stand = stand
+        self.table = table
+        self.action = "select"
+        self.payload = None
+        self.filters = []
+        self.order_by = []
+        self.limit_value = None
+
+    def select(self, _fields):
+        return self
+
+    def insert(self, payload, **_kwargs):
+        self.action, self.payload = "insert", dict(payload)
+        return self
+
+    def update(self, payload):
+        self.action, self.payload = "update", dict(payload)
+        return self
+
+    def eq(self, key, value):
+        self.filters.append(lambda row, key=key, value=value: str(row.get(key)) == str(value))
+        return self
+
+    def lt(self, key, value):
+        self.filters.append(lambda row, key=key, value=value: str(row.get(key) or "") < str(value))
+        return self
+
+    def in_(self, key, values):
+        allowed = {str(value) for value in values}
+        self.filters.append(lambda row, key=key: str(row.get(key)) in allowed)
+        return self
+
+    def order(self, key, desc=False):
+        self.order_by.append((key, desc))
+        return self
+
+    def limit(self, value):
+        self.limit_value = value
+        return self
+
+    def execute(self):
+        rows = self.stand.tables.setdefault(self.table, [])
+        if self.action == "insert":
+            self.stand.before_write(f"{self.table}.insert")
+            row = dict(self.payload)
+            if "id" not in row:
+                self.stand.next_id += 1
+                row["id"] = self.stand.next_id
+            if self.table == "moderation_cases" and any(r.get("op_key") == row.get("op_key") for r in rows):
+                raise RuntimeError("duplicate key value violates unique constraint moderation_cases_op_key")
+            rows.append(row)
+            return _Resp([dict(row)])
+        matched = [row for row in rows if all(check(row) for check in self.filters)]
+        if self.action == "update":
+            self.stand.before_write(f"{self.table}.update")
+            for row in matched:
+                row.update(self.payload)
+            return _Resp([dict(row) for row in matched])
+        selected = [dict(row) for row in matched]
+        for key, desc in reversed(self.order_by):
+            selected.sort(key=lambda row: str(row.get(key) or ""), reverse=desc)
+        return _Resp(selected[: self.limit_value] if self.limit_value is not None else selected)
+
+
+class _FailureStand:
+    """Локальная замена Supabase и `db`: считает записи и роняет заданную по счёту."""
+
+    def __init__(self, *, fail_at=None, crash=False):
+        self.fail_at = fail_at
+        self.crash = crash
+        self.writes = []
+        self.next_id = 100
+        self.point_actions = []
+        self.bank_ledger = []
+        self.supabase = self
+        self.tables = {
+            "moderation_violation_types": [{"id": 1, "code": "spam", "title": "Spam", "is_active": True}],
+            "moderation_penalty_rules": [
+                {
+                    "id": 10,
+                    "violation_type_id": 1,
+                    "escalation_step": 1,
+                    "warn_count_before": 0,
+                    "apply_warn": True,
+                    "mute_minutes": 15,
+                    "fine_points": FINE_POINTS,
+                    "apply_ban": False,
+                    "is_active": True,
+                    "description_for_admin": "Первый спам",
+                    "description_for_user": "Не спамьте",
+                }
+            ],
+            "moderation_warn_state": [],
+            "moderation_warn_state_by_violation": [],
+            "moderation_cases": [],
+            "moderation_actions": [],
+            "moderation_mutes": [],
+            "moderation_bans": [],
+            "moderation_case_fines": [],
+            "fines": [],
+            "bank": [{"id": 1, "total": 0.0}],
+            "bank_history": [],
+        }
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def before_write(self, label):
+        self.writes.append(label)
+        if self.fail_at is not None and len(self.writes) == self.fail_at:
+            if self.crash:
+                raise _ProcessCrash(label)
+            raise RuntimeError(f"injected failure at {label}")
+
+    def _db_write(self, label) -> bool:
+        try:
+            self.before_write(label)
+        except RuntimeError:
+            # Как настоящий Database: ошибка записи превращается в False.
+            return False
+        return True
+
+    def add_action_by_account(self, account_id, points, reason, author_account_id, op_key=None):
+        if not self._db_write("actions.apply"):
+            return False
+        if any(action["op_key"] == op_key for action in self.point_actions):
+            return True
+        self.point_actions.append({"account_id": account_id, "points": points, "op_key": op_key})
+        return True
+
+    def apply_bank_delta(self, delta, reason, *, account_id=None, op_key=None, allow_overdraft=False, **_kwargs):
+        if not self._db_write("bank.apply"):
+            return False
+        if any(row["op_key"] == op_key for row in self.bank_ledger):
+            return True
+        self.tables["bank"][0]["total"] += delta
+        self.bank_ledger.append({"delta": delta, "op_key": op_key})
+        self.tables["bank_history"].append({"account_id": account_id, "amount": delta, "reason": reason})
+        return True
+
+    def get_fine_by_id(self, _fine_id):
+        return None
+
+    def _inc_metric(self, _name):
+        return None
+
+
+@pytest.fixture
+def patch_identity(monkeypatch):
+    accounts = {"111": "acc-actor", "222": "acc-target"}
+    monkeypatch.setattr(
+        AccountsService,
+        "resolve_account_id",
+        staticmethod(lambda _provider, provider_user_id: accounts.get(str(provider_user_id))),
+    )
+    monkeypatch.setattr(AccountsService, "get_account_titles", staticmethod(lambda _account_id: []))
+    monkeypatch.setattr(ModerationService, "_missing_tables", set(), raising=False)
+
+
+def _commit(op_key="case-op-1"):
+    return ModerationService.commit_case(
+        provider="discord",
+        actor="111",
+        target="222",
+        violation_code="spam",
+        context={"moderation_op_key": op_key, "skip_authority": True},
+    )
+
+
+def _clean_run_writes(monkeypatch):
+    stand = _FailureStand()
+    monkeypatch.setattr(moderation_service, "db", stand)
+    assert _commit()["ok"] is True
+    return len(stand.writes)
+
+
+def _assert_all_or_nothing(stand):
+    cases = stand.tables["moderation_cases"]
+    applied = [case for case in cases if case.get("status") == ModerationService.STATUS_APPLIED]
+    assert not [case for case in cases if case.get("status") == ModerationService.STATUS_PENDING]
+    active_mutes = [row for row in stand.tables["moderation_mutes"] if row.get("is_active")]
+    points_delta = sum(action["points"] for action in stand.point_actions)
+    bank_total = stand.tables["bank"][0]["total"]
+    if applied:
+        assert len(applied) == 1
+        assert len(active_mutes) == 1
+        assert points_delta == -FINE_POINTS
+        assert bank_total == FINE_POINTS
+    else:
+        assert active_mutes == []
+        assert points_delta == 0
+        assert bank_total == 0
+
+
+def test_failure_between_any_two_steps_leaves_nothing_half_applied(monkeypatch, patch_identity):
+    total_writes = _clean_run_writes(monkeypatch)
+    assert total_writes >= 10
+
+    for fail_at in range(1, total_writes + 1):
+        stand = _FailureStand(fail_at=fail_at)
+        monkeypatch.setattr(moderation_service, "db", stand)
+
+        result = _commit()
+
+        _assert_all_or_nothing(stand)
+        applied = any(case.get("status") == ModerationService.STATUS_APPLIED for case in stand.tables["moderation_cases"])
+        assert result["ok"] is applied, stand.writes[-1]
+
+
+def test_crash_between_steps_is_compensated_by_recovery(monkeypatch, patch_identity):
+    total_writes = _clean_run_writes(monkeypatch)
+
+    for fail_at in range(1, total_writes + 1):
+        stand = _FailureStand(fail_at=fail_at, crash=True)
+        monkeypatch.setattr(moderation_service, "db", stand)
+
+        with pytest.raises(_ProcessCrash):
+            _commit()
+
+        stand.fail_at = None
+        stale_at = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+        for case in stand.tables["moderation_cases"]:
+            case["created_at"] = stale_at
+        totals = ModerationService.recover_stale_pending_cases()
+
+        assert totals["manual_review"] == 0, stand.writes[-1]
+        _assert_all_or_nothing(stand)
+
+        # Повтор с тем же op_key ничего не применяет второй раз.
+        case_was_claimed = bool(stand.tables["moderation_cases"])
+        point_actions_before_retry = len(stand.point_actions)
+        retry = _commit()
+        if case_was_claimed:
+            assert retry["status"] == ModerationService.STATUS_DUPLICATE
+            assert len(stand.point_actions) == point_actions_before_retry
+        _assert_all_or_nothing(stand)
+
+
+def test_recovery_skips_fresh_pending_case_and_finalize_cannot_revive_recovered_case(monkeypatch, patch_identity):
+    stand = _FailureStand()
+    monkeypatch.setattr(moderation_service, "db", stand)
+    stand.tables["moderation_cases"].append(
+        {
+            "id": 1,
+            "account_id": "acc-target",
+            "status": ModerationService.STATUS_PENDING,
+            "op_key": "in-flight",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+    )
+
+    assert ModerationService.recover_stale_pending_cases()["found"] == 0
+
+    stand.tables["moderation_cases"][0]["status"] = ModerationService.STATUS_ROLLED_BACK
+    assert ModerationService._claim_case_for_rollback(stand.tables["moderation_cases"][0]) is False
+
+
+def test_rollback_claim_is_exclusive_and_stale_claim_is_retaken(monkeypatch, patch_identity):
+    stand = _FailureStand()
+    monkeypatch.setattr(moderation_service, "db", stand)
+    stale_at = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    stand.tables["moderation_cases"].append(
+        {"id": 1, "account_id": "acc-target", "status": ModerationService.STATUS_PENDING, "op_key": "crashed", "created_at": stale_at}
+    )
+
+    # Откат в процессе и восстановление видят один и тот же pending-снимок: забирает только один.
+    first_view, second_view = dict(stand.tables["moderation_cases"][0]), dict(stand.tables["moderation_cases"][0])
+    assert ModerationService._claim_case_for_rollback(first_view) is True
+    assert ModerationService._claim_case_for_rollback(second_view) is False
+    assert stand.tables["moderation_cases"][0]["status"] == ModerationService.STATUS_ROLLING_BACK
+
+    # Владелец упал посреди компенсации: восстановление перезабирает кейс и закрывает его ровно один раз.
+    stand.tables["moderation_cases"][0]["updated_at"] = stale_at
+    first = ModerationService.recover_stale_pending_cases()
+    second = ModerationService.recover_stale_pending_cases()
+
+    assert first["recovered"] == 1
+    assert second["found"] == 0
+    assert stand.tables["moderation_cases"][0]["status"] == ModerationService.STATUS_ROLLED_BACK
@@ -4,6 +4,8 @@
 Где используется: Discord/Telegram/общая логика (тесты).
 """
 
+import copy
+import re
 import unittest
 from unittest.mock import patch
 
@@ -21,6 +23,8 @@ class _TableOp:
         self.fake_db = fake_db
         self.table_name = table_name
         self._filters = []
+        self._predicates = []
+        self._order = []
         self._limit = None
         self._payload = None
         self._action = "select"
@@ -33,6 +37,34 @@ class _TableOp:
         self._filters.append((key, value))
         return self
 
+    def in_(self, key, values):
+        allowed = {str(value) for value in values}
+        self._predicates.append(lambda row: str(row.get(key)) in allowed)
+        return self
+
+    def or_(self, expression):
+        # Достаточно для keyset-фильтра: `col.op."value"` и группы `and(...)`.
+        def _condition(term):
+            key, op, value = re.fullmatch(r'(\w+)\.(lt|eq)\."?([^"]*)"?', term).groups()
+
+            def _check(row):
+                current = row.get(key)
+                expected = type(current)(value) if isinstance(current, int) else value
+                return current < expected if op == "lt" else current == expected
+
+            return _check
+
+        branches = []
+        for group, single in re.findall(r"and\(([^)]*)\)|([^,]+)", expression):
+            checks = [_condition(term) for term in (group.split(",") if group else [single])]
+            branches.append(lambda row, checks=checks: all(check(row) for check in checks))
+        self._predicates.append(lambda row: any(branch(row) for branch in branches))
+        return self
+
+    def order(self, key, desc=False):
+        self._order.append((key, desc))
+        return self
+
     def limit(self, n):
         self._limit = n
         return self
@@ -78,8 +110,10 @@ class _TableOp:
 
         selected = []
         for row in rows:
-            if all(str(row.get(k)) == str(v) for k, v in self._filters):
+            if all(str(row.get(k)) == str(v) for k, v in self._filters) and all(check(row) for check in self._predicates):
                 selected.append(dict(row))
+        for key, desc in reversed(self._order):
+            selected.sort(key=lambda row: row.get(key), reverse=desc)
         if self._limit is not None:
             selected = selected[: self._limit]
         self.fake_db.operations.append({
@@ -167,6 +201,7 @@ class _FakeDb:
         self.fail_point_action = False
         self.fail_add_to_bank = False
         self.fail_log_bank_income = False
+        self.commit_rpc_available = False
 
     def _inc_metric(self, name):
         self.metrics.append(name)
@@ -240,6 +275,42 @@ class _FakeDb:
         return True
 
 
+    def commit_moderation_case(self, case_payload, plan):
+        # Имитация RPC sql/p26: все записи одной транзакцией, при ошибке таблицы возвращаются к снимку.
+        if not self.commit_rpc_available:
+            return None
+        for row in self.tables["moderation_cases"]:
+            if row.get("op_key") == case_payload.get("op_key"):
+                return {"status": "duplicate", "case": dict(row), "actions": [], "fine": None, "new_points": None, "error": None}
+        snapshot = copy.deepcopy((self.tables, self.sequences, self.point_actions))
+        try:
+            case_row = self.supabase.table("moderation_cases").insert(case_payload).execute().data[0]
+            case_ref = {"case_id": case_row["id"]}
+            action_rows = []
+            for step in ("warn", "mute", "ban", "kick", "demotion", "fine", "bank_income"):
+                step_plan = plan.get(step)
+                if not step_plan:
+                    continue
+                if step in {"mute", "ban"}:
+                    self.supabase.table(f"moderation_{step}s").insert({**step_plan["row"], **case_ref}).execute()
+                if step == "fine" and step_plan["payment_mode"] == ModerationService.FINE_PAYMENT_MODE_INSTANT:
+                    self.point_actions.append({
+                        "account_id": case_payload["account_id"],
+                        "points": -step_plan["amount"],
+                        "op_key": f"{case_payload['op_key']}:fine_points",
+                    })
+                if step == "bank_income":
+                    self.tables["bank"][0]["total"] += step_plan["amount"]
+                action_rows.append(self.supabase.table("moderation_actions").insert({**step_plan["action"], **case_ref}).execute().data[0])
+            finalized = self.supabase.table("moderation_cases").update(plan["finalize"]).eq("id", case_row["id"]).execute().data
+            if not finalized:
+                raise RuntimeError("finalize matched no rows")
+        except Exception as error:
+            self.tables, self.sequences, self.point_actions = snapshot
+            return {"status": "failed", "case": None, "actions": [], "fine": None, "new_points": None, "error": str(error)}
+        return {"status": "applied", "case": finalized[0], "actions": action_rows, "fine": None, "new_points": None, "error": None}
+
+
 class ModerationServiceTests(unittest.TestCase):
     def setUp(self):
         AccountsService._account_titles_cache = {}
@@ -677,7 +748,65 @@ class ModerationServiceTests(unittest.TestCase):
         self.assertEqual(self.fake_db.tables["moderation_cases"][0]["status"], ModerationService.STATUS_ROLLED_BACK)
         self.assertEqual(len(self.fake_db.point_actions), 0)
 
+    def test_commit_case_applies_case_and_penalties_through_single_rpc(self):
+        self.mock_resolve.side_effect = ["acc-actor", "acc-target"]
+        self.fake_db.commit_rpc_available = True
+
+        result = ModerationService.commit_case(
+            provider="discord",
+            actor="111",
+            target="222",
+            violation_code="spam",
+            context={"moderation_op_key": "rep:rpc-ok", "skip_authority": True, "reason_text": "Flood links"},
+        )
+
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["status"], ModerationService.STATUS_APPLIED)
+        self.assertEqual(self.fake_db.tables["moderation_cases"][0]["status"], ModerationService.STATUS_APPLIED)
+        self.assertEqual(result["fine_points_applied"], 3.0)
+        self.assertEqual(self.fake_db.point_actions[0]["points"], -3.0)
+        self.assertEqual(self.fake_db.tables["bank"][0]["total"], 3.0)
+        self.assertEqual([row["action_type"] for row in result["applied_actions"]], ["warn", "mute", "fine_points", "bank_income"])
+        self.assertTrue(all(row["case_id"] == result["case_id"] for row in self.fake_db.tables["moderation_actions"]))
+        # Пошаговый журнал не нужен: кейс не бывает виден наполовину.
+        self.assertFalse(any("commit_steps" in (op.get("payload") or {}) for op in self.fake_db.operations))
+
     def test_commit_case_returns_error_if_fine_applied_but_case_finalize_fails(self):
+        self.mock_resolve.side_effect = ["acc-actor", "acc-target"]
+        self.fake_db.commit_rpc_available = True
+        self.fake_db.fail_update_for = "moderation_cases"
+
+        result = ModerationService.commit_case(
+            provider="discord",
+            actor="111",
+            target="222",
+            violation_code="spam",
+            context={"moderation_op_key": "rep:finalize-fail", "skip_authority": True},
+        )
+
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["error_code"], "case_commit_failed")
+        # Транзакция отменена целиком: ни штрафа, ни мута, ни строки кейса.
+        self.assertEqual(self.fake_db.point_actions, [])
+        self.assertEqual(self.fake_db.tables["moderation_cases"], [])
+        self.assertEqual(self.fake_db.tables["moderation_mutes"], [])
+        self.assertEqual(self.fake_db.tables["bank"][0]["total"], 0.0)
+        self.assertEqual(result["rollback_status"], "not_required")
+
+    def test_commit_case_rpc_repeat_returns_duplicate(self):
+        self.fake_db.commit_rpc_available = True
+        context = {"moderation_op_key": "rep:rpc-repeat", "skip_authority": True}
+        self.mock_resolve.side_effect = ["acc-actor", "acc-target", "acc-actor", "acc-target"]
+
+        first = ModerationService.commit_case(provider="discord", actor="111", target="222", violation_code="spam", context=context)
+        second = ModerationService.commit_case(provider="discord", actor="111", target="222", violation_code="spam", context=context)
+
+        self.assertEqual(first["status"], ModerationService.STATUS_APPLIED)
+        self.assertEqual(second["status"], ModerationService.STATUS_DUPLICATE)
+        self.assertEqual(second["case_id"], first["case_id"])
+        self.assertEqual(len(self.fake_db.point_actions), 1)
+
+    def test_commit_case_without_rpc_leaves_unclaimed_finalize_failure_to_recovery(self):
         self.mock_resolve.side_effect = ["acc-actor", "acc-target"]
         self.fake_db.fail_update_for = "moderation_cases"
 
@@ -692,8 +821,11 @@ class ModerationServiceTests(unittest.TestCase):
         self.assertFalse(result["ok"])
         self.assertEqual(result["error_code"], "finalize_case_failed")
         self.assertEqual(self.fake_db.point_actions[0]["points"], -3.0)
-        self.assertEqual(self.fake_db.point_actions[1]["points"], 3.0)
-        self.assertEqual(result["rollback_status"], "manual_review_required")
+        # Кейс не удалось забрать на откат (pending -> rolling_back): компенсирует только восстановление,
+        # иначе оно же вернуло бы штраф второй раз.
+        self.assertEqual(len(self.fake_db.point_actions), 1)
+        self.assertEqual(result["rollback_status"], "recovery_pending")
+        self.assertEqual(self.fake_db.tables["moderation_cases"][0]["status"], ModerationService.STATUS_PENDING)
 
     def test_commit_case_moves_fine_to_bank_and_links_it_to_case_history(self):
         self.mock_resolve.side_effect = ["acc-actor", "acc-target"]
@@ -739,6 +871,52 @@ class ModerationServiceTests(unittest.TestCase):
         self.assertEqual(self.fake_db.point_actions[1]["points"], 3.0)
         self.assertIn(result["rollback_status"], {"rolled_back", "manual_review_required"})
 
+    def _seed_cases(self, count):
+        for case_id in range(1, count + 1):
+            # Два кейса на одну секунду проверяют разбор ничьих по id.
+            created_at = f"2026-03-01T10:00:{case_id // 2:02d}+00:00"
+            self.fake_db.tables["moderation_cases"].append(
+                {"id": case_id, "account_id": "acc-target", "status": "applied", "created_at": created_at}
+            )
+            self.fake_db.tables["moderation_actions"].extend(
+                [
+                    {"id": case_id * 10 + 1, "case_id": case_id, "action_type": "mute", "created_at": created_at},
+                    {"id": case_id * 10, "case_id": case_id, "action_type": "warn", "created_at": created_at},
+                ]
+            )
+        self.fake_db.tables["moderation_cases"].append(
+            {"id": 999, "account_id": "acc-other", "status": "applied", "created_at": "2026-03-02T00:00:00+00:00"}
+        )
+
+    def test_list_recent_cases_walks_keyset_pages_without_gaps(self):
+        self._seed_cases(11)
+
+        seen = []
+        cursor = None
+        while True:
+            page = ModerationService.list_recent_cases("acc-target", limit=4, cursor=cursor)
+            seen.extend(item["case"]["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(seen, list(range(11, 0, -1)))
+        first = ModerationService.list_recent_cases("acc-target", limit=4)
+        self.assertEqual(first["next_cursor"], "2026-03-01T10:00:04+00:00|8")
+        self.assertEqual([action["action_type"] for action in first["items"][0]["actions"]], ["warn", "mute"])
+
+    def test_list_recent_cases_uses_two_queries_regardless_of_history(self):
+        self._seed_cases(15)
+        self.fake_db.operations.clear()
+
+        page = ModerationService.list_recent_cases("acc-target", limit=5)
+
+        selects = [op["table"] for op in self.fake_db.operations if op["action"] == "select"]
+        self.assertEqual(selects, ["moderation_cases", "moderation_actions"])
+        self.assertEqual(len(page["items"]), 5)
+        self.assertTrue(all(len(item["actions"]) == 2 for item in page["items"]))
+        self.assertEqual(ModerationService.list_recent_cases("acc-target", cursor="not-a-date")["items"], [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -65,3 +65,46 @@ class ProfileTitlesLogicTests(unittest.IsolatedAsyncioTestCase):
         resolve_mock.assert_called_once_with("discord", "111")
         get_titles_mock.assert_called_once_with("acc-1")
         save_mock.assert_called_once_with("acc-1", ["Главный вице"], source="discord")
+
+    async def test_persisted_fingerprints_survive_restart_and_limit_recompute_to_changed_members(self):
+        store: dict[str, dict[str, str]] = {}
+        leader = SimpleNamespace(id=10, name="Глава клуба")
+        vice = SimpleNamespace(id=20, name="Главный вице")
+        guild = SimpleNamespace(id=222)
+        linked = SimpleNamespace(id=111, bot=False, roles=[leader], guild=guild)
+        unlinked = SimpleNamespace(id=333, bot=False, roles=[vice], guild=guild)
+        guild.members = [linked, unlinked]
+        bot = SimpleNamespace(guilds=[guild])
+
+        with (
+            patch.object(profile_titles_logic.RoleFingerprintService, "load_guild", side_effect=lambda guild_id: dict(store.get(str(guild_id), {}))),
+            patch.object(
+                profile_titles_logic.RoleFingerprintService,
+                "save_many",
+                side_effect=lambda guild_id, rows: store.setdefault(str(guild_id), {}).update(rows),
+            ),
+            patch.object(profile_titles_logic.AccountsService, "get_configured_title_roles", return_value={10: "Глава клуба", 20: "Главный вице"}),
+            patch.object(profile_titles_logic.AccountsService, "get_configured_title_role_names", return_value=set()),
+            patch.object(
+                profile_titles_logic.AccountsService,
+                "resolve_account_id",
+                side_effect=lambda _provider, member_id: "acc-1" if member_id == "111" else None,
+            ) as resolve_mock,
+            patch.object(profile_titles_logic.AccountsService, "get_account_titles", return_value=[]),
+            patch.object(profile_titles_logic.AccountsService, "save_account_titles", return_value=True) as save_mock,
+        ):
+            first = await profile_titles_logic.sync_discord_titles_once(bot)
+            profile_titles_logic._member_title_role_state_cache.clear()  # «рестарт» процесса
+            resolve_mock.reset_mock()
+            second = await profile_titles_logic.sync_discord_titles_once(bot)
+            second_resolved = [call.args[1] for call in resolve_mock.call_args_list]
+            linked.roles = [leader, vice]
+            third = await profile_titles_logic.sync_discord_titles_once(bot)
+
+        self.assertEqual((first["changed"], first["synced"]), (2, 1))
+        # Участник без аккаунта не получает отпечаток и пересчитывается, пока не привяжется.
+        self.assertEqual(list(store["222"]), ["111"])
+        self.assertEqual((second["changed"], second["unchanged"], second["synced"]), (1, 1, 0))
+        self.assertEqual(second_resolved, ["333"])
+        self.assertEqual((third["changed"], third["synced"]), (2, 1))
+        save_mock.assert_called_with("acc-1", ["Глава клуба", "Главный вице"], source="discord")
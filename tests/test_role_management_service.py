@@ -31,6 +31,7 @@ class _TableOp:
         self.fake_db = fake_db
         self.table_name = table_name
         self._filters = []
+        self._in_filters = []
         self._limit = None
         self._action = "select"
         self._payload = None
@@ -47,6 +48,10 @@ class _TableOp:
         self._filters.append((key, None if str(value).lower() == "null" else value))
         return self
 
+    def in_(self, key, values):
+        self._in_filters.append((key, list(values)))
+        return self
+
     def limit(self, n):
         self._limit = n
         return self
@@ -62,7 +67,7 @@ class _TableOp:
 
     def upsert(self, payload, **_kwargs):
         self._action = "upsert"
-        self._payload = dict(payload)
+        self._payload = [dict(item) for item in payload] if isinstance(payload, list) else dict(payload)
         return self
 
     def insert(self, payload, **_kwargs):
@@ -71,7 +76,9 @@ class _TableOp:
         return self
 
     def _matches(self, row):
-        return all(row.get(k) == v for k, v in self._filters)
+        return all(row.get(k) == v for k, v in self._filters) and all(
+            row.get(k) in values for k, values in self._in_filters
+        )
 
     def execute(self):
         self.fake_db.operations.append(
@@ -79,6 +86,8 @@ class _TableOp:
                 "table": self.table_name,
                 "action": self._action,
                 "filters": list(self._filters),
+                "in_filters": list(self._in_filters),
+                "rows": len(self._payload) if isinstance(self._payload, list) else 1,
             }
         )
         rows = self.fake_db.tables[self.table_name]
@@ -107,16 +116,29 @@ class _TableOp:
                 key_fields = ["discord_role_id", "name"]
             elif self.table_name == "role_categories":
                 key_fields = ["name"]
+            elif self.table_name == "profile_title_roles":
+                key_fields = ["discord_role_id"]
             else:
                 key_fields = ["name"]
-            for row in rows:
-                for key_field in key_fields:
-                    key_value = self._payload.get(key_field)
-                    if key_value and row.get(key_field) == key_value:
-                        row.update(self._payload)
-                        return _Resp([dict(row)])
-            rows.append(dict(self._payload))
-            return _Resp([dict(self._payload)])
+            payloads = self._payload if isinstance(self._payload, list) else [self._payload]
+            result = []
+            for payload in payloads:
+                target = next(
+                    (
+                        row
+                        for key_field in key_fields
+                        for row in rows
+                        if payload.get(key_field) and row.get(key_field) == payload.get(key_field)
+                    ),
+                    None,
+                )
+                if target is None:
+                    target = dict(payload)
+                    rows.append(target)
+                else:
+                    target.update(payload)
+                result.append(dict(target))
+            return _Resp(result)
 
         if self._action == "insert":
             rows.append(dict(self._payload))
@@ -150,6 +172,7 @@ class _FakeDb:
             "account_identities": [],
             "profile_title_roles": [],
             "role_change_audit": [],
+            "shop_items": [],
         }
         self.operations = []
         self.supabase = _FakeSupabase(self)
@@ -824,6 +847,144 @@ class RoleManagementServiceTests(unittest.TestCase):
         self.assertEqual(self.fake_db.tables["roles"], [])
         self.assertEqual(self.fake_db.tables["account_role_assignments"], [])
         self.assertEqual(self.fake_db.tables["role_permissions"], [])
+        role_deletes = [op for op in self.fake_db.operations if op["table"] == "roles" and op["action"] == "delete"]
+        self.assertEqual(role_deletes[0]["in_filters"], [("name", ["Legacy Discord"])])
+
+    def test_sync_discord_guild_roles_writes_new_roles_in_one_batch_and_reports_diff(self):
+        self.fake_db.tables["roles"] = [
+            {
+                "name": "Stable",
+                "category_name": "Discord сервер (auto)",
+                "position": 4,
+                "is_discord_managed": True,
+                "discord_role_id": "1",
+                "discord_role_name": "Stable",
+                "is_privileged_discord_role": False,
+                "is_sellable": False,
+                "show_in_roles_catalog": True,
+            },
+            {
+                "name": "Old Name",
+                "category_name": "Кастом",
+                "position": 2,
+                "is_discord_managed": True,
+                "discord_role_id": "2",
+            },
+        ]
+        guild_roles = [
+            {"id": "1", "name": "Stable", "position": 4, "guild_id": "g"},
+            {"id": "2", "name": "New Name", "position": 2, "guild_id": "g"},
+        ] + [{"id": str(100 + index), "name": f"Fresh {index}", "position": index, "guild_id": "g"} for index in range(3)]
+
+        result = RoleManagementService.sync_discord_guild_roles(guild_roles)
+
+        self.assertEqual(
+            {key: result[key] for key in ("inserted", "updated", "renamed", "unchanged", "removed", "upserted")},
+            {"inserted": 3, "updated": 0, "renamed": 1, "unchanged": 1, "removed": 0, "upserted": 4},
+        )
+        role_upserts = [op for op in self.fake_db.operations if op["table"] == "roles" and op["action"] == "upsert"]
+        self.assertEqual([op["rows"] for op in role_upserts], [3])
+        renamed = next(row for row in self.fake_db.tables["roles"] if row["discord_role_id"] == "2")
+        self.assertEqual(renamed["name"], "New Name")
+        self.assertEqual(renamed["category_name"], "Кастом")
+        self.assertEqual(len(self.fake_db.tables["roles"]), 5)
+
+    def test_sync_discord_guild_roles_rename_moves_dependent_rows_to_new_name(self):
+        self.fake_db.tables["roles"] = [
+            {"name": "Old Name", "category_name": "Кастом", "position": 2, "is_discord_managed": True, "discord_role_id": "2"},
+        ]
+        self.fake_db.tables["account_role_assignments"] = [
+            {"account_id": "acc-1", "role_name": "Old Name", "source": "discord"},
+            {"account_id": "acc-2", "role_name": "Other", "source": "custom"},
+        ]
+        self.fake_db.tables["role_permissions"] = [
+            {"role_name": "Old Name", "permission_name": "tickets.manage", "effect": "allow"},
+        ]
+        self.fake_db.tables["shop_items"] = [{"category_code": "roles", "role_name": "Old Name"}]
+
+        result = RoleManagementService.sync_discord_guild_roles([{"id": "2", "name": "New Name", "position": 2, "guild_id": "g"}])
+
+        self.assertEqual(result["renamed"], 1)
+        self.assertEqual(
+            [row["role_name"] for row in self.fake_db.tables["account_role_assignments"]],
+            ["New Name", "Other"],
+        )
+        self.assertEqual(self.fake_db.tables["role_permissions"][0]["role_name"], "New Name")
+        self.assertEqual(self.fake_db.tables["shop_items"][0]["role_name"], "New Name")
+
+    def test_sync_discord_guild_roles_rename_is_reverted_when_dependent_rows_fail(self):
+        self.fake_db.tables["roles"] = [
+            {"name": "Old Name", "category_name": "Кастом", "position": 2, "is_discord_managed": True, "discord_role_id": "2"},
+        ]
+        self.fake_db.tables["account_role_assignments"] = [
+            {"account_id": "acc-1", "role_name": "Old Name", "source": "discord"},
+        ]
+        del self.fake_db.tables["role_permissions"]
+
+        result = RoleManagementService.sync_discord_guild_roles([{"id": "2", "name": "New Name", "position": 2, "guild_id": "g"}])
+
+        self.assertEqual(result["renamed"], 0)
+        self.assertEqual(self.fake_db.tables["roles"][0]["name"], "Old Name")
+        self.assertEqual(self.fake_db.tables["account_role_assignments"][0]["role_name"], "Old Name")
+
+    def test_sync_discord_guild_roles_skips_unchanged_role_list_unless_forced(self):
+        guild_roles = [{"id": "5", "name": "Member", "position": 1, "guild_id": "g"}]
+
+        first = RoleManagementService.sync_discord_guild_roles(guild_roles)
+        operations_after_first = len(self.fake_db.operations)
+        second = RoleManagementService.sync_discord_guild_roles(list(reversed(guild_roles)))
+
+        self.assertEqual(first["inserted"], 1)
+        self.assertTrue(second["skipped_unchanged_snapshot"])
+        # Повтор читает только привязки external_role_bindings для отпечатка и не трогает каталог.
+        self.assertEqual(
+            [op["table"] for op in self.fake_db.operations[operations_after_first:]],
+            ["external_role_bindings"],
+        )
+
+        forced = RoleManagementService.sync_discord_guild_roles(guild_roles, force=True)
+        self.assertFalse(forced["skipped_unchanged_snapshot"])
+        self.assertEqual(forced["unchanged"], 1)
+        self.assertEqual(forced["upserted"], 0)
+
+    def test_sync_discord_guild_roles_resyncs_when_external_bindings_change(self):
+        guild_roles = [{"id": "5", "name": "Member", "position": 1, "guild_id": "g"}]
+        RoleManagementService.sync_discord_guild_roles(guild_roles)
+        self.fake_db.tables["external_role_bindings"] = [
+            {"account_id": "acc-1", "external_role_id": "77", "external_role_name": "Bound", "source": "discord", "deleted_at": None},
+        ]
+
+        result = RoleManagementService.sync_discord_guild_roles(guild_roles)
+
+        self.assertFalse(result["skipped_unchanged_snapshot"])
+        self.assertEqual(result["inserted"], 1)
+        self.assertIn("Bound", [row["name"] for row in self.fake_db.tables["roles"]])
+
+    def test_sync_discord_guild_roles_reports_failed_rows_and_retries_next_time(self):
+        guild_roles = [
+            {"id": "5", "name": "Member", "position": 1, "guild_id": "g"},
+            {"id": "6", "name": "Broken", "position": 2, "guild_id": "g"},
+        ]
+        original_execute = _TableOp.execute
+
+        def _failing_execute(op):
+            payload = op._payload
+            if op.table_name == "roles" and op._action == "upsert" and (
+                isinstance(payload, list) or payload.get("name") == "Broken"
+            ):
+                raise RuntimeError("forced upsert failure")
+            return original_execute(op)
+
+        with patch.object(_TableOp, "execute", _failing_execute):
+            first = RoleManagementService.sync_discord_guild_roles(guild_roles)
+
+        self.assertEqual((first["inserted"], first["failed"], first["upserted"]), (1, 1, 1))
+        self.assertEqual([row["name"] for row in self.fake_db.tables["roles"]], ["Member"])
+
+        second = RoleManagementService.sync_discord_guild_roles(guild_roles)
+
+        self.assertFalse(second["skipped_unchanged_snapshot"])
+        self.assertEqual((second["inserted"], second["failed"]), (1, 0))
 
 
     def test_list_roles_grouped_filters_protected_profile_titles_from_catalog(self):
@@ -0,0 +1,84 @@
+"""
+Назначение: модуль "test rpc capabilities" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: проверка однократного определения RPC и сигнатур, повторной проверки по ошибкам схемы и счётчиков fallback.
+Где используется: общая логика (тесты).
+"""
+
+from bot.data.db import Database
+from bot.data.rpc_capabilities import RPC_STATE_AVAILABLE, RPC_STATE_MISSING, RpcCapabilityRegistry
+
+MISSING = RuntimeError("Could not find the function public.apply_points_action(p_author_account_id) in the schema cache")
+
+
+def test_signature_is_detected_once_and_reused():
+    registry = RpcCapabilityRegistry()
+    client = object()
+
+    assert registry.plan(client, "apply_points_action", ("author_account_id", "author_id")) == ["author_account_id", "author_id"]
+    assert registry.record_error(client, "apply_points_action", MISSING, variant="author_account_id")
+    registry.record_success(client, "apply_points_action", "author_id")
+
+    assert registry.plan(client, "apply_points_action", ("author_account_id", "author_id")) == ["author_id"]
+    item = registry.snapshot()["rpcs"]["apply_points_action"]
+    assert item["state"] == RPC_STATE_AVAILABLE
+    assert item["failed_attempts"] == 1
+    assert item["probes"] == 1
+
+
+def test_missing_rpc_skips_round_trips_until_client_changes():
+    registry = RpcCapabilityRegistry()
+    client = object()
+
+    assert registry.plan(client, "apply_ticket_action") == ["default"]
+    assert registry.record_error(client, "apply_ticket_action", MISSING)
+    registry.record_fallback(client, "apply_ticket_action")
+    assert registry.plan(client, "apply_ticket_action") == []
+    registry.record_fallback(client, "apply_ticket_action")
+
+    item = registry.snapshot()["rpcs"]["apply_ticket_action"]
+    assert item["state"] == RPC_STATE_MISSING
+    assert item["fallback_rate"] == 1.0
+    # Другой клиент (переподключение) — определение заново.
+    assert registry.plan(object(), "apply_ticket_action") == ["default"]
+
+
+def test_runtime_errors_keep_capability_and_schema_errors_force_reprobe():
+    registry = RpcCapabilityRegistry()
+    client = object()
+    registry.plan(client, "apply_points_action", ("author_account_id", "author_id"))
+    registry.record_success(client, "apply_points_action", "author_account_id")
+
+    assert not registry.record_error(client, "apply_points_action", TimeoutError("read timeout"), variant="author_account_id")
+    assert registry.plan(client, "apply_points_action", ("author_account_id", "author_id")) == ["author_account_id"]
+
+    # Работавшая сигнатура исчезла: пробуем оставшиеся варианты.
+    assert registry.record_error(client, "apply_points_action", MISSING, variant="author_account_id")
+    assert registry.plan(client, "apply_points_action", ("author_account_id", "author_id")) == ["author_id"]
+
+    registry.record_error(client, "apply_points_action", RuntimeError("PGRST002: schema cache reload"), variant="author_id")
+    assert registry.plan(client, "apply_points_action", ("author_account_id", "author_id")) == ["author_account_id", "author_id"]
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class _MissingRpcSupabase:
+    def __init__(self):
+        self.rpc_calls = 0
+
+    def rpc(self, name, _payload):
+        self.rpc_calls += 1
+        raise RuntimeError(f"Could not find the function public.{name}")
+
+
+def test_ticket_rpc_path_pays_for_missing_function_once():
+    database = object.__new__(Database)
+    database.supabase = _MissingRpcSupabase()
+    kwargs = dict(account_id="acc-1", ticket_type="normal", delta=1, reason="menu", author_account_id="acc-admin", author_id=1, op_key="op")
+
+    assert database._apply_ticket_delta_atomic_via_rpc(**kwargs) == (False, False)
+    assert database._apply_ticket_delta_atomic_via_rpc(**kwargs) == (False, False)
+
+    assert database.supabase.rpc_calls == 1
@@ -0,0 +1,72 @@
+"""
+Назначение: модуль "test runtime supervisor" реализует продуктовый контур в зоне общая логика (тесты).
+Ответственность: проверка независимого перезапуска runtime с backoff и счётчиков здоровья.
+Где используется: общая логика (тесты).
+"""
+
+import asyncio
+
+from bot.runtime_supervisor import RuntimeSupervisor
+
+
+def test_failing_runtime_restarts_without_touching_healthy_one():
+    stop = {"value": False}
+    calls = {"telegram": 0, "discord_cancelled": False, "restarted": 0}
+
+    async def _telegram():
+        calls["telegram"] += 1
+        if calls["telegram"] >= 3:
+            stop["value"] = True
+            return
+        raise RuntimeError("telegram outage")
+
+    async def _discord():
+        try:
+            while not stop["value"]:
+                await asyncio.sleep(0.005)
+        except asyncio.CancelledError:
+            calls["discord_cancelled"] = True
+            raise
+
+    def _before_restart():
+        calls["restarted"] += 1
+
+    supervisor = RuntimeSupervisor(base_delay_sec=0.01, max_delay_sec=0.02, should_stop=lambda: stop["value"])
+    supervisor.add("discord-runtime", _discord)
+    supervisor.add("telegram-runtime", _telegram, before_restart=_before_restart)
+
+    asyncio.run(asyncio.wait_for(supervisor.run(), timeout=2))
+
+    health = supervisor.health_snapshot()
+    assert calls["telegram"] == 3
+    assert calls["restarted"] == 2
+    assert calls["discord_cancelled"] is False
+    assert health["telegram-runtime"]["restarts"] == 2
+    assert health["telegram-runtime"]["last_error"] == "RuntimeError: telegram outage"
+    assert health["discord-runtime"]["restarts"] == 0
+    assert health["discord-runtime"]["state"] == "stopped"
+
+
+def test_permanent_error_marks_runtime_failed_without_restart():
+    class _InvalidToken(Exception):
+        pass
+
+    attempts = []
+
+    async def _discord():
+        attempts.append(1)
+        raise _InvalidToken("bad token")
+
+    supervisor = RuntimeSupervisor(base_delay_sec=0.01)
+    supervisor.add("discord-runtime", _discord, permanent_errors=(_InvalidToken,))
+
+    asyncio.run(asyncio.wait_for(supervisor.run(), timeout=1))
+
+    assert len(attempts) == 1
+    assert supervisor.health_snapshot()["discord-runtime"]["state"] == "failed"
+
+
+def test_restart_delay_grows_exponentially_and_is_capped():
+    supervisor = RuntimeSupervisor(base_delay_sec=2, max_delay_sec=10)
+
+    assert [supervisor.restart_delay_seconds(n) for n in range(5)] == [0.0, 2, 4, 8, 10]
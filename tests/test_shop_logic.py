@@ -8,9 +8,18 @@ from pathlib import Path
 import re
 from unittest.mock import patch
 
+import pytest
+
 from bot.services import shop_service as shop_logic
 
 
+@pytest.fixture(autouse=True)
+def _reset_shop_catalog_cache():
+    shop_logic.invalidate_shop_catalog_cache(reason="test")
+    yield
+    shop_logic.invalidate_shop_catalog_cache(reason="test")
+
+
 def test_shop_catalog_items_sorted_and_paged():
     grouped = [
         {
@@ -161,7 +170,7 @@ def test_purchase_shop_item_requires_previous_volunteer_role():
     ), patch(
         "bot.services.shop_service.RoleManagementService.get_user_roles_by_account", return_value=[]
     ), patch(
-        "bot.services.shop_service.AccountsService.get_profile_by_account", return_value={"points": 200}
+        "bot.services.shop_service.PointsService.get_balance_by_account", return_value=200.0
     ), patch(
         "bot.services.shop_service.PointsService.remove_points_by_account"
     ) as debit_mock:
@@ -200,7 +209,9 @@ def test_purchase_shop_item_allows_volunteer_role_when_previous_owned():
         "bot.services.shop_service.RoleManagementService.get_user_roles_by_account",
         return_value=[{"name": "Новый волонтер"}],
     ), patch(
-        "bot.services.shop_service.AccountsService.get_profile_by_account", return_value={"points": 200}
+        "bot.services.shop_service.PointsService.get_balance_by_account", return_value=200.0
+    ), patch(
+        "bot.services.shop_service.PointsService.get_action_op_keys", return_value=[]
     ), patch(
         "bot.services.shop_service.PointsService.remove_points_by_account", return_value=True
     ), patch(
@@ -329,7 +340,9 @@ def test_purchase_shop_item_revoke_lower_volunteer_roles_on_upgrade():
         "bot.services.shop_service.RoleManagementService.get_user_roles_by_account",
         return_value=[{"name": "Хороший Помощник Бебр"}],
     ), patch(
-        "bot.services.shop_service.AccountsService.get_profile_by_account", return_value={"points": 200}
+        "bot.services.shop_service.PointsService.get_balance_by_account", return_value=200.0
+    ), patch(
+        "bot.services.shop_service.PointsService.get_action_op_keys", return_value=[]
     ), patch(
         "bot.services.shop_service.PointsService.remove_points_by_account", return_value=True
     ), patch(
@@ -347,3 +360,240 @@ def test_purchase_shop_item_revoke_lower_volunteer_roles_on_upgrade():
     assert result.ok is True
     revoked_names = [call.args[1] for call in revoke_mock.call_args_list]
     assert revoked_names == ["Новый волонтер", "Хороший Помощник Бебр"]
+
+
+def _sellable_item(role_name: str = "Коллекционер") -> "shop_logic.ShopItem":
+    return shop_logic.ShopItem(
+        shop_item_id="shop_1",
+        role_name=role_name,
+        short_name=role_name,
+        category="Роли",
+        position=0,
+        category_position=0,
+        description="",
+        acquire_hint="",
+        price_points=10,
+        base_price_points=10,
+        sale_price_points=None,
+        is_sale_active=False,
+    )
+
+
+def test_purchase_shop_item_uses_atomic_rpc_and_reports_duplicate():
+    item = _sellable_item()
+    rpc_results = [
+        {"status": "completed", "new_points": 190, "error_code": None},
+        {"status": "duplicate", "new_points": 190, "error_code": None},
+    ]
+    with patch("bot.services.shop_service.get_shop_catalog_items", return_value=[item]), patch(
+        "bot.services.shop_service.RoleManagementService.get_role", return_value={"is_sellable": True}
+    ), patch(
+        "bot.services.shop_service.RoleManagementService.get_user_roles_by_account", return_value=[]
+    ), patch(
+        "bot.services.shop_service.RoleManagementService.record_role_change_audit"
+    ) as audit_mock, patch(
+        "bot.services.shop_service.db.apply_shop_purchase", side_effect=rpc_results
+    ) as rpc_mock, patch(
+        "bot.services.shop_service.PointsService.remove_points_by_account"
+    ) as debit_mock:
+        first = shop_logic.purchase_shop_item(
+            account_id="acc-1", shop_item_id="shop_1", actor_provider="telegram", actor_user_id="100", idempotency_key="telegram:1:2"
+        )
+        second = shop_logic.purchase_shop_item(
+            account_id="acc-1", shop_item_id="shop_1", actor_provider="telegram", actor_user_id="100", idempotency_key="telegram:1:2"
+        )
+
+    assert first.ok is True and first.spent_points == 10
+    assert second.ok is False and second.reason == "duplicate_request"
+    op_keys = {call.kwargs["op_key"] for call in rpc_mock.call_args_list}
+    assert op_keys == {"shop_purchase:acc-1:коллекционер:telegram:1:2"}
+    assert audit_mock.call_count == 1
+    debit_mock.assert_not_called()
+
+
+def test_purchase_shop_item_rpc_rejections_map_to_user_texts():
+    item = _sellable_item()
+    with patch("bot.services.shop_service.get_shop_catalog_items", return_value=[item]), patch(
+        "bot.services.shop_service.RoleManagementService.get_role", return_value={"is_sellable": True}
+    ), patch(
+        "bot.services.shop_service.RoleManagementService.get_user_roles_by_account", return_value=[]
+    ), patch(
+        "bot.services.shop_service.db.apply_shop_purchase",
+        side_effect=[
+            {"status": "rejected", "new_points": 3, "error_code": "insufficient_points"},
+            {"status": "rejected", "new_points": 50, "error_code": "out_of_stock"},
+        ],
+    ):
+        poor = shop_logic.purchase_shop_item(account_id="acc-1", shop_item_id="shop_1", actor_provider="discord", actor_user_id="1")
+        sold_out = shop_logic.purchase_shop_item(account_id="acc-1", shop_item_id="shop_1", actor_provider="discord", actor_user_id="1")
+
+    assert poor.reason == "insufficient_points"
+    assert "у вас 3" in poor.message
+    assert sold_out.reason == "out_of_stock"
+    assert sold_out.message == shop_logic.SHOP_TEXT_OUT_OF_STOCK
+
+
+def test_purchase_shop_item_fallback_debits_once_per_idempotency_key():
+    item = _sellable_item("Коллекционер фолбэка")
+    with patch("bot.services.shop_service.get_shop_catalog_items", return_value=[item]), patch(
+        "bot.services.shop_service.RoleManagementService.get_role", return_value={"is_sellable": True}
+    ), patch(
+        "bot.services.shop_service.RoleManagementService.get_user_roles_by_account", return_value=[]
+    ), patch(
+        "bot.services.shop_service.db.apply_shop_purchase", return_value=None
+    ), patch(
+        "bot.services.shop_service.PointsService.get_balance_by_account", return_value=200.0
+    ), patch(
+        "bot.services.shop_service.PointsService.get_action_op_keys", return_value=[]
+    ), patch(
+        "bot.services.shop_service.PointsService.remove_points_by_account", return_value=True
+    ) as debit_mock, patch(
+        "bot.services.shop_service.RoleManagementService.assign_user_role_by_account", return_value={"ok": True}
+    ):
+        results = [
+            shop_logic.purchase_shop_item(
+                account_id="acc-2", shop_item_id="shop_1", actor_provider="discord", actor_user_id="1", idempotency_key="discord:555"
+            )
+            for _ in range(2)
+        ]
+
+    assert [result.ok for result in results] == [True, False]
+    assert results[1].reason == "duplicate_request"
+    debit_mock.assert_called_once()
+    assert debit_mock.call_args.kwargs["op_key"] == "shop_purchase:acc-2:коллекционер фолбэка:discord:555:debit"
+
+
+def test_purchase_shop_item_fallback_retry_after_refund_charges_again():
+    item = _sellable_item("Коллекционер ретрая")
+    base_key = "shop_purchase:acc-3:коллекционер ретрая:discord:777"
+    recorded_keys: list[str] = []
+
+    def _record(_account_id, _points, _reason, _author, op_key=None):
+        recorded_keys.append(op_key)
+        return True
+
+    with patch("bot.services.shop_service.get_shop_catalog_items", return_value=[item]), patch(
+        "bot.services.shop_service.RoleManagementService.get_role", return_value={"is_sellable": True}
+    ), patch(
+        "bot.services.shop_service.RoleManagementService.get_user_roles_by_account", return_value=[]
+    ), patch(
+        "bot.services.shop_service.db.apply_shop_purchase", return_value=None
+    ), patch(
+        "bot.services.shop_service.PointsService.get_balance_by_account", return_value=200.0
+    ), patch(
+        "bot.services.shop_service.PointsService.get_action_op_keys", side_effect=lambda *_: list(recorded_keys)
+    ), patch(
+        "bot.services.shop_service.PointsService.remove_points_by_account", side_effect=_record
+    ), patch(
+        "bot.services.shop_service.PointsService.add_points_by_account", side_effect=_record
+    ), patch(
+        "bot.services.shop_service.RoleManagementService.assign_user_role_by_account",
+        side_effect=[{"ok": False, "reason": "db_error"}, {"ok": True}],
+    ) as grant_mock:
+        results = [
+            shop_logic.purchase_shop_item(
+                account_id="acc-3", shop_item_id="shop_1", actor_provider="discord", actor_user_id="1", idempotency_key="discord:777"
+            )
+            for _ in range(2)
+        ]
+
+    assert [result.ok for result in results] == [False, True]
+    # Повтор после возврата списывает под ключом новой попытки, а не получает роль по дубликату списания.
+    assert recorded_keys == [f"{base_key}:debit", f"{base_key}:refund", f"{base_key}:debit:1"]
+    assert grant_mock.call_count == 2
+
+
+def test_purchase_shop_item_fallback_refuses_grant_when_attempt_already_debited():
+    item = _sellable_item("Коллекционер гонки")
+    base_key = "shop_purchase:acc-4:коллекционер гонки:discord:888"
+    with patch("bot.services.shop_service.get_shop_catalog_items", return_value=[item]), patch(
+        "bot.services.shop_service.RoleManagementService.get_role", return_value={"is_sellable": True}
+    ), patch(
+        "bot.services.shop_service.RoleManagementService.get_user_roles_by_account", return_value=[]
+    ), patch(
+        "bot.services.shop_service.db.apply_shop_purchase", return_value=None
+    ), patch(
+        "bot.services.shop_service.PointsService.get_balance_by_account", return_value=200.0
+    ), patch(
+        "bot.services.shop_service.PointsService.get_action_op_keys", return_value=[f"{base_key}:debit"]
+    ), patch(
+        "bot.services.shop_service.PointsService.remove_points_by_account"
+    ) as debit_mock, patch(
+        "bot.services.shop_service.RoleManagementService.assign_user_role_by_account"
+    ) as grant_mock:
+        result = shop_logic.purchase_shop_item(
+            account_id="acc-4", shop_item_id="shop_1", actor_provider="discord", actor_user_id="1", idempotency_key="discord:888"
+        )
+
+    assert result.ok is False and result.reason == "duplicate_request"
+    debit_mock.assert_not_called()
+    grant_mock.assert_not_called()
+
+
+def test_purchase_shop_item_blocks_privileged_role_before_rpc():
+    item = _sellable_item("Модератор")
+    role_state = {"is_sellable": True, "discord_role_id": "42", "is_privileged_discord_role": True}
+    with patch("bot.services.shop_service.get_shop_catalog_items", return_value=[item]), patch(
+        "bot.services.shop_service.RoleManagementService.get_role", return_value=role_state
+    ), patch(
+        "bot.services.role_management_service.AuthorityService.is_super_admin", return_value=False
+    ), patch(
+        "bot.services.role_management_service.AuthorityService.resolve_authority", return_value=None
+    ), patch(
+        "bot.services.shop_service.db.apply_shop_purchase"
+    ) as rpc_mock:
+        result = shop_logic.purchase_shop_item(account_id="acc-5", shop_item_id="shop_1", actor_provider="discord", actor_user_id="1")
+
+    assert result.ok is False
+    assert result.reason == "privileged_discord_role"
+    rpc_mock.assert_not_called()
+
+
+def _catalog_fixtures():
+    grouped = [{"category": "A", "position": 1, "roles": [{"name": f"Role {n}", "position": n} for n in range(1, 4)]}]
+    shop_rows = [
+        {"role_name": f"Role {n}", "display_position": n, "effective_price_points": 10, "base_price_points": 10, "sale_price_points": None, "is_sale_active": False}
+        for n in range(1, 4)
+    ]
+    return grouped, shop_rows
+
+
+def test_shop_catalog_cache_serves_pages_without_db_until_invalidated():
+    grouped, shop_rows = _catalog_fixtures()
+    with patch("bot.services.shop_service.RoleManagementService.list_public_roles_catalog", return_value=grouped), patch(
+        "bot.services.shop_service.RoleManagementService.list_active_shop_role_items", return_value=shop_rows
+    ) as shop_rows_mock, patch(
+        "bot.services.shop_service.RoleManagementService.get_user_roles_by_account", return_value=[]
+    ) as owned_mock:
+        first = shop_logic.get_shop_catalog_items(log_context="test", account_id="acc-1")
+        for page in range(3):
+            items = shop_logic.get_shop_catalog_items(log_context="test", account_id="acc-1")
+            page_data = shop_logic.get_shop_page_slice(items, page, page_size=shop_logic.SHOP_PAGE_SIZE)
+        assert items is first
+        assert page_data is first.pages[0]
+        assert shop_rows_mock.call_count == 1
+        assert owned_mock.call_count == 1
+
+        shop_logic.RoleManagementService.invalidate_catalog_cache(reason="test_admin_edit")
+        # Правка каталога сразу освобождает кэш витрины, а не только делает его устаревшим по версии.
+        assert shop_logic._shop_catalog_base is None
+        assert not shop_logic._shop_account_views
+        shop_logic.get_shop_catalog_items(log_context="test", account_id="acc-1")
+        assert shop_rows_mock.call_count == 2
+
+
+def test_shop_catalog_view_refreshes_after_account_role_change():
+    grouped, shop_rows = _catalog_fixtures()
+    with patch("bot.services.shop_service.RoleManagementService.list_public_roles_catalog", return_value=grouped), patch(
+        "bot.services.shop_service.RoleManagementService.list_active_shop_role_items", return_value=shop_rows
+    ) as shop_rows_mock, patch(
+        "bot.services.shop_service.RoleManagementService.get_user_roles_by_account",
+        side_effect=[[], [{"name": "Role 1"}]],
+    ):
+        before = shop_logic.get_shop_catalog_items(log_context="test", account_id="acc-7")
+        shop_logic.RoleManagementService.mark_account_roles_changed("acc-7")
+        after = shop_logic.get_shop_catalog_items(log_context="test", account_id="acc-7")
+
+    assert [item.role_name for item in before] == ["Role 1", "Role 2", "Role 3"]
+    assert [item.role_name for item in after] == ["Role 2", "Role 3"]
+    assert shop_rows_mock.call_count == 1
@@ -10,6 +10,7 @@ from unittest.mock import patch
 
 from aiogram.dispatcher.event.bases import SkipHandler
 
+from bot.services.telegram_chat_registry import TelegramChatRegistry
 from bot.telegram_bot.chat_registry_router import (
     remember_channel_edited_post,
     remember_channel_post,
@@ -22,6 +23,9 @@ from bot.telegram_bot.chat_registry_router import (
 
 
 class TelegramChatRegistryRouterTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        TelegramChatRegistry.reset()
+
     async def test_group_message_registers_chat_without_blocking_next_handlers(self):
         message = SimpleNamespace(chat=SimpleNamespace(id=-1001, title="Группа", type="supergroup"))
 
@@ -145,6 +149,72 @@ class TelegramChatRegistryRouterTests(unittest.IsolatedAsyncioTestCase):
 
         purge_mock.assert_not_called()
 
+    async def test_repeated_group_messages_write_registry_once_until_chat_changes(self):
+        message = SimpleNamespace(chat=SimpleNamespace(id=-1001, title="Группа", type="supergroup"))
+        renamed = SimpleNamespace(chat=SimpleNamespace(id=-1001, title="Новая группа", type="supergroup"))
+
+        with patch("bot.telegram_bot.chat_registry_router.GuiyPublishDestinationsService.register_telegram_chat", return_value=True) as register_mock:
+            for _ in range(5):
+                with self.assertRaises(SkipHandler):
+                    await remember_group_message(message)
+            with self.assertRaises(SkipHandler):
+                await remember_group_message(renamed)
+
+        self.assertEqual(register_mock.call_count, 2)
+        self.assertEqual(register_mock.call_args.kwargs["chat_title"], "Новая группа")
+        metrics = TelegramChatRegistry.metrics_snapshot()
+        self.assertEqual((metrics["hits"], metrics["misses"], metrics["writes"]), (4, 2, 2))
+
+    async def test_failed_registry_write_is_retried_on_next_message(self):
+        message = SimpleNamespace(chat=SimpleNamespace(id=-1001, title="Группа", type="supergroup"))
+
+        with patch(
+            "bot.telegram_bot.chat_registry_router.GuiyPublishDestinationsService.register_telegram_chat",
+            side_effect=[False, True, True],
+        ) as register_mock:
+            for _ in range(3):
+                with self.assertRaises(SkipHandler):
+                    await remember_group_message(message)
+
+        self.assertEqual(register_mock.call_count, 2)
+        self.assertEqual(TelegramChatRegistry.metrics_snapshot()["write_failures"], 1)
+
+    async def test_forget_during_inflight_write_does_not_remember_active_chat(self):
+        message = SimpleNamespace(chat=SimpleNamespace(id=-1001, title="Группа", type="supergroup"))
+        calls = []
+
+        def _register(**_kwargs):
+            if not calls:
+                # Чат помечают неактивным, пока первая запись "active" ещё в полёте.
+                TelegramChatRegistry.forget(-1001)
+            calls.append(_kwargs)
+            return True
+
+        with patch(
+            "bot.telegram_bot.chat_registry_router.GuiyPublishDestinationsService.register_telegram_chat",
+            side_effect=_register,
+        ):
+            for _ in range(3):
+                with self.assertRaises(SkipHandler):
+                    await remember_group_message(message)
+
+        # Первая запись не запомнилась, поэтому вторая снова пишет активный чат; третья уже дедуплицируется.
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(TelegramChatRegistry.metrics_snapshot()["known_chats"], 1)
+
+    async def test_stale_registry_entry_is_refreshed(self):
+        message = SimpleNamespace(chat=SimpleNamespace(id=-1001, title="Группа", type="supergroup"))
+
+        with (
+            patch("bot.telegram_bot.chat_registry_router.GuiyPublishDestinationsService.register_telegram_chat", return_value=True) as register_mock,
+            patch.object(TelegramChatRegistry, "REFRESH_SECONDS", 0.0),
+        ):
+            for _ in range(2):
+                with self.assertRaises(SkipHandler):
+                    await remember_group_message(message)
+
+        self.assertEqual(register_mock.call_count, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -383,6 +383,36 @@ class TelegramGuiyOwnerCommandTests(unittest.IsolatedAsyncioTestCase):
             self.assertFalse(_is_pending_guiy_owner_input_message(message))
 
 
+    def test_pending_input_filter_reads_local_index_without_store_io(self):
+        message = SimpleNamespace(
+            from_user=SimpleNamespace(id=43, is_bot=False),
+            text="обычный текст",
+            chat=SimpleNamespace(id=100),
+        )
+        _PENDING_GUIY_OWNER_ACTIONS[43] = PendingGuiyOwnerAction(
+            selected_action="say",
+            bot_user_id="999",
+            target_message_id=None,
+            reply_author_user_id=None,
+            created_at=1_000.0,
+            target_chat_or_guild="-1001",
+            control_chat_id="100",
+            target_destination_id="-1001",
+        )
+        store = _PENDING_GUIY_OWNER_ACTIONS.store
+
+        with patch("bot.telegram_bot.commands.guiy_owner.time.time", return_value=1_001.0), patch.object(
+            store, "get", side_effect=AssertionError("filter must not hit the flow-state store")
+        ):
+            self.assertTrue(_is_pending_guiy_owner_input_message(message))
+            self.assertFalse(
+                _is_pending_guiy_owner_input_message(
+                    SimpleNamespace(from_user=SimpleNamespace(id=44, is_bot=False), text="x", chat=SimpleNamespace(id=100))
+                )
+            )
+        _PENDING_GUIY_OWNER_ACTIONS.pop(43, None)
+
+
 class TelegramGuiyOwnerVisibilityTests(unittest.TestCase):
     def test_guiy_owner_hidden_from_public_help(self):
         from bot.telegram_bot.systems.commands_logic import HELPY_TEXT
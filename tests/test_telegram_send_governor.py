@@ -0,0 +1,128 @@
+"""
+Назначение: модуль "test telegram send governor" реализует продуктовый контур в зоне Telegram (тесты).
+Ответственность: проверка темпа отправок, retry_after и учёта отброшенных сообщений на фейковом Bot API.
+Где используется: Telegram (тесты).
+"""
+
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+
+from bot.telegram_bot.send_governor import TelegramSendDropped, TelegramSendGovernor
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+        # Уступаем цикл событий, чтобы параллельные отправки успели встать в очередь чата.
+        await asyncio.sleep(0)
+
+
+class _FakeBotApi:
+    """Фейковый Bot API: отвечает ok, а для заданных чатов сначала возвращает retry_after."""
+
+    def __init__(self, clock: _FakeClock, retry_after_plan: dict[int, list[int]] | None = None):
+        self.clock = clock
+        self.retry_after_plan = retry_after_plan or {}
+        self.delivered: list[tuple[float, object]] = []
+
+    async def __call__(self, _bot, method):
+        plan = self.retry_after_plan.get(getattr(method, "chat_id", None)) or []
+        if plan:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=plan.pop(0))
+        self.delivered.append((self.clock.now, method))
+        return "ok"
+
+
+def _governor(clock: _FakeClock, **kwargs) -> TelegramSendGovernor:
+    params = {"global_per_sec": 30.0, "private_per_sec": 1.0, "group_per_min": 20.0, "chat_burst": 1.0}
+    params.update(kwargs)
+    return TelegramSendGovernor(clock=clock, sleep=clock.sleep, **params)
+
+
+def test_private_chat_sends_are_paced_to_one_per_second():
+    clock = _FakeClock()
+    api = _FakeBotApi(clock)
+    governor = _governor(clock)
+
+    async def _run():
+        for index in range(3):
+            await governor(api, None, SendMessage(chat_id=42, text=f"m{index}"))
+
+    asyncio.run(_run())
+
+    times = [moment for moment, _method in api.delivered]
+    assert times == [1000.0, 1001.0, 1002.0]
+    assert governor.metrics_snapshot()["sent"] == 3
+    assert governor.metrics_snapshot()["delayed"] == 2
+
+
+def test_group_chat_uses_per_minute_limit_and_callbacks_are_not_paced():
+    clock = _FakeClock()
+    api = _FakeBotApi(clock)
+    governor = _governor(clock)
+
+    async def _run():
+        await governor(api, None, SendMessage(chat_id=-100500, text="a"))
+        await governor(api, None, SendMessage(chat_id=-100500, text="b"))
+        await governor(api, None, AnswerCallbackQuery(callback_query_id="cb"))
+
+    asyncio.run(_run())
+
+    assert [round(moment, 3) for moment, _method in api.delivered] == [1000.0, 1003.0, 1003.0]
+
+
+def test_retry_after_is_honoured_then_send_succeeds():
+    clock = _FakeClock()
+    api = _FakeBotApi(clock, retry_after_plan={7: [5]})
+    governor = _governor(clock)
+
+    result = asyncio.run(governor(api, None, SendMessage(chat_id=7, text="hello")))
+
+    assert result == "ok"
+    assert api.delivered[0][0] >= 1005.0
+    snapshot = governor.metrics_snapshot()
+    assert snapshot["retry_after"] == 1
+    assert snapshot["dropped"] == {}
+
+
+def test_send_is_dropped_and_reported_when_retry_after_exceeds_limit():
+    clock = _FakeClock()
+    api = _FakeBotApi(clock, retry_after_plan={7: [600]})
+    governor = _governor(clock, max_retry_after_sec=60)
+
+    with pytest.raises(TelegramRetryAfter):
+        asyncio.run(governor(api, None, SendMessage(chat_id=7, text="hello")))
+
+    assert governor.metrics_snapshot()["dropped"] == {"retry_after_exhausted": 1}
+    assert api.delivered == []
+
+
+def test_chat_queue_overflow_drops_extra_sends():
+    clock = _FakeClock()
+    api = _FakeBotApi(clock)
+    governor = _governor(clock, max_pending_per_chat=2)
+
+    async def _run():
+        return await asyncio.gather(
+            *(governor(api, None, SendMessage(chat_id=9, text=str(index))) for index in range(5)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(_run())
+
+    dropped = [result for result in results if isinstance(result, TelegramSendDropped)]
+    assert len(dropped) == 2
+    assert all(result.reason == "chat_queue_full" for result in dropped)
+    assert len(api.delivered) == 3
+    assert governor.metrics_snapshot()["pending"] == 0